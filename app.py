@@ -13,9 +13,12 @@ from flask import (
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import NotFound
+import functools
+import hashlib
 import json
 import queue
 import shutil
+import time
 import traceback
 from datetime import datetime
 from pathlib import Path
@@ -27,8 +30,20 @@ from utils.logger import (
     clear_session_context,
     register_log_listener,
     unregister_log_listener,
+    register_activity_hook,
 )
-from utils.job_manager import JobManager
+from utils.admission import AdmissionController
+from utils.analysis_planner import TARGETS as ANALYSIS_TARGETS, AnalysisPlanner
+from utils.analysis_windows import AnalysisWindow, frame_windows, windows_from_chunks, windows_over_source
+from utils.estimator import JobEstimator, analysis_actuals
+from utils.job_manager import (
+    POOL_API, POOL_CPU, PRIORITIES as JOB_PRIORITIES, PRIORITY_BATCH, PRIORITY_NORMAL, STATUS_CANCELLED,
+    STATUS_COMPLETED, STATUS_FAILED, STATUSES as JOB_STATUSES, JobManager, Stage,
+)
+from utils.job_store import JobStore
+from utils.media_store import MediaStore
+from utils.shot_index import ShotIndex
+from utils.upload_store import UploadError, UploadStore
 import config
 
 # Initialize Flask app
@@ -54,9 +69,30 @@ _services = {
     'gemini_analyzer': None,
     'gemini_tts': None,
     'video_processor': None,
+    'gemini_async': None,
+    'event_loop': None,
+    'http_transport': None,
     'initialized': False
 }
 
+def _get_http_transport():
+    """The pooled HTTP transport shared by every Google API client (None if disabled)."""
+    if config.HTTP_SHARED_TRANSPORT and _services['http_transport'] is None:
+        from utils.http_transport import SharedTransport
+        _services['http_transport'] = SharedTransport(
+            http2=config.HTTP2,
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_seconds=config.HTTP_KEEPALIVE_SECONDS,
+            connect_timeout_seconds=config.HTTP_CONNECT_TIMEOUT_SECONDS,
+            upload_timeout_seconds=config.HTTP_UPLOAD_TIMEOUT_SECONDS,
+            poll_timeout_seconds=config.HTTP_POLL_TIMEOUT_SECONDS,
+            generate_timeout_seconds=config.HTTP_GENERATE_TIMEOUT_SECONDS,
+            async_client=config.GEMINI_ASYNC_ANALYSIS,
+        )
+    return _services['http_transport']
+
+
 def _get_services():
     """Lazy initialization of heavy services on first use."""
     if not _services['initialized']:
@@ -67,6 +103,7 @@ def _get_services():
         from utils.gemini_tts import GeminiTTS
         from utils.video_processor import VideoProcessor
 
+        http_transport = _get_http_transport()
         _services['gemini_analyzer'] = GeminiVideoAnalyzer(
             api_key=config.GEMINI_API_KEY,
             api_delay_seconds=config.GEMINI_API_DELAY_SECONDS,
@@ -79,6 +116,20 @@ def _get_services():
             thinking_level=config.GEMINI_THINKING_LEVEL,
             clip_min=config.CLIP_DURATION_MIN,
             clip_max=config.CLIP_DURATION_MAX,
+            api_keys=config.GEMINI_API_KEYS,
+            rpm_per_key=config.GEMINI_API_RPM_PER_KEY,
+            streaming=config.GEMINI_STREAM_ANALYSIS,
+            hedge_requests=config.GEMINI_HEDGE_REQUESTS,
+            hedge_percentile=config.GEMINI_HEDGE_PERCENTILE,
+            hedge_min_samples=config.GEMINI_HEDGE_MIN_SAMPLES,
+            context_cache=config.GEMINI_CONTEXT_CACHE,
+            cache_ttl_seconds=config.GEMINI_CACHE_TTL_SECONDS,
+            inline_max_bytes=config.GEMINI_INLINE_MAX_BYTES,
+            snap_tolerance_seconds=config.SHOT_SNAP_TOLERANCE_SECONDS,
+            base_url=config.GEMINI_BASE_URL,
+            http_transport=http_transport,
+            request_timeout_seconds=config.GEMINI_REQUEST_TIMEOUT_SECONDS,
+            file_processing_timeout_seconds=config.GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS,
         )
         _services['gemini_tts'] = GeminiTTS(
             api_key=config.GEMINI_TTS_API_KEY,
@@ -89,8 +140,26 @@ def _get_services():
             max_retries=config.GEMINI_TTS_MAX_RETRIES,
             retry_backoff_seconds=config.GEMINI_TTS_RETRY_BACKOFF_SECONDS,
             max_wait_seconds=config.GEMINI_TTS_MAX_WAIT_SECONDS,
+            api_keys=config.GEMINI_TTS_API_KEYS,
+            rpm_per_key=config.GEMINI_TTS_RPM_PER_KEY,
+            base_url=config.GEMINI_BASE_URL,
+            http_transport=http_transport,
+            request_timeout_seconds=config.GEMINI_TTS_REQUEST_TIMEOUT_SECONDS,
+            daily_limit_per_key=config.GEMINI_TTS_DAILY_LIMIT_PER_KEY,
+        )
+        _services['video_processor'] = VideoProcessor(
+            config.FFMPEG_PATH,
+            clip_timeout_seconds=config.FFMPEG_CLIP_TIMEOUT_SECONDS,
+            clip_timeout_per_second=config.FFMPEG_TIMEOUT_PER_CLIP_SECOND,
         )
-        _services['video_processor'] = VideoProcessor(config.FFMPEG_PATH)
+        if config.GEMINI_ASYNC_ANALYSIS:
+            from utils.async_gemini import AsyncGeminiService, EventLoopThread
+            _services['gemini_async'] = AsyncGeminiService(
+                _services['gemini_analyzer'], _services['gemini_tts'],
+                request_timeout_seconds=config.GEMINI_REQUEST_TIMEOUT_SECONDS,
+            )
+            # One loop for every job: their API waits are multiplexed on it.
+            _services['event_loop'] = EventLoopThread()
         _services['initialized'] = True
 
         logger.info(f"Model: {config.GEMINI_MODEL_NAME} (thinking: {config.GEMINI_THINKING_LEVEL})")
@@ -130,6 +199,7 @@ def _youtube_uploader():
     return YouTubeUploader(
         client_secrets_file=config.YOUTUBE_CLIENT_SECRETS,
         token_file=config.YOUTUBE_TOKEN_FILE,
+        http_transport=_get_http_transport(),
     )
 
 
@@ -159,64 +229,425 @@ def _maybe_upload_youtube(gemini_analyzer, final_video_path, script_text, movie_
         return {'error': str(exc)}
 
 
-def _run_pipeline(job):
+def _from_media_store(source_sha256, name, target):
+    """Link a file derived earlier from the same source into `target`; True if there was one."""
+    if media_store is None or not source_sha256:
+        return False
+    return media_store.link_attachment(source_sha256, name, target) is not None
+
+
+def _to_media_store(source_sha256, name, path):
+    """Keep a derived file with the stored source, for later jobs on it."""
+    if media_store is None or not source_sha256 or not Path(path).exists():
+        return
+    try:
+        media_store.attach(source_sha256, name, path)
+    except Exception as exc:
+        logger.warning(f"Could not keep {name} in the media store: {exc}")
+
+
+def _shot_index(video_processor, video_path, session_dir, duration, source_sha256=None):
+    """Shot-cut index of the source (None when disabled or detection fails)."""
+    if not config.SHOT_INDEX:
+        return None
+    started = time.time()
+    cache_path = session_dir / "shots.json"
+    stored_name = f"shots_t{config.SHOT_SCENE_THRESHOLD}.json"
+    _from_media_store(source_sha256, stored_name, cache_path)
+    try:
+        shots = ShotIndex.build(
+            video_path, duration,
+            ffmpeg_path=video_processor.ffmpeg_path,
+            threshold=config.SHOT_SCENE_THRESHOLD,
+            cache_path=cache_path,
+        )
+    except Exception as exc:
+        logger.warning(f"Shot detection failed, continuing without a shot index: {exc}")
+        return None
+    _to_media_store(source_sha256, stored_name, cache_path)
+    logger.info(f"✓ Shot index: {len(shots)} cuts in {time.time() - started:.1f}s")
+    return shots
+
+
+def _proxy_name(window_seconds, cut_points):
+    """Media store name of a proxy: it depends on the settings and its keyframe times."""
+    settings = (config.ANALYSIS_PROXY_HEIGHT, config.ANALYSIS_PROXY_FPS, config.ANALYSIS_PROXY_VIDEO_KBPS,
+                config.ANALYSIS_PROXY_AUDIO_KBPS, config.ANALYSIS_PROXY_MONO_AUDIO,
+                config.ANALYSIS_PROXY_KEEP_AUDIO, window_seconds,
+                [round(t, 3) for t in cut_points] if cut_points else None)
+    return f"proxy_{hashlib.sha256(json.dumps(settings).encode()).hexdigest()[:16]}.mp4"
+
+
+def _analysis_proxy(video_processor, video_path, session_dir, window_seconds, cut_points=None,
+                    source_sha256=None):
     """
-    Execute the full pipeline for one job. Runs on the JobManager worker thread.
-    Returns the result dict; raising marks the job failed.
+    Low-bitrate copy of the source to upload for analysis.
+
+    Returns (path to analyze, report dict). Disabled or failed: (video_path, None),
+    so a transcode problem never blocks the job.
     """
-    params = job.params
-    session_id = job.job_id
-    set_session_context(session_id)
+    if not config.ANALYSIS_PROXY:
+        return video_path, None
+    started = time.time()
+    proxy_path = session_dir / "analysis_proxy.mp4"
+    stored_name = _proxy_name(window_seconds, cut_points)
+    if _from_media_store(source_sha256, stored_name, proxy_path):
+        logger.info(f"✓ Analysis proxy: reusing the stored one ({proxy_path.stat().st_size / 1024 ** 2:.1f} MB)")
+        return proxy_path, {
+            'source_bytes': video_path.stat().st_size,
+            'proxy_bytes': proxy_path.stat().st_size,
+            'transcode_seconds': 0.0,
+            'reused': True,
+        }
     try:
-        logger.info("=" * 80)
-        logger.info(f"PROCESSING JOB {session_id}")
-        logger.info("=" * 80)
+        proxy_path = video_processor.create_analysis_proxy(
+            video_path, proxy_path,
+            height=config.ANALYSIS_PROXY_HEIGHT,
+            fps=config.ANALYSIS_PROXY_FPS,
+            video_kbps=config.ANALYSIS_PROXY_VIDEO_KBPS,
+            audio_kbps=config.ANALYSIS_PROXY_AUDIO_KBPS,
+            mono_audio=config.ANALYSIS_PROXY_MONO_AUDIO,
+            keep_audio=config.ANALYSIS_PROXY_KEEP_AUDIO,
+            keyframe_seconds=window_seconds,
+            keyframe_times=cut_points,
+        )
+    except Exception as exc:
+        logger.warning(f"Analysis proxy failed, uploading the source instead: {exc}")
+        return video_path, None
+    report = {
+        'source_bytes': video_path.stat().st_size,
+        'proxy_bytes': proxy_path.stat().st_size,
+        'transcode_seconds': round(time.time() - started, 2),
+    }
+    logger.info(f"✓ Analysis proxy: {report['proxy_bytes'] / 1024 ** 2:.1f} MB "
+                f"(source {report['source_bytes'] / 1024 ** 2:.1f} MB) "
+                f"in {report['transcode_seconds']}s")
+    _to_media_store(source_sha256, stored_name, proxy_path)
+    return proxy_path, report
+
+
+def _proxy_savings(report, analysis_stats):
+    """
+    Add upload bytes and the estimated upload + processing time the proxy saved.
+    The estimate scales the measured upload time by the source/proxy size ratio.
+    """
+    if not report:
+        return None
+    analysis_stats = analysis_stats or {}
+    upload_bytes = analysis_stats.get('upload_bytes', 0)
+    upload_seconds = analysis_stats.get('upload_seconds', 0.0)
+    ratio = report['source_bytes'] / report['proxy_bytes'] if report['proxy_bytes'] else 1.0
+    seconds_saved = upload_seconds * ratio - upload_seconds
+    report.update({
+        'size_ratio': round(ratio, 2),
+        'upload_bytes': upload_bytes,
+        'upload_bytes_saved': int(upload_bytes * ratio - upload_bytes),
+        'upload_seconds': upload_seconds,
+        'est_upload_seconds_saved': round(seconds_saved, 1),
+        'est_net_seconds_saved': round(seconds_saved - report['transcode_seconds'], 1),
+    })
+    logger.info(f"Analysis proxy saved ~{report['upload_bytes_saved'] / 1024 ** 2:.0f} MB of upload "
+                f"and ~{report['est_net_seconds_saved']}s net")
+    return report
+
+
+def _analysis_plan(duration, params):
+    """Plan window length / fps / media resolution / thinking for this job."""
+    planner = AnalysisPlanner(
+        context_tokens=config.GEMINI_CONTEXT_TOKENS,
+        tpm_limit=config.GEMINI_TPM_LIMIT,
+        default_thinking_level=config.GEMINI_THINKING_LEVEL,
+    )
+    plan = planner.plan(
+        duration,
+        target=params.get('analysis_target') or config.ANALYSIS_TARGET,
+        prompt_chars=len(params.get('script_text') or '') + len(params.get('user_instructions') or ''),
+    )
+    if config.ANALYSIS_WINDOW_SECONDS > 0:
+        plan.chunk_seconds = config.ANALYSIS_WINDOW_SECONDS
+        plan.notes.append(f"window length fixed to {plan.chunk_seconds}s by ANALYSIS_WINDOW_SECONDS")
+    return plan
 
-        services = _get_services()
-        gemini_analyzer = services['gemini_analyzer']
-        gemini_tts = services['gemini_tts']
-        video_processor = services['video_processor']
 
-        session_dir = config.TEMP_DIR / session_id
-        session_audio_dir = config.AUDIO_DIR / session_id
-        session_output_dir = config.OUTPUT_DIR / session_id
-        for directory in [session_dir, session_audio_dir, session_output_dir]:
-            directory.mkdir(parents=True, exist_ok=True)
-
-        movie_title = params['movie_title']
-        user_instructions = params['user_instructions']
-        script_text = params['script_text']
-        auto_generate = params['auto_generate']
-
-        # Step 1: Acquire the source video (download here if it's a Drive URL).
-        job.set_stage("Acquiring video")
-        video_path = params.get('video_path')
-        if video_path:
-            video_path = Path(video_path)
-            if not video_path.exists():
-                raise RuntimeError("Uploaded video file is missing.")
+def _batch_options():
+    return {
+        'poll_initial_seconds': config.GEMINI_BATCH_POLL_INITIAL_SECONDS,
+        'poll_max_seconds': config.GEMINI_BATCH_POLL_MAX_SECONDS,
+        'max_wait_seconds': config.GEMINI_BATCH_MAX_WAIT_SECONDS,
+    }
+
+
+def _use_coarse_to_fine(analysis_source, duration, auto_generate):
+    """Coarse-to-fine needs autonomous mode, a known duration and a single upload."""
+    if not auto_generate or config.ANALYSIS_STRATEGY != 'coarse_to_fine':
+        return False
+    if not duration:
+        logger.warning("Could not read source duration; using per-chunk analysis")
+        return False
+    if analysis_source.stat().st_size > config.GEMINI_FILE_MAX_BYTES:
+        logger.warning("Source is over the single-upload limit; using per-chunk analysis")
+        return False
+    return True
+
+
+def _frame_sheet_grid():
+    """FRAME_SHEET_GRID ("4x4") as (columns, rows); None for single frames."""
+    try:
+        columns, rows = (int(part) for part in config.FRAME_SHEET_GRID.split('x'))
+    except ValueError:
+        return None
+    return (columns, rows) if columns * rows > 1 else None
+
+
+def _frame_windows(video_processor, video_path, window_seconds, duration, session_dir,
+                   shots=None, cut_points=None):
+    """Frame windows (contact sheets per span) or None when extraction fails."""
+    spans = windows_over_source(video_path, duration, window_seconds, starts=cut_points, shots=shots)
+    started = time.time()
+    try:
+        sheets = video_processor.extract_frame_sheets(
+            video_path, session_dir / "frames",
+            [(window.start_seconds, window.end_seconds) for window in spans],
+            fps=config.FRAME_SAMPLE_FPS,
+            height=config.FRAME_HEIGHT,
+            tile=_frame_sheet_grid(),
+            burn_timecodes=config.FRAME_BURN_TIMECODES,
+            scene_threshold=config.SHOT_SCENE_THRESHOLD if config.FRAME_AT_SHOTS else None,
+            max_gap_seconds=config.FRAME_MAX_GAP_SECONDS,
+        )
+    except Exception as exc:
+        logger.warning(f"Frame extraction failed, using video input instead: {exc}")
+        return None
+    windows = frame_windows(spans, sheets)
+    if not windows:
+        logger.warning("No frames were extracted; using video input instead")
+        return None
+    frame_bytes = sum(image.stat().st_size for window in windows for image, _ in window.frames)
+    logger.info(f"✓ {len(windows)} frame windows, {frame_bytes / 1024 ** 2:.1f} MB of frames "
+                f"in {time.time() - started:.1f}s")
+    return windows
+
+
+def _analysis_windows(video_processor, video_path, window_seconds, duration=None,
+                      shots=None, cut_points=None, session_dir=None):
+    """
+    Windows the analyzer will look at. In frames mode each window is a few
+    contact sheets of sampled frames; in offsets mode the source is uploaded
+    once and addressed by start/end offsets (no split); otherwise, or when the
+    source is too large for a single upload, it is split into chunk files.
+    With a shot index, windows start at `cut_points` (near shot cuts).
+    """
+    if config.GEMINI_ANALYSIS_INPUT == 'frames':
+        duration = duration or video_processor.get_video_duration(video_path)
+        if duration and session_dir is not None:
+            windows = _frame_windows(video_processor, video_path, window_seconds, duration,
+                                     session_dir, shots=shots, cut_points=cut_points)
+            if windows:
+                return windows
         else:
-            from utils.drive_downloader import download_from_drive
+            logger.warning("Could not read source duration; splitting into chunks instead")
+    if config.GEMINI_ANALYSIS_INPUT == 'offsets':
+        size = video_path.stat().st_size
+        duration = duration or video_processor.get_video_duration(video_path)
+        if size > config.GEMINI_FILE_MAX_BYTES:
+            logger.warning(f"Source is {size / 1024 ** 3:.1f} GB, over the single-upload limit; "
+                           f"splitting into chunks instead of offset windows")
+        elif duration:
+            windows = windows_over_source(video_path, duration, window_seconds,
+                                          starts=cut_points, shots=shots)
+            logger.info(f"✓ {len(windows)} offset windows over one upload (no split)")
+            return windows
+        else:
+            logger.warning("Could not read source duration; splitting into chunks instead")
+    video_chunks = video_processor.split_video(video_path, chunk_duration=window_seconds,
+                                               cut_points=cut_points)
+    logger.info(f"✓ Video split into {len(video_chunks)} chunks")
+    return windows_from_chunks(video_chunks, window_seconds, starts=cut_points, shots=shots)
+
+
+def _job_stage(run):
+    """Run a pipeline stage with the job's session id on its log lines."""
+    @functools.wraps(run)
+    def stage(job, ctx):
+        set_session_context(job.job_id)
+        try:
+            return run(job, ctx)
+        finally:
+            clear_session_context()
+    return stage
+
+
+@_job_stage
+def _stage_acquire(job, ctx):
+    """Step 1: acquire the source video (download here if it's a Drive URL)."""
+    params = job.params
+    session_id = job.job_id
+    logger.info("=" * 80)
+    logger.info(f"PROCESSING JOB {session_id}")
+    logger.info("=" * 80)
+
+    ctx['session_dir'] = config.TEMP_DIR / session_id
+    ctx['session_audio_dir'] = config.AUDIO_DIR / session_id
+    ctx['session_output_dir'] = config.OUTPUT_DIR / session_id
+    for directory in [ctx['session_dir'], ctx['session_audio_dir'], ctx['session_output_dir']]:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    # Sources go through the media store (when enabled): the job works on a
+    # hard link, and a video submitted again is neither kept twice nor
+    # downloaded again.
+    source_sha256 = params.get('source_sha256')
+    video_path = params.get('video_path')
+    if video_path:
+        video_path = Path(video_path)
+        if not video_path.exists() and media_store is not None and source_sha256 in media_store:
+            media_store.link(source_sha256, session_id, video_path)  # retried after the move
+        if not video_path.exists():
+            raise RuntimeError("Uploaded video file is missing.")
+        if media_store is not None:
+            source_sha256 = media_store.put(video_path, sha256=source_sha256, job_id=session_id)
+            media_store.link(source_sha256, session_id, video_path)
+    else:
+        from utils.drive_downloader import download_from_drive, extract_file_id
+        drive_url = params.get('drive_url')
+        drive_id = extract_file_id(drive_url or '')
+        video_path = ctx['session_dir'] / f"video_{session_id}.mp4"
+        source_sha256 = media_store.lookup_drive(drive_id) if media_store is not None and drive_id else None
+        if source_sha256:
+            try:
+                media_store.link(source_sha256, session_id, video_path)
+                logger.info(f"Drive file {drive_id} is already stored; skipped the download")
+            except KeyError:  # evicted in the meantime
+                source_sha256 = None
+        if not source_sha256:
             logger.info("Downloading video from Google Drive...")
-            target = session_dir / f"video_{session_id}.mp4"
-            downloaded = download_from_drive(params.get('drive_url'), target)
+            downloaded = download_from_drive(drive_url, video_path)
             if not downloaded:
                 raise RuntimeError("Failed to download video from Google Drive")
             video_path = Path(downloaded)
-        logger.info(f"✓ Source video ready: {video_path}")
-
-        # Step 2: Split, then ALIGN a provided script or GENERATE one.
-        job.set_stage("Analyzing video")
-        chunk_seconds = 600
-        video_chunks = video_processor.split_video(video_path, chunk_duration=chunk_seconds)
-        logger.info(f"✓ Video split into {len(video_chunks)} chunks")
+            if media_store is not None:
+                source_sha256 = media_store.put(video_path, drive_id=drive_id, job_id=session_id)
+                media_store.link(source_sha256, session_id, video_path)
+    ctx['video_path'] = video_path
+    ctx['source_sha256'] = source_sha256
+    # Probed here so the later stages' deadlines can scale with it.
+    duration = media_store.get_meta(source_sha256, 'duration') if source_sha256 and media_store else None
+    if duration is None:
+        duration = _get_services()['video_processor'].get_video_duration(video_path)
+        if source_sha256 and media_store is not None and duration:
+            media_store.set_meta(source_sha256, 'duration', duration)
+    ctx['duration'] = duration
+    logger.info(f"✓ Source video ready: {video_path}")
+
+
+@_job_stage
+def _stage_prepare(job, ctx):
+    """Step 2a: plan the analysis; shot index, proxy and windows (chunks / frames)."""
+    video_processor = _get_services()['video_processor']
+    session_dir = ctx['session_dir']
+    video_path = ctx['video_path']
+
+    duration = ctx['duration'] if 'duration' in ctx else video_processor.get_video_duration(video_path)
+    plan = _analysis_plan(duration, job.params)
+    chunk_seconds = plan.chunk_seconds
+    shots = _shot_index(video_processor, video_path, session_dir, duration, ctx.get('source_sha256'))
+    cut_points = None
+    if shots is not None and duration:
+        cut_points = shots.cut_points(chunk_seconds, duration, config.SHOT_CUT_TOLERANCE_SECONDS)
+    # The proxy (if enabled) is what gets split/uploaded; rendering uses video_path.
+    analysis_source, proxy_report = _analysis_proxy(
+        video_processor, video_path, session_dir, chunk_seconds, cut_points, ctx.get('source_sha256')
+    )
+    coarse_to_fine = _use_coarse_to_fine(analysis_source, duration, job.params['auto_generate'])
+    video_chunks = None
+    if not coarse_to_fine:
+        video_chunks = _analysis_windows(video_processor, analysis_source, chunk_seconds, duration,
+                                         shots=shots, cut_points=cut_points,
+                                         session_dir=session_dir)
+    ctx.update({
+        'duration': duration,
+        'chunk_seconds': chunk_seconds,
+        'plan': plan,
+        'shots': shots,
+        'cut_points': cut_points,
+        'shot_index': {
+            'cuts': len(shots),
+            'window_starts': [round(start, 3) for start in cut_points] if cut_points else None,
+        } if shots is not None else None,
+        'analysis_source': analysis_source,
+        'proxy_report': proxy_report,
+        'coarse_to_fine': coarse_to_fine,
+        'windows': video_chunks,
+    })
+
+
+@_job_stage
+def _stage_analyze(job, ctx):
+    """Step 2b: ALIGN a provided script or GENERATE one; validate scenes."""
+    params = job.params
+    services = _get_services()
+    gemini_analyzer = services['gemini_analyzer']
+    gemini_tts = services['gemini_tts']
+    user_instructions = params['user_instructions']
+    script_text = params['script_text']
+    auto_generate = params['auto_generate']
+    batch_priority = params.get('priority') == PRIORITY_BATCH
+    plan, shots = ctx['plan'], ctx['shots']
+    chunk_seconds = plan.chunk_seconds
+    analysis_source, duration = ctx['analysis_source'], ctx['duration']
+    coarse_to_fine, video_chunks = ctx['coarse_to_fine'], ctx['windows']
+
+    # Streaming mode: narration TTS starts while analysis is still running.
+    prefetcher = None
+    if config.GEMINI_STREAM_ANALYSIS:
+        prefetcher = gemini_tts.start_prefetch(ctx['session_audio_dir'])
+    on_scene = prefetcher.submit if prefetcher else None
 
-        if auto_generate:
+    try:
+        if coarse_to_fine:
+            logger.info("Autonomous mode (coarse-to-fine): surveying the film, then "
+                        "generating the recap for the selected windows...")
+            scenes_data = gemini_analyzer.generate_scenes_coarse_to_fine(
+                analysis_source, duration,
+                custom_instructions=user_instructions,
+                on_scene=on_scene,
+                plan=plan,
+                survey_fps=config.COARSE_SURVEY_FPS,
+                windows_per_hour=config.COARSE_WINDOWS_PER_HOUR,
+                detail_max_seconds=config.COARSE_DETAIL_MAX_SECONDS,
+                shots=shots,
+            )
+            script_text = scenes_data.get('full_script', '') or script_text
+        elif auto_generate and batch_priority:
+            logger.info("Autonomous mode (batch priority): submitting the recap generation "
+                        "to the Batch API...")
+            scenes_data = gemini_analyzer.generate_scenes_batch(
+                video_chunks=video_chunks,
+                custom_instructions=user_instructions,
+                chunk_seconds=chunk_seconds,
+                on_scene=on_scene,
+                plan=plan,
+                **_batch_options(),
+            )
+            script_text = scenes_data.get('full_script', '') or script_text
+        elif auto_generate and services.get('gemini_async'):
+            logger.info("Autonomous mode (async): generating the recap from the video...")
+            scenes_data = services['event_loop'].run(services['gemini_async'].generate_scenes(
+                video_chunks,
+                custom_instructions=user_instructions,
+                chunk_seconds=chunk_seconds,
+                concurrency=config.GEMINI_ASYNC_CONCURRENCY,
+                on_scene=on_scene,
+                plan=plan,
+            ))
+            script_text = scenes_data.get('full_script', '') or script_text
+        elif auto_generate:
             logger.info("Autonomous mode: generating the recap from the video...")
             scenes_data = gemini_analyzer.generate_scenes_from_video(
                 video_chunks=video_chunks,
                 custom_instructions=user_instructions,
                 chunk_seconds=chunk_seconds,
+                on_scene=on_scene,
+                plan=plan,
             )
             script_text = scenes_data.get('full_script', '') or script_text
         else:
@@ -225,123 +656,433 @@ def _run_pipeline(job):
                 script_text=script_text,
                 custom_instructions=user_instructions,
                 chunk_seconds=chunk_seconds,
+                on_scene=on_scene,
+                plan=plan,
             )
             scenes_data['full_script'] = script_text
-
-        scenes_data['movie_title'] = movie_title
-
-        script_path = session_output_dir / "script.txt"
-        script_path.write_text(script_text or '', encoding='utf-8')
-
-        # Validate scenes.
-        valid_scenes, skipped_scenes = [], []
-        for scene in scenes_data.get('scenes', []):
-            status_flag = (scene.get('status') or '').strip().lower()
-            has_timestamps = bool(scene.get('start_time') and scene.get('end_time'))
-            has_narration = bool(scene.get('narration') and scene['narration'].strip())
-            if status_flag == 'review' or not has_timestamps or not has_narration:
-                reasons = []
-                if status_flag == 'review':
-                    reasons.append('flagged for review')
-                if not has_timestamps:
-                    reasons.append('missing timestamps')
-                if not has_narration:
-                    reasons.append('missing narration')
-                scene['skip_reason'] = ', '.join(reasons)
-                skipped_scenes.append(scene)
-                continue
-            valid_scenes.append(scene)
-
-        if skipped_scenes:
-            logger.warning(f"Skipping {len(skipped_scenes)} segments (review/missing data).")
-        scenes_data['scenes'] = valid_scenes
-        if not valid_scenes:
-            raise RuntimeError("No usable segments were produced from the video.")
-        if skipped_scenes:
-            scenes_data['skipped_scenes'] = skipped_scenes
-        logger.info(f"✓ {len(valid_scenes)} usable segments")
-
-        session_output_dir.mkdir(parents=True, exist_ok=True)
-        scenes_json_path = session_output_dir / "scenes.json"
-        with open(scenes_json_path, 'w', encoding='utf-8') as f:
-            json.dump(scenes_data, f, indent=2)
-
-        # Step 3: Narration audio.
-        job.set_stage("Generating narration")
+    except BaseException:
+        # Failed, cancelled or stopped by the watchdog (which may retry the stage
+        # with a fresh prefetcher): don't synthesize the rest, delete what's made.
+        if prefetcher:
+            prefetcher.abort()
+        raise
+    if prefetcher:
+        prefetcher.close()
+
+    scenes_data['movie_title'] = params['movie_title']
+
+    session_output_dir = ctx['session_output_dir']
+    script_path = session_output_dir / "script.txt"
+    script_path.write_text(script_text or '', encoding='utf-8')
+
+    # Validate scenes.
+    valid_scenes, skipped_scenes = [], []
+    for scene in scenes_data.get('scenes', []):
+        status_flag = (scene.get('status') or '').strip().lower()
+        has_timestamps = bool(scene.get('start_time') and scene.get('end_time'))
+        has_narration = bool(scene.get('narration') and scene['narration'].strip())
+        if status_flag == 'review' or not has_timestamps or not has_narration:
+            reasons = []
+            if status_flag == 'review':
+                reasons.append('flagged for review')
+            if not has_timestamps:
+                reasons.append('missing timestamps')
+            if not has_narration:
+                reasons.append('missing narration')
+            scene['skip_reason'] = ', '.join(reasons)
+            skipped_scenes.append(scene)
+            continue
+        valid_scenes.append(scene)
+
+    if skipped_scenes:
+        logger.warning(f"Skipping {len(skipped_scenes)} segments (review/missing data).")
+    scenes_data['scenes'] = valid_scenes
+    if not valid_scenes:
+        if prefetcher:
+            prefetcher.discard_unused()
+        raise RuntimeError("No usable segments were produced from the video.")
+    if skipped_scenes:
+        scenes_data['skipped_scenes'] = skipped_scenes
+    logger.info(f"✓ {len(valid_scenes)} usable segments")
+
+    session_output_dir.mkdir(parents=True, exist_ok=True)
+    scenes_json_path = session_output_dir / "scenes.json"
+    with open(scenes_json_path, 'w', encoding='utf-8') as f:
+        json.dump(scenes_data, f, indent=2)
+
+    ctx.update({
+        'analysis_plan': plan.to_dict(),
+        'prefetcher': prefetcher,
+        'scenes_data': scenes_data,
+        'script_text': script_text,
+        'valid_scenes': valid_scenes,
+        'skipped_scenes': skipped_scenes,
+        'script_path': script_path,
+        'scenes_json_path': scenes_json_path,
+    })
+
+
+@_job_stage
+def _stage_tts(job, ctx):
+    """Step 3: narration audio."""
+    gemini_tts = _get_services()['gemini_tts']
+    prefetcher = ctx['prefetcher']
+    try:
         audio_files = gemini_tts.generate_audio_for_scenes(
-            scenes_data, session_audio_dir,
+            ctx['scenes_data'], ctx['session_audio_dir'],
             skip_failed=config.GEMINI_TTS_SKIP_FAILED_SCENES,
+            prefetched=prefetcher,
+            batch=job.params.get('priority') == PRIORITY_BATCH and config.GEMINI_TTS_BATCH,
+            batch_options=_batch_options(),
         )
-        logger.info(f"✓ Generated {len(audio_files)} audio files")
-
-        # Step 4: Render clips.
-        job.set_stage("Rendering clips")
-        processed_clips = video_processor.process_all_clips(
-            input_video=video_path,
-            scenes_data=scenes_data,
-            audio_files=audio_files,
-            output_dir=session_output_dir,
-            start_delay_ms=config.AUDIO_START_DELAY_MS,
-            use_audio_timing=config.USE_AUDIO_BASED_TIMING,
+    finally:
+        # Also on failure or a watchdog retry: the retry starts without this prefetcher.
+        if prefetcher:
+            prefetcher.discard_unused()
+    logger.info(f"✓ Generated {len(audio_files)} audio files")
+    if prefetcher:
+        logger.info(f"Narration prefetch: {prefetcher.stats()}")
+    ctx['narration_prefetch'] = prefetcher.stats() if prefetcher else None
+    ctx['audio_files'] = audio_files
+
+
+@_job_stage
+def _stage_render(job, ctx):
+    """Step 4: render clips."""
+    processed_clips = _get_services()['video_processor'].process_all_clips(
+        input_video=ctx['video_path'],
+        scenes_data=ctx['scenes_data'],
+        audio_files=ctx['audio_files'],
+        output_dir=ctx['session_output_dir'],
+        start_delay_ms=config.AUDIO_START_DELAY_MS,
+        use_audio_timing=config.USE_AUDIO_BASED_TIMING,
+    )
+    logger.info(f"✓ Processed {len(processed_clips)} clips")
+    ctx['processed_clips'] = processed_clips
+
+
+@_job_stage
+def _stage_finalize(job, ctx):
+    """Step 5: concatenate, clean up, and build the job result."""
+    services = _get_services()
+    session_id = job.job_id
+    session_dir = ctx['session_dir']
+    processed_clips = ctx['processed_clips']
+    clip_paths = [clip['clip_path'] for clip in processed_clips]
+    final_video_path = ctx['session_output_dir'] / f"final_video_{session_id}.mp4"
+    try:
+        services['video_processor'].concatenate_clips(clip_paths, final_video_path)
+    except Exception as e:
+        logger.warning(f"Could not concatenate clips: {str(e)}")
+        final_video_path = None
+
+    # Free disk: remove source + chunks (outputs/audio kept for download).
+    # A stored source only loses this job's link and reference.
+    try:
+        if session_dir.exists():
+            shutil.rmtree(session_dir)
+    except Exception as e:
+        logger.warning(f"Could not clean temp dir {session_dir}: {str(e)}")
+    if media_store is not None:
+        media_store.release(session_id)
+
+    scenes_data = ctx['scenes_data']
+    skipped_scenes = ctx['skipped_scenes']
+    ctx['final_video_path'] = final_video_path
+    ctx['result'] = {
+        'success': True,
+        'session_id': session_id,
+        'scenes_count': len(ctx['valid_scenes']),
+        'scenes': ctx['valid_scenes'],
+        'clips': processed_clips,
+        'final_video': str(final_video_path) if final_video_path else None,
+        'full_script': ctx['script_text'],
+        'movie_title': job.params['movie_title'],
+        'script_file': ctx['script_path'].name,
+        'scenes_file': ctx['scenes_json_path'].name,
+        'alignment_notes': scenes_data.get('notes'),
+        'analysis_stats': scenes_data.get('analysis_stats'),
+        'analysis_plan': ctx['analysis_plan'],
+        'coarse_to_fine': scenes_data.get('coarse_to_fine'),
+        'shot_index': ctx['shot_index'],
+        'narration_prefetch': ctx.get('narration_prefetch'),
+        'analysis_proxy': _proxy_savings(ctx['proxy_report'], scenes_data.get('analysis_stats')),
+        'skipped_scenes': len(skipped_scenes),
+        'skipped_scene_numbers': [s.get('scene_number') for s in skipped_scenes],
+        'skipped_scene_details': [
+            {'scene_number': s.get('scene_number'), 'reason': s.get('skip_reason')}
+            for s in skipped_scenes
+        ],
+        'instructions': job.params['user_instructions'],
+        'youtube': None,
+        # Cumulative per-key usage (shared across jobs since services are shared).
+        'api_keys': {
+            'analysis': services['gemini_analyzer'].key_pool.stats(),
+            'tts': services['gemini_tts'].key_pool.stats(),
+        },
+        # Cumulative connection reuse / latency per operation type.
+        'http_transport': services['http_transport'].stats() if services.get('http_transport') else None,
+    }
+
+
+@_job_stage
+def _stage_upload(job, ctx):
+    """Step 6 (optional): upload to YouTube. Non-fatal."""
+    params = job.params
+    if params.get('upload_youtube') and ctx['final_video_path']:
+        ctx['result']['youtube'] = _maybe_upload_youtube(
+            _get_services()['gemini_analyzer'], ctx['final_video_path'], ctx['script_text'],
+            params['movie_title'], params
         )
-        logger.info(f"✓ Processed {len(processed_clips)} clips")
+    logger.info("=" * 80)
+    logger.info(f"JOB {job.job_id} COMPLETED")
+    logger.info("=" * 80)
+
+
+def _floor_deadline(job, ctx):
+    return config.JOB_STAGE_MIN_DEADLINE_SECONDS or None
+
+
+def _media_deadline(job, ctx):
+    """Deadline for stages whose work grows with the source duration."""
+    if not config.JOB_STAGE_MIN_DEADLINE_SECONDS:
+        return None
+    minutes = (ctx.get('duration') or 0) / 60
+    return config.JOB_STAGE_MIN_DEADLINE_SECONDS + minutes * config.JOB_DEADLINE_PER_MEDIA_MINUTE
+
+
+def _scene_deadline(job, ctx):
+    """Deadline for stages whose work grows with the number of scenes."""
+    if not config.JOB_STAGE_MIN_DEADLINE_SECONDS:
+        return None
+    scenes = len(ctx.get('valid_scenes') or [])
+    return config.JOB_STAGE_MIN_DEADLINE_SECONDS + scenes * config.JOB_DEADLINE_PER_SCENE_SECONDS
+
+
+def _analyze_deadline(job, ctx):
+    # A Batch API job may legitimately wait for hours (GEMINI_BATCH_MAX_WAIT_SECONDS).
+    if job.params.get('auto_generate') and job.params.get('priority') == PRIORITY_BATCH \
+            and not ctx.get('coarse_to_fine'):
+        return None
+    return _media_deadline(job, ctx)
+
+
+def _tts_deadline(job, ctx):
+    if job.params.get('priority') == PRIORITY_BATCH and config.GEMINI_TTS_BATCH:
+        return None
+    return _scene_deadline(job, ctx)
+
+
+# Stages and the worker pool each runs on: network / quota-bound stages on the
+# api pool, ffmpeg work on the cpu pool, so jobs overlap across pools.
+PIPELINE_STAGES = [
+    Stage('acquire', _stage_acquire, POOL_API, label="Acquiring video", deadline=_floor_deadline),
+    Stage('prepare', _stage_prepare, POOL_CPU, label="Preparing analysis", deadline=_media_deadline),
+    Stage('analyze', _stage_analyze, POOL_API, label="Analyzing video", deadline=_analyze_deadline),
+    Stage('tts', _stage_tts, POOL_API, label="Generating narration", deadline=_tts_deadline),
+    Stage('render', _stage_render, POOL_CPU, label="Rendering clips", deadline=_scene_deadline),
+    Stage('finalize', _stage_finalize, POOL_CPU, label="Finalizing video", deadline=_scene_deadline),
+    Stage('upload', _stage_upload, POOL_API, label="Publishing", deadline=_scene_deadline),
+]
+
+# Stage context entries that are Paths / live objects rather than JSON.
+_CONTEXT_PATHS = ('session_dir', 'session_audio_dir', 'session_output_dir', 'video_path',
+                  'analysis_source', 'script_path', 'scenes_json_path', 'final_video_path')
+_CONTEXT_TRANSIENT = ('plan', 'shots', 'prefetcher')
+
+
+def _checkpoint_context(ctx):
+    """JSON-safe copy of a job's stage context, saved in job.json after each stage."""
+    data = {}
+    for key, value in ctx.items():
+        if key in _CONTEXT_TRANSIENT:
+            continue
+        if key in _CONTEXT_PATHS:
+            value = str(value) if value is not None else None
+        elif key == 'windows' and value is not None:
+            value = [window.to_state() for window in value]
+        data[key] = value
+    return data
+
+
+def _restore_context(job, data):
+    """
+    Stage context from a checkpoint. The plan is re-derived from the source
+    duration and the shot index reloaded from its cache file, so a job resumed
+    at analysis reuses the chunks / frames / proxy the prepare stage left on disk.
+    """
+    ctx = dict(data)
+    for key in _CONTEXT_PATHS:
+        if ctx.get(key):
+            ctx[key] = Path(ctx[key])
+    ctx['prefetcher'] = None
+    if 'chunk_seconds' in ctx:
+        ctx['plan'] = _analysis_plan(ctx['duration'], job.params)
+        ctx['plan'].chunk_seconds = ctx['chunk_seconds']  # must match the saved windows
+        shots_path = ctx['session_dir'] / "shots.json"
+        ctx['shots'] = ShotIndex.load(shots_path) if ctx.get('shot_index') and shots_path.exists() else None
+    if ctx.get('windows') is not None:
+        ctx['windows'] = [AnalysisWindow.from_state(window, shots=ctx['shots'])
+                          for window in ctx['windows']]
+        missing = [w.media_path for w in ctx['windows'] if not w.media_path.exists()]
+        if missing:
+            raise RuntimeError(f"analysis media is gone: {missing[0]}")
+    return ctx
+
+
+estimator = JobEstimator(
+    history_path=config.ESTIMATOR_HISTORY_PATH,
+    calibration_jobs=config.ESTIMATOR_CALIBRATION_JOBS,
+    clip_seconds=(config.CLIP_DURATION_MIN + config.CLIP_DURATION_MAX) / 2,
+)
 
-        # Step 5: Concatenate.
-        job.set_stage("Finalizing video")
-        clip_paths = [clip['clip_path'] for clip in processed_clips]
-        final_video_path = session_output_dir / f"final_video_{session_id}.mp4"
-        try:
-            video_processor.concatenate_clips(clip_paths, final_video_path)
-        except Exception as e:
-            logger.warning(f"Could not concatenate clips: {str(e)}")
-            final_video_path = None
 
-        # Free disk: remove source + chunks (outputs/audio kept for download).
-        try:
-            if session_dir.exists():
-                shutil.rmtree(session_dir)
-        except Exception as e:
-            logger.warning(f"Could not clean temp dir {session_dir}: {str(e)}")
+def _estimate_job(params, duration=None):
+    """Pre-flight estimate for a job with these params (duration: probed, if known)."""
+    priority = params.get('priority') or PRIORITY_NORMAL
+    skip = []
+    if params.get('auto_generate') and priority == PRIORITY_BATCH:
+        skip.append('analyze')  # Batch API turnaround isn't predictable
+    if priority == PRIORITY_BATCH and config.GEMINI_TTS_BATCH:
+        skip.append('tts')
+    wait = estimator.queue_wait(job_manager.active_jobs(), priority,
+                                parallelism=min(config.JOB_API_WORKERS, config.JOB_CPU_WORKERS))
+    return estimator.estimate(
+        duration_seconds=duration,
+        plan=_analysis_plan(duration, params) if duration else None,
+        params=params,
+        queue_wait_seconds=wait,
+        skip_stages=skip,
+    )
 
-        result = {
-            'success': True,
-            'session_id': session_id,
-            'scenes_count': len(valid_scenes),
-            'scenes': valid_scenes,
-            'clips': processed_clips,
-            'final_video': str(final_video_path) if final_video_path else None,
-            'full_script': script_text,
-            'movie_title': movie_title,
-            'script_file': script_path.name,
-            'scenes_file': scenes_json_path.name,
-            'alignment_notes': scenes_data.get('notes'),
-            'skipped_scenes': len(skipped_scenes),
-            'skipped_scene_numbers': [s.get('scene_number') for s in skipped_scenes],
-            'skipped_scene_details': [
-                {'scene_number': s.get('scene_number'), 'reason': s.get('skip_reason')}
-                for s in skipped_scenes
-            ],
-            'instructions': user_instructions,
-            'youtube': None,
-        }
 
-        # Step 6 (optional): upload to YouTube. Non-fatal.
-        if params.get('upload_youtube') and final_video_path:
-            job.set_stage("Uploading to YouTube")
-            result['youtube'] = _maybe_upload_youtube(
-                gemini_analyzer, final_video_path, script_text, movie_title, params
-            )
+def _probe_duration(video_path):
+    try:
+        return _get_services()['video_processor'].get_video_duration(video_path)
+    except Exception as e:
+        logger.warning(f"Could not probe {video_path} for the estimate: {str(e)}")
+        return None
+
+
+def _record_estimate(job, ctx):
+    """Compare a completed job with its pre-flight estimate (recalibrates the estimator)."""
+    estimate = job.params.get('estimate')
+    if not estimate:
+        return
+    actual = {
+        'duration_seconds': ctx.get('duration'),
+        'scenes': len(ctx.get('valid_scenes') or []),
+        **analysis_actuals((ctx.get('scenes_data') or {}).get('analysis_stats')),
+        'tts_calls': len(ctx.get('audio_files') or []),
+        'processing_seconds': round(sum(job.stage_seconds.values())),
+        'stage_seconds': dict(job.stage_seconds),
+    }
+    comparison = estimator.record(estimate, actual)
+    if isinstance(job.result, dict):
+        job.result['estimate'] = {'estimated': estimate, 'accuracy': comparison}
+    logger.info(f"Estimate vs actual for job {job.job_id}: "
+                + ", ".join(f"{metric} {row['error_pct']:+.0f}%" for metric, row in comparison.items()))
+
+
+def _release_job(job, ctx):
+    """
+    Free a cancelled job's working files: source, chunks, frames and proxy
+    (temp) and narration audio. Remote Gemini uploads and caches were already
+    deleted while its stage unwound; outputs/<sid> keeps job.json.
+    """
+    for base in (config.TEMP_DIR, config.AUDIO_DIR):
+        directory = base / job.job_id
+        if directory.exists():
+            shutil.rmtree(directory, ignore_errors=True)
+            logger.info(f"Deleted: {directory}")
+    if media_store is not None:
+        media_store.release(job.job_id)
+
+
+def _job_active(job_id):
+    """Whether a job still holds its media store references (failed jobs release none)."""
+    return any(job.job_id == job_id for job in job_manager.active_jobs())
+
+
+media_store = MediaStore(
+    config.MEDIA_STORE_DIR,
+    quota_bytes=int(config.MEDIA_STORE_QUOTA_GB * 1024 ** 3),
+    is_active=_job_active,
+) if config.MEDIA_STORE else None
+
+
+# Background job scheduler. Checkpoints to the job store after every stage;
+# unfinished jobs resume on startup. Results go to outputs/<sid>/job.json.
+job_manager = JobManager(
+    stages=PIPELINE_STAGES,
+    state_root=config.OUTPUT_DIR,
+    store=JobStore(config.JOB_DB_PATH),
+    pool_sizes={POOL_API: config.JOB_API_WORKERS, POOL_CPU: config.JOB_CPU_WORKERS},
+    checkpoint=_checkpoint_context,
+    restore=_restore_context,
+    resume=config.JOB_RESUME,
+    aging_seconds=config.JOB_AGING_SECONDS,
+    on_cancel=_release_job,
+    on_complete=_record_estimate,
+    stall_seconds=config.JOB_STALL_SECONDS,
+    stage_retries=config.JOB_STAGE_RETRIES,
+)
+# Any log line a job writes counts as progress for the stall watchdog.
+register_activity_hook(job_manager.heartbeat)
+
+
+def _recent_job_seconds():
+    """Run times of recently completed jobs (sum of their stage times)."""
+    jobs, _ = job_manager.list_jobs(status=[STATUS_COMPLETED], limit=20)
+    return [sum(job['stage_seconds'].values()) for job in jobs if job.get('stage_seconds')]
+
+
+def _tts_quota():
+    """The TTS key pool's remaining quota; None (check skipped) until the services are built."""
+    tts = _services['gemini_tts']
+    return tts.key_pool.remaining_today() if tts is not None else None
+
+
+admission = AdmissionController(
+    backlog=job_manager.backlog,
+    history=_recent_job_seconds,
+    quota=_tts_quota,
+    directories=[config.TEMP_DIR, config.OUTPUT_DIR],
+    max_queued_jobs=config.ADMISSION_MAX_QUEUED_JOBS,
+    max_backlog_seconds=config.ADMISSION_MAX_BACKLOG_SECONDS,
+    min_free_mb=config.ADMISSION_MIN_FREE_MB,
+    disk_factor=config.ADMISSION_DISK_FACTOR,
+    tts_calls_per_job=config.ADMISSION_TTS_CALLS_PER_JOB,
+    default_job_seconds=config.ADMISSION_DEFAULT_JOB_SECONDS,
+    # A job needs a turn on both pools; the smaller one bounds throughput.
+    parallelism=min(config.JOB_API_WORKERS, config.JOB_CPU_WORKERS),
+)
 
-        logger.info("=" * 80)
-        logger.info(f"JOB {session_id} COMPLETED")
-        logger.info("=" * 80)
-        return result
-    finally:
-        clear_session_context()
+
+upload_store = UploadStore(
+    config.UPLOAD_DIR,
+    max_size=config.RESUMABLE_UPLOAD_MAX_MB * 1024 * 1024,
+    expiry_seconds=config.UPLOAD_EXPIRY_HOURS * 3600,
+)
 
 
-# Background job queue (single worker). Persists results to outputs/<sid>/job.json.
-job_manager = JobManager(runner=_run_pipeline, state_root=config.OUTPUT_DIR)
+def _admit(priority, content_length=None):
+    """
+    Admission decision for a new job at `priority` whose upload is
+    `content_length` bytes (default: the current request's body, so /api/process
+    decides from its headers and query string, before the upload is read).
+    """
+    return admission.check(
+        content_length=(request.content_length or 0) if content_length is None else content_length,
+        priority=priority,
+        uses_tts=not (priority == PRIORITY_BATCH and config.GEMINI_TTS_BATCH),
+    )
+
+
+def _admission_rejected(decision):
+    response = jsonify({'error': decision.reason, 'admission': decision.to_dict()})
+    response.headers['Retry-After'] = decision.retry_after_header
+    return response, 429
 
 
 @app.route('/api/process', methods=['POST'])
@@ -349,10 +1090,43 @@ def process_video():
     """
     Enqueue a video processing job and return a job id immediately.
     Accepts a video file upload or a Google Drive URL (script optional).
+    Answers 429 with Retry-After, before reading the upload, when the server
+    can't take the job (see utils/admission.py); multipart bodies must carry a
+    Content-Length for that (411 otherwise).
+
+    `priority` belongs in the query string, where admission sees it before the
+    body; given in the form as well, it must be the same. A priority given only
+    in the form is admitted again once the form is read.
     """
     try:
+        query_priority = (request.args.get('priority') or '').strip().lower() or None
+        admitted_priority = query_priority or PRIORITY_NORMAL
+        if (config.ADMISSION_CONTROL and request.content_length is None
+                and request.mimetype == 'multipart/form-data'):
+            # A chunked upload has no size to check the free disk space against.
+            return jsonify({'error': 'Content-Length is required for uploads to /api/process'}), 411
+        decision = _admit(admitted_priority) if config.ADMISSION_CONTROL else None
+        if decision is not None and not decision.accepted:
+            return _admission_rejected(decision)
+
+        form_priority = (request.form.get('priority') or '').strip().lower() or None
+        if query_priority and form_priority and form_priority != query_priority:
+            return jsonify({'error': f"priority differs between the query string ({query_priority}) "
+                                     f"and the form ({form_priority})"}), 400
+        priority = query_priority or form_priority or PRIORITY_NORMAL
+        if priority not in JOB_PRIORITIES:
+            return jsonify({'error': 'priority must be one of: ' + ', '.join(JOB_PRIORITIES)}), 400
+        if decision is not None and priority != admitted_priority:
+            decision = _admit(priority)
+            if not decision.accepted:
+                return _admission_rejected(decision)
+
         session_id = _sanitize_session_id((request.form.get('session_id') or '').strip()) \
             or datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Checked before the source is saved or an upload is claimed into the
+        # session dir, which belongs to the running job.
+        if _job_active(session_id):
+            return jsonify({'error': f'Job {session_id} is already queued or running'}), 409
         session_dir = config.TEMP_DIR / session_id
         session_dir.mkdir(parents=True, exist_ok=True)
 
@@ -363,6 +1137,10 @@ def process_video():
         if auto_generate and not config.AUTO_GENERATE_SCRIPT:
             return jsonify({'error': 'Please provide the full script text.'}), 400
 
+        analysis_target = request.form.get('analysis_target', '').strip().lower() or None
+        if analysis_target and analysis_target not in ANALYSIS_TARGETS:
+            return jsonify({'error': 'analysis_target must be one of: ' + ', '.join(ANALYSIS_TARGETS)}), 400
+
         upload_youtube = request.form.get('upload_youtube', '').strip().lower() in {'1', 'true', 'on', 'yes'}
         if upload_youtube and not _youtube_authorized():
             return jsonify({'error': 'YouTube upload requested but not authorized. '
@@ -373,6 +1151,11 @@ def process_video():
             'user_instructions': user_instructions,
             'script_text': script_text,
             'auto_generate': auto_generate,
+            'analysis_target': analysis_target,
+            'priority': priority,
+            # Fair-share key: an explicit client/user id, else the caller's address.
+            'submitter': (request.form.get('submitter', '').strip()[:64]
+                          or request.remote_addr or 'anonymous'),
             'upload_youtube': upload_youtube,
             'youtube_privacy': request.form.get('youtube_privacy', config.YOUTUBE_DEFAULT_PRIVACY),
         }
@@ -381,6 +1164,14 @@ def process_video():
         # we return). File uploads are saved now; Drive URLs download in the job.
         if request.form.get('drive_url', '').strip():
             params['drive_url'] = request.form['drive_url'].strip()
+        elif request.form.get('upload_id', '').strip():
+            # A finished resumable upload: moved into the session dir, not copied.
+            try:
+                video_path, sha256 = upload_store.claim(request.form['upload_id'].strip(), session_dir)
+            except UploadError as e:
+                return jsonify({'error': str(e)}), e.status
+            params['video_path'] = str(video_path)
+            params['source_sha256'] = sha256
         elif 'video' in request.files and request.files['video'].filename:
             video_file = request.files['video']
             if not allowed_file(video_file.filename):
@@ -391,6 +1182,9 @@ def process_video():
         else:
             return jsonify({'error': 'Please provide either a video file or Google Drive URL'}), 400
 
+        # Drive videos aren't downloaded yet: their estimate assumes a typical duration.
+        duration = _probe_duration(params['video_path']) if params.get('video_path') else None
+        params['estimate'] = _estimate_job(params, duration)
         job = job_manager.submit(session_id, params)
         return jsonify({
             'success': True,
@@ -398,6 +1192,9 @@ def process_video():
             'session_id': session_id,
             'status': job.status,
             'queue_position': job_manager.queue_position(session_id),
+            'estimated_wait_seconds': params['estimate']['queue_wait_seconds'],
+            'eta_seconds': params['estimate']['eta_seconds'],
+            'estimate': params['estimate'],
             'message': 'Job queued. Poll /api/jobs/<job_id> for progress.',
         }), 202
 
@@ -406,6 +1203,143 @@ def process_video():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    Start a resumable upload: JSON or form with `filename`, `size` (bytes) and
+    optionally `sha256` and the job's `priority`. Subject to admission control
+    like /api/process.
+    """
+    data = request.get_json(silent=True) or request.form
+    filename = secure_filename(str(data.get('filename') or ''))
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Allowed: ' + ', '.join(ALLOWED_EXTENSIONS)}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be an integer number of bytes'}), 400
+    if config.ADMISSION_CONTROL:
+        priority = str(data.get('priority') or '').strip().lower() or PRIORITY_NORMAL
+        decision = _admit(priority, content_length=size)
+        if not decision.accepted:
+            return _admission_rejected(decision)
+    try:
+        upload = upload_store.create(filename, size, sha256=data.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    response = jsonify(upload.to_dict())
+    response.headers['Location'] = f"/api/uploads/{upload.upload_id}"
+    return response, 201
+
+
+def _content_range(upload):
+    """(start, length) from a `Content-Range: bytes start-end/size` header."""
+    header = (request.headers.get('Content-Range') or '').strip()
+    try:
+        unit, _, spec = header.partition(' ')
+        span, _, total = spec.partition('/')
+        start, _, end = span.partition('-')
+        start, end = int(start), int(end)
+        if unit != 'bytes' or end < start or (total not in ('*', '') and int(total) != upload.size):
+            raise ValueError(header)
+    except ValueError:
+        raise UploadError(f"Content-Range must be 'bytes start-end/{upload.size}'")
+    length = end - start + 1
+    if request.content_length is not None and request.content_length != length:
+        raise UploadError(f"Content-Length {request.content_length} doesn't match the range ({length})")
+    return start, length
+
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    """Write one byte range (raw request body, Content-Range header) of an upload."""
+    try:
+        upload = upload_store.get(upload_id)
+        start, length = _content_range(upload)
+        upload = upload_store.write(upload_id, start, request.stream, length)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(upload.to_dict()), 200
+
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Received and missing ranges, to resume an interrupted upload."""
+    try:
+        return jsonify(upload_store.get(upload_id).to_dict()), 200
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Verify all bytes arrived (and the SHA-256, if given); then pass upload_id to /api/process."""
+    data = request.get_json(silent=True) or request.form
+    try:
+        return jsonify(upload_store.complete(upload_id, sha256=data.get('sha256')).to_dict()), 200
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    """Abandon an upload and free its space."""
+    if not upload_store.delete(upload_id):
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify({'deleted': upload_id}), 200
+
+
+@app.route('/api/estimate', methods=['GET', 'POST'])
+def estimate_job():
+    """
+    Pre-flight estimate without enqueueing: Gemini calls, input tokens, TTS
+    calls, render minutes, per-stage seconds and the finish time given the
+    current queue. Takes `duration_seconds` or a `video` file (probed, then
+    deleted), plus the /api/process options (priority, analysis_target,
+    script_text, upload_youtube). Also returns the estimator's track record.
+    """
+    values = request.values
+    analysis_target = (values.get('analysis_target') or '').strip().lower() or None
+    if analysis_target and analysis_target not in ANALYSIS_TARGETS:
+        return jsonify({'error': 'analysis_target must be one of: ' + ', '.join(ANALYSIS_TARGETS)}), 400
+    priority = (values.get('priority') or '').strip().lower() or PRIORITY_NORMAL
+    if priority not in JOB_PRIORITIES:
+        return jsonify({'error': 'priority must be one of: ' + ', '.join(JOB_PRIORITIES)}), 400
+    script_text = (values.get('script_text') or '').strip()
+    params = {
+        'analysis_target': analysis_target,
+        'priority': priority,
+        'script_text': script_text,
+        'user_instructions': (values.get('instructions') or '').strip() or None,
+        'auto_generate': not script_text,
+        'upload_youtube': (values.get('upload_youtube') or '').strip().lower() in {'1', 'true', 'on', 'yes'},
+    }
+
+    duration = None
+    if values.get('duration_seconds'):
+        try:
+            duration = float(values['duration_seconds'])
+        except ValueError:
+            return jsonify({'error': 'duration_seconds must be a number'}), 400
+    elif 'video' in request.files and request.files['video'].filename:
+        video_file = request.files['video']
+        if not allowed_file(video_file.filename):
+            return jsonify({'error': 'Invalid file type. Allowed: ' + ', '.join(ALLOWED_EXTENSIONS)}), 400
+        probe_path = config.TEMP_DIR / f"estimate_{datetime.now():%Y%m%d_%H%M%S_%f}_{secure_filename(video_file.filename)}"
+        try:
+            video_file.save(probe_path)
+            duration = _probe_duration(probe_path)
+        finally:
+            probe_path.unlink(missing_ok=True)
+        if not duration:
+            return jsonify({'error': 'Could not read the video duration'}), 400
+
+    return jsonify({
+        'estimate': _estimate_job(params, duration),
+        'accuracy': estimator.accuracy(),
+    }), 200
+
+
 @app.route('/api/jobs/<job_id>')
 def get_job(job_id):
     """Return current status/result for a job."""
@@ -417,10 +1351,39 @@ def get_job(job_id):
     return jsonify(payload), 200
 
 
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """
+    Cancel a queued or running job. Queued jobs are cancelled at once (200);
+    a running job stops within seconds (202, poll /api/jobs/<job_id>).
+    """
+    job = job_manager.cancel(secure_filename(job_id))
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status in (STATUS_COMPLETED, STATUS_FAILED):
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    return jsonify(job.to_dict(include_result=False)), 200 if job.status == STATUS_CANCELLED else 202
+
+
 @app.route('/api/jobs')
 def list_jobs():
-    """List known jobs (most recent state, no full results)."""
-    return jsonify({'jobs': job_manager.list_jobs()}), 200
+    """
+    List jobs, newest first, without full results. Query params: status
+    (comma-separated), priority, limit (max 200), offset.
+    """
+    statuses = [s for s in (request.args.get('status') or '').lower().split(',') if s]
+    if any(s not in JOB_STATUSES for s in statuses):
+        return jsonify({'error': 'status must be one of: ' + ', '.join(JOB_STATUSES)}), 400
+    priority = (request.args.get('priority') or '').lower() or None
+    if priority and priority not in JOB_PRIORITIES:
+        return jsonify({'error': 'priority must be one of: ' + ', '.join(JOB_PRIORITIES)}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    jobs, total = job_manager.list_jobs(status=statuses, priority=priority, limit=limit, offset=offset)
+    return jsonify({'jobs': jobs, 'total': total, 'limit': limit, 'offset': offset}), 200
 
 
 @app.route('/api/youtube/status')
@@ -487,7 +1450,8 @@ def status():
             'gemini_tts': config.GEMINI_TTS_MODEL,
             'auto_generate_script': config.AUTO_GENERATE_SCRIPT,
             'ffmpeg': 'available'
-        }
+        },
+        'http_transport': _services['http_transport'].stats() if _services['http_transport'] else None,
     }), 200
 
 @app.route('/api/logs/stream')
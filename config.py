@@ -2,6 +2,7 @@
 Configuration file for Video Editing Automation
 """
 import os
+import re
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -26,16 +27,41 @@ def _env_int(name, default):
         return default
 
 
+def _env_float(name, default):
+    val = os.getenv(name)
+    if val is None or not str(val).strip():
+        return default
+    try:
+        return float(val)
+    except ValueError:
+        return default
+
+
+def _env_list(name):
+    """Comma/whitespace-separated list from the environment (blank entries dropped)."""
+    val = os.getenv(name) or ""
+    return [item.strip() for item in re.split(r"[,\s]+", val) if item.strip()]
+
+
 # API Keys - Load from environment variables
 # The new-format AI Studio keys ("AQ.*") authenticate the Gemini API for BOTH
 # analysis and native text-to-speech, so a single key covers everything.
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_TTS_API_KEY = os.getenv("GEMINI_TTS_API_KEY") or GEMINI_API_KEY
+# Optional key pools (comma-separated). Each key should come from its own project
+# so it has its own quota; calls are routed to the key with the most headroom and
+# keys that hit a daily limit are retired until the quota resets.
+GEMINI_API_KEYS = _env_list("GEMINI_API_KEYS") or ([GEMINI_API_KEY] if GEMINI_API_KEY else [])
+GEMINI_TTS_API_KEYS = _env_list("GEMINI_TTS_API_KEYS") or (
+    [GEMINI_TTS_API_KEY] if GEMINI_TTS_API_KEY else []
+)
 
 # Gemini model and client configuration
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-3.5-flash")
 GEMINI_API_VERSION = os.getenv("GEMINI_API_VERSION", "v1beta")
 GEMINI_THINKING_LEVEL = os.getenv("GEMINI_THINKING_LEVEL", "high")
+# Optional API endpoint override, e.g. a local stand-in server for tests.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
 
 # Directories
 BASE_DIR = Path(__file__).parent
@@ -50,6 +76,10 @@ for directory in [UPLOAD_DIR, OUTPUT_DIR, TEMP_DIR, AUDIO_DIR]:
 
 # FFmpeg settings
 FFMPEG_PATH = "ffmpeg"  # Assumes ffmpeg is in PATH
+# A clip render is killed after max(FFMPEG_CLIP_TIMEOUT_SECONDS,
+# clip seconds * FFMPEG_TIMEOUT_PER_CLIP_SECOND).
+FFMPEG_CLIP_TIMEOUT_SECONDS = _env_int("FFMPEG_CLIP_TIMEOUT_SECONDS", 300)
+FFMPEG_TIMEOUT_PER_CLIP_SECOND = _env_int("FFMPEG_TIMEOUT_PER_CLIP_SECOND", 20)
 
 # Clip length guidance (fed into the analysis/generation prompt)
 CLIP_DURATION_MIN = _env_int("CLIP_DURATION_MIN", 5)   # seconds
@@ -69,6 +99,11 @@ GEMINI_TTS_MAX_WAIT_SECONDS = _env_int("GEMINI_TTS_MAX_WAIT_SECONDS", 120)
 # If a scene's audio still fails after retries, skip it instead of failing the whole
 # job (the clip for that scene is skipped). Set False to fail hard.
 GEMINI_TTS_SKIP_FAILED_SCENES = _env_bool("GEMINI_TTS_SKIP_FAILED_SCENES", True)
+# Optional per-key requests-per-minute cap for the TTS pool (0 = pacing delay only).
+GEMINI_TTS_RPM_PER_KEY = _env_int("GEMINI_TTS_RPM_PER_KEY", 0)
+# Your plan's TTS requests per key per day, if known (0 = unknown). Lets admission
+# control refuse jobs the remaining daily quota can't narrate.
+GEMINI_TTS_DAILY_LIMIT_PER_KEY = _env_int("GEMINI_TTS_DAILY_LIMIT_PER_KEY", 0)
 
 # Gemini generation settings
 # NOTE: alignment/timestamping wants deterministic output, so temperatures are low.
@@ -78,12 +113,136 @@ GEMINI_TIMESTAMP_TEMPERATURE = float(os.getenv("GEMINI_TIMESTAMP_TEMPERATURE", "
 # Autonomy: when no script is supplied, generate the recap directly from the video.
 AUTO_GENERATE_SCRIPT = _env_bool("AUTO_GENERATE_SCRIPT", True)
 
+# Stream analysis replies and start narration TTS for each scene as soon as its
+# JSON object arrives, instead of waiting for the whole chunk (and every chunk).
+GEMINI_STREAM_ANALYSIS = _env_bool("GEMINI_STREAM_ANALYSIS", False)
+
 # Rate limiting between Gemini API calls.
 #   Free tier historically needs ~60s; paid/flash tiers can use a small value or 0.
 #   The retry logic now also handles 429s, so a modest default is safe.
 GEMINI_API_DELAY_SECONDS = _env_int("GEMINI_API_DELAY_SECONDS", 6)
 GEMINI_API_MAX_RETRIES = _env_int("GEMINI_API_MAX_RETRIES", 3)
 GEMINI_API_RETRY_BACKOFF_SECONDS = _env_int("GEMINI_API_RETRY_BACKOFF_SECONDS", 5)
+GEMINI_API_RPM_PER_KEY = _env_int("GEMINI_API_RPM_PER_KEY", 0)  # 0 = pacing delay only
+# Hedged requests: if a chunk analysis call is slower than this percentile of
+# recent calls, send a duplicate (only when the key has a free rate-limit slot)
+# and use whichever reply arrives first.
+GEMINI_HEDGE_REQUESTS = _env_bool("GEMINI_HEDGE_REQUESTS", False)
+GEMINI_HEDGE_PERCENTILE = _env_int("GEMINI_HEDGE_PERCENTILE", 90)
+GEMINI_HEDGE_MIN_SAMPLES = _env_int("GEMINI_HEDGE_MIN_SAMPLES", 5)
+# Explicit context caching: each chunk's video + instructions are cached once so
+# retries/follow-up calls reference the cache instead of re-sending the video.
+GEMINI_CONTEXT_CACHE = _env_bool("GEMINI_CONTEXT_CACHE", True)
+GEMINI_CACHE_TTL_SECONDS = _env_int("GEMINI_CACHE_TTL_SECONDS", 900)
+# Batch priority (form field priority=batch): autonomous analysis goes through the
+# Gemini Batch API (cheaper, outside the interactive quota, hours of latency) and
+# is polled with backoff. TTS can be batched too where the TTS model supports it.
+GEMINI_BATCH_POLL_INITIAL_SECONDS = _env_int("GEMINI_BATCH_POLL_INITIAL_SECONDS", 30)
+GEMINI_BATCH_POLL_MAX_SECONDS = _env_int("GEMINI_BATCH_POLL_MAX_SECONDS", 600)
+GEMINI_BATCH_MAX_WAIT_SECONDS = _env_int("GEMINI_BATCH_MAX_WAIT_SECONDS", 24 * 3600)
+GEMINI_TTS_BATCH = _env_bool("GEMINI_TTS_BATCH", False)
+
+# Job scheduler: worker threads per stage pool. The api pool runs download,
+# analysis, TTS and YouTube stages; the cpu pool runs ffmpeg rendering. With
+# one of each, one job can render while the next one is being analyzed.
+JOB_API_WORKERS = _env_int("JOB_API_WORKERS", 1)
+JOB_CPU_WORKERS = _env_int("JOB_CPU_WORKERS", 1)
+# Re-enqueue queued jobs and resume interrupted ones (from their last completed
+# stage) when the server starts.
+JOB_RESUME = _env_bool("JOB_RESUME", True)
+# Queued work is ordered urgent > normal > batch, fair across submitters. A job
+# queued more than JOB_AGING_SECONDS before one a level above it still goes
+# first (aging: nothing starves).
+JOB_AGING_SECONDS = _env_int("JOB_AGING_SECONDS", 1800)
+# SQLite job store (WAL): job state, params and stage checkpoints.
+JOB_DB_PATH = Path(os.getenv("JOB_DB_PATH", str(BASE_DIR / "jobs.db")))
+# Stage deadlines, scaled by the input: JOB_STAGE_MIN_DEADLINE_SECONDS plus
+# JOB_DEADLINE_PER_MEDIA_MINUTE per minute of source (prepare, analyze) or
+# JOB_DEADLINE_PER_SCENE_SECONDS per scene (TTS, render, finalize, upload).
+# Batch API waits have none. 0 disables deadlines.
+JOB_STAGE_MIN_DEADLINE_SECONDS = _env_int("JOB_STAGE_MIN_DEADLINE_SECONDS", 900)
+JOB_DEADLINE_PER_MEDIA_MINUTE = _env_int("JOB_DEADLINE_PER_MEDIA_MINUTE", 60)
+JOB_DEADLINE_PER_SCENE_SECONDS = _env_int("JOB_DEADLINE_PER_SCENE_SECONDS", 120)
+# A stage that logs nothing for JOB_STALL_SECONDS is stalled (0 disables). Timed
+# out stages are stopped and retried JOB_STAGE_RETRIES times, then the job fails.
+JOB_STALL_SECONDS = _env_int("JOB_STALL_SECONDS", 900)
+JOB_STAGE_RETRIES = _env_int("JOB_STAGE_RETRIES", 1)
+# Async analysis: autonomous generation runs on one shared asyncio loop (SDK async
+# client), up to GEMINI_ASYNC_CONCURRENCY windows in flight, each request bounded
+# by GEMINI_REQUEST_TIMEOUT_SECONDS. Rate limits are shared with the blocking path.
+# The same timeout bounds each blocking Gemini call (it is retried like a network
+# error); an upload still PROCESSING after GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS
+# fails, and a TTS call is bounded by GEMINI_TTS_REQUEST_TIMEOUT_SECONDS.
+GEMINI_ASYNC_ANALYSIS = _env_bool("GEMINI_ASYNC_ANALYSIS", False)
+GEMINI_ASYNC_CONCURRENCY = _env_int("GEMINI_ASYNC_CONCURRENCY", 4)
+GEMINI_REQUEST_TIMEOUT_SECONDS = _env_int("GEMINI_REQUEST_TIMEOUT_SECONDS", 600)
+GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS = _env_int("GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS", 1800)
+GEMINI_TTS_REQUEST_TIMEOUT_SECONDS = _env_int("GEMINI_TTS_REQUEST_TIMEOUT_SECONDS", 120)
+# Shared HTTP transport for all Google API clients (Gemini analysis + TTS, YouTube):
+# one keep-alive pool (HTTP/2 when the `h2` package is installed) and timeouts
+# per operation type.
+HTTP_SHARED_TRANSPORT = _env_bool("HTTP_SHARED_TRANSPORT", True)
+HTTP2 = _env_bool("HTTP2", True)
+HTTP_MAX_CONNECTIONS = _env_int("HTTP_MAX_CONNECTIONS", 20)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = _env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 10)
+HTTP_KEEPALIVE_SECONDS = _env_int("HTTP_KEEPALIVE_SECONDS", 60)
+HTTP_CONNECT_TIMEOUT_SECONDS = _env_int("HTTP_CONNECT_TIMEOUT_SECONDS", 10)
+HTTP_UPLOAD_TIMEOUT_SECONDS = _env_int("HTTP_UPLOAD_TIMEOUT_SECONDS", 900)
+HTTP_POLL_TIMEOUT_SECONDS = _env_int("HTTP_POLL_TIMEOUT_SECONDS", 30)
+HTTP_GENERATE_TIMEOUT_SECONDS = _env_int("HTTP_GENERATE_TIMEOUT_SECONDS", 600)
+
+# How the source reaches the model:
+#   chunks  - split into ANALYSIS_WINDOW_SECONDS files, one upload per chunk
+#   offsets - upload the source once; each window is a start/end offset into it
+#   frames  - no video: JPEG frames sampled locally per window (one ffmpeg pass),
+#             tiled into contact sheets with burned-in timecodes, sent inline
+GEMINI_ANALYSIS_INPUT = (os.getenv("GEMINI_ANALYSIS_INPUT") or "chunks").strip().lower()
+# Window length override in seconds; 0 lets the analysis planner choose.
+ANALYSIS_WINDOW_SECONDS = _env_int("ANALYSIS_WINDOW_SECONDS", 0)
+# Analysis planner: default per-job target (cost | balanced | latency) and the
+# model limits it plans against (TPM 0 = unknown / not limiting).
+ANALYSIS_TARGET = (os.getenv("ANALYSIS_TARGET") or "balanced").strip().lower()
+GEMINI_CONTEXT_TOKENS = _env_int("GEMINI_CONTEXT_TOKENS", 1_048_576)
+GEMINI_TPM_LIMIT = _env_int("GEMINI_TPM_LIMIT", 0)
+# Autonomous-mode strategy:
+#   chunks         - full-detail generation over every window
+#   coarse_to_fine - a cheap low-fps / low-resolution pass over the whole film picks
+#                    the story windows; only those get full-detail generation
+ANALYSIS_STRATEGY = (os.getenv("ANALYSIS_STRATEGY") or "chunks").strip().lower()
+COARSE_SURVEY_FPS = _env_float("COARSE_SURVEY_FPS", 0.25)
+COARSE_WINDOWS_PER_HOUR = _env_int("COARSE_WINDOWS_PER_HOUR", 12)
+COARSE_DETAIL_MAX_SECONDS = _env_int("COARSE_DETAIL_MAX_SECONDS", 300)
+# Frames input mode: sampling rate (or one frame per shot change, at least every
+# FRAME_MAX_GAP_SECONDS), frame height, and contact-sheet grid ("" = single frames).
+FRAME_SAMPLE_FPS = _env_float("FRAME_SAMPLE_FPS", 0.5)
+FRAME_AT_SHOTS = _env_bool("FRAME_AT_SHOTS", False)
+FRAME_MAX_GAP_SECONDS = _env_int("FRAME_MAX_GAP_SECONDS", 10)
+FRAME_HEIGHT = _env_int("FRAME_HEIGHT", 180)
+FRAME_SHEET_GRID = (os.getenv("FRAME_SHEET_GRID", "4x4") or "").strip().lower()
+FRAME_BURN_TIMECODES = _env_bool("FRAME_BURN_TIMECODES", True)
+
+# Shot-boundary index: detect cuts locally (ffmpeg scene score on a small decode),
+# cut chunks near them, snap scene timestamps to them and hint them in prompts.
+SHOT_INDEX = _env_bool("SHOT_INDEX", False)
+SHOT_SCENE_THRESHOLD = _env_float("SHOT_SCENE_THRESHOLD", 0.3)
+SHOT_SNAP_TOLERANCE_SECONDS = _env_float("SHOT_SNAP_TOLERANCE_SECONDS", 1.5)
+SHOT_CUT_TOLERANCE_SECONDS = _env_int("SHOT_CUT_TOLERANCE_SECONDS", 30)
+# Files API per-file limit; larger sources fall back to chunks in offsets mode.
+GEMINI_FILE_MAX_BYTES = _env_int("GEMINI_FILE_MAX_BYTES", 2 * 1024 ** 3)
+# Inputs up to this size are sent as inline bytes in the request instead of
+# upload + processing poll + delete. Base64 inflates them by ~4/3, so keep this
+# well under the ~20 MB request limit. 0 always uses the Files API.
+GEMINI_INLINE_MAX_BYTES = _env_int("GEMINI_INLINE_MAX_BYTES", 14 * 1024 * 1024)
+
+# Analysis proxy: upload a small low-bitrate transcode for analysis instead of
+# the full-quality source (rendering still uses the original).
+ANALYSIS_PROXY = _env_bool("ANALYSIS_PROXY", False)
+ANALYSIS_PROXY_HEIGHT = _env_int("ANALYSIS_PROXY_HEIGHT", 480)
+ANALYSIS_PROXY_FPS = _env_int("ANALYSIS_PROXY_FPS", 2)
+ANALYSIS_PROXY_VIDEO_KBPS = _env_int("ANALYSIS_PROXY_VIDEO_KBPS", 400)
+ANALYSIS_PROXY_AUDIO_KBPS = _env_int("ANALYSIS_PROXY_AUDIO_KBPS", 32)
+ANALYSIS_PROXY_MONO_AUDIO = _env_bool("ANALYSIS_PROXY_MONO_AUDIO", True)
+ANALYSIS_PROXY_KEEP_AUDIO = _env_bool("ANALYSIS_PROXY_KEEP_AUDIO", True)
 
 # Video processing synchronization settings
 AUDIO_START_DELAY_MS = _env_int("AUDIO_START_DELAY_MS", 0)  # Silence before narration starts
@@ -99,7 +258,35 @@ FLASK_HOST = os.getenv("FLASK_HOST", "127.0.0.1")
 FLASK_PORT = _env_int("FLASK_PORT", 5001)
 FLASK_DEBUG = _env_bool("FLASK_DEBUG", False)
 MAX_UPLOAD_MB = _env_int("MAX_UPLOAD_MB", 2048)  # Upload cap in MB (None-like: set 0 to disable)
+# Resumable uploads (/api/uploads): largest video in MB (0 = no limit; each chunk
+# request is still capped by MAX_UPLOAD_MB) and hours an idle, unclaimed upload is kept.
+RESUMABLE_UPLOAD_MAX_MB = _env_int("RESUMABLE_UPLOAD_MAX_MB", 20480)
+UPLOAD_EXPIRY_HOURS = _env_int("UPLOAD_EXPIRY_HOURS", 24)
+# Content-addressed source store: each video is kept once (by SHA-256, Drive
+# files also by file id) and hard-linked into jobs, with its probed duration,
+# shot index and analysis proxies. Unreferenced items are evicted, least
+# recently used first, above MEDIA_STORE_QUOTA_GB (0 = no limit).
+MEDIA_STORE = _env_bool("MEDIA_STORE", True)
+MEDIA_STORE_DIR = Path(os.getenv("MEDIA_STORE_DIR", str(BASE_DIR / "media")))
+MEDIA_STORE_QUOTA_GB = _env_float("MEDIA_STORE_QUOTA_GB", 50.0)
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*")  # Comma-separated origins, or "*"
+# Admission control: /api/process answers 429 + Retry-After (before reading the
+# upload) when the queue is full, the estimated wait is too long, the work dirs
+# lack space for ADMISSION_DISK_FACTOR x the upload plus ADMISSION_MIN_FREE_MB,
+# or the daily TTS quota can't cover ADMISSION_TTS_CALLS_PER_JOB per queued job.
+# Accepted jobs get an ETA (median of recent job times; the default until then).
+ADMISSION_CONTROL = _env_bool("ADMISSION_CONTROL", True)
+ADMISSION_MAX_QUEUED_JOBS = _env_int("ADMISSION_MAX_QUEUED_JOBS", 20)
+ADMISSION_MAX_BACKLOG_SECONDS = _env_int("ADMISSION_MAX_BACKLOG_SECONDS", 6 * 3600)
+ADMISSION_MIN_FREE_MB = _env_int("ADMISSION_MIN_FREE_MB", 2048)
+ADMISSION_DISK_FACTOR = _env_float("ADMISSION_DISK_FACTOR", 3.0)
+ADMISSION_TTS_CALLS_PER_JOB = _env_int("ADMISSION_TTS_CALLS_PER_JOB", 30)
+ADMISSION_DEFAULT_JOB_SECONDS = _env_int("ADMISSION_DEFAULT_JOB_SECONDS", 1800)
+# Pre-flight estimates (calls, tokens, TTS, render time, ETA): each completed job's
+# estimate is kept next to its actual figures in ESTIMATOR_HISTORY_PATH, and the
+# last ESTIMATOR_CALIBRATION_JOBS of them recalibrate the model.
+ESTIMATOR_HISTORY_PATH = Path(os.getenv("ESTIMATOR_HISTORY_PATH", str(BASE_DIR / "estimates.json")))
+ESTIMATOR_CALIBRATION_JOBS = _env_int("ESTIMATOR_CALIBRATION_JOBS", 20)
 
 # Logging
 LOG_FILE = BASE_DIR / "automation.log"
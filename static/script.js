@@ -260,6 +260,71 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    const UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024;
+    const UPLOAD_MAX_ATTEMPTS = 5;
+
+    async function readError(response, fallback) {
+        try {
+            const data = await response.json();
+            return (data && data.error) || fallback;
+        } catch (parseError) {
+            return fallback;
+        }
+    }
+
+    // Resumable upload: the file goes up in byte ranges; after a dropped
+    // request the server says which ranges are missing and only those are re-sent.
+    async function uploadResumable(file, onProgress, priority) {
+        const created = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size, priority }),
+        });
+        if (!created.ok) {
+            throw new Error(await readError(created, 'Could not start the upload.'));
+        }
+        let upload = await created.json();
+        let attempts = 0;
+        while (upload.missing.length) {
+            const [start, end] = upload.missing[0];
+            const stop = Math.min(end, start + UPLOAD_CHUNK_BYTES);
+            try {
+                const response = await fetch(`/api/uploads/${upload.upload_id}`, {
+                    method: 'PATCH',
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'Content-Range': `bytes ${start}-${stop - 1}/${file.size}`,
+                    },
+                    body: file.slice(start, stop),
+                });
+                if (response.status >= 400 && response.status < 500) {
+                    throw Object.assign(new Error(await readError(response, 'Upload rejected.')), { fatal: true });
+                }
+                if (!response.ok) {
+                    throw new Error(await readError(response, 'Upload chunk failed.'));
+                }
+                upload = await response.json();
+                attempts = 0;
+            } catch (error) {
+                attempts += 1;
+                if (error.fatal || attempts >= UPLOAD_MAX_ATTEMPTS) {
+                    throw error;
+                }
+                await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempts));
+                const status = await fetch(`/api/uploads/${upload.upload_id}`);
+                if (status.ok) {
+                    upload = await status.json();
+                }
+            }
+            onProgress(upload.received / file.size);
+        }
+        const completed = await fetch(`/api/uploads/${upload.upload_id}/complete`, { method: 'POST' });
+        if (!completed.ok) {
+            throw new Error(await readError(completed, 'Could not finish the upload.'));
+        }
+        return upload.upload_id;
+    }
+
     function generateSessionId() {
         const now = new Date();
         const pad = (value) => value.toString().padStart(2, '0');
@@ -751,10 +816,11 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
             const sessionId = generateSessionId();
+            // Sent in the query string of /api/process (and with the upload), so
+            // admission control judges the job at its own priority before the
+            // body is read.
+            const priority = 'normal';
             const formData = new FormData();
-            if (videoFile) {
-                formData.append('video', videoFile);
-            }
             if (driveUrl) {
                 formData.append('drive_url', driveUrl);
             }
@@ -785,10 +851,19 @@ document.addEventListener('DOMContentLoaded', () => {
                 : 'Preparing to align your script to the video…');
 
             try {
+                if (videoFile) {
+                    setStage('Uploading video');
+                    const uploadId = await uploadResumable(videoFile, (fraction) => {
+                        updateProgress(Math.round(5 * fraction), `Uploading video… ${Math.round(100 * fraction)}%`);
+                    }, priority);
+                    formData.append('upload_id', uploadId);
+                    setStage(autoMode ? 'Generating recap from video' : 'Aligning recap to video');
+                }
+
                 // Enqueue the job. The server returns immediately with a job id;
                 // real progress comes from the live log stream + job polling, so
                 // the result survives a page refresh or a dropped connection.
-                const response = await fetch('/api/process', {
+                const response = await fetch(`/api/process?priority=${encodeURIComponent(priority)}`, {
                     method: 'POST',
                     body: formData,
                 });
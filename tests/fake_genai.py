@@ -0,0 +1,180 @@
+"""
+Local stand-in for the parts of the google-genai client the app uses.
+
+Records every call so tests can assert on what would have been sent (uploads,
+cache entries, generate requests) without network access or an API key.
+`responder(call)` decides each generate reply; it returns the reply text.
+Batch jobs finish after `batch_polls` polls; their requests go through the same
+responder (a None reply becomes a per-request error) and are marked
+`call.batch = True`. `client.aio` exposes the same fakes as coroutines.
+"""
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+_ids = itertools.count(1)
+
+
+def _usage(prompt_tokens, cached_tokens=0, output_tokens=100):
+    return SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        cached_content_token_count=cached_tokens,
+        candidates_token_count=output_tokens,
+    )
+
+
+class FakeFiles:
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, file, config=None):
+        data = file.read()
+        name = f"files/fake-{next(_ids)}"
+        uploaded = SimpleNamespace(
+            name=name, uri=f"https://stand-in/{name}", mime_type="video/mp4",
+            state="ACTIVE", size_bytes=len(data),
+        )
+        self.client.uploaded[name] = uploaded
+        self.client.log.append(("files.upload", name))
+        return uploaded
+
+    def get(self, name):
+        return self.client.uploaded[name]
+
+    def delete(self, name):
+        self.client.log.append(("files.delete", name))
+        self.client.uploaded.pop(name, None)
+
+
+class FakeCaches:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, model, config):
+        if not self.client.caching_supported:
+            raise RuntimeError("400 caching not supported for this model")
+        name = f"cachedContents/fake-{next(_ids)}"
+        cache = SimpleNamespace(name=name, model=model, contents=config.contents, ttl=config.ttl)
+        self.client.caches_live[name] = cache
+        self.client.log.append(("caches.create", name))
+        return cache
+
+    def update(self, name, config):
+        self.client.caches_live[name].ttl = config.ttl
+        self.client.log.append(("caches.update", name))
+
+    def delete(self, name):
+        self.client.log.append(("caches.delete", name))
+        self.client.caches_live.pop(name, None)
+
+
+class FakeModels:
+    VIDEO_TOKENS = 150_000
+
+    def __init__(self, client):
+        self.client = client
+
+    def _call(self, model, contents, config, batch=False):
+        cached = getattr(config, "cached_content", None) if config else None
+        call = SimpleNamespace(model=model, contents=contents, config=config, cached_content=cached,
+                               batch=batch)
+        self.client.generate_calls.append(call)
+        text = self.client.responder(call)
+        prompt_tokens = 50 + self.VIDEO_TOKENS
+        usage = _usage(prompt_tokens, cached_tokens=self.VIDEO_TOKENS if cached else 0)
+        return text, usage
+
+    def generate_content(self, model, contents, config=None):
+        text, usage = self._call(model, contents, config)
+        return SimpleNamespace(text=text, candidates=[], usage_metadata=usage)
+
+    def generate_content_stream(self, model, contents, config=None):
+        text, usage = self._call(model, contents, config)
+        for i in range(0, len(text), 16):
+            last = i + 16 >= len(text)
+            yield SimpleNamespace(text=text[i:i + 16], usage_metadata=usage if last else None)
+
+
+class FakeBatches:
+    def __init__(self, client):
+        self.client = client
+        self.jobs = {}
+
+    def create(self, model, src, config=None):
+        name = f"batches/fake-{next(_ids)}"
+        job = SimpleNamespace(name=name, model=model, src=src, state="JOB_STATE_PENDING",
+                              dest=None, error=None, polls=0,
+                              display_name=getattr(config, "display_name", None))
+        self.jobs[name] = job
+        self.client.log.append(("batches.create", name))
+        return job
+
+    def get(self, name):
+        job = self.jobs[name]
+        job.polls += 1
+        self.client.log.append(("batches.get", name))
+        if job.state == "JOB_STATE_PENDING" and job.polls >= self.client.batch_polls:
+            if self.client.batch_final_state != "JOB_STATE_SUCCEEDED":
+                job.state = self.client.batch_final_state
+                return job
+            responses = []
+            for request in job.src:
+                text, usage = self.client.models._call(job.model, request.contents, request.config,
+                                                       batch=True)
+                if text is None:
+                    responses.append(SimpleNamespace(response=None, error="request failed"))
+                else:
+                    responses.append(SimpleNamespace(
+                        response=SimpleNamespace(text=text, candidates=[], usage_metadata=usage),
+                        error=None,
+                    ))
+            job.dest = SimpleNamespace(inlined_responses=responses)
+            job.state = "JOB_STATE_SUCCEEDED"
+        return job
+
+    def cancel(self, name):
+        self.client.log.append(("batches.cancel", name))
+        self.jobs[name].state = "JOB_STATE_CANCELLED"
+
+
+class FakeAio:
+    """client.aio: the same fakes behind coroutines; `aio_delay` makes each call slow."""
+
+    def __init__(self, client):
+        self.client = client
+        self.files = SimpleNamespace(upload=self._upload, get=self._wrap(client.files.get),
+                                     delete=self._wrap(client.files.delete))
+        self.models = SimpleNamespace(generate_content=self._wrap(client.models.generate_content))
+
+    def _wrap(self, func):
+        async def call(**kwargs):
+            if self.client.aio_delay:
+                await asyncio.sleep(self.client.aio_delay)
+            return func(**kwargs)
+        return call
+
+    async def _upload(self, file, config=None):
+        with open(file, "rb") as handle:
+            return self.client.files.upload(file=handle, config=config)
+
+
+class FakeClient:
+    def __init__(self, responder, caching_supported=True, batch_polls=2,
+                 batch_final_state="JOB_STATE_SUCCEEDED"):
+        self.responder = responder
+        self.caching_supported = caching_supported
+        self.batch_polls = batch_polls
+        self.batch_final_state = batch_final_state
+        self.uploaded = {}
+        self.caches_live = {}
+        self.generate_calls = []
+        self.log = []
+        self.files = FakeFiles(self)
+        self.caches = FakeCaches(self)
+        self.models = FakeModels(self)
+        self.batches = FakeBatches(self)
+        self.aio_delay = 0
+        self.aio = FakeAio(self)
+
+    def count(self, op):
+        return sum(1 for entry in self.log if entry[0] == op)
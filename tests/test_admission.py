@@ -0,0 +1,69 @@
+"""
+Admission control: new jobs are refused (with a Retry-After) when the queue,
+backlog, disk or TTS quota can't take them, and accepted ones get an ETA.
+"""
+from types import SimpleNamespace
+
+from utils.admission import AdmissionController
+
+GB = 1024 ** 3
+
+
+def _controller(queued=None, running=0, free=100 * GB, history=(), quota=(None, 3600), **kwargs):
+    kwargs.setdefault("default_job_seconds", 600)
+    return AdmissionController(
+        backlog=lambda: {"queued": dict(queued or {}), "running": running},
+        history=lambda: list(history),
+        quota=lambda: quota,
+        directories=["/work"],
+        disk_usage=lambda path: SimpleNamespace(free=free),
+        **kwargs,
+    )
+
+
+def test_idle_server_accepts_with_eta_from_history():
+    decision = _controller(history=[100, 300, 200]).check(content_length=GB)
+    assert decision.accepted
+    assert decision.wait_seconds == 0 and decision.eta_seconds == 200
+
+
+def test_wait_counts_jobs_at_or_above_the_priority():
+    controller = _controller(queued={"urgent": 1, "normal": 2, "batch": 4}, running=2,
+                             parallelism=2)
+    # normal: 1 urgent + 2 normal queued + half of the 2 running, over 2 workers
+    assert controller.estimate("normal") == (1200, 1800)
+    assert controller.estimate("urgent")[0] == 600
+    assert controller.estimate("batch")[0] == 2400
+
+
+def test_full_queue_is_rejected():
+    decision = _controller(queued={"normal": 3}, max_queued_jobs=3).check()
+    assert not decision.accepted and "Queue is full" in decision.reason
+    assert decision.retry_after_header == "600"
+
+
+def test_long_backlog_is_rejected_until_it_drains():
+    decision = _controller(queued={"normal": 10}, max_backlog_seconds=3600).check()
+    assert not decision.accepted
+    assert decision.retry_after_seconds == 6000 - 3600
+
+
+def test_upload_that_would_fill_the_disk_is_rejected():
+    controller = _controller(free=5 * GB, min_free_mb=1024, disk_factor=3)
+    assert controller.check(content_length=GB).accepted
+    decision = controller.check(content_length=2 * GB)
+    assert not decision.accepted and "disk" in decision.reason
+
+
+def test_tts_quota():
+    # 40 calls left, 30 per job: the next job fits only while nothing is queued.
+    assert _controller(quota=(40, 3600), tts_calls_per_job=30).check().accepted
+    decision = _controller(queued={"normal": 1}, quota=(40, 3600), tts_calls_per_job=30).check()
+    assert not decision.accepted and decision.retry_after_seconds == 3600
+    # Unknown daily limit: only refused once every key is retired.
+    assert _controller(quota=(None, 3600), tts_calls_per_job=30).check().accepted
+    assert not _controller(quota=(0, 7200)).check().accepted
+    # No TTS service built yet: nothing to check.
+    assert _controller(quota=None, tts_calls_per_job=30).check().accepted
+    # Jobs that don't use interactive TTS skip the check.
+    assert _controller(quota=(0, 7200)).check(uses_tts=False).accepted
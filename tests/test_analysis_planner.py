@@ -0,0 +1,65 @@
+"""
+Analysis planner: window length / fps / resolution / thinking chosen from the
+duration, token limits and target, then adjusted from observed windows.
+"""
+import json
+
+from tests.fake_genai import FakeClient
+from utils.analysis_planner import AnalysisPlanner
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+
+
+def test_balanced_keeps_previous_defaults_and_evens_windows():
+    plan = AnalysisPlanner().plan(1500, target="balanced")
+
+    assert (plan.fps, plan.media_resolution, plan.thinking_level) == (1.0, "HIGH", "high")
+    assert plan.chunk_seconds == 500 and plan.chunk_count == 3
+
+
+def test_targets_trade_tokens_for_latency():
+    planner = AnalysisPlanner()
+    cost = planner.plan(7200, target="cost")
+    latency = planner.plan(7200, target="latency")
+
+    assert cost.chunk_seconds > latency.chunk_seconds
+    assert cost.estimated_request_tokens(600) < latency.estimated_request_tokens(600)
+    assert latency.thinking_level == "low"
+
+
+def test_small_context_shortens_windows_and_tpm_caps_requests():
+    plan = AnalysisPlanner(context_tokens=128_000, tpm_limit=100_000).plan(3600, target="balanced")
+
+    assert plan.estimated_request_tokens() <= plan.token_budget <= 90_000
+    assert plan.chunk_seconds < 600 and plan.notes
+
+
+def test_observed_overrun_steps_later_windows_down():
+    plan = AnalysisPlanner(context_tokens=400_000).plan(3600, target="balanced")
+
+    plan.observe(0, plan.chunk_seconds, latency_seconds=400, prompt_tokens=plan.token_budget * 2)
+
+    fields = [change["field"] for change in plan.adjustments]
+    assert fields == ["media_resolution", "thinking_level"]
+    assert plan.settings() == {"fps": 1.0, "media_resolution": "MEDIA_RESOLUTION_MEDIUM",
+                               "thinking_level": "medium"}
+
+
+def test_analyzer_applies_plan_settings(monkeypatch, tmp_path):
+    chunk = tmp_path / "chunk_001.mp4"
+    chunk.write_bytes(b"\x00" * 512)
+    reply = json.dumps({"scenes": [
+        {"scene_number": 1, "start_time": "00:05", "end_time": "00:17",
+         "narration": "The climbers argue about turning back before the storm."},
+    ]})
+    client = FakeClient(lambda call: reply, caching_supported=False)
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    analyzer = GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0)
+    plan = AnalysisPlanner().plan(300, target="cost")
+
+    analyzer.generate_scenes_from_video([chunk], chunk_seconds=plan.chunk_seconds, plan=plan)
+
+    call = client.generate_calls[0]
+    assert call.config.media_resolution == "MEDIA_RESOLUTION_LOW"
+    assert call.config.thinking_config.thinking_level.value == "LOW"
+    assert call.contents[0].video_metadata.fps == 0.5
+    assert plan.observations[0]["prompt_tokens"] == 50 + client.models.VIDEO_TOKENS
@@ -0,0 +1,54 @@
+"""
+Analysis proxy: one ffmpeg pass to a small low-bitrate copy, and upload
+bytes/time recorded in the analysis stats so the savings can be reported.
+"""
+import json
+from types import SimpleNamespace
+
+from tests.fake_genai import FakeClient
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+from utils.video_processor import VideoProcessor
+
+
+def test_proxy_is_one_ffmpeg_pass(monkeypatch, tmp_path):
+    commands = []
+
+    def fake_run(command, **kwargs):
+        commands.append(command)
+        if "-i" in command:
+            (tmp_path / "proxy.mp4").write_bytes(b"\x00" * 64)
+        return SimpleNamespace(returncode=0, stdout=b"", stderr=b"")
+
+    monkeypatch.setattr("utils.cancellation.run_process", fake_run)
+    processor = VideoProcessor()
+    commands.clear()
+
+    proxy = processor.create_analysis_proxy(tmp_path / "movie.mp4", tmp_path / "proxy.mp4",
+                                            height=360, fps=1, video_kbps=250,
+                                            keyframe_seconds=600)
+
+    assert proxy == tmp_path / "proxy.mp4"
+    assert len(commands) == 1
+    command = " ".join(commands[0])
+    assert "scale=-2:'min(360,ih)',fps=1" in command
+    assert "-b:v 250k" in command and "-ac 1" in command
+    assert "expr:gte(t,n_forced*600)" in command
+
+
+def test_upload_bytes_are_recorded(monkeypatch, tmp_path):
+    chunk = tmp_path / "chunk_001.mp4"
+    chunk.write_bytes(b"\x00" * 4096)
+    reply = json.dumps({"scenes": [
+        {"scene_number": 1, "start_time": "00:05", "end_time": "00:17",
+         "narration": "The pilot realizes the radio has been dead the whole time."},
+    ]})
+    client = FakeClient(lambda call: reply)
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    analyzer = GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0,
+                                   inline_max_bytes=0)
+
+    stats = analyzer.generate_scenes_from_video([chunk])["analysis_stats"]
+
+    assert stats["uploads"] == 1
+    assert stats["upload_bytes"] == 4096
+    assert stats["upload_seconds"] >= 0
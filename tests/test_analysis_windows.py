@@ -0,0 +1,75 @@
+"""
+Offset windows: the source is uploaded once and each window is sent as a
+start/end offset into it, with timestamps mapped back onto the source timeline.
+Runs against the local stand-in client in tests/fake_genai.py.
+"""
+import json
+
+import pytest
+
+from tests.fake_genai import FakeClient
+from utils.analysis_windows import windows_from_chunks, windows_over_source
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+
+
+def _reply(start, end):
+    return json.dumps({"scenes": [
+        {"scene_number": 1, "start_time": start, "end_time": end, "duration_seconds": 12,
+         "narration": "The detective finds the letter hidden inside the piano bench."},
+    ]})
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "movie.mp4"
+    path.write_bytes(b"\x00" * 2048)
+    return path
+
+
+def _analyzer(monkeypatch, client):
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    monkeypatch.setattr("utils.gemini_analyzer.time.sleep", lambda seconds: None)
+    return GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0, max_retries=2,
+                               context_cache=False, inline_max_bytes=0)
+
+
+def test_windows_over_source_cover_duration(source):
+    windows = windows_over_source(source, 1500, 600)
+    assert [(w.start_seconds, w.end_seconds) for w in windows] == [(0, 600), (600, 1200), (1200, 1500)]
+    assert all(w.media_offset and w.media_path == source for w in windows)
+
+
+def test_single_upload_with_offset_metadata(monkeypatch, source):
+    client = FakeClient(lambda call: _reply("00:10", "00:22"))
+    analyzer = _analyzer(monkeypatch, client)
+
+    result = analyzer.generate_scenes_from_video(windows_over_source(source, 1500, 600))
+
+    assert client.count("files.upload") == 1
+    assert client.uploaded == {}
+    offsets = [(call.contents[0].video_metadata.start_offset, call.contents[0].video_metadata.end_offset)
+               for call in client.generate_calls]
+    assert offsets == [("0.000s", "600.000s"), ("600.000s", "1200.000s"), ("1200.000s", "1500.000s")]
+    starts = [scene["start_time"] for scene in result["scenes"]]
+    assert starts == ["00:00:10.000", "00:10:10.000", "00:20:10.000"]
+
+
+def test_source_timestamps_are_not_offset_twice(monkeypatch, source):
+    client = FakeClient(lambda call: _reply("10:10", "10:22"))
+    analyzer = _analyzer(monkeypatch, client)
+    window = windows_over_source(source, 1500, 600)[1]
+
+    scenes = analyzer._offset_and_clamp_scenes(json.loads(_reply("10:10", "10:22"))["scenes"], window)
+
+    assert scenes[0]["start_time"] == "00:10:10.000"
+    assert scenes[0]["end_time"] == "00:10:22.000"
+
+
+def test_chunk_windows_clamp_to_chunk_length(monkeypatch, source):
+    analyzer = _analyzer(monkeypatch, FakeClient(lambda call: ""))
+    window = windows_from_chunks([source, source], 600)[1]
+
+    scenes = analyzer._offset_and_clamp_scenes(json.loads(_reply("09:50", "10:30"))["scenes"], window)
+
+    assert scenes[0]["start_time"] == "00:19:50.000"
+    assert scenes[0]["end_time"] == "00:20:00.000"
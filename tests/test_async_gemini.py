@@ -0,0 +1,139 @@
+"""
+Asyncio service layer: windows analyzed concurrently on one event loop through
+the SDK's async client, with timeouts that clean up uploads and rate limiting
+shared with the blocking key pool. Runs against tests/fake_genai.py.
+"""
+import asyncio
+import json
+
+import pytest
+from google.genai import errors as genai_errors
+
+from tests.fake_genai import FakeClient
+from utils.analysis_planner import AnalysisPlanner
+from utils.analysis_windows import windows_over_source
+from utils.async_gemini import AsyncGeminiService, EventLoopThread
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+
+REPLY = json.dumps({"scenes": [
+    {"scene_number": 1, "start_time": "00:10", "end_time": "00:25",
+     "narration": "The detective finds the second letter hidden in the piano."},
+]})
+
+
+def _service(monkeypatch, client, **analyzer_options):
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    analyzer = GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0,
+                                   inline_max_bytes=0, **analyzer_options)
+    return AsyncGeminiService(analyzer, poll_seconds=0)
+
+
+def test_offset_windows_share_one_upload_on_the_loop_thread(monkeypatch, tmp_path):
+    source = tmp_path / "movie.mp4"
+    source.write_bytes(b"\x00" * 2048)
+    client = FakeClient(lambda call: REPLY, caching_supported=False)
+    service = _service(monkeypatch, client)
+    loop = EventLoopThread()
+    try:
+        result = loop.run(service.generate_scenes(windows_over_source(source, 1800, 600),
+                                                  concurrency=2), timeout=10)
+    finally:
+        loop.stop()
+
+    assert client.count("files.upload") == 1 and client.uploaded == {}
+    assert [scene["start_time"] for scene in result["scenes"]] == [
+        "00:00:10.000", "00:10:10.000", "00:20:10.000"]
+    assert result["analysis_stats"]["async"]["failed_windows"] == []
+
+
+def test_plan_settings_stats_and_scenes_as_each_window_resolves(monkeypatch, tmp_path):
+    source = tmp_path / "movie.mp4"
+    source.write_bytes(b"\x00" * 2048)
+    client = FakeClient(lambda call: REPLY, caching_supported=False)
+    service = _service(monkeypatch, client)
+    plan = AnalysisPlanner().plan(1200, target="cost")
+    settings = plan.settings()
+    delivered = []
+
+    result = asyncio.run(service.generate_scenes(windows_over_source(source, 1200, 600),
+                                                 on_scene=delivered.append, plan=plan))
+
+    config = client.generate_calls[0].config
+    assert config.media_resolution == settings["media_resolution"]
+    assert config.thinking_config.thinking_level.value.lower() == settings["thinking_level"].lower()
+    assert client.generate_calls[0].contents[0].video_metadata.fps == settings["fps"]
+    assert len(delivered) == 2
+    stats = result["analysis_stats"]
+    assert stats["calls"] == 2 and stats["prompt_tokens"] > 0 and stats["upload_bytes"] == 2048
+    assert stats["async"]["windows"] == 2
+    assert [o["window"] for o in plan.observations] == [0, 1]
+
+
+def _quota_error(per_day):
+    metric = "GenerateRequestsPerDayPerProjectPerModel" if per_day else "GenerateRequestsPerMinute"
+    return genai_errors.ClientError(429, {"error": {
+        "code": 429, "message": f"Quota exceeded for metric {metric}", "status": "RESOURCE_EXHAUSTED",
+    }})
+
+
+def test_rate_limits_back_off_and_daily_quota_retires_the_key(monkeypatch, tmp_path):
+    source = tmp_path / "movie.mp4"
+    source.write_bytes(b"\x00" * 2048)
+    errors = [_quota_error(per_day=False), _quota_error(per_day=True)]
+
+    def responder(call):
+        if errors:
+            raise errors.pop(0)
+        return REPLY
+
+    client = FakeClient(responder, caching_supported=False)
+    service = _service(monkeypatch, client, retry_backoff_seconds=5,
+                       api_keys=["key-aaaaaaaaaa", "key-bbbbbbbbbb"])
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr("utils.async_gemini.asyncio.sleep", fake_sleep)
+    window = windows_over_source(source, 600, 600)[0]
+    window.media_offset = False
+    result = asyncio.run(service.generate_scenes([window]))
+
+    # Per-minute 429: the analyzer's 429 backoff. Per-day 429: key retired, no wait.
+    assert sleeps == [20]
+    assert service.analyzer.key_pool.active_count() == 1
+    assert len(result["scenes"]) == 1
+    assert result["analysis_stats"]["retries"] == {"error": 2}
+
+
+def test_timeout_deletes_the_upload(monkeypatch, tmp_path):
+    source = tmp_path / "movie.mp4"
+    source.write_bytes(b"\x00" * 2048)
+    client = FakeClient(lambda call: REPLY, caching_supported=False)
+    service = _service(monkeypatch, client, max_retries=1)
+    window = windows_over_source(source, 600, 600)[0]
+    window.media_offset = False  # analyze_window uploads (and owns) the file itself
+    client.aio_delay = 0.2
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(service.analyze_window(window, "prompt", timeout=0.1))
+
+    assert client.count("files.upload") == 1 and client.uploaded == {}
+
+
+def test_async_callers_share_the_key_pool_budget(monkeypatch):
+    client = FakeClient(lambda call: REPLY)
+    service = _service(monkeypatch, client, rpm_per_key=0)
+    pool = service.analyzer.key_pool
+    pool.min_interval_seconds = 30
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(round(seconds))
+
+    monkeypatch.setattr("utils.key_pool.asyncio.sleep", fake_sleep)
+    pool.acquire()  # a blocking caller takes the current slot
+
+    asyncio.run(pool.acquire_async())
+
+    assert waits == [30]
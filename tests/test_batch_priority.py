@@ -0,0 +1,97 @@
+"""
+Batch priority: autonomous generation submitted as one Gemini Batch API job,
+polled with backoff, with interactive fallback for windows the batch could not
+answer; batch jobs run on their own worker lane. Runs against the local
+stand-in client in tests/fake_genai.py.
+"""
+import json
+import threading
+
+from tests.fake_genai import FakeClient
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+from utils.job_manager import STATUS_COMPLETED, JobManager
+
+REPLY = json.dumps({"scenes": [
+    {"scene_number": 1, "start_time": "00:30", "end_time": "00:45",
+     "narration": "The courier finally opens the briefcase and freezes."},
+]})
+
+
+def _analyzer(monkeypatch, client):
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    monkeypatch.setattr("utils.gemini_analyzer.time.sleep", lambda _: None)
+    return GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0)
+
+
+def _chunks(tmp_path):
+    chunks = [tmp_path / "chunk_001.mp4", tmp_path / "chunk_002.mp4"]
+    for chunk in chunks:
+        chunk.write_bytes(b"\x00" * 1024)
+    return chunks
+
+
+def test_windows_go_out_in_one_polled_batch(monkeypatch, tmp_path):
+    client = FakeClient(lambda call: REPLY, caching_supported=False, batch_polls=3)
+    analyzer = _analyzer(monkeypatch, client)
+    delays = []
+    monkeypatch.setattr("utils.gemini_batch.time.sleep", delays.append)
+
+    result = analyzer.generate_scenes_batch(_chunks(tmp_path), poll_initial_seconds=10,
+                                            poll_max_seconds=25)
+
+    assert client.count("batches.create") == 1
+    assert delays == [10, 20, 25]
+    assert all(call.batch for call in client.generate_calls) and len(client.generate_calls) == 2
+    # Small chunks still use the Files API (batch requests are size-limited) and are cleaned up.
+    assert client.count("files.upload") == 2 and client.uploaded == {}
+    assert [scene["start_time"] for scene in result["scenes"]] == ["00:00:30.000", "00:10:30.000"]
+    batch = result["analysis_stats"]["batch"]
+    assert batch["state"] == "JOB_STATE_SUCCEEDED" and batch["interactive_windows"] == 0
+
+
+def test_failed_batch_requests_fall_back_to_interactive(monkeypatch, tmp_path):
+    batch_replies = iter([REPLY, None])
+    client = FakeClient(lambda call: next(batch_replies) if call.batch else REPLY,
+                        caching_supported=False, batch_polls=1)
+    monkeypatch.setattr("utils.gemini_batch.time.sleep", lambda _: None)
+    analyzer = _analyzer(monkeypatch, client)
+
+    result = analyzer.generate_scenes_batch(_chunks(tmp_path))
+
+    interactive = [call for call in client.generate_calls if not call.batch]
+    assert len(interactive) == 1
+    assert [scene["start_time"] for scene in result["scenes"]] == ["00:00:30.000", "00:10:30.000"]
+    assert result["analysis_stats"]["batch"]["interactive_windows"] == 1
+
+
+def test_failed_batch_generates_everything_interactively(monkeypatch, tmp_path):
+    client = FakeClient(lambda call: REPLY, caching_supported=False, batch_polls=1,
+                        batch_final_state="JOB_STATE_EXPIRED")
+    monkeypatch.setattr("utils.gemini_batch.time.sleep", lambda _: None)
+    analyzer = _analyzer(monkeypatch, client)
+
+    result = analyzer.generate_scenes_batch(_chunks(tmp_path))
+
+    assert len(result["scenes"]) == 2
+    assert "JOB_STATE_EXPIRED" in result["analysis_stats"]["batch"]["error"]
+
+
+def test_batch_jobs_do_not_block_normal_jobs(tmp_path):
+    release = threading.Event()
+    done = threading.Event()
+
+    def runner(job):
+        if job.priority == "batch":
+            release.wait(5)
+        else:
+            done.set()
+        return {"ok": True}
+
+    manager = JobManager(runner=runner, state_root=tmp_path)
+    manager.submit("overnight", {"priority": "batch"})
+    normal = manager.submit("urgent", {})
+
+    assert done.wait(5)
+    assert manager.get("overnight").status != STATUS_COMPLETED
+    release.set()
+    assert normal.priority == "normal"
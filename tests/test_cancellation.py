@@ -0,0 +1,122 @@
+"""
+Job cancellation: a cancelled job's sleeps, ffmpeg processes and pending API
+calls stop within seconds, queued jobs leave the queue at once, and the worker
+moves on to the next job.
+"""
+import sys
+import threading
+import time
+
+import pytest
+
+from utils import cancellation
+from utils.cancellation import CancelToken, JobCancelled, cancel_scope
+from utils.job_manager import STATUS_CANCELLED, STATUS_COMPLETED, STATUS_FAILED, JobManager, Stage
+
+
+def _cancel_soon(token, delay=0.1):
+    threading.Timer(delay, token.cancel).start()
+
+
+def _wait(manager, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job.status in (STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} did not finish")
+
+
+def test_sleep_wakes_up_on_cancel():
+    token = CancelToken()
+    _cancel_soon(token)
+    started = time.time()
+    with cancel_scope(token), pytest.raises(JobCancelled):
+        cancellation.sleep(30)
+    assert time.time() - started < 2
+
+
+def test_running_process_is_killed():
+    token = CancelToken()
+    _cancel_soon(token, delay=0.3)
+    started = time.time()
+    with cancel_scope(token), pytest.raises(JobCancelled):
+        cancellation.run_process([sys.executable, "-c", "import time; time.sleep(30)"])
+    assert time.time() - started < 5
+
+
+def test_pending_call_is_abandoned_and_its_result_discarded():
+    token = CancelToken()
+    release = threading.Event()
+    discarded = []
+    _cancel_soon(token)
+    with cancel_scope(token), pytest.raises(JobCancelled):
+        # e.g. an upload still in flight when the job is cancelled
+        cancellation.call(lambda: release.wait(5) and "files/abc", discard=discarded.append)
+    release.set()
+    deadline = time.time() + 2
+    while not discarded and time.time() < deadline:
+        time.sleep(0.01)
+    assert discarded == ["files/abc"]
+
+
+def test_no_token_means_plain_calls():
+    assert cancellation.call(lambda: 42) == 42
+    cancellation.sleep(0)
+    cancellation.check()
+
+
+def test_cancel_running_job_frees_the_worker(tmp_path):
+    started = threading.Event()
+    released = []
+
+    def analyze(job, ctx):
+        ctx["session"] = job.job_id
+        if job.job_id == "long":
+            started.set()
+            cancellation.sleep(60)  # e.g. waiting on TTS quota
+        ctx["result"] = {"done": job.job_id}
+
+    manager = JobManager(state_root=tmp_path, stages=[Stage("analyze", analyze)],
+                         on_cancel=lambda job, ctx: released.append((job.job_id, ctx.get("session"))))
+    manager.submit("long", {})
+    manager.submit("next", {})
+    assert started.wait(5)
+
+    assert manager.cancel("long").stage in ("Cancelling", "Cancelled")
+
+    long_job, next_job = _wait(manager, "long"), _wait(manager, "next")
+    assert long_job.status == STATUS_CANCELLED and long_job.stage == "Cancelled"
+    assert next_job.status == STATUS_COMPLETED and next_job.result == {"done": "next"}
+    assert released == [("long", "long")]
+    # The store has the final state too.
+    assert manager.list_jobs(status=[STATUS_CANCELLED])[1] == 1
+
+
+def test_cancel_queued_job_is_immediate(tmp_path):
+    gate, started = threading.Event(), threading.Event()
+    ran = []
+
+    def work(job, ctx):
+        ran.append(job.job_id)
+        started.set()
+        gate.wait(5)
+        ctx["result"] = {}
+
+    manager = JobManager(state_root=tmp_path, stages=[Stage("work", work)])
+    manager.submit("first", {})
+    manager.submit("queued", {})
+    assert started.wait(5)
+    assert manager.queue_position("queued") == 1
+
+    job = manager.cancel("queued")
+    assert job.status == STATUS_CANCELLED
+    assert manager.queue_position("queued") == 0
+
+    gate.set()
+    assert _wait(manager, "first").status == STATUS_COMPLETED
+    assert ran == ["first"]
+    # Finished jobs are returned unchanged.
+    assert manager.cancel("first").status == STATUS_COMPLETED
+    assert manager.cancel("missing") is None
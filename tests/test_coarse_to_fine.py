@@ -0,0 +1,60 @@
+"""
+Coarse-to-fine autonomous mode: a low-detail survey of the whole film picks
+story windows, and only those get full-detail generation, all from one upload.
+Runs against the local stand-in client in tests/fake_genai.py.
+"""
+import json
+
+from tests.fake_genai import FakeClient
+from utils.analysis_windows import merge_spans
+from utils.gemini_analyzer import STORY_WINDOWS_RESPONSE_SCHEMA, GeminiVideoAnalyzer
+
+SURVEY_REPLY = json.dumps({"windows": [
+    {"start_time": "05:00", "end_time": "06:00", "summary": "The heist crew meets."},
+    {"start_time": "06:05", "end_time": "06:40", "summary": "The plan is explained."},
+    {"start_time": "50:00", "end_time": "51:30", "summary": "The vault opens."},
+]})
+SCENE_REPLY = json.dumps({"scenes": [
+    {"scene_number": 1, "start_time": "00:20", "end_time": "00:35",
+     "narration": "The crew gathers in a diner and the leader lays out the job."},
+]})
+
+
+def _responder(call):
+    if call.config.response_schema is STORY_WINDOWS_RESPONSE_SCHEMA:
+        return SURVEY_REPLY
+    return SCENE_REPLY
+
+
+def test_merge_spans_pads_merges_and_splits():
+    spans = merge_spans([(300, 360), (365, 400), (3000, 3900)], 3600,
+                        padding_seconds=10, max_seconds=300)
+
+    assert spans[0] == (290, 410)
+    assert len(spans) == 4 and spans[1][0] == 2990 and spans[-1][1] == 3600
+    assert all(end - start <= 300 for start, end in spans)
+
+
+def test_survey_then_detail_on_selected_windows(monkeypatch, tmp_path):
+    source = tmp_path / "movie.mp4"
+    source.write_bytes(b"\x00" * 4096)
+    client = FakeClient(_responder, caching_supported=False)
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    analyzer = GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0,
+                                   inline_max_bytes=0)
+
+    result = analyzer.generate_scenes_coarse_to_fine(source, 3600)
+
+    assert client.count("files.upload") == 1 and client.uploaded == {}
+    survey, *details = client.generate_calls
+    assert survey.config.media_resolution == "MEDIA_RESOLUTION_LOW"
+    assert survey.contents[0].video_metadata.fps == 0.25
+    offsets = [(call.contents[0].video_metadata.start_offset,
+                call.contents[0].video_metadata.end_offset) for call in details]
+    assert offsets == [("290.000s", "410.000s"), ("2990.000s", "3100.000s")]
+    assert [scene["start_time"] for scene in result["scenes"]] == ["00:05:10.000", "00:50:10.000"]
+
+    report = result["coarse_to_fine"]
+    assert report["detail"]["windows"] == 2
+    assert report["detail"]["coverage"] < 0.1
+    assert report["total_tokens"] < report["per_chunk_estimate"]["tokens"]
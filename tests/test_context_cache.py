@@ -0,0 +1,79 @@
+"""
+Explicit context caching: a chunk is uploaded and cached once, retries refer to
+the cache, and both are deleted when the chunk is done. Runs against the local
+stand-in client in tests/fake_genai.py.
+"""
+import json
+
+import pytest
+
+from tests.fake_genai import FakeClient
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+
+GOOD_REPLY = json.dumps({"scenes": [
+    {"scene_number": 1, "start_time": "00:10", "end_time": "00:22", "duration_seconds": 12,
+     "narration": "The runt wakes up alone in the nest and calls for its mother."},
+]})
+
+
+@pytest.fixture
+def chunk(tmp_path):
+    path = tmp_path / "chunk_001.mp4"
+    path.write_bytes(b"\x00" * 1024)
+    return path
+
+
+def _analyzer(monkeypatch, client, **kwargs):
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    monkeypatch.setattr("utils.gemini_analyzer.time.sleep", lambda seconds: None)
+    return GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0, max_retries=3,
+                               inline_max_bytes=0, **kwargs)
+
+
+def test_retry_reuses_upload_and_cache(monkeypatch, chunk):
+    replies = iter(["Sorry, here is what I saw:", GOOD_REPLY])
+    client = FakeClient(lambda call: next(replies))
+    analyzer = _analyzer(monkeypatch, client)
+
+    result = analyzer.generate_scenes_from_video([chunk], chunk_seconds=600)
+
+    assert len(result["scenes"]) == 1
+    assert client.count("files.upload") == 1
+    assert client.count("caches.create") == 1
+    assert len(client.generate_calls) == 2
+    assert all(call.cached_content for call in client.generate_calls)
+    # Only the short trigger is sent once the video + prompt are cached.
+    assert all(len(call.contents) == 1 for call in client.generate_calls)
+    assert client.caches_live == {} and client.uploaded == {}
+    stats = result["analysis_stats"]
+    assert stats["retries"] == {"malformed_output": 1}
+    assert stats["cached_tokens"] == 2 * client.models.VIDEO_TOKENS
+
+
+def test_falls_back_to_inline_media_when_caching_unavailable(monkeypatch, chunk):
+    client = FakeClient(lambda call: GOOD_REPLY, caching_supported=False)
+    analyzer = _analyzer(monkeypatch, client)
+
+    result = analyzer.generate_scenes_from_video([chunk], chunk_seconds=600)
+
+    assert len(result["scenes"]) == 1
+    call = client.generate_calls[0]
+    assert call.cached_content is None and len(call.contents) == 2
+    assert client.uploaded == {}
+
+
+def test_small_input_is_sent_inline(monkeypatch, chunk):
+    client = FakeClient(lambda call: GOOD_REPLY, caching_supported=False)
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    analyzer = GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0,
+                                   inline_max_bytes=4096)
+
+    result = analyzer.generate_scenes_from_video([chunk], chunk_seconds=600)
+
+    assert len(result["scenes"]) == 1
+    assert client.count("files.upload") == 0 and client.count("files.delete") == 0
+    media = client.generate_calls[0].contents[0]
+    assert media.inline_data.data == chunk.read_bytes()
+    paths = result["analysis_stats"]["input_paths"]
+    assert list(paths) == ["inline"]
+    assert paths["inline"]["request_latency"]["count"] == 1
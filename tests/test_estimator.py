@@ -0,0 +1,90 @@
+"""
+Pre-flight estimates: breakdown from duration / plan / defaults, queue wait
+from the jobs ahead, and recalibration from recorded actuals.
+"""
+import json
+from types import SimpleNamespace
+
+from tests.fake_genai import FakeClient
+from utils.analysis_planner import AnalysisPlanner
+from utils.estimator import JobEstimator, analysis_actuals
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+
+
+def _stage(estimate, name):
+    return next(s["seconds"] for s in estimate["stages"] if s["stage"] == name)
+
+
+def test_estimate_from_plan_and_defaults():
+    plan = AnalysisPlanner().plan(3600, target="balanced")
+    estimate = JobEstimator().estimate(3600, plan=plan)
+    assert estimate["assumed_duration"] is False
+    assert estimate["gemini_calls"] == plan.chunk_count == 6
+    assert estimate["input_tokens"] == 6 * plan.estimated_request_tokens()
+    assert estimate["scenes"] == estimate["tts_calls"] == 30
+    assert _stage(estimate, "analyze") == 60 * 30  # default 30s per media minute
+    assert _stage(estimate, "upload") == 0         # no YouTube upload requested
+    assert estimate["eta_seconds"] == estimate["processing_seconds"]
+
+
+def test_unknown_duration_is_flagged():
+    estimate = JobEstimator().estimate(None)
+    assert estimate["assumed_duration"] and estimate["duration_seconds"] == 3600
+
+
+def test_records_recalibrate_and_track_accuracy(tmp_path):
+    path = tmp_path / "estimates.json"
+    estimator = JobEstimator(history_path=path)
+    estimate = estimator.estimate(1200)
+    comparison = estimator.record(estimate, {
+        "duration_seconds": 1200, "scenes": 20, "gemini_calls": 4, "tts_calls": 20,
+        "processing_seconds": 1000,
+        "stage_seconds": {"analyze": 400, "render": 100},
+    })
+    assert comparison["scenes"] == {"estimated": 10, "actual": 20, "error_pct": -50.0}
+
+    # Reloaded from disk: the next estimate uses the observed rates and ratios.
+    estimator = JobEstimator(history_path=path)
+    recalibrated = estimator.estimate(2400)
+    assert recalibrated["scenes"] == 40                  # 1 scene per media minute
+    assert _stage(recalibrated, "analyze") == 40 * 20    # 20s per media minute
+    assert _stage(recalibrated, "render") == 40 * 5      # 5s per scene
+    assert recalibrated["gemini_calls"] == 4 * 2         # 2x the windows, as observed
+    accuracy = estimator.accuracy()
+    assert accuracy["scenes"] == {"samples": 1, "median_abs_error_pct": 50.0, "median_bias_pct": -50.0}
+
+
+def test_queue_wait_counts_remaining_work_ahead():
+    estimator = JobEstimator()
+    stages = [{"stage": "a", "seconds": 100}, {"stage": "b", "seconds": 50}]
+
+    def job(status, priority, stage_index=0):
+        return SimpleNamespace(status=status, priority=priority, stage_index=stage_index,
+                               params={"estimate": {"stages": stages}})
+
+    jobs = [job("running", "normal", stage_index=1), job("queued", "normal"), job("queued", "batch")]
+    assert estimator.queue_wait(jobs, "normal") == 50 + 150
+    assert estimator.queue_wait(jobs, "urgent") == 50
+    assert estimator.queue_wait(jobs, "batch", parallelism=2) == (50 + 150 + 150) / 2
+
+
+def test_analysis_call_count_reaches_the_comparison(monkeypatch, tmp_path):
+    replies = iter(["Sorry, here is what I saw:"] + [json.dumps({"scenes": [
+        {"scene_number": 1, "start_time": "00:10", "end_time": "00:22",
+         "narration": "The keeper counts the lambs twice before nightfall."}]})] * 2)
+    client = FakeClient(lambda call: next(replies), caching_supported=False)
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    monkeypatch.setattr("utils.gemini_analyzer.time.sleep", lambda seconds: None)
+    analyzer = GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0, max_retries=3,
+                                   inline_max_bytes=0)
+    chunks = []
+    for index in (1, 2):
+        chunks.append(tmp_path / f"chunk_00{index}.mp4")
+        chunks[-1].write_bytes(b"\x00" * 1024)
+
+    result = analyzer.generate_scenes_from_video(chunks, chunk_seconds=600)
+
+    actual = analysis_actuals(result["analysis_stats"])
+    assert actual["gemini_calls"] == len(client.generate_calls) == 3  # one retry included
+    comparison = JobEstimator.compare({"gemini_calls": 2}, actual)
+    assert comparison["gemini_calls"]["actual"] == 3
@@ -0,0 +1,71 @@
+"""
+Frames input mode: one ffmpeg pass samples timecoded frames into per-window
+contact sheets, which are sent inline instead of video; the stamped film times
+the model reports map back to the usual absolute scene timestamps.
+"""
+import json
+from types import SimpleNamespace
+
+from tests.fake_genai import FakeClient
+from utils.analysis_windows import AnalysisWindow, frame_windows
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+from utils.video_processor import VideoProcessor
+
+SHOWINFO = "".join(
+    f"[Parsed_showinfo_3 @ 0x1] n:{n:4d} pts:{n * 2} pts_time:{n * 2.0} duration:1\n"
+    for n in range(12)
+).encode()
+
+
+def test_frames_for_all_windows_come_from_one_pass(monkeypatch, tmp_path):
+    commands = []
+
+    def fake_run(command, **kwargs):
+        commands.append(command)
+        if "-filter_complex" in command:
+            for name, count in (("window_001", 2), ("window_002", 1)):
+                for i in range(1, count + 1):
+                    (tmp_path / "frames" / name / f"sheet_{i:03d}.jpg").write_bytes(b"\xff\xd8" * 10)
+        return SimpleNamespace(returncode=0, stdout=b"", stderr=SHOWINFO)
+
+    monkeypatch.setattr("utils.cancellation.run_process", fake_run)
+    processor = VideoProcessor()
+    commands.clear()
+
+    sheets = processor.extract_frame_sheets(tmp_path / "movie.mp4", tmp_path / "frames",
+                                            [(0, 16), (16, 24)], fps=0.5, tile=(2, 2))
+
+    assert len(commands) == 1
+    graph = commands[0][commands[0].index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]fps=0.5,scale=-2:180,drawtext=")
+    assert "split=2[s0][s1]" in graph and "trim=start=16.000:end=24.000,tile=2x2[o1]" in graph
+    assert [times for _, times in sheets[0]] == [[0.0, 2.0, 4.0, 6.0], [8.0, 10.0, 12.0, 14.0]]
+    assert [times for _, times in sheets[1]] == [[16.0, 18.0, 20.0, 22.0]]
+
+
+def test_frame_window_is_sent_inline_and_maps_film_times(monkeypatch, tmp_path):
+    sheet = tmp_path / "window_002" / "sheet_001.jpg"
+    sheet.parent.mkdir()
+    sheet.write_bytes(b"\xff\xd8" * 2000)
+    spans = [AnalysisWindow(0, 0, 600, tmp_path), AnalysisWindow(1, 600, 1200, tmp_path)]
+    window = frame_windows(spans, [[], [(sheet, [600.0, 602.0, 604.0, 606.0])]])[0]
+    reply = json.dumps({"scenes": [
+        {"scene_number": 1, "start_time": "00:10:02", "end_time": "00:10:06",
+         "narration": "The guard notices the open door and reaches for his radio."},
+    ]})
+    client = FakeClient(lambda call: reply, caching_supported=False)
+    monkeypatch.setattr("utils.gemini_analyzer.genai.Client", lambda **_: client)
+    analyzer = GeminiVideoAnalyzer(api_key="test-key-0000", api_delay_seconds=0)
+
+    result = analyzer.generate_scenes_from_video([window])
+
+    assert client.count("files.upload") == 0
+    label, image, prompt = client.generate_calls[0].contents
+    assert label.text == "Image 1 frames at: 00:10:00, 00:10:02, 00:10:04, 00:10:06"
+    assert image.inline_data.mime_type == "image/jpeg"
+    assert "given as still frames" in prompt.text
+    scene = result["scenes"][0]
+    assert (scene["start_time"], scene["end_time"]) == ("00:10:02.000", "00:10:06.000")
+    stats = result["analysis_stats"]
+    assert stats["upload_bytes"] == 4000
+    assert "frames" in stats["input_paths"]
@@ -0,0 +1,73 @@
+"""
+Request hedging in GeminiVideoAnalyzer._execute_with_retry: a slow call gets a
+duplicate once it passes the learned latency percentile, and only when the key
+has rate-limit headroom.
+"""
+import threading
+import time
+
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+from utils.key_pool import ApiKeyPool
+from utils.latency_tracker import LatencyTracker
+
+
+class MockAnalyzer(GeminiVideoAnalyzer):
+    def __init__(self, min_interval_seconds=0):
+        self.key_pool = ApiKeyPool(["key-aaaaaaaaaa"], client_factory=lambda k: None,
+                                   min_interval_seconds=min_interval_seconds)
+        self.max_retries = 1
+        self.retry_backoff_seconds = 1
+        self.hedge_requests = True
+        self.hedge_percentile = 90
+        self.hedge_min_samples = 3
+        self.request_timeout_seconds = None
+        self.latency = LatencyTracker()
+        for _ in range(5):
+            self.latency.record(0.05)
+
+
+def _slow_then_fast():
+    """First call hangs (tail latency); the duplicate returns quickly."""
+    calls = []
+    release = threading.Event()
+
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(2)
+            return "slow"
+        return "fast"
+    return func, calls, release
+
+
+def test_slow_call_is_hedged_and_duplicate_wins():
+    analyzer = MockAnalyzer()
+    stats = analyzer._new_run_stats()
+    func, calls, release = _slow_then_fast()
+    started = time.time()
+    result = analyzer._execute_with_retry(func, "test call", key=analyzer.key_pool.primary,
+                                          hedge_stats=stats)
+    release.set()
+    assert result == "fast"
+    assert time.time() - started < 1
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    assert stats["calls"] == 2  # the duplicate is a request of its own
+
+
+def test_no_hedge_without_rate_limit_headroom():
+    analyzer = MockAnalyzer(min_interval_seconds=60)
+    key = analyzer.key_pool.acquire()  # the primary call used the only slot
+    stats = analyzer._new_run_stats()
+    func, calls, release = _slow_then_fast()
+    threading.Timer(0.3, release.set).start()
+    assert analyzer._execute_with_retry(func, "test call", key=key, hedge_stats=stats) == "slow"
+    assert len(calls) == 1 and stats["hedged"] == 0 and stats["calls"] == 1
+
+
+def test_calls_are_counted_with_hedging_off():
+    analyzer = MockAnalyzer()
+    analyzer.hedge_requests = False
+    stats = analyzer._new_run_stats()
+    assert analyzer._execute_with_retry(lambda: "ok", "test call", hedge_stats=stats) == "ok"
+    assert analyzer._execute_with_retry(lambda: "ok", "test call", stats=stats) == "ok"
+    assert stats["calls"] == 2 and stats["hedged"] == 0
@@ -0,0 +1,62 @@
+"""
+Shared HTTP transport: one keep-alive pool for every Google API client, with a
+timeout per operation type and connection-reuse metrics. Runs against a local
+HTTP/1.1 server.
+"""
+import http.server
+import threading
+
+import httpx
+import pytest
+
+from utils.http_transport import SharedTransport, classify
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = b'{"state": "ACTIVE"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_polls_reuse_one_connection_with_the_poll_timeout(server):
+    transport = SharedTransport(http2=False, poll_timeout_seconds=7, connect_timeout_seconds=3)
+    try:
+        responses = [transport.client.get(f"{server}/v1beta/files/abc") for _ in range(3)]
+    finally:
+        transport.close()
+
+    assert all(response.status_code == 200 for response in responses)
+    assert responses[0].request.extensions["timeout"] == {
+        "connect": 3, "read": 7, "write": 7, "pool": 7}
+    poll = transport.stats()["operations"]["poll"]
+    assert poll["requests"] == 3
+    assert poll["new_connections"] == 1 and poll["reused_connections"] == 2
+    assert poll["http_versions"] == {"HTTP/1.1": 3}
+
+
+def test_classify_by_operation():
+    base = "https://generativelanguage.googleapis.com"
+    assert classify(httpx.Request("POST", f"{base}/upload/v1beta/files")) == "upload"
+    assert classify(httpx.Request(
+        "POST", f"{base}/v1beta/models/gemini-3-pro:generateContent")) == "generate"
+    assert classify(httpx.Request(
+        "POST", f"{base}/v1beta/models/gemini-3-pro:batchGenerateContent")) == "batch"
+    assert classify(httpx.Request("DELETE", f"{base}/v1beta/files/abc")) == "other"
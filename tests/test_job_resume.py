@@ -0,0 +1,103 @@
+"""
+Crash-safe jobs: the job store is checkpointed after every stage, and a new
+JobManager over the same store re-queues queued jobs and resumes
+interrupted ones at the stage they were in. Finished narration audio is reused.
+"""
+import threading
+import time
+
+from utils.gemini_tts import GeminiTTS
+from utils.job_manager import POOL_API, POOL_CPU, STATUS_COMPLETED, STATUS_RUNNING, JobManager, Stage
+from utils.job_store import JobStore
+
+
+def _wait(manager, job_id, status, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job and job.status == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} never reached {status}")
+
+
+def test_restart_resumes_interrupted_and_queued_jobs(tmp_path):
+    runs = []
+    crashed = threading.Event()
+
+    def acquire(job, ctx):
+        runs.append((job.job_id, "acquire"))
+        ctx["video"] = f"{job.job_id}.mp4"
+
+    def render(job, ctx):
+        runs.append((job.job_id, "render"))
+        ctx["result"] = {"rendered": ctx["video"]}
+
+    def dies(job, ctx):
+        crashed.wait(5)  # the process "dies" while this stage runs
+        raise RuntimeError("killed")
+
+    def acquire_until_b(job, ctx):
+        if job.job_id == "b":
+            dies(job, ctx)
+        acquire(job, ctx)
+
+    first = JobManager(state_root=tmp_path, stages=[
+        Stage("acquire", acquire_until_b, POOL_API), Stage("render", dies, POOL_CPU),
+    ], checkpoint=dict)
+    first.submit("a", {"movie_title": "A"})
+    first.submit("b", {"movie_title": "B"})  # interrupted in its first stage
+    first.submit("c", {"movie_title": "C"})  # still queued behind b
+    deadline = time.time() + 5
+    while (first.get("a").stage_index < 1 or first.get("b").status != STATUS_RUNNING) \
+            and time.time() < deadline:
+        time.sleep(0.01)
+
+    state = JobStore(tmp_path / "jobs.db").get("a")
+    assert state["status"] == STATUS_RUNNING and state["stage_index"] == 1
+    assert state["checkpoint"] == {"video": "a.mp4"}
+
+    try:
+        second = JobManager(state_root=tmp_path, stages=[
+            Stage("acquire", acquire, POOL_API), Stage("render", render, POOL_CPU),
+        ], checkpoint=dict)
+        jobs = {job_id: _wait(second, job_id, STATUS_COMPLETED) for job_id in "abc"}
+    finally:
+        crashed.set()
+
+    assert {job_id: job.result["rendered"] for job_id, job in jobs.items()} == {
+        "a": "a.mp4", "b": "b.mp4", "c": "c.mp4"}
+    assert runs.count(("a", "acquire")) == 1  # resumed at render, not redone
+    assert jobs["c"].params == {"movie_title": "C"}
+
+
+class _FakeTTSClient:
+    def __init__(self):
+        self.calls = 0
+        self.models = self
+
+    def generate_content(self, model, contents, config):
+        self.calls += 1
+        blob = type("Blob", (), {"data": b"\x00\x00" * 240, "mime_type": "audio/L16;rate=24000"})()
+        part = type("Part", (), {"inline_data": blob})()
+        content = type("Content", (), {"parts": [part]})()
+        return type("Response", (), {"candidates": [type("Candidate", (), {"content": content})()]})()
+
+
+def test_tts_reuses_audio_from_an_interrupted_run(monkeypatch, tmp_path):
+    client = _FakeTTSClient()
+    monkeypatch.setattr("utils.gemini_tts.genai.Client", lambda **_: client)
+    tts = GeminiTTS(api_key="test-key-0000")
+    scenes = {"scenes": [
+        {"scene_number": 1, "narration": "The heist begins at midnight."},
+        {"scene_number": 2, "narration": "Nobody expected the vault to be empty."},
+    ]}
+
+    tts.generate_audio_for_scenes(scenes, str(tmp_path))
+    assert client.calls == 2
+    scenes["scenes"][1]["narration"] = "A rewritten line for scene two."
+    audio = tts.generate_audio_for_scenes(scenes, str(tmp_path))
+
+    assert client.calls == 3  # only the scene whose narration changed
+    assert [item["scene_number"] for item in audio] == [1, 2]
+    assert not list(tmp_path.glob("*.part"))
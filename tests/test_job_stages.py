@@ -0,0 +1,70 @@
+"""
+Stage-aware JobManager: api and cpu stages of different jobs overlap, while
+each job's own stages run in order.
+"""
+import threading
+import time
+
+from utils.job_manager import POOL_API, POOL_CPU, STATUS_COMPLETED, STATUS_FAILED, JobManager, Stage
+
+
+def _wait(manager, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job.status in (STATUS_COMPLETED, STATUS_FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} did not finish")
+
+
+def test_render_overlaps_another_jobs_api_stage(tmp_path):
+    api_waiting = threading.Event()
+    rendered_while_waiting = threading.Event()
+    log = []
+
+    def analyze(job, ctx):
+        log.append((job.job_id, "analyze"))
+        ctx["scenes"] = job.job_id
+        if job.job_id == "b":
+            api_waiting.set()
+            # Job b holds the only api worker (e.g. waiting on TTS quota)...
+            rendered_while_waiting.wait(5)
+
+    def render(job, ctx):
+        log.append((job.job_id, "render"))
+        if job.job_id == "a":
+            api_waiting.wait(5)
+            rendered_while_waiting.set()  # ...while job a renders on the cpu pool.
+        ctx["result"] = {"rendered": ctx["scenes"]}
+
+    manager = JobManager(state_root=tmp_path, stages=[
+        Stage("analyze", analyze, POOL_API),
+        Stage("render", render, POOL_CPU),
+    ])
+    manager.submit("a", {})
+    manager.submit("b", {})
+
+    a, b = _wait(manager, "a"), _wait(manager, "b")
+    assert rendered_while_waiting.is_set()
+    assert a.result == {"rendered": "a"} and b.result == {"rendered": "b"}
+    for job_id in ("a", "b"):
+        assert [stage for jid, stage in log if jid == job_id] == ["analyze", "render"]
+    assert set(a.stage_seconds) == {"analyze", "render"}
+
+
+def test_failed_stage_stops_the_job(tmp_path):
+    ran = []
+
+    def boom(job, ctx):
+        raise RuntimeError("no usable segments")
+
+    manager = JobManager(state_root=tmp_path, stages=[
+        Stage("analyze", boom, POOL_API),
+        Stage("render", lambda job, ctx: ran.append(job.job_id), POOL_CPU),
+    ])
+    manager.submit("x", {})
+
+    job = _wait(manager, "x")
+    assert job.status == STATUS_FAILED and job.error == "no usable segments"
+    assert ran == []
@@ -0,0 +1,51 @@
+"""
+SQLite job store: indexed queue positions, paginated / filtered listing,
+results read lazily from job.json, and a second connection (as another
+process would open) seeing the same state.
+"""
+import time
+
+from utils.job_manager import STATUS_COMPLETED, STATUS_QUEUED, JobManager
+from utils.job_store import JobStore
+
+
+def _state(job_id, status=STATUS_QUEUED, priority="normal"):
+    return {"job_id": job_id, "status": status, "priority": priority, "stage": "Queued",
+            "params": {"movie_title": job_id}, "stage_seconds": {}}
+
+
+def test_queue_position_is_per_lane_and_skips_started_jobs(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    for job_id, priority in [("a", "normal"), ("b", "batch"), ("c", "normal"), ("d", "normal")]:
+        store.insert(_state(job_id, priority=priority))
+    store.save(dict(_state("a"), status="running"))
+
+    assert [store.queue_position(job_id) for job_id in "abcd"] == [0, 1, 1, 2]
+    assert store.queue_position("missing") == 0
+
+
+def test_listing_is_paginated_filtered_and_shared_across_connections(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    for i in range(5):
+        store.insert(_state(f"job{i}", status=STATUS_COMPLETED if i % 2 else STATUS_QUEUED))
+
+    other = JobStore(tmp_path / "jobs.db")  # e.g. a second server process
+    page, total = other.list(limit=2, offset=1)
+    assert total == 5 and [job["job_id"] for job in page] == ["job3", "job2"]
+    queued, total = other.list(status=[STATUS_QUEUED])
+    assert total == 3 and {job["job_id"] for job in queued} == {"job0", "job2", "job4"}
+    assert "params" not in page[0]
+
+
+def test_finished_jobs_load_their_result_lazily(tmp_path):
+    manager = JobManager(runner=lambda job: {"scenes_count": 3}, state_root=tmp_path)
+    manager.submit("movie", {"movie_title": "Heat"})
+    deadline = time.time() + 5
+    while manager.get("movie").status != STATUS_COMPLETED and time.time() < deadline:
+        time.sleep(0.01)
+
+    job = manager.get("movie")  # no longer in memory: read back from the store
+    assert job._result_loader is not None
+    assert job.result == {"scenes_count": 3}
+    jobs, total = manager.list_jobs()
+    assert total == 1 and jobs[0]["status"] == STATUS_COMPLETED and "result" not in jobs[0]
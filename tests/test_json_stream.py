@@ -0,0 +1,89 @@
+"""
+Incremental scene parsing for streamed replies, and narration prefetch reuse.
+"""
+import json
+import os
+import threading
+import time
+
+from utils.gemini_tts import NarrationPrefetcher
+from utils.json_stream import SceneStreamParser
+
+REPLY = '```json\n' + json.dumps({"scenes": [
+    {"scene_number": 1, "start_time": "00:05", "end_time": "00:15",
+     "narration": "She says \"run {now}\" and [they] flee."},
+    {"scene_number": 2, "start_time": "01:05", "end_time": "01:20",
+     "narration": "Back at the farm, the runt wakes up.\\n"},
+]}, indent=2) + '\n```'
+
+
+def test_scenes_are_emitted_as_soon_as_they_close():
+    parser = SceneStreamParser()
+    emitted_at = []
+    for i in range(0, len(REPLY), 7):
+        for scene in parser.feed(REPLY[i:i + 7]):
+            emitted_at.append((i, scene))
+    assert [s["scene_number"] for _, s in emitted_at] == [1, 2]
+    assert emitted_at[0][1]["narration"].startswith('She says "run {now}"')
+    # The first scene is available before the second one has even started.
+    assert emitted_at[0][0] < REPLY.index('"scene_number": 2')
+
+
+def test_single_character_feeding_matches_whole_parse():
+    parser = SceneStreamParser()
+    scenes = [s for ch in REPLY for s in parser.feed(ch)]
+    assert scenes == json.loads(REPLY.strip("`json\n"))["scenes"]
+
+
+class _FakeTTS:
+    def __init__(self):
+        self.calls = []
+
+    def text_to_speech(self, text, output_path):
+        self.calls.append(text)
+        with open(output_path, "wb") as f:
+            f.write(b"RIFF")
+        return output_path
+
+
+def test_prefetcher_dedupes_and_hands_over_audio(tmp_path):
+    tts = _FakeTTS()
+    prefetcher = NarrationPrefetcher(tts, str(tmp_path))
+    prefetcher.submit({"narration": "The robot wakes up."})
+    prefetcher.submit({"narration": "The robot wakes up. "})  # same text, delivered twice
+    prefetcher.submit({"narration": "A discarded attempt."})
+    prefetcher.close()
+
+    assert len(tts.calls) == 2
+    path = prefetcher.take("The robot wakes up.")
+    assert path and os.path.exists(path)
+    assert prefetcher.take("never synthesized") is None
+    assert prefetcher.discard_unused() == 1
+    assert prefetcher.stats()["reused"] == 1
+
+
+def test_prefetcher_abort_drops_queued_narration_and_deletes_audio(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    class _SlowTTS(_FakeTTS):
+        def text_to_speech(self, text, output_path):
+            started.set()
+            release.wait(5)
+            return super().text_to_speech(text, output_path)
+
+    tts = _SlowTTS()
+    prefetcher = NarrationPrefetcher(tts, str(tmp_path))
+    for number in range(5):
+        prefetcher.submit({"narration": f"Scene {number}."})
+    assert started.wait(5)
+    aborting = threading.Thread(target=prefetcher.abort)
+    aborting.start()
+    while not prefetcher._aborted:
+        time.sleep(0.001)
+    release.set()  # the one in progress finishes, the queued ones are dropped
+    aborting.join(5)
+
+    assert len(tts.calls) == 1
+    assert os.listdir(tmp_path) == []
+    prefetcher.submit({"narration": "After the failure."})
+    assert prefetcher.stats()["submitted"] == 5
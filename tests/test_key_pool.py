@@ -0,0 +1,89 @@
+"""
+ApiKeyPool routing/retirement, and GeminiTTS moving to the next key when one
+hits its daily quota. No network: clients are simple stand-ins.
+"""
+from types import SimpleNamespace
+
+from google.genai import errors as genai_errors
+
+from utils.gemini_tts import GeminiTTS
+from utils.key_pool import ApiKeyPool, KeyPoolExhausted
+
+
+def _daily_quota_error():
+    return genai_errors.ClientError(429, {"error": {
+        "code": 429,
+        "message": "Quota exceeded for metric GenerateRequestsPerDayPerProjectPerModel",
+        "status": "RESOURCE_EXHAUSTED",
+    }})
+
+
+def test_acquire_routes_to_key_with_most_headroom():
+    pool = ApiKeyPool(["key-aaaaaaaaaa", "key-bbbbbbbbbb"], client_factory=lambda k: k,
+                      min_interval_seconds=30)
+    first = pool.acquire()
+    second = pool.acquire()  # first key is paced for 30s, second is free now
+    assert first is not second
+    assert pool.try_acquire(first) is False
+
+
+def test_retired_keys_are_skipped_until_pool_is_exhausted():
+    pool = ApiKeyPool(["key-aaaaaaaaaa", "key-bbbbbbbbbb"], client_factory=lambda k: k)
+    a = pool.acquire()
+    assert pool.retire(a, seconds=3600) is True
+    assert pool.acquire() is not a
+    assert pool.retire(pool.acquire(), seconds=3600) is False
+    try:
+        pool.acquire()
+        raise AssertionError("expected KeyPoolExhausted")
+    except KeyPoolExhausted:
+        pass
+    stats = pool.stats()
+    assert stats["active_keys"] == 0
+    assert all(k["retired"] for k in stats["keys"])
+
+
+class _FakeModels:
+    def __init__(self, exhausted):
+        self.exhausted = exhausted
+        self.calls = 0
+
+    def generate_content(self, **kwargs):
+        self.calls += 1
+        if self.exhausted:
+            raise _daily_quota_error()
+        blob = SimpleNamespace(data=b"\x00\x00" * 10, mime_type="audio/L16;rate=24000")
+        part = SimpleNamespace(inline_data=blob)
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+def test_tts_rotates_to_next_key_on_daily_quota(monkeypatch):
+    fakes = {"key-aaaaaaaaaa": _FakeModels(exhausted=True),
+             "key-bbbbbbbbbb": _FakeModels(exhausted=False)}
+    monkeypatch.setattr("utils.gemini_tts.genai.Client",
+                        lambda api_key, http_options=None: SimpleNamespace(models=fakes[api_key]))
+    tts = GeminiTTS(api_key=None, api_keys=list(fakes), max_retries=2)
+
+    pcm, rate = tts._synthesize("hello there")
+    assert rate == 24000 and pcm
+    pcm, _ = tts._synthesize("second call goes straight to the healthy key")
+    assert fakes["key-aaaaaaaaaa"].calls == 1
+    assert fakes["key-bbbbbbbbbb"].calls == 2
+    assert tts.key_pool.stats()["active_keys"] == 1
+
+
+def test_remaining_today_counts_calls_against_the_daily_limit():
+    pool = ApiKeyPool(["key-aaaaaaaaaa", "key-bbbbbbbbbb"], client_factory=lambda k: k,
+                      daily_limit=10)
+    for _ in range(3):
+        pool.acquire()
+    remaining, resets_in = pool.remaining_today()
+    assert remaining == 17 and resets_in > 0
+
+    pool.retire(pool.primary)
+    assert pool.remaining_today()[0] == 10 - pool._keys[1].day_calls
+    pool.retire(pool._keys[1], seconds=120)
+    remaining, resets_in = pool.remaining_today()
+    assert remaining == 0 and 100 < resets_in <= 120
+
+    assert ApiKeyPool(["key-cccccccccc"], client_factory=lambda k: k).remaining_today()[0] is None
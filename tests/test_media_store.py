@@ -0,0 +1,82 @@
+"""
+Content-addressed source store: identical videos are kept once, Drive files
+are found again by file id, jobs get hard links and hold references, derived
+files stay with their source, and unreferenced items are evicted LRU first.
+"""
+import hashlib
+import os
+
+from utils.media_store import MediaStore
+
+
+def _video(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+def test_same_content_is_stored_once(tmp_path):
+    store = MediaStore(tmp_path / "media")
+    first = _video(tmp_path / "job1" / "movie.mp4", b"frames" * 100)
+    second = _video(tmp_path / "job2" / "copy.MP4", b"frames" * 100)
+
+    sha = store.put(first)
+    assert sha == hashlib.sha256(b"frames" * 100).hexdigest()
+    assert store.put(second) == sha
+    assert not first.exists() and not second.exists()  # moved in / dropped as a duplicate
+    assert store.stats()["items"] == 1
+
+    linked = store.link(sha, "job2", tmp_path / "job2" / "copy.MP4")
+    assert os.path.samefile(linked, store.path(sha))
+    # Putting the job's own link back is a no-op.
+    assert store.put(linked, sha256=sha) == sha and linked.exists()
+
+
+def test_drive_file_is_found_by_id_after_restart(tmp_path):
+    store = MediaStore(tmp_path / "media")
+    downloaded = _video(tmp_path / "job1" / "video.mp4", b"drive video")
+    sha = store.put(downloaded, drive_id="1AbC")
+    store.set_meta(sha, "duration", 5400.0)
+
+    reopened = MediaStore(tmp_path / "media")
+    assert reopened.lookup_drive("1AbC") == sha
+    assert reopened.lookup_drive("other") is None
+    assert reopened.get_meta(sha, "duration") == 5400.0
+
+
+def test_attachments_are_linked_into_later_jobs(tmp_path):
+    store = MediaStore(tmp_path / "media")
+    sha = store.put(_video(tmp_path / "src.mp4", b"source"))
+    assert store.link_attachment(sha, "shots.json", tmp_path / "job1" / "shots.json") is None
+
+    shots = _video(tmp_path / "job1" / "shots.json", b'{"boundaries": [12.5]}')
+    store.attach(sha, "shots.json", shots)
+
+    target = store.link_attachment(sha, "shots.json", tmp_path / "job2" / "shots.json")
+    assert target.read_bytes() == b'{"boundaries": [12.5]}'
+    assert MediaStore(tmp_path / "media").attachment(sha, "shots.json") is not None
+
+
+def test_lru_eviction_spares_referenced_items(tmp_path):
+    active = {"running"}
+    store = MediaStore(tmp_path / "media", quota_bytes=250, is_active=active.__contains__)
+
+    old = store.put(_video(tmp_path / "a.mp4", b"a" * 100))
+    used = store.put(_video(tmp_path / "b.mp4", b"b" * 100))
+    store.link(used, "running", tmp_path / "running" / "b.mp4")
+    store.link(old, "crashed", tmp_path / "crashed" / "a.mp4")  # never released
+    store.link(old, "finished", tmp_path / "finished" / "a.mp4")
+    store.release("finished")
+    recent = store.put(_video(tmp_path / "c.mp4", b"c" * 100), drive_id="1C")
+
+    # Over quota: the crashed job's reference doesn't count, the running one does.
+    assert old not in store
+    assert used in store and recent in store
+    assert store.stats()["bytes"] == 200
+    # The job's link outlives eviction of the stored copy.
+    assert (tmp_path / "crashed" / "a.mp4").read_bytes() == b"a" * 100
+
+    active.clear()
+    store.release("running")
+    store.put(_video(tmp_path / "d.mp4", b"d" * 100))
+    assert used not in store and recent in store  # least recently used goes first
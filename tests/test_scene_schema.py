@@ -0,0 +1,60 @@
+"""
+Scene-list validation and retry-cause accounting for structured analysis output.
+"""
+import pytest
+
+from utils.gemini_analyzer import (
+    GeminiVideoAnalyzer,
+    MalformedResponseError,
+    validate_scene_list,
+)
+
+
+class MockAnalyzer(GeminiVideoAnalyzer):
+    def __init__(self):
+        pass
+
+
+def test_validate_scene_list_normalizes_types():
+    scenes = validate_scene_list({"scenes": [
+        {"scene_number": "2", "start_time": "00:05", "end_time": 12,
+         "duration_seconds": "7", "narration": "He runs."},
+    ]})
+    assert scenes[0]["scene_number"] == 2
+    assert scenes[0]["duration_seconds"] == 7.0
+
+
+@pytest.mark.parametrize("payload", [
+    [],
+    {"clips": []},
+    {"scenes": {"scene_number": 1}},
+    {"scenes": ["not an object"]},
+    {"scenes": [{"start_time": ["00:01"], "end_time": "00:05", "narration": "x"}]},
+    {"scenes": [{"start_time": "00:01", "end_time": "00:05", "narration": 5}]},
+])
+def test_validate_scene_list_rejects_bad_shapes(payload):
+    with pytest.raises(MalformedResponseError):
+        validate_scene_list(payload)
+
+
+def test_missing_fields_are_left_for_the_pipeline_to_skip():
+    scenes = validate_scene_list({"scenes": [{"start_time": "", "narration": "Only text."}]})
+    assert scenes[0]["scene_number"] == 1
+
+
+def test_parse_scene_response_wraps_unparseable_text():
+    analyzer = MockAnalyzer()
+    with pytest.raises(MalformedResponseError):
+        analyzer._parse_scene_response("I could not watch the video, sorry.")
+
+
+def test_run_stats_measure_malformed_fraction():
+    analyzer = MockAnalyzer()
+    stats = analyzer._new_run_stats()
+    analyzer._count_retry(stats, "malformed_output")
+    analyzer._count_retry(stats, "no_scenes")
+    analyzer._count_retry(stats, "no_scenes")
+    analyzer._count_retry(stats, "malformed_output")
+    stats = analyzer._finish_run_stats(stats)
+    assert stats["total_retries"] == 4
+    assert stats["malformed_retry_fraction"] == 0.5
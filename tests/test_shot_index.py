@@ -0,0 +1,55 @@
+"""
+Shot-boundary index: cut detection output parsing, nearest-cut lookups, chunk
+cut points near cuts, and scene timestamps snapped to cuts.
+"""
+from types import SimpleNamespace
+
+from utils.analysis_windows import windows_from_chunks
+from utils.gemini_analyzer import GeminiVideoAnalyzer
+from utils.shot_index import ShotIndex, detect_shot_boundaries
+
+SHOWINFO = b"""
+[Parsed_showinfo_2 @ 0x1] n:   0 pts:  12012 pts_time:12.012  duration:1001 fmt:yuv420p
+[Parsed_showinfo_2 @ 0x1] n:   1 pts: 610610 pts_time:610.61  duration:1001 fmt:yuv420p
+[Parsed_showinfo_2 @ 0x1] n:   2 pts: 45045 pts_time:45.045  duration:1001 fmt:yuv420p
+"""
+
+
+def test_detection_parses_showinfo(monkeypatch):
+    commands = []
+
+    def fake_run(command, **kwargs):
+        commands.append(command)
+        return SimpleNamespace(returncode=0, stdout=b"", stderr=SHOWINFO)
+
+    monkeypatch.setattr("utils.cancellation.run_process", fake_run)
+
+    assert detect_shot_boundaries("movie.mp4", threshold=0.4) == [12.012, 45.045, 610.61]
+    assert "scale=-2:144,select='gt(scene,0.4)',showinfo" in commands[0]
+
+
+def test_lookups_and_cut_points():
+    shots = ShotIndex([12.0, 45.0, 598.0, 611.0, 1190.0], duration_seconds=1500)
+
+    assert shots.nearest(600, tolerance=5) == 598.0
+    assert shots.nearest(300, tolerance=5) is None
+    assert shots.between(10, 600) == [12.0, 45.0, 598.0]
+    assert shots.cut_points(600, 1500, tolerance=30) == [0.0, 598.0, 1190.0]
+    assert shots.hint(0, 60) == "00:12, 00:45"
+
+
+def test_scene_times_snap_to_cuts_within_tolerance(tmp_path):
+    analyzer = GeminiVideoAnalyzer.__new__(GeminiVideoAnalyzer)
+    analyzer.snap_tolerance_seconds = 1.5
+    shots = ShotIndex([612.0, 629.5, 640.0])
+    window = windows_from_chunks([tmp_path / "a.mp4", tmp_path / "b.mp4"], 600, shots=shots)[1]
+
+    scenes = analyzer._offset_and_clamp_scenes(
+        [{"start_time": "00:11", "end_time": "00:30", "narration": "x"},
+         {"start_time": "00:50", "end_time": "01:00", "narration": "y"}],
+        window,
+    )
+
+    assert (scenes[0]["start_time"], scenes[0]["end_time"]) == ("00:10:12.000", "00:10:29.500")
+    assert (scenes[1]["start_time"], scenes[1]["end_time"]) == ("00:10:50.000", "00:11:00.000")
+    assert "Shot cuts in this segment" in analyzer._window_note(window)
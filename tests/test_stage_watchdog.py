@@ -0,0 +1,114 @@
+"""
+Stage deadlines and the stall watchdog: a hung stage is stopped and retried
+from its checkpoint, then fails the job; a stage that ignores cancellation is
+abandoned and its pool gets a fresh worker; timeouts land in the result.
+"""
+import threading
+import time
+
+import pytest
+
+from utils import cancellation
+from utils.job_manager import STATUS_CANCELLED, STATUS_COMPLETED, STATUS_FAILED, JobManager, Stage
+
+
+def _wait(manager, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job.status in (STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} did not finish")
+
+
+def _manager(tmp_path, stages, **kwargs):
+    kwargs.setdefault("watchdog_interval_seconds", 0.05)
+    return JobManager(state_root=tmp_path, stages=stages, **kwargs)
+
+
+def test_stalled_stage_is_retried_and_recorded(tmp_path):
+    attempts = []
+
+    def prepare(job, ctx):
+        ctx["chunks"] = 3
+
+    def analyze(job, ctx):
+        attempts.append(dict(ctx))
+        ctx["partial"] = True
+        if len(attempts) == 1:
+            cancellation.sleep(60)  # hung, no heartbeats
+        ctx["result"] = {"chunks": ctx["chunks"]}
+
+    manager = _manager(tmp_path, [Stage("prepare", prepare), Stage("analyze", analyze)],
+                       stall_seconds=0.3, checkpoint=dict)
+    manager.submit("job", {})
+    job = _wait(manager, "job")
+
+    assert job.status == STATUS_COMPLETED
+    # The retry starts from the prepare checkpoint, not the half-done context.
+    assert attempts[1] == {"chunks": 3}
+    assert [(t["stage"], t["action"]) for t in job.result["timeouts"]] == [("analyze", "retried")]
+    assert "no progress" in job.timeouts[0]["reason"]
+
+
+def test_heartbeats_keep_a_slow_stage_alive(tmp_path):
+    manager = None
+
+    def work(job, ctx):
+        for _ in range(6):
+            cancellation.sleep(0.1)
+            manager.heartbeat(job.job_id)
+        ctx["result"] = {}
+
+    manager = _manager(tmp_path, [Stage("work", work)], stall_seconds=0.3)
+    manager.submit("job", {})
+    job = _wait(manager, "job")
+    assert job.status == STATUS_COMPLETED and job.timeouts == []
+
+
+def test_deadline_fails_the_job_after_retries(tmp_path):
+    def render(job, ctx):
+        cancellation.sleep(60)
+
+    # Scales with the input: 0.1s per scene.
+    stage = Stage("render", render, deadline=lambda job, ctx: 0.1 * job.params["scenes"])
+    manager = _manager(tmp_path, [stage], stage_retries=1)
+    manager.submit("job", {"scenes": 2})
+    job = _wait(manager, "job")
+
+    assert job.status == STATUS_FAILED
+    assert "deadline" in job.error
+    assert [t["action"] for t in job.timeouts] == ["retried", "failed"]
+    assert all(t["after_seconds"] >= 0.2 for t in job.timeouts)
+
+
+def test_uncancellable_stage_is_abandoned_and_worker_replaced(tmp_path):
+    stuck = threading.Event()
+
+    def work(job, ctx):
+        if job.job_id == "hung":
+            stuck.wait(10)  # e.g. a blocking download that can't be interrupted
+        ctx["result"] = {"done": job.job_id}
+
+    manager = _manager(tmp_path, [Stage("work", work, deadline=0.2)],
+                       stage_retries=0, abandon_seconds=0.2)
+    manager.submit("hung", {})
+    manager.submit("next", {})
+
+    hung, following = _wait(manager, "hung"), _wait(manager, "next")
+    assert hung.status == STATUS_FAILED and hung.timeouts[0]["action"] == "failed"
+    assert following.status == STATUS_COMPLETED
+
+    # When the stuck call finally returns, its outcome is ignored.
+    stuck.set()
+    time.sleep(0.2)
+    assert manager.get("hung").status == STATUS_FAILED
+
+
+def test_call_timeout_outside_a_job():
+    release = threading.Event()
+    with pytest.raises(TimeoutError):
+        cancellation.call(lambda: release.wait(5), timeout=0.1)
+    release.set()
+    assert cancellation.call(lambda: 7, timeout=1) == 7
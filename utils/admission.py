@@ -0,0 +1,171 @@
+"""
+Admission control for new jobs.
+
+Why: /api/process used to accept (and write to disk) any number of multi-GB
+uploads regardless of how deep the queue was, how much disk was left or how
+much TTS quota remained, so disks filled up and jobs sat queued for days. The
+app now asks `AdmissionController.check()` BEFORE the request body is read
+(it only needs the Content-Length), and either rejects the job (the route
+answers 429 with Retry-After) or accepts it with an estimate of when it will
+start and finish.
+
+A job is rejected when:
+- free space in any work directory (temp / outputs) is below the expected
+  footprint of the upload (its size times `disk_factor`, for the proxy,
+  chunks and rendered clips) plus a `min_free_mb` reserve,
+- `max_queued_jobs` jobs are already waiting,
+- the estimated wait before it would start exceeds `max_backlog_seconds`,
+- the remaining daily TTS quota can't cover it and the jobs ahead of it
+  (only when the daily limit is known, or every TTS key is retired).
+
+Estimates use the median run time of recently completed jobs (or a default
+until there are some): the wait is the jobs queued at the same or a higher
+priority, plus half of the running ones, divided by the worker parallelism.
+"""
+import math
+import shutil
+import statistics
+
+from utils.job_manager import PRIORITY_LEVELS, PRIORITY_NORMAL
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class AdmissionDecision:
+    def __init__(self, accepted, reason=None, retry_after_seconds=None,
+                 wait_seconds=None, eta_seconds=None):
+        self.accepted = accepted
+        self.reason = reason
+        self.retry_after_seconds = retry_after_seconds
+        self.wait_seconds = wait_seconds    # estimated time until the job starts
+        self.eta_seconds = eta_seconds      # estimated time until it is done
+
+    @property
+    def retry_after_header(self):
+        """Whole seconds for the Retry-After header (at least 1)."""
+        return str(max(int(math.ceil(self.retry_after_seconds or 0)), 1))
+
+    def to_dict(self):
+        return {
+            "accepted": self.accepted,
+            "reason": self.reason,
+            "retry_after_seconds": (round(self.retry_after_seconds)
+                                    if self.retry_after_seconds is not None else None),
+            "estimated_wait_seconds": round(self.wait_seconds) if self.wait_seconds is not None else None,
+            "eta_seconds": round(self.eta_seconds) if self.eta_seconds is not None else None,
+        }
+
+
+class AdmissionController:
+    def __init__(self, backlog, history=None, quota=None, directories=(),
+                 max_queued_jobs=20, max_backlog_seconds=6 * 3600, min_free_mb=2048,
+                 disk_factor=3.0, tts_calls_per_job=0, default_job_seconds=1800,
+                 parallelism=1, disk_usage=shutil.disk_usage):
+        """
+        Args:
+            backlog: callable() -> {"queued": {priority: count}, "running": count}
+            history: callable() -> run times (seconds) of recently completed jobs
+            quota: callable() -> (TTS calls left today or None if unknown,
+                   seconds until more quota is available), or None to skip
+                   the check for now
+            directories: work directories whose free space is checked
+            max_queued_jobs: waiting jobs beyond which new ones are rejected (0: no cap)
+            max_backlog_seconds: longest acceptable estimated wait (0: no cap)
+            min_free_mb: disk space that must remain free after the job's footprint
+            disk_factor: expected disk footprint as a multiple of the upload size
+            tts_calls_per_job: TTS requests a typical job makes (0: skip the quota check
+                               unless every key is retired)
+            default_job_seconds: job run time assumed until jobs have completed
+            parallelism: jobs that can run at once
+            disk_usage: shutil.disk_usage-compatible callable (tests pass a fake)
+        """
+        self._backlog = backlog
+        self._history = history
+        self._quota = quota
+        self.directories = list(directories)
+        self.max_queued_jobs = max(max_queued_jobs or 0, 0)
+        self.max_backlog_seconds = max(max_backlog_seconds or 0, 0)
+        self.min_free_bytes = max(min_free_mb or 0, 0) * 1024 * 1024
+        self.disk_factor = max(disk_factor or 0, 1.0)
+        self.tts_calls_per_job = max(tts_calls_per_job or 0, 0)
+        self.default_job_seconds = max(default_job_seconds or 0, 1)
+        self.parallelism = max(parallelism or 0, 1)
+        self._disk_usage = disk_usage
+
+    def typical_job_seconds(self):
+        """Median run time of recent jobs, or the default until there are some."""
+        durations = []
+        if self._history is not None:
+            try:
+                durations = [d for d in self._history() if d and d > 0]
+            except Exception as exc:
+                logger.warning(f"Admission: could not read job history: {exc}")
+        return statistics.median(durations) if durations else self.default_job_seconds
+
+    def estimate(self, priority="normal", backlog=None, typical=None):
+        """(seconds until a new job of this priority starts, seconds until it is done)."""
+        backlog = backlog if backlog is not None else self._backlog()
+        typical = typical if typical is not None else self.typical_job_seconds()
+        level = PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS[PRIORITY_NORMAL])
+        ahead = sum(count for queued_priority, count in backlog.get("queued", {}).items()
+                    if PRIORITY_LEVELS.get(queued_priority, PRIORITY_LEVELS[PRIORITY_NORMAL]) <= level)
+        ahead += backlog.get("running", 0) / 2.0
+        wait = ahead * typical / self.parallelism
+        return wait, wait + typical
+
+    def _free_bytes(self):
+        free = None
+        for directory in self.directories:
+            try:
+                space = self._disk_usage(str(directory)).free
+            except OSError as exc:
+                logger.warning(f"Admission: could not check free space in {directory}: {exc}")
+                continue
+            free = space if free is None else min(free, space)
+        return free
+
+    def check(self, content_length=0, priority="normal", uses_tts=True):
+        """Decide whether to accept a new job whose request body is `content_length` bytes."""
+        backlog = self._backlog()
+        typical = self.typical_job_seconds()
+        queued = sum(backlog.get("queued", {}).values())
+        running = backlog.get("running", 0)
+        # A slot frees up (and temp space with it) roughly every typical / parallelism.
+        slot_seconds = typical / self.parallelism
+
+        free = self._free_bytes()
+        needed = (content_length or 0) * self.disk_factor + self.min_free_bytes
+        if free is not None and free < needed:
+            return self._reject(
+                f"Not enough free disk space ({free / 1024 ** 3:.1f} GB free, "
+                f"{needed / 1024 ** 3:.1f} GB needed)", slot_seconds)
+
+        if self.max_queued_jobs and queued >= self.max_queued_jobs:
+            return self._reject(f"Queue is full ({queued} jobs waiting)", slot_seconds)
+
+        wait, eta = self.estimate(priority, backlog, typical)
+        if self.max_backlog_seconds and wait > self.max_backlog_seconds:
+            return self._reject(
+                f"Backlog too long (estimated wait {wait / 3600:.1f}h)",
+                wait - self.max_backlog_seconds)
+
+        if uses_tts and self._quota is not None:
+            try:
+                remaining, resets_in = self._quota() or (None, None)
+            except Exception as exc:
+                logger.warning(f"Admission: could not read TTS quota: {exc}")
+                remaining, resets_in = None, None
+            needed_calls = self.tts_calls_per_job * (queued + running + 1)
+            if remaining == 0 or (remaining is not None and self.tts_calls_per_job
+                                  and remaining < needed_calls):
+                return self._reject(
+                    f"Daily TTS quota exhausted ({remaining} requests left, "
+                    f"~{needed_calls} needed)", resets_in)
+
+        return AdmissionDecision(True, wait_seconds=wait, eta_seconds=eta)
+
+    @staticmethod
+    def _reject(reason, retry_after):
+        logger.warning(f"Admission: rejecting new job: {reason}")
+        return AdmissionDecision(False, reason=reason, retry_after_seconds=max(retry_after or 0, 1))
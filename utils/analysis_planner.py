@@ -0,0 +1,267 @@
+"""
+Token-budget-aware planning of the video analysis pass.
+
+Picks chunk (window) length, frame sampling rate, media resolution and thinking
+level from the source duration, the model's context window / TPM limit and a
+per-job target:
+
+- cost:     fewest tokens (low resolution, sparse frames, long windows)
+- balanced: the previous fixed behaviour (600 s windows, 1 fps, high resolution)
+- latency:  short windows and light thinking so each request returns quickly
+
+Video token usage is estimated per second of media (frames x tokens per frame +
+audio). The estimate is replaced by what the API actually reports after each
+window, and later windows step resolution / fps / thinking down when a window
+comes back over the token budget or slower than the target allows. Window
+length is fixed once the windows are cut; per-request settings adapt.
+"""
+import math
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+TARGETS = ("cost", "balanced", "latency")
+
+# Approximate video tokens per sampled frame at each media resolution, and
+# audio tokens per second. Only a starting point: observe() recalibrates.
+TOKENS_PER_FRAME = {"LOW": 66, "MEDIUM": 258, "HIGH": 280}
+AUDIO_TOKENS_PER_SECOND = 32
+
+RESOLUTION_STEPS = ["HIGH", "MEDIUM", "LOW"]
+THINKING_STEPS = ["high", "medium", "low"]
+FPS_STEPS = [1.0, 0.5, 0.25]
+
+_TARGET_DEFAULTS = {
+    # chunk seconds, fps, media resolution, thinking level (None = planner default),
+    # per-window latency budget in seconds (None = no latency adjustments)
+    "cost": dict(chunk_seconds=1200, fps=0.5, media_resolution="LOW", thinking_level="low",
+                 latency_budget=None),
+    "balanced": dict(chunk_seconds=600, fps=1.0, media_resolution="HIGH", thinking_level=None,
+                     latency_budget=300),
+    "latency": dict(chunk_seconds=300, fps=1.0, media_resolution="MEDIUM", thinking_level="low",
+                    latency_budget=90),
+}
+
+MIN_CHUNK_SECONDS = 120
+MAX_CHUNK_SECONDS = 1800
+
+
+def _step_down(steps, current):
+    """Next cheaper value in `steps` after `current` (None when already the cheapest)."""
+    if current not in steps:
+        return None
+    index = steps.index(current)
+    return steps[index + 1] if index + 1 < len(steps) else None
+
+
+class AnalysisPlan:
+    def __init__(self, target, chunk_seconds, fps, media_resolution, thinking_level,
+                 tokens_per_second, request_overhead_tokens, token_budget, latency_budget,
+                 duration_seconds, notes=None):
+        self.target = target
+        self.chunk_seconds = chunk_seconds
+        self.fps = fps
+        self.media_resolution = media_resolution
+        self.thinking_level = thinking_level
+        self.tokens_per_second = tokens_per_second
+        self.request_overhead_tokens = request_overhead_tokens
+        self.token_budget = token_budget
+        self.latency_budget = latency_budget
+        self.duration_seconds = duration_seconds
+        self.notes = list(notes or [])
+        self.adjustments = []
+        self.observations = []
+        self._calibrated = False
+
+    @property
+    def chunk_count(self):
+        return max(1, math.ceil(self.duration_seconds / self.chunk_seconds)) if self.duration_seconds else None
+
+    def estimated_request_tokens(self, window_seconds=None):
+        seconds = window_seconds if window_seconds is not None else self.chunk_seconds
+        return int(seconds * self.tokens_per_second + self.request_overhead_tokens)
+
+    def settings(self):
+        """Per-request settings for the next window."""
+        return {
+            "fps": self.fps,
+            "media_resolution": f"MEDIA_RESOLUTION_{self.media_resolution}",
+            "thinking_level": self.thinking_level,
+        }
+
+    def _adjust(self, after_window, field, new_value, reason):
+        old_value = getattr(self, field)
+        setattr(self, field, new_value)
+        self.adjustments.append({
+            "after_window": after_window,
+            "field": field,
+            "from": old_value,
+            "to": new_value,
+            "reason": reason,
+        })
+        logger.info(f"Analysis plan: {field} {old_value} -> {new_value} after window "
+                    f"{after_window} ({reason})")
+
+    def _rescale_tokens_per_second(self, old_fps, old_resolution):
+        """Re-estimate media tokens/s after a settings step-down (keeps calibration)."""
+        old_rate = old_fps * TOKENS_PER_FRAME[old_resolution] + AUDIO_TOKENS_PER_SECOND
+        new_rate = self.fps * TOKENS_PER_FRAME[self.media_resolution] + AUDIO_TOKENS_PER_SECOND
+        self.tokens_per_second *= new_rate / old_rate
+
+    def observe(self, window_index, window_seconds, latency_seconds, prompt_tokens):
+        """
+        Feed back one finished window: its request latency and prompt tokens.
+        Adjusts the settings used for later windows.
+        """
+        self.observations.append({
+            "window": window_index,
+            "latency_seconds": round(latency_seconds, 2) if latency_seconds is not None else None,
+            "prompt_tokens": prompt_tokens,
+        })
+        if prompt_tokens and window_seconds:
+            media_tokens = max(prompt_tokens - self.request_overhead_tokens, 0)
+            measured = media_tokens / window_seconds
+            # First measurement replaces the table estimate; later ones are smoothed.
+            if self._calibrated:
+                self.tokens_per_second = 0.5 * self.tokens_per_second + 0.5 * measured
+            else:
+                self.tokens_per_second = measured
+                self._calibrated = True
+
+        if self.estimated_request_tokens() > self.token_budget:
+            old_fps, old_resolution = self.fps, self.media_resolution
+            resolution = _step_down(RESOLUTION_STEPS, self.media_resolution)
+            if resolution:
+                self._adjust(window_index, "media_resolution", resolution, "over token budget")
+            else:
+                fps = _step_down(FPS_STEPS, self.fps)
+                if fps:
+                    self._adjust(window_index, "fps", fps, "over token budget")
+            self._rescale_tokens_per_second(old_fps, old_resolution)
+
+        if (self.latency_budget and latency_seconds is not None
+                and latency_seconds > self.latency_budget):
+            thinking = _step_down(THINKING_STEPS, self.thinking_level)
+            if thinking:
+                self._adjust(window_index, "thinking_level", thinking,
+                             f"window took {latency_seconds:.0f}s > {self.latency_budget}s")
+            else:
+                old_fps, old_resolution = self.fps, self.media_resolution
+                resolution = _step_down(RESOLUTION_STEPS, self.media_resolution)
+                if resolution:
+                    self._adjust(window_index, "media_resolution", resolution,
+                                 f"window took {latency_seconds:.0f}s > {self.latency_budget}s")
+                    self._rescale_tokens_per_second(old_fps, old_resolution)
+
+    def to_dict(self):
+        return {
+            "target": self.target,
+            "chunk_seconds": self.chunk_seconds,
+            "chunk_count": self.chunk_count,
+            "fps": self.fps,
+            "media_resolution": self.media_resolution,
+            "thinking_level": self.thinking_level,
+            "estimated_request_tokens": self.estimated_request_tokens(),
+            "token_budget": self.token_budget,
+            "latency_budget_seconds": self.latency_budget,
+            "notes": self.notes,
+            "adjustments": self.adjustments,
+            "observations": self.observations,
+        }
+
+
+class AnalysisPlanner:
+    def __init__(self, context_tokens=1_048_576, tpm_limit=0, output_reserve_tokens=16_000,
+                 context_headroom=0.8, default_thinking_level="high"):
+        """
+        Args:
+            context_tokens: Model input context window
+            tpm_limit: Input tokens-per-minute limit of the tier (0 = unknown);
+                       a single request must fit inside it
+            output_reserve_tokens: Room kept for the reply (and thinking)
+            context_headroom: Fraction of the context a request may use
+            default_thinking_level: Thinking level of targets that don't set one
+        """
+        self.context_tokens = context_tokens
+        self.tpm_limit = tpm_limit
+        self.output_reserve_tokens = output_reserve_tokens
+        self.context_headroom = context_headroom
+        self.default_thinking_level = default_thinking_level
+
+    def token_budget(self):
+        budget = int(self.context_tokens * self.context_headroom) - self.output_reserve_tokens
+        if self.tpm_limit:
+            budget = min(budget, int(self.tpm_limit * 0.9))
+        return max(budget, 10_000)
+
+    def plan(self, duration_seconds, target="balanced", prompt_chars=0):
+        """
+        Build the plan for one job.
+
+        Args:
+            duration_seconds: Source duration (None when unknown: defaults apply)
+            target: "cost", "balanced" or "latency"
+            prompt_chars: Size of the text sent with every request (instructions
+                          + script), ~4 characters per token
+        """
+        if target not in TARGETS:
+            logger.warning(f"Unknown analysis target {target!r}; using 'balanced'")
+            target = "balanced"
+        defaults = _TARGET_DEFAULTS[target]
+        chunk_seconds = defaults["chunk_seconds"]
+        fps = defaults["fps"]
+        resolution = defaults["media_resolution"]
+        notes = []
+
+        overhead = 2_000 + prompt_chars // 4
+        budget = self.token_budget()
+
+        def per_second(fps_value, resolution_value):
+            return fps_value * TOKENS_PER_FRAME[resolution_value] + AUDIO_TOKENS_PER_SECOND
+
+        def max_fitting_seconds(fps_value, resolution_value):
+            return (budget - overhead) / per_second(fps_value, resolution_value)
+
+        # Fit a window into the budget: shorten it first, then cheapen the frames.
+        while max_fitting_seconds(fps, resolution) < MIN_CHUNK_SECONDS:
+            cheaper = _step_down(RESOLUTION_STEPS, resolution)
+            if cheaper:
+                notes.append(f"media resolution {resolution} -> {cheaper} to fit the token budget")
+                resolution = cheaper
+                continue
+            slower = _step_down(FPS_STEPS, fps)
+            if not slower:
+                break
+            notes.append(f"fps {fps} -> {slower} to fit the token budget")
+            fps = slower
+        fitting = int(max_fitting_seconds(fps, resolution))
+        if chunk_seconds > fitting:
+            notes.append(f"window shortened from {chunk_seconds}s to fit {budget} tokens")
+            chunk_seconds = fitting
+        chunk_seconds = min(max(chunk_seconds, MIN_CHUNK_SECONDS), MAX_CHUNK_SECONDS)
+
+        # Spread the duration evenly so the last window is not a tiny remainder.
+        if duration_seconds and duration_seconds > 0:
+            if duration_seconds <= chunk_seconds:
+                chunk_seconds = int(math.ceil(duration_seconds))
+            else:
+                count = math.ceil(duration_seconds / chunk_seconds)
+                chunk_seconds = int(math.ceil(duration_seconds / count))
+
+        plan = AnalysisPlan(
+            target=target,
+            chunk_seconds=chunk_seconds,
+            fps=fps,
+            media_resolution=resolution,
+            thinking_level=defaults["thinking_level"] or self.default_thinking_level,
+            tokens_per_second=per_second(fps, resolution),
+            request_overhead_tokens=overhead,
+            token_budget=budget,
+            latency_budget=defaults["latency_budget"],
+            duration_seconds=duration_seconds,
+            notes=notes,
+        )
+        logger.info(f"Analysis plan ({target}): {plan.chunk_count or '?'} x {chunk_seconds}s windows, "
+                    f"{fps} fps, {resolution} resolution, ~{plan.estimated_request_tokens()} tokens/request")
+        return plan
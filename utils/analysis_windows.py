@@ -0,0 +1,182 @@
+"""
+Analysis windows: the spans of the source video the model looks at, one request each.
+
+A window knows where it sits on the source timeline (start/end seconds) and
+which media file carries it:
+
+- chunk windows: a physically split chunk file (chunk_001.mp4, ...). The model
+  sees the whole file; its timestamps are relative to the chunk start.
+- offset windows: the ONE uploaded source (or proxy) with start/end offsets sent
+  as video metadata, so no split, no per-chunk upload and no per-chunk
+  server-side processing wait. The model is asked for segment-relative
+  timestamps here too, so the same offset + clamp math applies to both kinds.
+- frame windows: no video at all; JPEG frames (or contact sheets of frames)
+  sampled locally from the span, each frame stamped with its film timecode
+  (VideoProcessor.extract_frame_sheets). Far fewer bytes and input tokens than
+  video; the model reports the stamped film times, which are converted back to
+  segment-relative before the same offset + clamp math.
+
+Windows of one source may share its ShotIndex (utils/shot_index.py), used to
+snap timestamps to shot cuts and to hint the cuts to the model.
+"""
+from pathlib import Path
+
+
+class AnalysisWindow:
+    def __init__(self, index, start_seconds, end_seconds, media_path, media_offset=False,
+                 shots=None, frames=None):
+        self.index = index
+        self.start_seconds = float(start_seconds)
+        self.end_seconds = float(end_seconds)
+        self.media_path = Path(media_path)
+        self.media_offset = media_offset  # True: send start/end offsets with the media
+        self.shots = shots  # ShotIndex of the source (absolute times) or None
+        self.frames = frames  # [(image path, [absolute frame seconds])] or None
+
+    @property
+    def length_seconds(self):
+        return max(self.end_seconds - self.start_seconds, 0.0)
+
+    @property
+    def name(self):
+        if self.frames is not None:
+            return f"{len(self.frames)} frame image(s) @ {self.start_seconds:.0f}-{self.end_seconds:.0f}s"
+        if self.media_offset:
+            return f"{self.media_path.name} @ {self.start_seconds:.0f}-{self.end_seconds:.0f}s"
+        return self.media_path.name
+
+    def to_dict(self):
+        return {
+            "index": self.index,
+            "start_seconds": round(self.start_seconds, 3),
+            "end_seconds": round(self.end_seconds, 3),
+            "media": self.media_path.name,
+            "media_offset": self.media_offset,
+            "frames": sum(len(times) for _, times in self.frames) if self.frames is not None else None,
+        }
+
+    def to_state(self):
+        """Everything but the shot index, JSON-safe (job checkpoints)."""
+        return {
+            "index": self.index,
+            "start_seconds": self.start_seconds,
+            "end_seconds": self.end_seconds,
+            "media_path": str(self.media_path),
+            "media_offset": self.media_offset,
+            "frames": [[str(image), list(times)] for image, times in self.frames]
+            if self.frames is not None else None,
+        }
+
+    @classmethod
+    def from_state(cls, data, shots=None):
+        frames = data.get("frames")
+        return cls(data["index"], data["start_seconds"], data["end_seconds"], data["media_path"],
+                   media_offset=data.get("media_offset", False), shots=shots,
+                   frames=[(Path(image), times) for image, times in frames]
+                   if frames is not None else None)
+
+    def __repr__(self):
+        return f"AnalysisWindow({self.index}, {self.name})"
+
+
+def windows_from_chunks(chunk_paths, chunk_seconds, starts=None, shots=None):
+    """
+    Windows for physically split chunk files.
+
+    Args:
+        chunk_paths: chunk files in timeline order
+        chunk_seconds: nominal chunk length (used when `starts` is not given)
+        starts: optional actual start second of each chunk (for non-uniform cuts)
+        shots: optional ShotIndex of the source
+    """
+    windows = []
+    for i, path in enumerate(chunk_paths):
+        start = starts[i] if starts else i * chunk_seconds
+        if starts and i + 1 < len(starts):
+            end = starts[i + 1]
+        else:
+            end = start + chunk_seconds
+        windows.append(AnalysisWindow(i, start, end, path, shots=shots))
+    return windows
+
+
+def windows_over_source(source_path, duration_seconds, window_seconds, starts=None, shots=None):
+    """
+    Offset windows covering a single uploaded source, `window_seconds` each, or
+    starting at the given `starts` (e.g. ShotIndex.cut_points).
+    """
+    if not duration_seconds or duration_seconds <= 0:
+        raise ValueError("Source duration is required for offset windows")
+    if not starts:
+        starts = []
+        start = 0.0
+        while start < duration_seconds:
+            starts.append(start)
+            start += window_seconds
+    ends = list(starts[1:]) + [duration_seconds]
+    return [
+        AnalysisWindow(i, start, min(end, duration_seconds), source_path, media_offset=True, shots=shots)
+        for i, (start, end) in enumerate(zip(starts, ends))
+    ]
+
+
+def frame_windows(windows, sheets):
+    """
+    Frame windows over the spans of `windows`, given the per-window output of
+    VideoProcessor.extract_frame_sheets (a list of (image, frame times) per
+    window). Spans that got no frames (shorter than the sampling interval) are
+    dropped.
+    """
+    result = []
+    for window, window_sheets in zip(windows, sheets):
+        window_sheets = [(Path(image), list(times)) for image, times in window_sheets if times]
+        if not window_sheets:
+            continue
+        result.append(AnalysisWindow(len(result), window.start_seconds, window.end_seconds,
+                                     window_sheets[0][0].parent, shots=window.shots,
+                                     frames=window_sheets))
+    return result
+
+
+def as_windows(video_chunks, chunk_seconds):
+    """Accept either AnalysisWindows or plain chunk paths (legacy callers)."""
+    items = list(video_chunks or [])
+    if items and all(isinstance(item, AnalysisWindow) for item in items):
+        return items
+    return windows_from_chunks([Path(p) for p in items], chunk_seconds)
+
+
+def merge_spans(spans, duration_seconds, padding_seconds=10, min_seconds=45, max_seconds=300):
+    """
+    Turn candidate (start, end) spans on the source timeline into analysis spans.
+
+    Each span is padded on both sides, widened to `min_seconds`, clamped to the
+    source, overlapping/touching spans are merged, and anything longer than
+    `max_seconds` is cut into equal parts. Returns sorted (start, end) tuples.
+    """
+    padded = []
+    for start, end in spans:
+        if start is None or end is None or end <= start:
+            continue
+        start, end = start - padding_seconds, end + padding_seconds
+        if end - start < min_seconds:
+            grow = (min_seconds - (end - start)) / 2
+            start, end = start - grow, end + grow
+        start = max(start, 0.0)
+        end = min(end, duration_seconds) if duration_seconds else end
+        if end > start:
+            padded.append((start, end))
+
+    merged = []
+    for start, end in sorted(padded):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    result = []
+    for start, end in merged:
+        parts = max(1, -(-int(end - start) // int(max_seconds)))
+        step = (end - start) / parts
+        result.extend((start + i * step, start + (i + 1) * step) for i in range(parts))
+    return result
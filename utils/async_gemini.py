@@ -0,0 +1,350 @@
+"""
+Asyncio service layer over the SDK's async client (`client.aio`).
+
+GeminiVideoAnalyzer and GeminiTTS block a worker thread for every upload,
+processing poll, rate-limit wait and request. The operations here are
+coroutines instead, so the API waits of many jobs can share ONE event loop:
+
+- upload(): Files API upload + processing poll, awaiting between polls
+- analyze_window(): one window's recap generation -> absolute-time scenes
+- generate_scenes(): every window of a video, at most `concurrency` at once
+- synthesize(): one narration -> WAV file
+
+Each operation has a timeout and can be cancelled; a cancelled or timed-out
+upload/analysis deletes whatever it uploaded. Rate limiting goes through the
+same ApiKeyPools the blocking code uses (ApiKeyPool.acquire_async), so threaded
+and async callers never double-book a key.
+
+Prompts, parsing, timestamp math, AnalysisPlan settings, retry backoff and
+daily-quota key retirement are the analyzer's / TTS engine's own, and the run
+reports the analyzer's analysis_stats, so results match the blocking paths.
+Blocking code can use the layer through EventLoopThread:
+
+    loop = EventLoopThread()
+    service = AsyncGeminiService(analyzer, tts)
+    result = loop.run(service.generate_scenes(windows, plan=plan), timeout=3600)
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from pathlib import Path
+
+from google.genai import types
+
+from utils import cancellation
+from utils.analysis_windows import as_windows
+from utils.gemini_analyzer import (
+    SCENES_RESPONSE_SCHEMA, MalformedResponseError, _ChunkSession, _FrameMedia, _InlineMedia, _MediaUploads,
+)
+from utils.key_pool import KeyPoolExhausted, is_daily_quota_exhausted
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+async def _with_context(coro, items):
+    for var, value in items:
+        var.set(value)
+    return await coro
+
+
+class EventLoopThread:
+    """An asyncio loop running on its own daemon thread."""
+
+    def __init__(self, name="gemini-async"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """
+        Schedule `coro` on the loop; returns a concurrent.futures.Future (cancel()
+        cancels it). The caller's context variables (e.g. the session id used in
+        log lines) are carried over into the coroutine's task.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            _with_context(coro, list(contextvars.copy_context().items())), self.loop
+        )
+
+    def run(self, coro, timeout=None):
+        """
+        Run `coro` on the loop and block for its result; cancels it on timeout
+        or when the calling job is cancelled (raising JobCancelled).
+        """
+        future = self.submit(coro)
+        unregister = cancellation.on_cancel(future.cancel)
+        try:
+            return future.result(timeout=timeout)
+        except BaseException:
+            future.cancel()
+            cancellation.check()
+            raise
+        finally:
+            unregister()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class AsyncGeminiService:
+    def __init__(self, analyzer, tts=None, request_timeout_seconds=600,
+                 upload_timeout_seconds=1800, poll_seconds=2):
+        """
+        Args:
+            analyzer: GeminiVideoAnalyzer (key pool, model, prompts, parsing)
+            tts: Optional GeminiTTS (key pool, model, voice)
+            request_timeout_seconds: Default timeout per generate request
+            upload_timeout_seconds: Default timeout per upload incl. processing
+            poll_seconds: Interval between file processing polls
+        """
+        self.analyzer = analyzer
+        self.tts = tts
+        self.request_timeout_seconds = request_timeout_seconds
+        self.upload_timeout_seconds = upload_timeout_seconds
+        self.poll_seconds = poll_seconds
+
+    async def _delete_file(self, key, uploaded):
+        try:
+            await key.client.aio.files.delete(name=uploaded.name)
+            logger.debug(f"Deleted remote file: {uploaded.name}")
+        except Exception as exc:
+            logger.debug(f"Could not delete remote file {uploaded.name}: {exc}")
+
+    async def upload(self, path, key=None, timeout=None):
+        """
+        Upload a video and wait until it is processed.
+
+        Returns:
+            (PooledKey, uploaded file) - the file belongs to that key's project
+        """
+        path = Path(path)
+        key = key or await self.analyzer.key_pool.acquire_async()
+        uploaded = None
+
+        async def upload_and_poll():
+            nonlocal uploaded
+            uploaded = await key.client.aio.files.upload(
+                file=str(path),
+                config=types.UploadFileConfig(mime_type="video/mp4", display_name=path.name),
+            )
+            while uploaded.state == "PROCESSING":
+                await asyncio.sleep(self.poll_seconds)
+                uploaded = await key.client.aio.files.get(name=uploaded.name)
+            if uploaded.state == "FAILED":
+                raise ValueError(f"Video processing failed for {path.name}")
+            return uploaded
+
+        try:
+            return key, await asyncio.wait_for(upload_and_poll(),
+                                               timeout or self.upload_timeout_seconds)
+        except BaseException:
+            # Cancelled, timed out or failed: don't leave the upload behind.
+            if uploaded is not None:
+                await asyncio.shield(self._delete_file(key, uploaded))
+            raise
+
+    async def analyze_window(self, window, prompt_text, timeout=None, shared=None, plan=None,
+                             stats=None, requests=None):
+        """
+        Recap generation for one AnalysisWindow (one attempt).
+
+        Args:
+            shared: Optional (PooledKey, uploaded file) of the window's media,
+                    uploaded once for several offset windows (not deleted here)
+            plan: Optional AnalysisPlan; its current settings (fps, media
+                  resolution, thinking level) apply to the request
+            stats: Optional run stats (as the analyzer keeps them) to add this
+                   attempt's upload, latency and token figures to
+            requests: Optional list; (latency, prompt tokens) of the request is
+                      appended, for the plan's feedback
+
+        Returns:
+            Scenes with absolute timestamps, as generate_scenes_from_video gives
+        """
+        analyzer = self.analyzer
+        stats = stats if stats is not None else analyzer._new_run_stats()
+        settings = plan.settings() if plan else {}
+        key = await analyzer.key_pool.acquire_async(prefer=shared[0] if shared else None)
+        uploaded = None
+        try:
+            if shared and shared[0] is key:
+                media = shared[1]
+            else:
+                prepare_started = time.time()
+                if window.frames is not None:
+                    media = _FrameMedia(window.frames)
+                elif window.media_path.stat().st_size <= analyzer.inline_max_bytes:
+                    media = _InlineMedia(window.media_path)
+                else:
+                    key, uploaded = await self.upload(window.media_path, key=key)
+                    media = uploaded
+                self._record_media(stats, media, window, uploaded is not None, prepare_started)
+            session = _ChunkSession.for_window(analyzer, window, prompt_text, f"window {window.index + 1}",
+                                               fps=settings.get("fps"))
+            session.use_media(key, media)
+            stats["calls"] += 1
+            started = time.time()
+            response = await asyncio.wait_for(
+                key.client.aio.models.generate_content(
+                    model=analyzer.model_name,
+                    contents=session.media_parts(),
+                    config=analyzer._build_generation_config(
+                        analyzer.narration_temperature, response_schema=SCENES_RESPONSE_SCHEMA,
+                        media_resolution=settings.get("media_resolution"),
+                        thinking_level=settings.get("thinking_level"),
+                    ),
+                ),
+                timeout or self.request_timeout_seconds,
+            )
+            latency = round(time.time() - started, 2)
+            analyzer.key_pool.record_success(key)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            raise
+        except Exception as exc:
+            analyzer.record_call_failure(key, exc)
+            raise
+        finally:
+            if uploaded is not None:
+                await asyncio.shield(self._delete_file(key, uploaded))
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens_before = stats["prompt_tokens"]
+        analyzer._record_usage(stats, usage)
+        stats["chunk_latencies"].append(latency)
+        stats["input_requests"].setdefault(_MediaUploads.input_kind(media), []).append(latency)
+        if requests is not None:
+            requests.append((latency, stats["prompt_tokens"] - prompt_tokens_before))
+        response_text = analyzer._extract_response_text(response)
+        if not response_text:
+            return []
+        return analyzer._offset_and_clamp_scenes(analyzer._parse_scene_response(response_text), window)
+
+    @staticmethod
+    def _record_media(stats, media, window, uploaded, started):
+        """Bytes and time it took to get a window's media ready (as _MediaUploads records them)."""
+        elapsed = time.time() - started
+        size = media.size if isinstance(media, _FrameMedia) else window.media_path.stat().st_size
+        stats["uploads"] += 1 if uploaded else 0
+        stats["upload_bytes"] += size
+        stats["upload_seconds"] += elapsed
+        stats["input_prepare"].setdefault(_MediaUploads.input_kind(media), []).append(round(elapsed, 2))
+
+    async def generate_scenes(self, video_chunks, custom_instructions=None, chunk_seconds=600,
+                              concurrency=4, timeout=None, on_scene=None, plan=None):
+        """
+        Autonomous recap generation over all windows, up to `concurrency` windows
+        in flight. A failed window is retried up to the analyzer's max_retries,
+        with the blocking path's backoff (awaited, not slept) and key handling:
+        a daily-quota 429 retires the key and the retry moves to another one.
+        Cancelling the call cancels every window still running.
+
+        Args:
+            on_scene: Optional callback(scene), called with a window's usable
+                      scenes as soon as that window resolves
+            plan: Optional AnalysisPlan (settings per request, fed back per window)
+
+        Returns:
+            {"scenes": [...], "full_script": "...", "analysis_stats": {...}}, the
+            stats as generate_scenes_from_video reports them, plus "async"
+        """
+        analyzer = self.analyzer
+        windows = as_windows(video_chunks, chunk_seconds)
+        prompt_text = analyzer._recap_prompt_text(custom_instructions)
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        stats = analyzer._new_run_stats()
+        failures = {}
+        started = time.time()
+
+        # Offset windows all point at one source: upload it once for all of them.
+        shared = {}
+        for path in {window.media_path for window in windows if window.media_offset}:
+            if path.stat().st_size > analyzer.inline_max_bytes:
+                upload_started = time.time()
+                shared[path] = await self.upload(path)
+                stats["uploads"] += 1
+                stats["upload_bytes"] += path.stat().st_size
+                stats["upload_seconds"] += time.time() - upload_started
+                stats["input_prepare"].setdefault("files_api", []).append(
+                    round(time.time() - upload_started, 2))
+
+        async def run_window(window):
+            async with semaphore:
+                stats["chunks"] += 1
+                requests = []
+                try:
+                    for attempt in range(1, analyzer.max_retries + 1):
+                        stats["attempts"] += 1
+                        try:
+                            scenes = await self.analyze_window(
+                                window, prompt_text, timeout=timeout,
+                                shared=shared.get(window.media_path), plan=plan,
+                                stats=stats, requests=requests,
+                            )
+                        except (asyncio.CancelledError, KeyPoolExhausted):
+                            raise
+                        except MalformedResponseError as exc:
+                            cause, backoff = "malformed_output", analyzer.retry_backoff_seconds
+                            failures[window.index] = str(exc)
+                        except Exception as exc:
+                            cause = "error"
+                            backoff = analyzer.retry_backoff(exc, attempt)
+                            if backoff is None:  # not transient: retried like any failed chunk
+                                backoff = analyzer.retry_backoff_seconds
+                            elif getattr(exc, "code", None) == 429 and is_daily_quota_exhausted(exc):
+                                backoff = 0  # its key was retired; the retry goes to another one
+                            failures[window.index] = str(exc)
+                        else:
+                            if scenes:
+                                failures.pop(window.index, None)
+                                analyzer._emit_scenes(on_scene, scenes)
+                                logger.info(f"✓ {window.name}: generated {len(scenes)} scenes")
+                                return scenes
+                            cause, backoff = "no_usable_scenes", analyzer.retry_backoff_seconds
+                            failures[window.index] = "no usable scenes"
+                        analyzer._count_retry(stats, cause)
+                        logger.warning(f"{window.name}: attempt {attempt} failed: {failures[window.index]}")
+                        if attempt < analyzer.max_retries and backoff:
+                            await asyncio.sleep(backoff)
+                    return []
+                finally:
+                    if plan is not None and requests:
+                        plan.observe(window.index, window.length_seconds, *requests[-1])
+
+        try:
+            per_window = await asyncio.gather(*(run_window(window) for window in windows))
+        finally:
+            for key, uploaded in shared.values():
+                await asyncio.shield(self._delete_file(key, uploaded))
+        stats["async"] = {
+            "windows": len(windows),
+            "concurrency": max(concurrency, 1),
+            "failed_windows": sorted(failures),
+            "seconds": round(time.time() - started, 2),
+        }
+        return analyzer._recap_result([scene for scenes in per_window for scene in scenes], stats)
+
+    async def synthesize(self, text, output_path, timeout=None):
+        """Narration -> WAV at output_path (one attempt)."""
+        if self.tts is None:
+            raise ValueError("AsyncGeminiService was created without a TTS engine")
+        tts = self.tts
+        key = await tts.key_pool.acquire_async()
+        try:
+            response = await asyncio.wait_for(
+                key.client.aio.models.generate_content(
+                    model=tts.model_name, contents=text, config=tts._speech_config(),
+                ),
+                timeout or self.request_timeout_seconds,
+            )
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            raise
+        except Exception:
+            tts.key_pool.record_failure(key)
+            raise
+        audio = tts._audio_from_response(response)
+        if not audio:
+            tts.key_pool.record_failure(key)
+            raise RuntimeError("Gemini TTS returned no audio content")
+        tts.key_pool.record_success(key)
+        return tts._write_wav(output_path, *audio)
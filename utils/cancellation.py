@@ -0,0 +1,198 @@
+"""
+Cooperative cancellation for jobs.
+
+Why: a job nobody wants any more used to run to the end, holding its worker,
+the TTS quota and the CPU. Each job now has a CancelToken. JobManager makes it
+the current token (a context variable) while one of the job's stages runs, and
+the blocking primitives below honour it:
+
+- sleep(): retry backoffs, rate-limit waits and poll intervals wake up at once,
+- run_process(): the ffmpeg / ffprobe Popen handle is killed on cancel,
+- call(): a blocking API request runs on a helper thread and is abandoned
+  (its late result handed to `discard`, e.g. to delete an uploaded file); it
+  can also be given a wall-clock timeout,
+- check(): raise between steps.
+
+They all raise JobCancelled, a BaseException like asyncio.CancelledError, so
+the pipeline's broad `except Exception` retry handlers don't swallow it while
+their `finally` blocks still release uploads and caches. Threads that copy the
+caller's context (hedged requests, the narration prefetcher, the asyncio loop
+via EventLoopThread) see the same token. Outside a job there is no token and
+everything behaves like time.sleep / subprocess.run / a plain call.
+"""
+import contextlib
+import contextvars
+import subprocess
+import threading
+import time
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class JobCancelled(BaseException):
+    """The job this code runs for was cancelled."""
+
+
+class CancelToken:
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}  # handle -> callable, run once on cancel
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="Cancelled"):
+        """Cancel and run the registered callbacks; False if already cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = list(self._callbacks.values()), {}
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as exc:
+                logger.debug(f"Cancel callback failed: {exc}")
+        return True
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
+
+    def sleep(self, seconds):
+        if self._event.wait(max(seconds, 0)):
+            raise JobCancelled(self.reason)
+
+    def on_cancel(self, callback):
+        """
+        Run `callback` when the token is cancelled (at once if it already is).
+        Returns a function that unregisters it.
+        """
+        handle = object()
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks[handle] = callback
+                return lambda: self._unregister(handle)
+        callback()
+        return lambda: None
+
+    def _unregister(self, handle):
+        with self._lock:
+            self._callbacks.pop(handle, None)
+
+
+_current = contextvars.ContextVar("cancel_token", default=None)
+
+
+def current_token():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def cancel_scope(token):
+    """Make `token` the current one for the code (and copied contexts) inside."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def check():
+    """Raise JobCancelled if the current job was cancelled."""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+def sleep(seconds):
+    """time.sleep that wakes up (raising JobCancelled) when the job is cancelled."""
+    token = _current.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+def on_cancel(callback):
+    """Register `callback` on the current token; returns an unregister function."""
+    token = _current.get()
+    if token is None:
+        return lambda: None
+    return token.on_cancel(callback)
+
+
+def run_process(command, timeout=None, text=False):
+    """
+    subprocess.run(command, stdout/stderr captured) whose process is killed
+    when the current job is cancelled (JobCancelled is raised instead of
+    returning the killed process's result). Raises subprocess.TimeoutExpired
+    like subprocess.run, after killing the process.
+    """
+    check()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=text)
+    unregister = on_cancel(process.kill)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except BaseException:
+        process.kill()
+        process.communicate()
+        raise
+    finally:
+        unregister()
+    check()
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+def call(func, discard=None, timeout=None):
+    """
+    Return func(), or raise JobCancelled as soon as the current job is
+    cancelled (TimeoutError once `timeout` seconds have passed), leaving the
+    call to finish on its own thread. If the abandoned call later succeeds,
+    `discard(result)` is called (e.g. to delete an upload).
+    """
+    token = _current.get()
+    if token is None and timeout is None:
+        return func()
+    if token is not None:
+        token.check()
+    lock = threading.Lock()
+    done = threading.Event()
+    outcome = {"abandoned": False}
+
+    def run():
+        try:
+            outcome["result"] = func()
+        except BaseException as exc:
+            outcome["error"] = exc
+        with lock:
+            done.set()
+            abandoned = outcome["abandoned"]
+        if abandoned and discard is not None and "result" in outcome:
+            try:
+                discard(outcome["result"])
+            except Exception as exc:
+                logger.debug(f"Could not discard an abandoned call's result: {exc}")
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), name="cancellable-call", daemon=True).start()
+    unregister = token.on_cancel(done.set) if token is not None else (lambda: None)
+    try:
+        done.wait(timeout)
+    finally:
+        unregister()
+    with lock:
+        if "result" not in outcome and "error" not in outcome:
+            outcome["abandoned"] = True
+            if token is not None and token.cancelled:
+                raise JobCancelled(token.reason)
+            raise TimeoutError(f"call did not return within {timeout}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
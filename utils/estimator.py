@@ -0,0 +1,295 @@
+"""
+Pre-flight cost and duration estimates for jobs.
+
+Why: a job's cost (Gemini calls and input tokens, TTS calls, render time) and
+finish time were only known once it had run. `JobEstimator.estimate()` now
+predicts them up front from:
+
+- the probed source duration (or, before it is known, the median duration
+  of recent jobs) and the analysis plan's windows and tokens per request,
+- per-stage timings of completed jobs, as seconds per unit of input: per
+  job (acquire), per media minute (prepare, analyze) or per scene (TTS,
+  render, finalize, upload), and their scenes per media minute,
+- the queue: the estimated remaining work of the jobs that will run first.
+
+Each completed job's estimate is `record()`ed next to what actually
+happened. The last `calibration_jobs` records recalibrate the model: the
+per-unit rates and scenes per minute are medians of actual values, and
+the call / token counts are scaled by the median actual / estimated ratio.
+`accuracy()` reports the median error per metric over the history.
+Built-in rates are only a starting point until jobs have completed.
+"""
+import json
+import math
+import os
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from utils.job_manager import PRIORITY_LEVELS, PRIORITY_NORMAL
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+UNIT_JOB = "job"
+UNIT_MEDIA_MINUTE = "media_minute"
+UNIT_SCENE = "scene"
+
+# Pipeline stages in order, and what their run time scales with.
+STAGE_UNITS = {
+    "acquire": UNIT_JOB,
+    "prepare": UNIT_MEDIA_MINUTE,
+    "analyze": UNIT_MEDIA_MINUTE,
+    "tts": UNIT_SCENE,
+    "render": UNIT_SCENE,
+    "finalize": UNIT_SCENE,
+    "upload": UNIT_SCENE,
+}
+# Seconds per unit before any job has completed.
+DEFAULT_RATES = {"acquire": 60, "prepare": 3, "analyze": 30, "tts": 20,
+                 "render": 8, "finalize": 1, "upload": 2}
+DEFAULT_SCENES_PER_MINUTE = 0.5
+DEFAULT_DURATION_SECONDS = 3600
+DEFAULT_WINDOW_SECONDS = 600
+
+# Counts whose model is scaled by the observed actual / estimated ratio.
+CORRECTED_METRICS = ("gemini_calls", "input_tokens", "tts_calls")
+# Metrics whose estimate is compared with the actual value.
+TRACKED_METRICS = ("processing_seconds", "scenes", "gemini_calls", "input_tokens", "tts_calls")
+
+
+def analysis_actuals(analysis_stats):
+    """The actual Gemini figures of a run, from its `analysis_stats`."""
+    analysis_stats = analysis_stats or {}
+    return {
+        "gemini_calls": analysis_stats.get("calls"),
+        "input_tokens": analysis_stats.get("prompt_tokens"),
+    }
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+class JobEstimator:
+    def __init__(self, history_path=None, max_history=200, calibration_jobs=20,
+                 clip_seconds=12.5, default_rates=None):
+        """
+        Args:
+            history_path: JSON file keeping estimate / actual pairs across restarts
+                          (None: in memory only)
+            max_history: records kept
+            calibration_jobs: most recent records the model is calibrated from
+            clip_seconds: typical clip length, for the output length estimate
+            default_rates: {stage: seconds per unit}, merged over DEFAULT_RATES
+        """
+        self.history_path = Path(history_path) if history_path else None
+        self.max_history = max(max_history, 1)
+        self.calibration_jobs = max(calibration_jobs, 1)
+        self.clip_seconds = clip_seconds
+        self.default_rates = dict(DEFAULT_RATES, **(default_rates or {}))
+        self._lock = threading.Lock()
+        self._history = self._load()
+
+    # ---------------- history ----------------
+
+    def _load(self):
+        if self.history_path is None or not self.history_path.exists():
+            return []
+        try:
+            with open(self.history_path, encoding="utf-8") as f:
+                return list(json.load(f))[-self.max_history:]
+        except Exception as exc:
+            logger.warning(f"Could not read estimate history {self.history_path}: {exc}")
+            return []
+
+    def _save_locked(self):
+        if self.history_path is None:
+            return
+        try:
+            self.history_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.history_path.with_name(self.history_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._history, f)
+            os.replace(tmp_path, self.history_path)
+        except Exception as exc:
+            logger.warning(f"Could not save estimate history {self.history_path}: {exc}")
+
+    def record(self, estimate, actual):
+        """
+        Keep a completed job's estimate next to its actual figures (same keys:
+        duration_seconds, scenes, gemini_calls, input_tokens, tts_calls,
+        processing_seconds, stage_seconds) and return their comparison.
+        """
+        with self._lock:
+            self._history.append({"at": time.time(), "estimate": estimate, "actual": actual})
+            del self._history[:-self.max_history]
+            self._save_locked()
+        return self.compare(estimate, actual)
+
+    @staticmethod
+    def compare(estimate, actual):
+        """{metric: {estimated, actual, error_pct}} for the tracked metrics both have."""
+        comparison = {}
+        for metric in TRACKED_METRICS:
+            estimated, observed = estimate.get(metric), actual.get(metric)
+            if estimated is None or not observed:
+                continue
+            comparison[metric] = {
+                "estimated": estimated,
+                "actual": observed,
+                "error_pct": round(100.0 * (estimated - observed) / observed, 1),
+            }
+        return comparison
+
+    def accuracy(self):
+        """Per metric over the history: samples, median absolute and signed error (%)."""
+        with self._lock:
+            history = list(self._history)
+        errors = {}
+        for record in history:
+            for metric, row in self.compare(record["estimate"], record["actual"]).items():
+                errors.setdefault(metric, []).append(row["error_pct"])
+        return {
+            metric: {
+                "samples": len(values),
+                "median_abs_error_pct": round(statistics.median(abs(v) for v in values), 1),
+                "median_bias_pct": round(statistics.median(values), 1),
+            }
+            for metric, values in errors.items()
+        }
+
+    def calibration(self):
+        """Model parameters from the most recent records (defaults where there are none)."""
+        with self._lock:
+            recent = list(self._history[-self.calibration_jobs:])
+        rates = {}
+        for stage, unit in STAGE_UNITS.items():
+            samples = []
+            for record in recent:
+                estimate, actual = record["estimate"], record["actual"]
+                seconds = (actual.get("stage_seconds") or {}).get(stage)
+                if seconds is None or stage in estimate.get("skipped_stages", ()) \
+                        or (stage == "upload" and not estimate.get("upload_youtube")):
+                    continue
+                units = self._units(unit, actual.get("duration_seconds"), actual.get("scenes"))
+                if units:
+                    samples.append(seconds / units)
+            rates[stage] = _median(samples)
+            if rates[stage] is None:
+                rates[stage] = self.default_rates.get(stage, 0)
+        scenes_per_minute = _median(
+            record["actual"]["scenes"] / (record["actual"]["duration_seconds"] / 60)
+            for record in recent
+            if record["actual"].get("scenes") and record["actual"].get("duration_seconds")
+        )
+        bias = {}
+        for metric in CORRECTED_METRICS:
+            ratio = _median(
+                record["actual"][metric] / record["estimate"]["raw"][metric]
+                for record in recent
+                if record["actual"].get(metric) and (record["estimate"].get("raw") or {}).get(metric)
+            )
+            bias[metric] = ratio if ratio is not None else 1.0
+        return {
+            "samples": len(recent),
+            "rates": rates,
+            "scenes_per_minute": scenes_per_minute or DEFAULT_SCENES_PER_MINUTE,
+            "median_duration_seconds": _median(r["actual"].get("duration_seconds") for r in recent),
+            "median_processing_seconds": _median(r["actual"].get("processing_seconds") for r in recent),
+            "bias": bias,
+        }
+
+    @staticmethod
+    def _units(unit, duration_seconds, scenes):
+        if unit == UNIT_JOB:
+            return 1
+        if unit == UNIT_MEDIA_MINUTE:
+            return (duration_seconds or 0) / 60
+        return scenes or 0
+
+    # ---------------- estimates ----------------
+
+    def estimate(self, duration_seconds=None, plan=None, params=None, queue_wait_seconds=0,
+                 skip_stages=()):
+        """
+        Breakdown for one job.
+
+        Args:
+            duration_seconds: probed source duration (None: not known yet)
+            plan: its AnalysisPlan (windows and tokens per request), if made
+            params: job params (upload_youtube adds the upload stage)
+            queue_wait_seconds: estimated wait before it starts (see queue_wait())
+            skip_stages: stages expected to take no measurable time (e.g. analysis
+                         through the Batch API, which has no reliable duration)
+        """
+        params = params or {}
+        calibration = self.calibration()
+        assumed = not duration_seconds
+        duration = duration_seconds or calibration["median_duration_seconds"] or DEFAULT_DURATION_SECONDS
+        scenes = max(1, round(duration / 60 * calibration["scenes_per_minute"]))
+        if plan is not None and plan.chunk_count:
+            windows = plan.chunk_count
+            tokens = windows * plan.estimated_request_tokens()
+        else:
+            windows = max(1, math.ceil(duration / DEFAULT_WINDOW_SECONDS))
+            tokens = None
+        raw = {"gemini_calls": windows, "input_tokens": tokens, "tts_calls": scenes}
+        corrected = {metric: (round(value * calibration["bias"][metric]) if value is not None else None)
+                     for metric, value in raw.items()}
+
+        upload = bool(params.get("upload_youtube"))
+        stages = []
+        for stage, unit in STAGE_UNITS.items():
+            if stage in skip_stages or (stage == "upload" and not upload):
+                seconds = 0.0
+            else:
+                seconds = calibration["rates"][stage] * self._units(unit, duration, scenes)
+            stages.append({"stage": stage, "seconds": round(seconds, 1)})
+        processing = sum(stage["seconds"] for stage in stages)
+        render = sum(stage["seconds"] for stage in stages if stage["stage"] in ("render", "finalize"))
+        eta = queue_wait_seconds + processing
+        return {
+            "duration_seconds": round(duration, 1),
+            "assumed_duration": assumed,
+            "analysis_windows": windows,
+            "scenes": scenes,
+            **corrected,
+            "render_minutes": round(render / 60, 1),
+            "output_minutes": round(scenes * self.clip_seconds / 60, 1),
+            "stages": stages,
+            "processing_seconds": round(processing),
+            "queue_wait_seconds": round(queue_wait_seconds),
+            "eta_seconds": round(eta),
+            "finishes_at": (datetime.now() + timedelta(seconds=eta)).isoformat(timespec="seconds"),
+            "upload_youtube": upload,
+            "skipped_stages": list(skip_stages),
+            "raw": raw,
+            "calibration_samples": calibration["samples"],
+        }
+
+    def remaining_seconds(self, job):
+        """Estimated processing left for a queued or running job."""
+        estimate = (job.params or {}).get("estimate")
+        if not estimate:
+            return (self.calibration()["median_processing_seconds"]
+                    or self.estimate()["processing_seconds"])
+        stages = estimate.get("stages") or []
+        return sum(stage["seconds"] for stage in stages[job.stage_index:])
+
+    def queue_wait(self, jobs, priority="normal", parallelism=1):
+        """
+        Seconds until a new job of `priority` would start: the remaining work
+        of the running jobs and of the queued ones it won't overtake, spread
+        over `parallelism` workers.
+        """
+        level = PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS[PRIORITY_NORMAL])
+        total = 0.0
+        for job in jobs:
+            if job.status == "queued" and PRIORITY_LEVELS.get(job.priority, PRIORITY_LEVELS[PRIORITY_NORMAL]) > level:
+                continue
+            total += self.remaining_seconds(job)
+        return total / max(parallelism, 1)
@@ -0,0 +1,109 @@
+"""
+Scheduling order for one JobManager worker pool.
+
+Why: a strict FIFO queue lets a 3-hour movie (or three) submitted first hold up
+every short urgent recap behind it, and lets one submitter who enqueues ten jobs
+push everyone else back by ten jobs. Each pool now dispatches the waiting entry
+with the earliest virtual deadline:
+
+    enqueued_at + aging_seconds * (level + fair-share penalty)
+
+- level: urgent 0, normal 1, batch 2. An urgent job outranks a normal one
+  queued up to `aging_seconds` before it, a batch one up to twice that. Past
+  that, the older job wins, so nothing waits forever (aging).
+- fair-share penalty: each submitter has a virtual time that advances by
+  1 / weight(priority) whenever one of its jobs is dispatched; the penalty is
+  how far ahead it is of the least-served submitter still waiting. A submitter
+  that queued ten jobs gets pushed back after each one it is served; an entry's
+  penalty only shrinks while it waits, so aging still bounds its wait. A
+  submitter arriving at an idle queue starts at the current virtual time, so
+  being idle does not bank credit.
+- ties go to submission order.
+
+`order()` replays that rule on a snapshot, so queue positions match the order
+jobs will really be dispatched in (until new jobs arrive).
+"""
+import threading
+import time
+
+LEVELS = {"urgent": 0, "normal": 1, "batch": 2}
+DEFAULT_WEIGHTS = {"urgent": 4.0, "normal": 1.0, "batch": 0.5}
+
+
+class FairQueue:
+    def __init__(self, aging_seconds=1800, weights=None, clock=time.time):
+        """
+        Args:
+            aging_seconds: head start per priority level (0: plain FIFO + fair share)
+            weights: {priority: share weight}, merged over DEFAULT_WEIGHTS
+            clock: time source (simulations pass a virtual clock)
+        """
+        self.aging_seconds = aging_seconds
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self._clock = clock
+        self._entries = []   # [job, enqueued_at]
+        self._served = {}    # submitter -> virtual time
+        self._vtime = 0.0    # virtual time of the last dispatch
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def _pick(self, entries, served):
+        floor = min(served.get(job.submitter, 0.0) for job, _ in entries)
+        return min(range(len(entries)), key=lambda i: (
+            entries[i][1] + self.aging_seconds * (
+                LEVELS.get(entries[i][0].priority, LEVELS["normal"])
+                + served.get(entries[i][0].submitter, 0.0) - floor
+            ),
+            entries[i][0].sequence,
+        ))
+
+    def _charge(self, job, served):
+        served[job.submitter] = served.get(job.submitter, 0.0) + 1.0 / self.weights.get(job.priority, 1.0)
+
+    def put(self, job):
+        with self._cond:
+            if not any(entry[0].submitter == job.submitter for entry in self._entries):
+                self._served[job.submitter] = max(self._served.get(job.submitter, 0.0), self._vtime)
+            self._entries.append([job, self._clock()])
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Remove and return the next job; blocks while empty (None on timeout)."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._entries, timeout=timeout):
+                return None
+            job, _ = self._entries.pop(self._pick(self._entries, self._served))
+            self._vtime = self._served.get(job.submitter, 0.0)
+            self._charge(job, self._served)
+            return job
+
+    def remove(self, job_id):
+        """Drop a waiting job; False if it isn't waiting here."""
+        with self._cond:
+            for index, (job, _) in enumerate(self._entries):
+                if job.job_id == job_id:
+                    del self._entries[index]
+                    return True
+        return False
+
+    def order(self):
+        """Waiting jobs in the order they would be dispatched now."""
+        with self._cond:
+            entries = list(self._entries)
+            served = dict(self._served)
+        ordered = []
+        while entries:
+            job, _ = entries.pop(self._pick(entries, served))
+            self._charge(job, served)
+            ordered.append(job)
+        return ordered
+
+    def position(self, job_id):
+        """1-based dispatch position of a waiting job; 0 if it isn't waiting here."""
+        for index, job in enumerate(self.order(), 1):
+            if job.job_id == job_id:
+                return index
+        return 0
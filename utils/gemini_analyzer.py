@@ -4,13 +4,24 @@ Gemini AI video analyzer using the new google-genai library
 from google import genai
 from google.genai import types
 from google.genai import errors as genai_errors
+import contextvars
 import json
+import math
 import re
 import difflib
 import time
 import textwrap
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import wait as futures_wait
 from pathlib import Path
-import httpx
+from utils import cancellation
+from utils.analysis_windows import AnalysisWindow, as_windows, merge_spans, windows_over_source
+from utils.gemini_batch import run_batch
+from utils.cancellation import JobCancelled
+from utils.http_transport import NETWORK_ERRORS
+from utils.json_stream import SceneStreamParser
+from utils.key_pool import ApiKeyPool, KeyPoolExhausted, is_daily_quota_exhausted
+from utils.latency_tracker import LatencyTracker, latency_summary
 from utils.logger import setup_logger
 
 logger = setup_logger()
@@ -18,37 +29,394 @@ logger = setup_logger()
 # HTTP status codes worth retrying (rate limit + transient server errors)
 _RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
+# Declared response schemas. Requests send these with a JSON mime type so the
+# model emits parseable JSON directly (no regex scraping, no parse-retry loops).
+SCENES_RESPONSE_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "scenes": types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "scene_number": types.Schema(type=types.Type.INTEGER),
+                    "start_time": types.Schema(type=types.Type.STRING),
+                    "end_time": types.Schema(type=types.Type.STRING),
+                    "duration_seconds": types.Schema(type=types.Type.NUMBER),
+                    "narration": types.Schema(type=types.Type.STRING),
+                },
+                required=["scene_number", "start_time", "end_time", "narration"],
+                property_ordering=["scene_number", "start_time", "end_time",
+                                   "duration_seconds", "narration"],
+            ),
+        ),
+    },
+    required=["scenes"],
+)
+
+METADATA_RESPONSE_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "title": types.Schema(type=types.Type.STRING),
+        "description": types.Schema(type=types.Type.STRING),
+        "tags": types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)),
+    },
+    required=["title", "description", "tags"],
+)
+
+# Coarse pass of the coarse-to-fine strategy: which spans of the film matter.
+STORY_WINDOWS_RESPONSE_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "windows": types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "start_time": types.Schema(type=types.Type.STRING),
+                    "end_time": types.Schema(type=types.Type.STRING),
+                    "summary": types.Schema(type=types.Type.STRING),
+                },
+                required=["start_time", "end_time"],
+                property_ordering=["start_time", "end_time", "summary"],
+            ),
+        ),
+    },
+    required=["windows"],
+)
+
+
+class MalformedResponseError(ValueError):
+    """The model's reply could not be parsed/validated as the expected JSON."""
+
+
+def validate_scene_list(data):
+    """
+    Validate a parsed scene-list reply and normalize field types.
+
+    Returns the list of scene dicts. Structural problems (not an object, no
+    `scenes` array, a scene that is not an object, wrong field types) raise
+    MalformedResponseError. Missing/blank timestamps or narration are left as
+    they are: the pipeline reports those scenes as skipped, not as a bad reply.
+    """
+    if not isinstance(data, dict):
+        raise MalformedResponseError(f"expected a JSON object, got {type(data).__name__}")
+    scenes = data.get("scenes")
+    if scenes is None:
+        raise MalformedResponseError("missing 'scenes' array")
+    if not isinstance(scenes, list):
+        raise MalformedResponseError(f"'scenes' must be an array, got {type(scenes).__name__}")
+
+    validated = []
+    for position, scene in enumerate(scenes, 1):
+        if not isinstance(scene, dict):
+            raise MalformedResponseError(f"scene {position} is not an object")
+        for field in ("start_time", "end_time"):
+            value = scene.get(field)
+            if value is not None and not isinstance(value, (str, int, float)):
+                raise MalformedResponseError(f"scene {position} has a non-scalar {field}")
+        narration = scene.get("narration")
+        if narration is not None and not isinstance(narration, str):
+            raise MalformedResponseError(f"scene {position} narration must be a string")
+        try:
+            scene["scene_number"] = int(scene.get("scene_number") or position)
+        except (TypeError, ValueError):
+            raise MalformedResponseError(f"scene {position} has a non-integer scene_number")
+        duration = scene.get("duration_seconds")
+        if duration is not None:
+            try:
+                scene["duration_seconds"] = float(duration)
+            except (TypeError, ValueError):
+                raise MalformedResponseError(f"scene {position} has a non-numeric duration_seconds")
+        validated.append(scene)
+    return validated
+
+
+# Sent instead of the full instructions once a chunk's video + prompt are cached.
+_CACHED_TRIGGER = "Follow the instructions above for this video segment and output the JSON now."
+
+
+class _InlineMedia:
+    """Media small enough to send as inline bytes in the request itself."""
+
+    input_kind = "inline"
+
+    def __init__(self, path, mime_type="video/mp4"):
+        self.path = Path(path)
+        self.mime_type = mime_type
+        self.data = self.path.read_bytes()
+
+
+class _FrameMedia:
+    """Sampled JPEG frames / contact sheets of one frame window, sent inline."""
+
+    input_kind = "frames"
+    mime_type = "image/jpeg"
+
+    def __init__(self, frames):
+        self.sheets = [(Path(image).read_bytes(), times) for image, times in frames]
+
+    @property
+    def size(self):
+        return sum(len(data) for data, _ in self.sheets)
+
+
+class _MediaUploads:
+    """
+    Media for one analysis run, shared by every window that uses it.
+
+    Frame windows carry their own small JPEGs, always sent inline. Other
+    inputs up to the analyzer's inline limit are read once and sent as inline
+    bytes (no upload, no processing poll, no delete). Larger inputs go through
+    the Files API: chunk windows each have their own file, so each is uploaded
+    once and deleted as soon as its window is done; offset windows all point at
+    the same source, which is uploaded (and server-side processed) ONCE for the
+    run. Files belong to the project of the key that uploaded them; asking for
+    a file on a different key re-uploads it there.
+    """
+
+    def __init__(self, analyzer, stats, inline_max_bytes=None):
+        self.analyzer = analyzer
+        self.stats = stats
+        self.inline_max_bytes = analyzer.inline_max_bytes if inline_max_bytes is None else inline_max_bytes
+        self._files = {}  # media path -> (PooledKey, uploaded file)
+        self._inline = {}  # media path -> _InlineMedia / _FrameMedia
+
+    def owner(self, path):
+        """The key the media is currently uploaded with (or None)."""
+        entry = self._files.get(Path(path))
+        return entry[0] if entry else None
+
+    def get(self, path, key, frames=None):
+        path = Path(path)
+        if path in self._inline:
+            return self._inline[path]
+        entry = self._files.get(path)
+        if entry and entry[0] is key:
+            return entry[1]
+        if entry:
+            self.release(path)
+        started = time.time()
+        if frames is not None:
+            media = _FrameMedia(frames)
+            size = media.size
+            self._inline[path] = media
+            logger.info(f"Sending {len(frames)} frame image(s) inline for {path.name} "
+                        f"({size / 1024:.0f} KB)")
+            self._record(media, size, started)
+            return media
+        size = path.stat().st_size
+        if size <= self.inline_max_bytes:
+            media = _InlineMedia(path)
+            self._inline[path] = media
+            logger.info(f"Sending {path.name} inline ({size / 1024 ** 2:.1f} MB, no Files API upload)")
+        else:
+            media = self.analyzer.upload_video(path, client=key.client)
+            if not getattr(media, "uri", None):
+                self.analyzer._delete_remote_file(media, client=key.client)
+                raise ValueError(f"Failed to get URI for {path.name}")
+            self._files[path] = (key, media)
+            self.stats["uploads"] += 1
+        self._record(media, size, started)
+        return media
+
+    def _record(self, media, size, started):
+        # Time to get the media ready (upload + server-side processing, or a
+        # local read for inline), and bytes sent.
+        elapsed = time.time() - started
+        self.stats["upload_seconds"] += elapsed
+        self.stats["upload_bytes"] += size
+        self.stats["input_prepare"].setdefault(self.input_kind(media), []).append(round(elapsed, 2))
+
+    @staticmethod
+    def input_kind(media):
+        return getattr(media, "input_kind", "files_api")
+
+    def release(self, path):
+        self._inline.pop(Path(path), None)
+        entry = self._files.pop(Path(path), None)
+        if entry:
+            key, video_file = entry
+            self.analyzer._delete_remote_file(video_file, client=key.client)
+
+    def release_unused(self, remaining_windows):
+        """Delete uploads no remaining window refers to."""
+        needed = {window.media_path for window in remaining_windows}
+        for path in list(self._files) + list(self._inline):
+            if path not in needed:
+                self.release(path)
+
+    def release_all(self):
+        for path in list(self._files) + list(self._inline):
+            self.release(path)
+
+
+class _ChunkSession:
+    """
+    Per-window request state that survives retries.
+
+    The window's media comes from the run's _MediaUploads (uploaded once by
+    whichever key is picked first) and, when context caching is enabled, is put
+    into an explicit cached content entry together with the static
+    instructions. Retries and any follow-up calls for the window then send only
+    a short trigger and reference the cache, instead of re-uploading the video
+    and re-sending hundreds of thousands of input tokens.
+
+    Uploaded files and caches belong to the project of the key that created
+    them, so the session sticks to that key; if the key is retired mid-window,
+    the media is re-uploaded with the next key. release() deletes the cache;
+    the upload is released by the run once no later window needs it.
+    """
+
+    def __init__(self, analyzer, window, prompt_text, label, stats, uploads, fps=None):
+        self.analyzer = analyzer
+        self.window = window
+        self.fps = fps
+        self.prompt_text = prompt_text
+        self.label = label
+        self.stats = stats
+        self.uploads = uploads
+        self.key = None
+        self.video_file = None
+        self.cache = None
+        self.cache_expires_at = 0.0
+        self._cache_unavailable = not analyzer.context_cache
+
+    @classmethod
+    def for_window(cls, analyzer, window, prompt_text, label, stats=None, uploads=None, fps=None):
+        """Session for `window`: the run's prompt plus the window's own note (span, shot cuts)."""
+        return cls(analyzer, window, prompt_text + analyzer._window_note(window), label, stats,
+                   uploads, fps=fps)
+
+    def use_media(self, key, media):
+        """Send `media` (ready on `key`) instead of getting it from the run's uploads."""
+        self.release()
+        self.key, self.video_file = key, media
+
+    def acquire(self):
+        """Wait for a rate-limit slot and make sure the media is ready on that key."""
+        prefer = self.key or self.uploads.owner(self.window.media_path)
+        key = self.analyzer._wait_for_rate_limit(prefer=prefer)
+        video_file = self.uploads.get(self.window.media_path, key, frames=self.window.frames)
+        if key is not self.key or video_file is not self.video_file:
+            self.release()
+            self.key, self.video_file = key, video_file
+        if self.cache is None and not self._cache_unavailable:
+            self._create_cache()
+        elif self.cache is not None:
+            self._extend_cache_ttl()
+        return key
+
+    def media_parts(self):
+        """Request contents: the window's media (or frame sheets) followed by the prompt."""
+        if isinstance(self.video_file, _FrameMedia):
+            # Each image is preceded by the film times of its frames so the
+            # model can place events even where a burned-in timecode is unreadable.
+            parts = []
+            for number, (data, times) in enumerate(self.video_file.sheets, 1):
+                stamps = ", ".join(GeminiVideoAnalyzer._seconds_to_timestamp(t)[:8] for t in times)
+                parts.append(types.Part.from_text(text=f"Image {number} frames at: {stamps}"))
+                parts.append(types.Part(inline_data=types.Blob(data=data, mime_type=_FrameMedia.mime_type)))
+            return parts + [types.Part.from_text(text=self.prompt_text)]
+        metadata = {}
+        if self.window.media_offset:
+            # Only this span of the single uploaded source is sent to the model.
+            metadata["start_offset"] = f"{self.window.start_seconds:.3f}s"
+            metadata["end_offset"] = f"{self.window.end_seconds:.3f}s"
+        if self.fps:
+            metadata["fps"] = self.fps
+        video_metadata = types.VideoMetadata(**metadata) if metadata else None
+        if isinstance(self.video_file, _InlineMedia):
+            media_part = types.Part(
+                inline_data=types.Blob(data=self.video_file.data, mime_type=self.video_file.mime_type),
+                video_metadata=video_metadata,
+            )
+        else:
+            media_part = types.Part(
+                file_data=types.FileData(file_uri=self.video_file.uri,
+                                         mime_type=self.video_file.mime_type),
+                video_metadata=video_metadata,
+            )
+        return [media_part, types.Part.from_text(text=self.prompt_text)]
+
+    @property
+    def input_kind(self):
+        return _MediaUploads.input_kind(self.video_file)
+
+    def _create_cache(self):
+        ttl = self.analyzer.cache_ttl_seconds
+        try:
+            self.cache = self.key.client.caches.create(
+                model=self.analyzer.model_name,
+                config=types.CreateCachedContentConfig(
+                    contents=[types.Content(role="user", parts=self.media_parts())],
+                    display_name=f"recap-{self.label}".replace(" ", "-"),
+                    ttl=f"{ttl}s",
+                ),
+            )
+            self.cache_expires_at = time.time() + ttl
+            self.stats["caches_created"] += 1
+            logger.info(f"Cached {self.label} video + instructions ({self.cache.name}, ttl {ttl}s)")
+        except Exception as exc:
+            # Model/tier without explicit caching, or input below the minimum
+            # cacheable size: send the media inline with each request instead.
+            self._cache_unavailable = True
+            self.cache = None
+            logger.info(f"Context cache not used for {self.label}: {exc}")
+
+    def _extend_cache_ttl(self):
+        """Push the TTL out again if a long retry backoff brought it close to expiry."""
+        if self.cache_expires_at - time.time() > 120:
+            return
+        ttl = self.analyzer.cache_ttl_seconds
+        try:
+            self.key.client.caches.update(
+                name=self.cache.name, config=types.UpdateCachedContentConfig(ttl=f"{ttl}s")
+            )
+            self.cache_expires_at = time.time() + ttl
+        except Exception as exc:
+            logger.debug(f"Could not extend cache TTL for {self.label}: {exc}")
+
+    def contents(self):
+        if self.cache is not None:
+            return [types.Part.from_text(text=_CACHED_TRIGGER)]
+        return self.media_parts()
+
+    def configure(self, gen_config):
+        if self.cache is not None:
+            gen_config.cached_content = self.cache.name
+        return gen_config
+
+    def release(self):
+        """Delete the cache (best effort)."""
+        if self.cache is not None:
+            try:
+                self.key.client.caches.delete(name=self.cache.name)
+                logger.debug(f"Deleted context cache: {self.cache.name}")
+            except Exception as exc:
+                logger.debug(f"Could not delete context cache {self.cache.name}: {exc}")
+            self.cache = None
+        self.video_file = None
+        self.key = None
+
+
 class GeminiVideoAnalyzer:
-    
-    def _wait_for_rate_limit(self):
+
+    def _wait_for_rate_limit(self, prefer=None):
         """
-        Wait if necessary to respect rate limits between API calls
-        
+        Wait if necessary to respect rate limits between API calls, and return the
+        pooled key (with its client) to make the call with.
+
         For free tier: Need ~2 minutes between calls
         For paid tier: Can set delay to 0
+        With several keys the delay applies per key, so calls rotate to whichever
+        key is free soonest.
+
+        Args:
+            prefer: PooledKey to stay on if still active (uploaded files belong
+                    to the project of the key that uploaded them)
         """
-        if self.api_delay_seconds > 0:
-            current_time = time.time()
-            time_since_last_call = current_time - self.last_api_call_time
-            
-            if time_since_last_call < self.api_delay_seconds and self.last_api_call_time > 0:
-                wait_time = self.api_delay_seconds - time_since_last_call
-                logger.info(f"⏳ Rate limit: Waiting {wait_time:.0f}s before next API call...")
-                logger.info(f"   (Free tier requires ~{self.api_delay_seconds}s between calls)")
-                
-                # Show countdown for long waits
-                if wait_time > 10:
-                    for remaining in range(int(wait_time), 0, -30 if wait_time > 60 else -10):
-                        if remaining <= wait_time:
-                            logger.info(f"   ⏰ {remaining}s remaining...")
-                            time.sleep(min(30 if wait_time > 60 else 10, remaining))
-                else:
-                    time.sleep(wait_time)
-                
-                logger.info("CORRECT: Rate limit wait complete, proceeding with API call")
-            
-            self.last_api_call_time = time.time()
-    
+        return self.key_pool.acquire(prefer=prefer)
 
     def __init__(self, api_key, api_delay_seconds=60,
                  narration_temperature=0.5, timestamp_temperature=0.2,
@@ -56,29 +424,62 @@ class GeminiVideoAnalyzer:
                  model_name="gemini-3.5-flash",
                  api_version=None,
                  thinking_level="high",
-                 clip_min=5, clip_max=20):
+                 clip_min=5, clip_max=20,
+                 api_keys=None, rpm_per_key=0, streaming=False,
+                 hedge_requests=False, hedge_percentile=90, hedge_min_samples=5,
+                 context_cache=True, cache_ttl_seconds=900, base_url=None,
+                 inline_max_bytes=14 * 1024 * 1024, snap_tolerance_seconds=1.5,
+                 http_transport=None, request_timeout_seconds=None,
+                 file_processing_timeout_seconds=1800):
         """
         Initialize Gemini API client
         
         Args:
             api_key: Gemini API key
             api_delay_seconds: Delay between API calls to avoid rate limits (default: 60s for free tier)
+            api_keys: Optional list of keys to rotate across (defaults to [api_key])
+            rpm_per_key: Optional requests-per-minute cap per key (0 disables)
+            streaming: Stream chunk replies and hand each scene to `on_scene`
+                       as soon as its JSON object is complete
+            hedge_requests: Send a duplicate chunk request when the first one is
+                            slower than `hedge_percentile` of recent calls
+            hedge_min_samples: Calls to observe before hedging kicks in
+            context_cache: Put each chunk's video + instructions in an explicit
+                           context cache so retries only send a short trigger
+            cache_ttl_seconds: TTL of those caches (extended while a chunk is
+                               still being worked on; deleted when it is done)
+            base_url: Optional API endpoint override (e.g. a local stand-in)
+            inline_max_bytes: Inputs up to this size are sent as inline bytes
+                              instead of going through the Files API (0 disables)
+            snap_tolerance_seconds: Snap scene start/end to a shot cut this close
+                                    (windows with a ShotIndex; 0 disables)
+            http_transport: Optional SharedTransport; every key's client then uses
+                            its pooled connections and per-operation timeouts
+            request_timeout_seconds: Wall-clock limit per API call; a call still
+                                     running then is abandoned and retried (None: no limit)
+            file_processing_timeout_seconds: Give up on an upload still PROCESSING
+                                             after this long (None: wait forever)
         """
         self.api_key = api_key
         
         # Set HTTP options
         http_options = types.HttpOptions(
             api_version=api_version if api_version else None,
-            timeout=600000  # 10 minutes in milliseconds
+            base_url=base_url or None,
+            timeout=600000,  # 10 minutes in milliseconds
+            **(http_transport.http_options() if http_transport else {}),
         )
         
-        self.client = genai.Client(
-            api_key=api_key,
-            http_options=http_options
+        self.key_pool = ApiKeyPool(
+            api_keys or [api_key],
+            client_factory=lambda key: genai.Client(api_key=key, http_options=http_options),
+            min_interval_seconds=api_delay_seconds,
+            rpm_limit=rpm_per_key,
+            name="analysis",
         )
+        self.client = self.key_pool.primary.client
         
         self.api_delay_seconds = api_delay_seconds
-        self.last_api_call_time = 0  # Track last API call for rate limiting
         self.narration_temperature = narration_temperature
         self.timestamp_temperature = timestamp_temperature
         self.max_retries = max(max_retries, 1)
@@ -87,15 +488,31 @@ class GeminiVideoAnalyzer:
         self.thinking_level = thinking_level
         self.clip_min = clip_min
         self.clip_max = clip_max
+        self.streaming = streaming
+        self.hedge_requests = hedge_requests
+        self.hedge_percentile = min(max(hedge_percentile, 50), 99)
+        self.hedge_min_samples = max(hedge_min_samples, 1)
+        self.latency = LatencyTracker()
+        self.context_cache = context_cache
+        self.cache_ttl_seconds = max(cache_ttl_seconds, 60)
+        self.inline_max_bytes = max(inline_max_bytes or 0, 0)
+        self.snap_tolerance_seconds = max(snap_tolerance_seconds or 0, 0)
+        self.request_timeout_seconds = request_timeout_seconds or None
+        self.file_processing_timeout_seconds = file_processing_timeout_seconds or None
         
         logger.info("Gemini API client initialized successfully")
-        logger.info(f"API rate limit delay: {api_delay_seconds}s between calls")
+        logger.info(f"API rate limit delay: {api_delay_seconds}s between calls per key "
+                    f"({len(self.key_pool)} key(s))")
         logger.info(f"Narration temperature: {narration_temperature}")
         logger.info(f"Timestamp temperature: {timestamp_temperature}")
         logger.info(f"Model: {self.model_name}")
         if api_version:
             logger.info(f"API version override: {api_version}")
         logger.info(f"Thinking level: {self.thinking_level}")
+        logger.info(f"Streaming analysis: {'ENABLED' if streaming else 'DISABLED'}")
+        logger.info(f"Context caching: {'ENABLED' if context_cache else 'DISABLED'}")
+        if hedge_requests:
+            logger.info(f"Request hedging: ENABLED (after p{self.hedge_percentile} of recent latency)")
     
     def _time_to_seconds(self, timestamp):
         """Convert a HH:MM:SS or MM:SS timestamp to seconds."""
@@ -194,7 +611,74 @@ class GeminiVideoAnalyzer:
                 
         raise ValueError(f"Could not extract valid JSON from response: {response_text[:100]}...")
     
-    def _execute_with_retry(self, func, description):
+    def _parse_scene_response(self, response_text):
+        """
+        Parse a scene-list reply and validate its shape.
+
+        Raises:
+            MalformedResponseError: the reply is not JSON or not a scene list.
+        """
+        try:
+            data = self._extract_json_from_response(response_text)
+        except ValueError as exc:
+            raise MalformedResponseError(str(exc)) from exc
+        return validate_scene_list(data)
+
+    @staticmethod
+    def _new_run_stats():
+        """Per-run counters: how often chunks were retried, and why."""
+        return {
+            "structured_output": True,
+            "chunks": 0,
+            "attempts": 0,
+            "retries": {},
+            "chunk_latencies": [],
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "output_tokens": 0,
+            "uploads": 0,
+            "upload_bytes": 0,
+            "upload_seconds": 0.0,
+            "caches_created": 0,
+            "input_prepare": {},
+            "input_requests": {},
+        }
+
+    @staticmethod
+    def _count_retry(stats, cause):
+        stats["retries"][cause] = stats["retries"].get(cause, 0) + 1
+
+    @staticmethod
+    def _finish_run_stats(stats):
+        total = sum(stats["retries"].values())
+        stats["total_retries"] = total
+        malformed = stats["retries"].get("malformed_output", 0)
+        stats["malformed_retry_fraction"] = round(malformed / total, 3) if total else 0.0
+        stats["chunk_latency"] = latency_summary(stats.pop("chunk_latencies"))
+        # Share of first requests that got a duplicate (duplicates count as calls too).
+        primary_calls = stats["calls"] - stats["hedged"]
+        stats["hedge_rate"] = round(stats["hedged"] / primary_calls, 3) if primary_calls else 0.0
+        stats["upload_seconds"] = round(stats["upload_seconds"], 2)
+        # Per input path (inline bytes vs Files API): prepare + request latency,
+        # to tune the inline size threshold.
+        prepare, requests = stats.pop("input_prepare"), stats.pop("input_requests")
+        stats["input_paths"] = {
+            kind: {
+                "prepare_latency": latency_summary(prepare.get(kind, [])),
+                "request_latency": latency_summary(requests.get(kind, [])),
+            }
+            for kind in sorted(set(prepare) | set(requests))
+        }
+        logger.info(f"Analysis stats: {stats['chunks']} chunk(s), {stats['attempts']} attempt(s), "
+                    f"retries by cause: {stats['retries'] or 'none'}, "
+                    f"chunk latency p99: {stats['chunk_latency']['p99']}s, "
+                    f"hedge rate: {stats['hedge_rate']}")
+        return stats
+
+    def _execute_with_retry(self, func, description, key=None, hedge_stats=None, stats=None):
         """
         Execute a Gemini API call with retry handling for transient failures.
 
@@ -205,14 +689,38 @@ class GeminiVideoAnalyzer:
         NOTE: The google-genai SDK raises google.genai.errors.APIError, which is
         NOT an httpx error — the previous version only caught httpx and therefore
         never actually retried real rate-limit/server errors.
+
+        When `key` (the PooledKey the call runs on) is given, outcomes are
+        recorded on it, and a daily-quota 429 retires the key and re-raises at
+        once so the caller can move the work to another key.
+
+        Passing `hedge_stats` (a run-stats dict) marks the call as idempotent and
+        eligible for hedging when hedging is enabled; see _call_hedged. Every
+        attempt is counted in the `calls` of `stats` (default: `hedge_stats`),
+        hedged or not.
+
+        If the job is cancelled the pending call is abandoned (JobCancelled); a
+        call running past `request_timeout_seconds` is abandoned and retried.
         """
         last_error = None
+        stats = stats if stats is not None else hedge_stats
         for attempt in range(1, self.max_retries + 1):
+            if stats is not None:
+                stats["calls"] += 1
             try:
-                return func()
+                if hedge_stats is not None and self.hedge_requests:
+                    result = cancellation.call(lambda: self._call_hedged(func, description, key, hedge_stats),
+                                               timeout=self.request_timeout_seconds)
+                else:
+                    result = cancellation.call(func, timeout=self.request_timeout_seconds)
+                if key is not None:
+                    self.key_pool.record_success(key)
+                return result
             except genai_errors.APIError as exc:
                 status = getattr(exc, "code", None)
-                if status is not None and status not in _RETRYABLE_STATUS:
+                if key is not None and self.record_call_failure(key, exc):
+                    raise
+                if self.retry_backoff(exc, attempt) is None:
                     logger.error(
                         f"Gemini API error during {description}: {status} {exc}. Not retryable."
                     )
@@ -222,8 +730,10 @@ class GeminiVideoAnalyzer:
                     f"Gemini API transient error during {description}: {status} {exc}. "
                     f"Attempt {attempt}/{self.max_retries}"
                 )
-            except httpx.HTTPError as exc:
+            except NETWORK_ERRORS as exc:
                 last_error = exc
+                if key is not None:
+                    self.record_call_failure(key, exc)
                 logger.warning(
                     f"Gemini API network error during {description}: {exc}. "
                     f"Attempt {attempt}/{self.max_retries}"
@@ -231,33 +741,239 @@ class GeminiVideoAnalyzer:
 
             if attempt >= self.max_retries:
                 break
-            # Exponential-ish backoff; give 429s extra room.
-            backoff = self.retry_backoff_seconds * attempt
-            if isinstance(last_error, genai_errors.APIError) and getattr(last_error, "code", None) == 429:
-                backoff = max(backoff, self.retry_backoff_seconds * 4)
+            backoff = self.retry_backoff(last_error, attempt)
             logger.info(f"Retrying {description} in {backoff}s...")
-            time.sleep(backoff)
+            cancellation.sleep(backoff)
 
         raise RuntimeError(
             f"{description} failed after {self.max_retries} attempts. Last error: {last_error}"
         ) from last_error
 
-    def _build_generation_config(self, temperature):
+    def record_call_failure(self, key, exc):
+        """
+        Record a failed call on the key it ran on. A daily-quota 429 retires the
+        key; returns True in that case (the work should move to another key).
+        """
+        status = getattr(exc, "code", None) if isinstance(exc, genai_errors.APIError) else None
+        self.key_pool.record_failure(key, rate_limited=status == 429)
+        if status == 429 and is_daily_quota_exhausted(exc):
+            self.key_pool.retire(key)
+            return True
+        return False
+
+    def retry_backoff(self, exc, attempt):
+        """
+        Seconds to wait before retrying a call that failed with `exc` on its
+        `attempt`-th try, or None if the error is not transient (a bad request
+        or key).
+        """
+        if isinstance(exc, genai_errors.APIError):
+            status = getattr(exc, "code", None)
+            if status is not None and status not in _RETRYABLE_STATUS:
+                return None
+        elif not isinstance(exc, NETWORK_ERRORS):
+            return None
+        # Exponential-ish backoff; give 429s extra room.
+        backoff = self.retry_backoff_seconds * attempt
+        if isinstance(exc, genai_errors.APIError) and getattr(exc, "code", None) == 429:
+            backoff = max(backoff, self.retry_backoff_seconds * 4)
+        return backoff
+
+    def _request_chunk_text(self, client, contents, gen_config, description, key, stats,
+                            on_partial=None, input_kind=None):
+        """
+        Send one (stateless) chunk request and return the reply text, recording
+        its latency (also per `input_kind`) and token usage in `stats`.
+
+        In streaming mode the reply is consumed from the SDK's content stream and
+        every scene object is passed to `on_partial` as soon as it is complete.
+        Streamed calls have side effects, so they are never hedged.
+        """
+        started = time.time()
+        try:
+            if self.streaming and on_partial is not None:
+                text, usage = self._execute_with_retry(
+                    lambda: self._stream_response_text(
+                        client.models.generate_content_stream(
+                            model=self.model_name, contents=contents, config=gen_config
+                        ),
+                        on_partial,
+                    ),
+                    description=description,
+                    key=key,
+                    stats=stats,
+                )
+                self._record_usage(stats, usage)
+                return text
+            response = self._execute_with_retry(
+                lambda: client.models.generate_content(
+                    model=self.model_name, contents=contents, config=gen_config
+                ),
+                description=description,
+                key=key,
+                hedge_stats=stats,
+            )
+            self._record_usage(stats, getattr(response, "usage_metadata", None))
+            return self._extract_response_text(response)
+        finally:
+            elapsed = round(time.time() - started, 2)
+            stats["chunk_latencies"].append(elapsed)
+            if input_kind:
+                stats["input_requests"].setdefault(input_kind, []).append(elapsed)
+
+    @staticmethod
+    def _record_usage(stats, usage):
+        """Accumulate token usage (prompt / cached / output) from a reply's usage metadata."""
+        if usage is None:
+            return
+        stats["prompt_tokens"] += getattr(usage, "prompt_token_count", None) or 0
+        stats["cached_tokens"] += getattr(usage, "cached_content_token_count", None) or 0
+        stats["output_tokens"] += getattr(usage, "candidates_token_count", None) or 0
+
+    def _call_hedged(self, func, description, key, stats):
+        """
+        Run `func`, and if it has not returned by the learned latency percentile,
+        send a duplicate; the first successful reply wins.
+
+        The duplicate only goes out if the key has a free rate-limit slot right
+        now (ApiKeyPool.try_acquire), so hedging never exceeds the pacing budget.
+        The losing call is abandoned (its result is ignored). The duplicate
+        counts as a call of its own.
+        """
+        threshold = None
+        if self.latency.count >= self.hedge_min_samples:
+            threshold = self.latency.percentile(self.hedge_percentile)
+
+        started = time.time()
+        if threshold is None:
+            result = func()
+            self.latency.record(time.time() - started)
+            return result
+
+        # Each thread needs its own context copy (a Context can't be entered twice at once).
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gemini-hedge")
+        try:
+            primary = executor.submit(contextvars.copy_context().run, func)
+            done, _ = futures_wait([primary], timeout=threshold)
+            if done:
+                result = primary.result()
+                self.latency.record(time.time() - started)
+                return result
+
+            if key is None or not self.key_pool.try_acquire(key):
+                logger.info(f"{description} is slower than p{self.hedge_percentile} "
+                            f"({threshold:.0f}s) but no rate-limit headroom to hedge; waiting.")
+                result = primary.result()
+                self.latency.record(time.time() - started)
+                return result
+
+            logger.info(f"{description} exceeded p{self.hedge_percentile} ({threshold:.0f}s); "
+                        f"sending a hedged duplicate request")
+            stats["hedged"] += 1
+            stats["calls"] += 1
+            hedge = executor.submit(contextvars.copy_context().run, func)
+            pending = {primary, hedge}
+            last_error = None
+            while pending:
+                done, pending = futures_wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        last_error = future.exception()
+                        continue
+                    if future is hedge:
+                        stats["hedge_wins"] += 1
+                        logger.info(f"Hedged request won for {description}")
+                    self.latency.record(time.time() - started)
+                    return future.result()
+            raise last_error
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _stream_response_text(stream, on_object):
+        """
+        Drain a streamed reply, emitting scene objects on the way.
+
+        Returns:
+            (full_text, usage_metadata of the final chunk or None)
+        """
+        parser = SceneStreamParser()
+        pieces = []
+        usage = None
+        for chunk in stream:
+            cancellation.check()  # stop reading an abandoned stream
+            # Raw fragment text: do NOT strip, whitespace may sit inside a JSON string.
+            fragment = getattr(chunk, "text", None) or ""
+            pieces.append(fragment)
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            for scene in parser.feed(fragment):
+                on_object(scene)
+        if parser.emitted:
+            logger.info(f"Streamed {parser.emitted} scene(s) before the reply completed")
+        return "".join(pieces).strip(), usage
+
+    def _partial_scene_sink(self, on_scene, window):
+        """Callback turning a streamed window-relative scene into an absolute one for on_scene."""
+        if on_scene is None:
+            return None
+        return lambda scene: self._emit_scenes(
+            on_scene, self._offset_and_clamp_scenes([dict(scene)], window)
+        )
+
+    def _emit_scenes(self, on_scene, scenes):
+        """Hand usable scenes (absolute timestamps) to on_scene. Never raises."""
+        if on_scene is None:
+            return
+        for scene in scenes:
+            usable = (
+                scene.get('start_time') and scene.get('end_time')
+                and (scene.get('narration') or '').strip()
+                and (scene.get('status') or '').strip().lower() != 'review'
+            )
+            if not usable:
+                continue
+            try:
+                on_scene(scene)
+            except Exception as exc:
+                logger.debug(f"on_scene callback failed: {exc}")
+
+    @staticmethod
+    def _observe_window(plan, window, stats, calls_before, tokens_before):
+        """Report a finished window's last request latency and prompt tokens to the plan."""
+        if plan is None:
+            return
+        latencies = stats["chunk_latencies"][calls_before:]
+        if not latencies:
+            return
+        prompt_tokens = (stats["prompt_tokens"] - tokens_before) // len(latencies)
+        plan.observe(window.index, window.length_seconds, latencies[-1], prompt_tokens)
+
+    def _build_generation_config(self, temperature, response_schema=None,
+                                 media_resolution=None, thinking_level=None):
         """
         Build a GenerateContentConfig that honors the configured thinking level
         and temperature. Previously temperature was hardcoded to 0.0 and the
         thinking level was never sent at all.
+
+        With `response_schema`, the model is constrained to JSON matching the
+        schema, so replies parse directly instead of being scraped from prose.
+        `media_resolution` / `thinking_level` override the defaults (high
+        resolution, the configured thinking level), e.g. from an AnalysisPlan.
         """
         kwargs = dict(
             temperature=temperature,
             top_p=0.9,
             top_k=40,
-            media_resolution="MEDIA_RESOLUTION_HIGH",
+            media_resolution=media_resolution or "MEDIA_RESOLUTION_HIGH",
         )
-        if self.thinking_level:
+        if response_schema is not None:
+            kwargs["response_mime_type"] = "application/json"
+            kwargs["response_schema"] = response_schema
+        thinking_level = thinking_level or self.thinking_level
+        if thinking_level:
             try:
                 kwargs["thinking_config"] = types.ThinkingConfig(
-                    thinking_level=self.thinking_level
+                    thinking_level=thinking_level
                 )
             except Exception as exc:  # older SDKs / unsupported models
                 logger.debug(f"thinking_config not applied: {exc}")
@@ -272,38 +988,44 @@ class GeminiVideoAnalyzer:
         s = total_seconds % 60
         return f"{h:02d}:{m:02d}:{s:06.3f}"
 
-    def _delete_remote_file(self, video_file):
+    def _delete_remote_file(self, video_file, client=None):
         """Best-effort deletion of an uploaded file to avoid quota buildup."""
         name = getattr(video_file, "name", None)
         if not name:
             return
         try:
-            self.client.files.delete(name=name)
+            (client or self.client).files.delete(name=name)
             logger.debug(f"Deleted uploaded Gemini file: {name}")
         except Exception as exc:
             logger.debug(f"Could not delete uploaded file {name}: {exc}")
 
-    def upload_video(self, video_path):
+    def upload_video(self, video_path, client=None):
         """
         Upload video to Gemini
 
         Args:
             video_path: Path to video file
+            client: SDK client (key) to upload with; defaults to the primary key
 
         Returns:
             Uploaded file object
         """
+        client = client or self.client
         try:
             logger.info(f"Uploading video to Gemini: {video_path}")
             
             # Upload the video file using the new API
+            # Abandoned on cancel; an upload that still completes is deleted.
             with open(video_path, 'rb') as video_file:
-                uploaded_file = self.client.files.upload(
-                    file=video_file,
-                    config=types.UploadFileConfig(
-                        mime_type='video/mp4',
-                        display_name=Path(video_path).name
-                    )
+                uploaded_file = cancellation.call(
+                    lambda: client.files.upload(
+                        file=video_file,
+                        config=types.UploadFileConfig(
+                            mime_type='video/mp4',
+                            display_name=Path(video_path).name
+                        )
+                    ),
+                    discard=lambda uploaded: self._delete_remote_file(uploaded, client=client),
                 )
             
             logger.info(f"Video uploaded successfully. File name: {uploaded_file.name}")
@@ -311,10 +1033,19 @@ class GeminiVideoAnalyzer:
             
             # Wait for the file to be processed
             logger.info("Waiting for video to be processed...")
-            while uploaded_file.state == 'PROCESSING':
-                time.sleep(2)
-                uploaded_file = self.client.files.get(name=uploaded_file.name)
-                logger.debug(f"Video processing state: {uploaded_file.state}")
+            started = time.time()
+            try:
+                while uploaded_file.state == 'PROCESSING':
+                    if (self.file_processing_timeout_seconds
+                            and time.time() - started > self.file_processing_timeout_seconds):
+                        raise TimeoutError(f"{uploaded_file.name} still processing after "
+                                           f"{self.file_processing_timeout_seconds}s")
+                    cancellation.sleep(2)
+                    uploaded_file = client.files.get(name=uploaded_file.name)
+                    logger.debug(f"Video processing state: {uploaded_file.state}")
+            except (TimeoutError, JobCancelled):
+                self._delete_remote_file(uploaded_file, client=client)
+                raise
             
             if uploaded_file.state == 'FAILED':
                 logger.error("Video processing failed")
@@ -390,17 +1121,73 @@ class GeminiVideoAnalyzer:
             
         return -1
 
-    def _offset_and_clamp_scenes(self, scenes, chunk_index, chunk_seconds):
+    @staticmethod
+    def _window_note(window):
+        """
+        Prompt lines for a window: which span of the film an offset window
+        covers, and the local shot cuts (segment-relative) when a ShotIndex is
+        attached, so clips can start/end on cuts without the model hunting for them.
+        """
+        note = ""
+        if window.frames is not None:
+            start = GeminiVideoAnalyzer._seconds_to_timestamp(window.start_seconds)[:8]
+            end = GeminiVideoAnalyzer._seconds_to_timestamp(window.end_seconds)[:8]
+            note += (f"\n\nThis request covers {start}-{end} of the film, given as still "
+                     f"frames instead of video: each image is a grid of frames in time order "
+                     f"(left to right, top to bottom), each frame stamped with its film time "
+                     f"(HH:MM:SS). Give every timestamp as the film time of the frames it "
+                     f"spans, exactly as stamped.")
+        elif window.media_offset:
+            start = GeminiVideoAnalyzer._seconds_to_timestamp(window.start_seconds)[:8]
+            end = GeminiVideoAnalyzer._seconds_to_timestamp(window.end_seconds)[:8]
+            note += (f"\n\nThis request covers only {start}-{end} of the film. Give every "
+                     f"timestamp relative to the start of this segment (00:00 = {start}).")
+        if window.shots is not None:
+            cuts = window.shots.hint(window.start_seconds, window.end_seconds)
+            if cuts:
+                note += (f"\n\nShot cuts in this segment (MM:SS from its start): {cuts}. "
+                         f"Prefer starting and ending clips on these cuts.")
+        return note
+
+    def _reported_absolute(self, scenes, window):
         """
-        Convert chunk-relative timestamps to absolute video time, clamping to the
-        chunk bounds so a hallucinated timestamp can't push a clip past EOF.
+        True when the model answered an offset window with source timestamps
+        instead of segment-relative ones. Only decidable once the window starts
+        past its own length (then the two ranges cannot overlap). Frame windows
+        are asked for film times, so they count as absolute unless the model
+        clearly answered relative to the segment anyway.
+        """
+        if window.frames is not None:
+            starts = [self._time_to_seconds(scene.get('start_time')) for scene in scenes]
+            return any(value is not None and value >= window.start_seconds - 1.0 for value in starts)
+        if not window.media_offset or window.start_seconds < window.length_seconds:
+            return False
+        starts = [self._time_to_seconds(scene.get('start_time')) for scene in scenes]
+        starts = [value for value in starts if value is not None]
+        return bool(starts) and all(value >= window.start_seconds - 1.0 for value in starts)
+
+    def _offset_and_clamp_scenes(self, scenes, window):
+        """
+        Convert window-relative timestamps to absolute video time, clamping to the
+        window bounds so a hallucinated timestamp can't push a clip past EOF.
         Returns the list of scenes that had usable start < end after clamping.
+
+        Args:
+            scenes: parsed scenes with window-relative timestamps
+            window: the AnalysisWindow the scenes came from
         """
-        chunk_offset_seconds = chunk_index * chunk_seconds
+        chunk_offset_seconds = window.start_seconds
+        chunk_seconds = window.length_seconds
+        already_absolute = self._reported_absolute(scenes, window)
+        if already_absolute:
+            logger.info(f"{window.name}: model reported source timestamps; not offsetting")
         cleaned = []
         for scene in scenes:
             start_rel = self._time_to_seconds(scene.get('start_time'))
             end_rel = self._time_to_seconds(scene.get('end_time'))
+            if already_absolute and start_rel is not None and end_rel is not None:
+                start_rel -= chunk_offset_seconds
+                end_rel -= chunk_offset_seconds
 
             if start_rel is None or end_rel is None:
                 # Unparseable timestamp(s): blank them so downstream code can't crash
@@ -421,23 +1208,48 @@ class GeminiVideoAnalyzer:
                 )
                 continue
 
+            if window.shots is not None and self.snap_tolerance_seconds > 0:
+                start_rel, end_rel = self._snap_to_shots(window, start_rel, end_rel)
+
             scene['start_time'] = self._seconds_to_timestamp(start_rel + chunk_offset_seconds)
             scene['end_time'] = self._seconds_to_timestamp(end_rel + chunk_offset_seconds)
             scene['duration_seconds'] = round(end_rel - start_rel, 2)
             cleaned.append(scene)
         return cleaned
 
+    def _snap_to_shots(self, window, start_rel, end_rel):
+        """
+        Move window-relative start/end to the nearest shot cut within the snap
+        tolerance, staying inside the window; a snap that would leave less than
+        a second of clip is not applied.
+        """
+        offset, tolerance = window.start_seconds, self.snap_tolerance_seconds
+        snapped_start = window.shots.snap(start_rel + offset, tolerance) - offset
+        snapped_end = window.shots.snap(end_rel + offset, tolerance) - offset
+        snapped_start = min(max(snapped_start, 0.0), window.length_seconds)
+        snapped_end = min(max(snapped_end, 0.0), window.length_seconds)
+        if snapped_end - snapped_start < 1.0:
+            return start_rel, end_rel
+        return snapped_start, snapped_end
+
     def analyze_video_chunks(self, video_chunks, script_text, custom_instructions=None,
-                             chunk_seconds=600):
+                             chunk_seconds=600, on_scene=None, plan=None):
         """
         Analyze video chunks sequentially using independent sessions with dynamic
         script trimming. Aligns a provided script to the video timeline.
 
         Args:
-            video_chunks: List of paths to video chunk files
+            video_chunks: List of paths to video chunk files, or AnalysisWindows
+                          (e.g. offset windows over one uploaded source)
             script_text: Full script text to align
             custom_instructions: Optional user instructions (kept separate from the script)
-            chunk_seconds: Length of each chunk in seconds (for offset + clamping)
+            chunk_seconds: Length of each chunk in seconds (for offset + clamping
+                           of plain chunk paths)
+            on_scene: Optional callback(scene) fed usable scenes (absolute timestamps)
+                      as early as possible, e.g. to start narration TTS. Scenes from
+                      an attempt that is later retried may also be delivered.
+            plan: Optional AnalysisPlan supplying fps / media resolution / thinking
+                  level per window; it is updated from each window's latency and tokens
 
         Returns:
             Aggregated scenes data: {"scenes": [...]}
@@ -448,147 +1260,163 @@ class GeminiVideoAnalyzer:
             if not script_text:
                 raise ValueError("Script text is required.")
 
-            logger.info(f"Starting sequential analysis of {len(video_chunks)} chunks with dynamic script trimming...")
+            windows = as_windows(video_chunks, chunk_seconds)
+            logger.info(f"Starting sequential analysis of {len(windows)} chunks with dynamic script trimming...")
 
+            stats = self._new_run_stats()
+            uploads = _MediaUploads(self, stats)
             all_scenes = []
             remaining_script = script_text
 
-            for i, chunk_path in enumerate(video_chunks):
+            for i, window in enumerate(windows):
                 chunk_num = i + 1
-                logger.info(f"\n--- Processing Chunk {chunk_num}/{len(video_chunks)}: {chunk_path.name} ---")
+                logger.info(f"\n--- Processing Chunk {chunk_num}/{len(windows)}: {window.name} ---")
                 logger.info(f"Remaining script length: {len(remaining_script)} chars")
 
                 if len(remaining_script.strip()) < 10:
                     logger.warning("Remaining script is too short, skipping remaining chunks.")
                     break
 
-                max_chunk_retries = self.max_retries
-                chunk_retry_count = 0
-                chunk_success = False
-
-                while chunk_retry_count < max_chunk_retries and not chunk_success:
-                    if chunk_retry_count > 0:
-                        logger.info(f"Retrying chunk {chunk_num} (Attempt {chunk_retry_count + 1}/{max_chunk_retries})...")
-                        time.sleep(self.retry_backoff_seconds)
-
-                    video_file = None
-                    try:
-                        # Fresh chat per chunk so each is analyzed independently.
-                        chat = self.client.chats.create(model=self.model_name)
-
-                        self._wait_for_rate_limit()
-                        video_file = self.upload_video(chunk_path)
-
-                        file_uri = getattr(video_file, "uri", None)
-                        if not file_uri:
-                            raise ValueError(f"Failed to get URI for chunk {chunk_num}")
-
-                        video_part = types.Part.from_uri(
-                            file_uri=file_uri,
-                            mime_type=video_file.mime_type
-                        )
-
-                        # Construct prompt with the REMAINING script only.
-                        prompt_text = textwrap.dedent(f"""
-                            I will upload several cut versions of 1 movie each 10min long so its easy for you too understand, and i want you too watch each part of the movie and understand it end too end then match the script to the movie with corresponding timestamps. note use only the exact words in the script nothing out of it and also always end exactly the way the script ends dont add no continuation symbols or marks always end each section exactly the way it is in the script and also i want ot to be quick cuts about {self.clip_min}secs too {self.clip_max}secs per clip and also each narration per clip should be at least 10 words long and each clip should be not be a continuation of the previous meaning if scene 1 ends at 1:25 for example, scene 2 should not start from 1:25 or 1:26, there should be at least a 10sec difference. Output JSON in this exact format:
-                            {{
-                              "scenes": [
-                                {{
-                                  "scene_number": 1,
-                                  "start_time": "MM:SS",
-                                  "end_time": "MM:SS",
-                                  "duration_seconds": 12.5,
-                                  "narration": "Exact text from script"
-                                }}
-                              ]
-                            }}
-
-                            SCRIPT:
-                            \"\"\"{remaining_script}\"\"\"
-                        """).strip()
-
-                        if custom_instructions:
-                            prompt_text += f"\n\nADDITIONAL INSTRUCTIONS:\n{custom_instructions}"
-
-                        prompt_part = types.Part.from_text(text=prompt_text)
-
-                        logger.info(f"Sending request to Gemini for chunk {chunk_num}...")
-                        gen_config = self._build_generation_config(self.timestamp_temperature)
-                        response = self._execute_with_retry(
-                            lambda: chat.send_message(message=[video_part, prompt_part], config=gen_config),
-                            description=f"analysis of chunk {chunk_num}"
-                        )
+                # Construct prompt with the REMAINING script only. It stays the same
+                # across this chunk's retries, so it is cached together with the video.
+                prompt_text = textwrap.dedent(f"""
+                    I will upload several cut versions of 1 movie each 10min long so its easy for you too understand, and i want you too watch each part of the movie and understand it end too end then match the script to the movie with corresponding timestamps. note use only the exact words in the script nothing out of it and also always end exactly the way the script ends dont add no continuation symbols or marks always end each section exactly the way it is in the script and also i want ot to be quick cuts about {self.clip_min}secs too {self.clip_max}secs per clip and also each narration per clip should be at least 10 words long and each clip should be not be a continuation of the previous meaning if scene 1 ends at 1:25 for example, scene 2 should not start from 1:25 or 1:26, there should be at least a 10sec difference. Output JSON in this exact format:
+                    {{
+                      "scenes": [
+                        {{
+                          "scene_number": 1,
+                          "start_time": "MM:SS",
+                          "end_time": "MM:SS",
+                          "duration_seconds": 12.5,
+                          "narration": "Exact text from script"
+                        }}
+                      ]
+                    }}
 
-                        response_text = self._extract_response_text(response)
+                    SCRIPT:
+                    \"\"\"{remaining_script}\"\"\"
+                """).strip()
 
-                        if not response_text:
-                            logger.warning(f"Empty response for chunk {chunk_num}, retrying...")
-                            chunk_retry_count += 1
-                            continue
+                prompt_text += self._window_note(window)
+                if custom_instructions:
+                    prompt_text += f"\n\nADDITIONAL INSTRUCTIONS:\n{custom_instructions}"
 
-                        chunk_data = self._extract_json_from_response(response_text)
-                        scenes = chunk_data.get("scenes", [])
+                max_chunk_retries = self.max_retries
+                chunk_retry_count = 0
+                chunk_success = False
+                # Upload (and cache) once per chunk; retries reuse it.
+                settings = plan.settings() if plan else {}
+                session = _ChunkSession(self, window, prompt_text, f"chunk {chunk_num}", stats, uploads,
+                                        fps=settings.get("fps"))
+                calls_before, tokens_before = len(stats["chunk_latencies"]), stats["prompt_tokens"]
 
-                        if not scenes:
-                            logger.warning(f"No scenes returned for chunk {chunk_num}")
-                            chunk_retry_count += 1
-                            continue
+                stats["chunks"] += 1
+                try:
+                    while chunk_retry_count < max_chunk_retries and not chunk_success:
+                        stats["attempts"] += 1
+                        if chunk_retry_count > 0:
+                            logger.info(f"Retrying chunk {chunk_num} (Attempt {chunk_retry_count + 1}/{max_chunk_retries})...")
+                            cancellation.sleep(self.retry_backoff_seconds)
 
-                        # Offset + clamp timestamps for THIS attempt (not yet committed).
-                        attempt_scenes = self._offset_and_clamp_scenes(scenes, i, chunk_seconds)
-                        if not attempt_scenes:
-                            logger.warning(f"No usable scenes after clamping for chunk {chunk_num}")
+                        try:
+                            key = session.acquire()
+
+                            logger.info(f"Sending request to Gemini for chunk {chunk_num}...")
+                            gen_config = self._build_generation_config(
+                                self.timestamp_temperature, response_schema=SCENES_RESPONSE_SCHEMA,
+                                media_resolution=settings.get("media_resolution"),
+                                thinking_level=settings.get("thinking_level"),
+                            )
+                            response_text = self._request_chunk_text(
+                                key.client, session.contents(), session.configure(gen_config),
+                                description=f"analysis of chunk {chunk_num}",
+                                key=key,
+                                stats=stats,
+                                on_partial=self._partial_scene_sink(on_scene, window),
+                                input_kind=session.input_kind,
+                            )
+
+                            if not response_text:
+                                logger.warning(f"Empty response for chunk {chunk_num}, retrying...")
+                                chunk_retry_count += 1
+                                self._count_retry(stats, "empty_response")
+                                continue
+
+                            scenes = self._parse_scene_response(response_text)
+
+                            if not scenes:
+                                logger.warning(f"No scenes returned for chunk {chunk_num}")
+                                chunk_retry_count += 1
+                                self._count_retry(stats, "no_scenes")
+                                continue
+
+                            # Offset + clamp timestamps for THIS attempt (not yet committed).
+                            attempt_scenes = self._offset_and_clamp_scenes(scenes, window)
+                            if not attempt_scenes:
+                                logger.warning(f"No usable scenes after clamping for chunk {chunk_num}")
+                                chunk_retry_count += 1
+                                self._count_retry(stats, "no_usable_scenes")
+                                continue
+
+                            # --- DYNAMIC SCRIPT TRIMMING ---
+                            last_narration = (attempt_scenes[-1].get('narration') or '').strip()
+                            split_index = -1
+                            if last_narration:
+                                logger.info(f"Looking for split point after: '{last_narration[:50]}...'")
+                                split_index = self._find_script_split_point(remaining_script, last_narration)
+
+                            if split_index != -1:
+                                all_scenes.extend(attempt_scenes)
+                                self._emit_scenes(on_scene, attempt_scenes)
+                                prev_len = len(remaining_script)
+                                remaining_script = remaining_script[split_index:].strip()
+                                logger.info(f"✓ Chunk {chunk_num}: {len(attempt_scenes)} scenes. "
+                                            f"Trimmed {prev_len - len(remaining_script)} chars; {len(remaining_script)} left.")
+                                chunk_success = True
+                            elif chunk_retry_count < max_chunk_retries - 1:
+                                # Discard this attempt's scenes and retry for a cleaner split.
+                                logger.warning("Could not locate split point; retrying chunk for better alignment...")
+                                chunk_retry_count += 1
+                                self._count_retry(stats, "split_point_not_found")
+                                continue
+                            else:
+                                # Final attempt: commit scenes AND advance the script by the
+                                # approximate amount consumed, so the next chunk does NOT
+                                # re-process the same script (which caused duplicate scenes).
+                                all_scenes.extend(attempt_scenes)
+                                self._emit_scenes(on_scene, attempt_scenes)
+                                consumed = sum(len(s.get('narration') or '') for s in attempt_scenes)
+                                prev_len = len(remaining_script)
+                                remaining_script = remaining_script[consumed:].strip()
+                                logger.warning(f"✓ Chunk {chunk_num}: {len(attempt_scenes)} scenes (approx trim). "
+                                               f"Advanced ~{prev_len - len(remaining_script)} chars to avoid re-processing.")
+                                chunk_success = True
+
+                        except (KeyPoolExhausted, JobCancelled):
+                            uploads.release_all()
+                            raise
+                        except MalformedResponseError as e:
+                            logger.error(f"Malformed JSON for chunk {chunk_num}: {e}")
                             chunk_retry_count += 1
+                            self._count_retry(stats, "malformed_output")
                             continue
-
-                        # --- DYNAMIC SCRIPT TRIMMING ---
-                        last_narration = (attempt_scenes[-1].get('narration') or '').strip()
-                        split_index = -1
-                        if last_narration:
-                            logger.info(f"Looking for split point after: '{last_narration[:50]}...'")
-                            split_index = self._find_script_split_point(remaining_script, last_narration)
-
-                        if split_index != -1:
-                            all_scenes.extend(attempt_scenes)
-                            prev_len = len(remaining_script)
-                            remaining_script = remaining_script[split_index:].strip()
-                            logger.info(f"✓ Chunk {chunk_num}: {len(attempt_scenes)} scenes. "
-                                        f"Trimmed {prev_len - len(remaining_script)} chars; {len(remaining_script)} left.")
-                            chunk_success = True
-                        elif chunk_retry_count < max_chunk_retries - 1:
-                            # Discard this attempt's scenes and retry for a cleaner split.
-                            logger.warning("Could not locate split point; retrying chunk for better alignment...")
+                        except Exception as e:
+                            logger.error(f"Error processing chunk {chunk_num}: {str(e)}")
                             chunk_retry_count += 1
+                            self._count_retry(stats, "error")
                             continue
-                        else:
-                            # Final attempt: commit scenes AND advance the script by the
-                            # approximate amount consumed, so the next chunk does NOT
-                            # re-process the same script (which caused duplicate scenes).
-                            all_scenes.extend(attempt_scenes)
-                            consumed = sum(len(s.get('narration') or '') for s in attempt_scenes)
-                            prev_len = len(remaining_script)
-                            remaining_script = remaining_script[consumed:].strip()
-                            logger.warning(f"✓ Chunk {chunk_num}: {len(attempt_scenes)} scenes (approx trim). "
-                                           f"Advanced ~{prev_len - len(remaining_script)} chars to avoid re-processing.")
-                            chunk_success = True
-
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse JSON for chunk {chunk_num}.")
-                        chunk_retry_count += 1
-                        continue
-                    except Exception as e:
-                        logger.error(f"Error processing chunk {chunk_num}: {str(e)}")
-                        chunk_retry_count += 1
-                        continue
-                    finally:
-                        # Always remove the uploaded chunk from Gemini to avoid quota buildup.
-                        self._delete_remote_file(video_file)
+                finally:
+                    # Always remove the cache, and the upload once no later window
+                    # needs it, from Gemini to avoid quota buildup.
+                    session.release()
+                    uploads.release_unused(windows[chunk_num:])
+                    self._observe_window(plan, window, stats, calls_before, tokens_before)
 
             # Renumber scenes sequentially
             for idx, scene in enumerate(all_scenes, 1):
                 scene['scene_number'] = idx
 
-            return {"scenes": all_scenes}
+            return {"scenes": all_scenes, "analysis_stats": self._finish_run_stats(stats)}
 
         except Exception as e:
             logger.error(f"Error in sequential video analysis: {str(e)}", exc_info=True)
@@ -624,15 +1452,18 @@ class GeminiVideoAnalyzer:
         """).strip()
 
         try:
-            self._wait_for_rate_limit()
-            gen_config = self._build_generation_config(self.narration_temperature)
+            key = self._wait_for_rate_limit()
+            gen_config = self._build_generation_config(
+                self.narration_temperature, response_schema=METADATA_RESPONSE_SCHEMA
+            )
             response = self._execute_with_retry(
-                lambda: self.client.models.generate_content(
+                lambda: key.client.models.generate_content(
                     model=self.model_name,
                     contents=prompt,
                     config=gen_config,
                 ),
                 description="YouTube metadata generation",
+                key=key,
             )
             data = self._extract_json_from_response(self._extract_response_text(response))
             return {
@@ -644,8 +1475,46 @@ class GeminiVideoAnalyzer:
             logger.warning(f"Metadata generation failed, using fallback: {exc}")
             return fallback
 
+    def _recap_prompt_text(self, custom_instructions=None):
+        """Instructions for autonomous recap generation over one window."""
+        prompt_text = textwrap.dedent(f"""
+            You are a professional YouTube movie-recap narrator (in the style of channels like
+            Mystery Recapped or Story Recapped). Watch this ~10-minute segment of a movie end to
+            end and WRITE the recap narration yourself — do not just describe what is on screen,
+            tell the STORY: what is happening in the plot, character names, motivations and beats.
+
+            Rules:
+            - Present tense, engaging, story-driven narration.
+            - Pick the most important story moments as separate clips.
+            - Each clip should be {self.clip_min}–{self.clip_max} seconds long.
+            - Each narration should be at least 10 words and read naturally when spoken aloud.
+            - Clips must NOT be back-to-back: leave at least a ~10 second gap between the end of
+              one clip and the start of the next.
+            - Narration for a clip must describe ONLY what happens within that clip's timestamps
+              (no foreshadowing or backstory from outside the window).
+            - Do not include any visual stage directions or camera notes in the narration text.
+
+            Output ONLY JSON in exactly this format:
+            {{
+              "scenes": [
+                {{
+                  "scene_number": 1,
+                  "start_time": "MM:SS",
+                  "end_time": "MM:SS",
+                  "duration_seconds": 12.5,
+                  "narration": "The written recap narration for this clip."
+                }}
+              ]
+            }}
+        """).strip()
+
+        if custom_instructions:
+            prompt_text += f"\n\nADDITIONAL CREATIVE DIRECTION:\n{custom_instructions}"
+        return prompt_text
+
     def generate_scenes_from_video(self, video_chunks, custom_instructions=None,
-                                   chunk_seconds=600):
+                                   chunk_seconds=600, on_scene=None, plan=None,
+                                   media_uploads=None):
         """
         AUTONOMOUS MODE: watch the video and WRITE the recap narration directly,
         with timestamps — no pre-written script required.
@@ -655,9 +1524,14 @@ class GeminiVideoAnalyzer:
         have to paste a script. The assembled narration is returned as `full_script`.
 
         Args:
-            video_chunks: List of paths to video chunk files
+            video_chunks: List of paths to video chunk files, or AnalysisWindows
             custom_instructions: Optional creative direction (tone, focus, etc.)
-            chunk_seconds: Length of each chunk in seconds (for offset + clamping)
+            chunk_seconds: Length of each chunk in seconds (for offset + clamping
+                           of plain chunk paths)
+            on_scene: Optional callback(scene) fed usable scenes as early as possible
+            plan: Optional AnalysisPlan (see analyze_video_chunks)
+            media_uploads: Internal; uploads left over from an earlier pass over
+                           the same media (released here once no window needs them)
 
         Returns:
             {"scenes": [...], "full_script": "..."}
@@ -665,117 +1539,402 @@ class GeminiVideoAnalyzer:
         if not video_chunks:
             raise ValueError("No video chunks provided for generation.")
 
-        logger.info(f"AUTONOMOUS generation over {len(video_chunks)} chunk(s) — no script needed.")
+        windows = as_windows(video_chunks, chunk_seconds)
+        logger.info(f"AUTONOMOUS generation over {len(windows)} chunk(s) — no script needed.")
 
+        # The instructions are the same for every chunk; each chunk session caches
+        # them together with its video.
+        prompt_text = self._recap_prompt_text(custom_instructions)
+
+        stats = self._new_run_stats()
+        uploads = media_uploads or _MediaUploads(self, stats)
+        uploads.stats = stats
         all_scenes = []
 
-        for i, chunk_path in enumerate(video_chunks):
+        for i, window in enumerate(windows):
             chunk_num = i + 1
-            logger.info(f"\n--- Generating recap for Chunk {chunk_num}/{len(video_chunks)}: {chunk_path.name} ---")
+            logger.info(f"\n--- Generating recap for Chunk {chunk_num}/{len(windows)}: {window.name} ---")
 
             max_chunk_retries = self.max_retries
             chunk_retry_count = 0
             chunk_success = False
+            settings = plan.settings() if plan else {}
+            session = _ChunkSession.for_window(self, window, prompt_text, f"chunk {chunk_num}",
+                                               stats, uploads, fps=settings.get("fps"))
+            calls_before, tokens_before = len(stats["chunk_latencies"]), stats["prompt_tokens"]
 
-            while chunk_retry_count < max_chunk_retries and not chunk_success:
-                if chunk_retry_count > 0:
-                    logger.info(f"Retrying chunk {chunk_num} (Attempt {chunk_retry_count + 1}/{max_chunk_retries})...")
-                    time.sleep(self.retry_backoff_seconds)
+            stats["chunks"] += 1
+            try:
+                while chunk_retry_count < max_chunk_retries and not chunk_success:
+                    stats["attempts"] += 1
+                    if chunk_retry_count > 0:
+                        logger.info(f"Retrying chunk {chunk_num} (Attempt {chunk_retry_count + 1}/{max_chunk_retries})...")
+                        cancellation.sleep(self.retry_backoff_seconds)
 
-                video_file = None
-                try:
-                    chat = self.client.chats.create(model=self.model_name)
-                    self._wait_for_rate_limit()
-                    video_file = self.upload_video(chunk_path)
-
-                    file_uri = getattr(video_file, "uri", None)
-                    if not file_uri:
-                        raise ValueError(f"Failed to get URI for chunk {chunk_num}")
-
-                    video_part = types.Part.from_uri(file_uri=file_uri, mime_type=video_file.mime_type)
-
-                    prompt_text = textwrap.dedent(f"""
-                        You are a professional YouTube movie-recap narrator (in the style of channels like
-                        Mystery Recapped or Story Recapped). Watch this ~10-minute segment of a movie end to
-                        end and WRITE the recap narration yourself — do not just describe what is on screen,
-                        tell the STORY: what is happening in the plot, character names, motivations and beats.
-
-                        Rules:
-                        - Present tense, engaging, story-driven narration.
-                        - Pick the most important story moments as separate clips.
-                        - Each clip should be {self.clip_min}–{self.clip_max} seconds long.
-                        - Each narration should be at least 10 words and read naturally when spoken aloud.
-                        - Clips must NOT be back-to-back: leave at least a ~10 second gap between the end of
-                          one clip and the start of the next.
-                        - Narration for a clip must describe ONLY what happens within that clip's timestamps
-                          (no foreshadowing or backstory from outside the window).
-                        - Do not include any visual stage directions or camera notes in the narration text.
-
-                        Output ONLY JSON in exactly this format:
-                        {{
-                          "scenes": [
-                            {{
-                              "scene_number": 1,
-                              "start_time": "MM:SS",
-                              "end_time": "MM:SS",
-                              "duration_seconds": 12.5,
-                              "narration": "The written recap narration for this clip."
-                            }}
-                          ]
-                        }}
-                    """).strip()
+                    try:
+                        key = session.acquire()
 
-                    if custom_instructions:
-                        prompt_text += f"\n\nADDITIONAL CREATIVE DIRECTION:\n{custom_instructions}"
+                        logger.info(f"Sending generation request to Gemini for chunk {chunk_num}...")
+                        gen_config = self._build_generation_config(
+                            self.narration_temperature, response_schema=SCENES_RESPONSE_SCHEMA,
+                            media_resolution=settings.get("media_resolution"),
+                            thinking_level=settings.get("thinking_level"),
+                        )
+                        response_text = self._request_chunk_text(
+                            key.client, session.contents(), session.configure(gen_config),
+                            description=f"recap generation for chunk {chunk_num}",
+                            key=key,
+                            stats=stats,
+                            on_partial=self._partial_scene_sink(on_scene, window),
+                            input_kind=session.input_kind,
+                        )
+                        if not response_text:
+                            logger.warning(f"Empty response for chunk {chunk_num}, retrying...")
+                            chunk_retry_count += 1
+                            self._count_retry(stats, "empty_response")
+                            continue
 
-                    prompt_part = types.Part.from_text(text=prompt_text)
+                        scenes = self._parse_scene_response(response_text)
+                        if not scenes:
+                            logger.warning(f"No scenes generated for chunk {chunk_num}")
+                            chunk_retry_count += 1
+                            self._count_retry(stats, "no_scenes")
+                            continue
 
-                    logger.info(f"Sending generation request to Gemini for chunk {chunk_num}...")
-                    gen_config = self._build_generation_config(self.narration_temperature)
-                    response = self._execute_with_retry(
-                        lambda: chat.send_message(message=[video_part, prompt_part], config=gen_config),
-                        description=f"recap generation for chunk {chunk_num}"
-                    )
+                        attempt_scenes = self._offset_and_clamp_scenes(scenes, window)
+                        if not attempt_scenes:
+                            logger.warning(f"No usable scenes after clamping for chunk {chunk_num}")
+                            chunk_retry_count += 1
+                            self._count_retry(stats, "no_usable_scenes")
+                            continue
 
-                    response_text = self._extract_response_text(response)
-                    if not response_text:
-                        logger.warning(f"Empty response for chunk {chunk_num}, retrying...")
-                        chunk_retry_count += 1
-                        continue
+                        all_scenes.extend(attempt_scenes)
+                        self._emit_scenes(on_scene, attempt_scenes)
+                        logger.info(f"✓ Chunk {chunk_num}: generated {len(attempt_scenes)} scenes")
+                        chunk_success = True
 
-                    chunk_data = self._extract_json_from_response(response_text)
-                    scenes = chunk_data.get("scenes", [])
-                    if not scenes:
-                        logger.warning(f"No scenes generated for chunk {chunk_num}")
+                    except (KeyPoolExhausted, JobCancelled):
+                        uploads.release_all()
+                        raise
+                    except MalformedResponseError as e:
+                        logger.error(f"Malformed JSON for chunk {chunk_num}: {e}")
                         chunk_retry_count += 1
+                        self._count_retry(stats, "malformed_output")
                         continue
-
-                    attempt_scenes = self._offset_and_clamp_scenes(scenes, i, chunk_seconds)
-                    if not attempt_scenes:
-                        logger.warning(f"No usable scenes after clamping for chunk {chunk_num}")
+                    except Exception as e:
+                        logger.error(f"Error generating chunk {chunk_num}: {str(e)}")
                         chunk_retry_count += 1
+                        self._count_retry(stats, "error")
                         continue
+            finally:
+                session.release()
+                uploads.release_unused(windows[chunk_num:])
+                self._observe_window(plan, window, stats, calls_before, tokens_before)
 
-                    all_scenes.extend(attempt_scenes)
-                    logger.info(f"✓ Chunk {chunk_num}: generated {len(attempt_scenes)} scenes")
-                    chunk_success = True
+        return self._recap_result(all_scenes, stats)
 
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to parse JSON for chunk {chunk_num}.")
-                    chunk_retry_count += 1
-                    continue
-                except Exception as e:
-                    logger.error(f"Error generating chunk {chunk_num}: {str(e)}")
-                    chunk_retry_count += 1
-                    continue
-                finally:
-                    self._delete_remote_file(video_file)
-
-        # Renumber and assemble the full narration script from the generated scenes.
+    def _recap_result(self, all_scenes, stats):
+        """Renumber the generated scenes and assemble the full narration script."""
         for idx, scene in enumerate(all_scenes, 1):
             scene['scene_number'] = idx
 
         full_script = "\n\n".join(
             (s.get('narration') or '').strip() for s in all_scenes if (s.get('narration') or '').strip()
         )
-        return {"scenes": all_scenes, "full_script": full_script}
+        return {
+            "scenes": all_scenes,
+            "full_script": full_script,
+            "analysis_stats": self._finish_run_stats(stats),
+        }
+
+    def generate_scenes_batch(self, video_chunks, custom_instructions=None, chunk_seconds=600,
+                              on_scene=None, plan=None, poll_initial_seconds=30,
+                              poll_max_seconds=600, max_wait_seconds=24 * 3600):
+        """
+        AUTONOMOUS MODE at batch priority: the same per-window generation as
+        generate_scenes_from_video, but every window goes out in ONE Gemini
+        Batch API job (cheaper, outside the interactive per-minute quota, no
+        latency guarantee) and the job waits for it with backoff.
+
+        Media goes through the Files API (batch requests are size-limited, so
+        video is never inlined) on a single key, since the batch can only
+        reference files of its own project. Windows whose batch request failed
+        or gave no usable scenes - or all of them, if the batch itself fails -
+        are generated interactively afterwards, so a batch problem only costs
+        latency.
+
+        Returns:
+            {"scenes": [...], "full_script": "...", "analysis_stats": {..., "batch": {...}}}
+        """
+        if not video_chunks:
+            raise ValueError("No video chunks provided for generation.")
+
+        windows = as_windows(video_chunks, chunk_seconds)
+        logger.info(f"AUTONOMOUS generation over {len(windows)} chunk(s) via the Batch API.")
+        prompt_text = self._recap_prompt_text(custom_instructions)
+        settings = plan.settings() if plan else {}
+        stats = self._new_run_stats()
+        uploads = _MediaUploads(self, stats, inline_max_bytes=0)
+
+        try:
+            key = self._wait_for_rate_limit()
+            requests = []
+            for window in windows:
+                session = _ChunkSession.for_window(self, window, prompt_text, f"chunk {window.index + 1}",
+                                                   stats, uploads, fps=settings.get("fps"))
+                session.use_media(key, uploads.get(window.media_path, key, frames=window.frames))
+                requests.append(types.InlinedRequest(
+                    model=self.model_name,
+                    contents=[types.Content(role="user", parts=session.media_parts())],
+                    config=self._build_generation_config(
+                        self.narration_temperature, response_schema=SCENES_RESPONSE_SCHEMA,
+                        media_resolution=settings.get("media_resolution"),
+                        thinking_level=settings.get("thinking_level"),
+                    ),
+                ))
+            responses, report = run_batch(
+                key.client, self.model_name, requests,
+                display_name=f"recap-{windows[0].media_path.stem}-{len(windows)}w",
+                poll_initial_seconds=poll_initial_seconds,
+                poll_max_seconds=poll_max_seconds,
+                max_wait_seconds=max_wait_seconds,
+            )
+        except (KeyPoolExhausted, JobCancelled):
+            uploads.release_all()
+            raise
+        except Exception as exc:
+            logger.warning(f"Batch generation failed ({exc}); generating every chunk interactively")
+            uploads.release_all()
+            result = self.generate_scenes_from_video(windows, custom_instructions, chunk_seconds,
+                                                     on_scene=on_scene, plan=plan)
+            result["analysis_stats"]["batch"] = {"error": str(exc), "interactive_windows": len(windows)}
+            return result
+
+        scenes_by_window, failed = {}, []
+        for window, response in zip(windows, responses):
+            stats["chunks"] += 1
+            stats["attempts"] += 1
+            stats["calls"] += 1  # one request in the batch
+            scenes = []
+            if response is not None:
+                self._record_usage(stats, getattr(response, "usage_metadata", None))
+                try:
+                    response_text = self._extract_response_text(response)
+                    if response_text:
+                        scenes = self._offset_and_clamp_scenes(self._parse_scene_response(response_text), window)
+                except MalformedResponseError as exc:
+                    logger.error(f"Malformed JSON in batch reply for {window.name}: {exc}")
+                    self._count_retry(stats, "malformed_output")
+            if scenes:
+                scenes_by_window[window.index] = scenes
+                self._emit_scenes(on_scene, scenes)
+            else:
+                failed.append(window)
+
+        report["interactive_windows"] = len(failed)
+        if failed:
+            logger.info(f"{len(failed)} chunk(s) had no usable batch reply; generating them interactively")
+            uploads.release_unused(failed)
+            retry = self.generate_scenes_from_video(failed, custom_instructions, chunk_seconds,
+                                                    on_scene=on_scene, plan=plan, media_uploads=uploads)
+            report["interactive_stats"] = retry["analysis_stats"]
+        else:
+            retry = {"scenes": []}
+            uploads.release_all()
+
+        # Windows do not overlap, so source order is start-time order (scenes
+        # with blanked timestamps go last; they are skipped downstream anyway).
+        def source_order(scene):
+            start = self._time_to_seconds(scene.get('start_time'))
+            return math.inf if start is None else start
+
+        batch_scenes = [scene for window in windows for scene in scenes_by_window.get(window.index, [])]
+        all_scenes = sorted(batch_scenes + retry["scenes"], key=source_order)
+        stats["batch"] = report
+        return self._recap_result(all_scenes, stats)
+
+    def _parse_story_windows(self, response_text, window):
+        """Survey reply -> list of (start, end) spans in absolute source seconds."""
+        try:
+            data = self._extract_json_from_response(response_text)
+        except ValueError as exc:
+            raise MalformedResponseError(str(exc)) from exc
+        items = data.get("windows") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise MalformedResponseError("missing 'windows' array")
+        offset = 0.0 if self._reported_absolute(items, window) else window.start_seconds
+        spans = []
+        for item in items:
+            start = self._time_to_seconds(item.get("start_time"))
+            end = self._time_to_seconds(item.get("end_time"))
+            if start is None or end is None:
+                continue
+            start = min(max(start + offset, window.start_seconds), window.end_seconds)
+            end = min(max(end + offset, window.start_seconds), window.end_seconds)
+            if end > start:
+                spans.append((start, end))
+        return spans
+
+    def _survey_story_windows(self, survey_windows, custom_instructions, uploads, stats,
+                              fps, windows_per_hour):
+        """Coarse pass: ask for the story-relevant spans of each survey window."""
+        spans = []
+        for window in survey_windows:
+            wanted = max(2, math.ceil(window.length_seconds / 3600 * windows_per_hour))
+            prompt_text = textwrap.dedent(f"""
+                You are planning a YouTube movie-recap video. This is a quick, low-detail
+                pass over the film. List the story moments the recap must cover: plot
+                beats, reveals, turning points and key character moments. Skip credits,
+                filler and repeated footage.
+
+                Return about {wanted} windows, each 30-180 seconds long, in order, with a
+                one-sentence summary of what happens. Output ONLY JSON:
+                {{
+                  "windows": [
+                    {{"start_time": "MM:SS", "end_time": "MM:SS", "summary": "What happens"}}
+                  ]
+                }}
+            """).strip() + self._window_note(window)
+            if custom_instructions:
+                prompt_text += f"\n\nADDITIONAL CREATIVE DIRECTION:\n{custom_instructions}"
+
+            label = f"survey {window.index + 1}"
+            session = _ChunkSession(self, window, prompt_text, label, stats, uploads, fps=fps)
+            stats["chunks"] += 1
+            try:
+                for attempt in range(1, self.max_retries + 1):
+                    stats["attempts"] += 1
+                    try:
+                        key = session.acquire()
+                        gen_config = self._build_generation_config(
+                            self.timestamp_temperature,
+                            response_schema=STORY_WINDOWS_RESPONSE_SCHEMA,
+                            media_resolution="MEDIA_RESOLUTION_LOW",
+                            thinking_level="low",
+                        )
+                        response_text = self._request_chunk_text(
+                            key.client, session.contents(), session.configure(gen_config),
+                            description=f"story {label}",
+                            key=key,
+                            stats=stats,
+                            input_kind=session.input_kind,
+                        )
+                        found = self._parse_story_windows(response_text, window)
+                        logger.info(f"✓ {label}: {len(found)} candidate story window(s)")
+                        spans.extend(found)
+                        break
+                    except (KeyPoolExhausted, JobCancelled):
+                        uploads.release_all()
+                        raise
+                    except MalformedResponseError as e:
+                        logger.error(f"Malformed story windows for {label}: {e}")
+                        self._count_retry(stats, "malformed_output")
+                    except Exception as e:
+                        logger.error(f"Error in {label}: {str(e)}")
+                        self._count_retry(stats, "error")
+                    if attempt < self.max_retries:
+                        cancellation.sleep(self.retry_backoff_seconds)
+            finally:
+                session.release()
+        return spans
+
+    def generate_scenes_coarse_to_fine(self, video_path, duration_seconds, custom_instructions=None,
+                                       on_scene=None, plan=None, survey_fps=0.25,
+                                       survey_window_seconds=7200, windows_per_hour=12,
+                                       detail_padding_seconds=10, detail_max_seconds=300,
+                                       shots=None):
+        """
+        AUTONOMOUS MODE, coarse-to-fine: a cheap low-fps / low-resolution pass over
+        the whole film picks the story windows, then only those windows get the
+        full-detail recap generation (exact timestamps + narration).
+
+        The source is uploaded once; both passes address it with offsets. If the
+        survey finds nothing usable, the whole film is analyzed window by window.
+
+        Args:
+            video_path: Source (or analysis proxy) to upload
+            duration_seconds: Its duration
+            custom_instructions: Optional creative direction
+            on_scene: Optional callback(scene) fed usable scenes as early as possible
+            plan: Optional AnalysisPlan for the detail pass
+            survey_fps: Frame sampling rate of the coarse pass
+            survey_window_seconds: Longest span one survey request covers
+            windows_per_hour: Story windows to ask for per hour of film
+            detail_padding_seconds: Context added around each selected window
+            detail_max_seconds: Longest detail window (longer spans are cut)
+            shots: Optional ShotIndex of the source (cut hints + snapping)
+
+        Returns:
+            {"scenes", "full_script", "analysis_stats", "coarse_to_fine": report}
+        """
+        if not duration_seconds or duration_seconds <= 0:
+            raise ValueError("Source duration is required for coarse-to-fine analysis.")
+        started = time.time()
+        survey_stats = self._new_run_stats()
+        uploads = _MediaUploads(self, survey_stats)
+        survey_windows = windows_over_source(video_path, duration_seconds, survey_window_seconds)
+        # The survey only needs rough spans; no cut list in its prompt.
+        logger.info(f"COARSE pass over {duration_seconds:.0f}s in {len(survey_windows)} request(s) "
+                    f"at {survey_fps} fps, low resolution")
+        spans = self._survey_story_windows(survey_windows, custom_instructions, uploads,
+                                           survey_stats, survey_fps, windows_per_hour)
+        survey_seconds = time.time() - started
+
+        detail_spans = merge_spans(spans, duration_seconds, padding_seconds=detail_padding_seconds,
+                                   max_seconds=detail_max_seconds)
+        if detail_spans:
+            detail_windows = [AnalysisWindow(i, start, end, video_path, media_offset=True, shots=shots)
+                              for i, (start, end) in enumerate(detail_spans)]
+        else:
+            logger.warning("Coarse pass found no story windows; analyzing the whole film instead")
+            detail_windows = windows_over_source(video_path, duration_seconds,
+                                                 plan.chunk_seconds if plan else 600, shots=shots)
+        detail_media_seconds = sum(window.length_seconds for window in detail_windows)
+        logger.info(f"FINE pass over {len(detail_windows)} window(s), {detail_media_seconds:.0f}s "
+                    f"({detail_media_seconds / duration_seconds:.0%} of the film)")
+
+        detail_started = time.time()
+        result = self.generate_scenes_from_video(detail_windows, custom_instructions,
+                                                 on_scene=on_scene, plan=plan,
+                                                 media_uploads=uploads)
+        detail_seconds = time.time() - detail_started
+        uploads.release_all()
+
+        result["coarse_to_fine"] = self._coarse_to_fine_report(
+            self._finish_run_stats(survey_stats), result["analysis_stats"], duration_seconds,
+            len(detail_windows), detail_media_seconds, survey_seconds, detail_seconds,
+        )
+        return result
+
+    @staticmethod
+    def _coarse_to_fine_report(survey_stats, detail_stats, duration_seconds, detail_windows,
+                               detail_media_seconds, survey_seconds, detail_seconds):
+        """
+        Tokens and wall time of both passes, against an estimate of analyzing the
+        whole film the per-chunk way (the detail pass's measured tokens and time
+        per second of media, scaled to the full duration).
+        """
+        def tokens(stats):
+            return stats["prompt_tokens"] + stats["output_tokens"]
+
+        survey_tokens, detail_tokens = tokens(survey_stats), tokens(detail_stats)
+        scale = duration_seconds / detail_media_seconds if detail_media_seconds else 1.0
+        per_chunk_tokens = int(detail_tokens * scale)
+        per_chunk_seconds = detail_seconds * scale
+        total_tokens = survey_tokens + detail_tokens
+        total_seconds = survey_seconds + detail_seconds
+        report = {
+            "survey": {"requests": survey_stats["chunks"], "tokens": survey_tokens,
+                       "seconds": round(survey_seconds, 2), "stats": survey_stats},
+            "detail": {"windows": detail_windows, "media_seconds": round(detail_media_seconds, 1),
+                       "coverage": round(detail_media_seconds / duration_seconds, 3),
+                       "tokens": detail_tokens, "seconds": round(detail_seconds, 2)},
+            "total_tokens": total_tokens,
+            "total_seconds": round(total_seconds, 2),
+            "per_chunk_estimate": {"tokens": per_chunk_tokens, "seconds": round(per_chunk_seconds, 2)},
+            "token_ratio": round(total_tokens / per_chunk_tokens, 3) if per_chunk_tokens else None,
+            "time_ratio": round(total_seconds / per_chunk_seconds, 3) if per_chunk_seconds else None,
+        }
+        logger.info(f"Coarse-to-fine: {total_tokens} tokens / {total_seconds:.0f}s vs ~{per_chunk_tokens} "
+                    f"tokens / {per_chunk_seconds:.0f}s estimated per-chunk")
+        return report
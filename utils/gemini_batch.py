@@ -0,0 +1,111 @@
+"""
+Gemini Batch API helper for non-urgent jobs.
+
+A batch job takes a list of generate_content requests, runs them
+asynchronously (typically within hours, at a lower price than interactive
+calls and outside the interactive per-minute quota) and returns the
+responses in request order. This module submits one, polls it with
+exponential backoff until it reaches a terminal state, and hands back the
+per-request responses so callers can parse them exactly like interactive
+replies. It goes through the normal SDK client, so a stand-in API set with
+GEMINI_BASE_URL works the same way.
+"""
+import time
+
+from google.genai import types
+
+from utils import cancellation
+from utils.cancellation import JobCancelled
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+SUCCEEDED_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+TERMINAL_STATES = SUCCEEDED_STATES | {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+class BatchJobFailed(RuntimeError):
+    """The batch ended without results (failed, cancelled, expired or timed out)."""
+
+
+def _state(job):
+    state = getattr(job, "state", None)
+    return getattr(state, "value", state) or "JOB_STATE_UNSPECIFIED"
+
+
+def _cancel(client, job):
+    try:
+        client.batches.cancel(name=job.name)
+    except Exception as exc:
+        logger.debug(f"Could not cancel batch {job.name}: {exc}")
+
+
+def run_batch(client, model, requests, display_name, poll_initial_seconds=30,
+              poll_max_seconds=600, max_wait_seconds=24 * 3600):
+    """
+    Submit `requests` as one batch job and wait for it.
+
+    Args:
+        client: genai.Client to submit with (uploaded files referenced by the
+                requests must belong to the same project)
+        model: Model name for every request
+        requests: list of types.InlinedRequest
+        display_name: Batch display name (shows up in the console)
+        poll_initial_seconds: First poll interval; doubles up to poll_max_seconds
+        max_wait_seconds: Give up (and cancel the batch) after this long
+
+    Returns:
+        (responses, report): one entry per request, each the
+        GenerateContentResponse or None when that request failed, and a dict
+        with the batch name, final state, polls and wait time.
+    """
+    started = time.time()
+    job = client.batches.create(
+        model=model,
+        src=requests,
+        config=types.CreateBatchJobConfig(display_name=display_name),
+    )
+    logger.info(f"Submitted batch {job.name} with {len(requests)} request(s); polling for completion")
+
+    delay = max(poll_initial_seconds, 1)
+    polls = 0
+    try:
+        while _state(job) not in TERMINAL_STATES:
+            if time.time() - started >= max_wait_seconds:
+                _cancel(client, job)
+                raise BatchJobFailed(f"Batch {job.name} not finished after {max_wait_seconds}s (cancelled)")
+            cancellation.sleep(delay)
+            delay = min(delay * 2, max(poll_max_seconds, 1))
+            job = client.batches.get(name=job.name)
+            polls += 1
+            logger.debug(f"Batch {job.name}: {_state(job)} after {time.time() - started:.0f}s")
+    except JobCancelled:
+        # The job that wanted these results is gone; don't leave the batch running.
+        _cancel(client, job)
+        raise
+
+    state = _state(job)
+    report = {
+        "name": job.name,
+        "state": state,
+        "requests": len(requests),
+        "polls": polls,
+        "wait_seconds": round(time.time() - started, 1),
+    }
+    if state not in SUCCEEDED_STATES:
+        raise BatchJobFailed(f"Batch {job.name} ended in {state}: {getattr(job, 'error', None)}")
+
+    inlined = getattr(getattr(job, "dest", None), "inlined_responses", None) or []
+    responses = []
+    for i in range(len(requests)):
+        item = inlined[i] if i < len(inlined) else None
+        if item is None or getattr(item, "error", None) is not None:
+            responses.append(None)
+            if item is not None:
+                logger.warning(f"Batch {job.name} request {i + 1} failed: {item.error}")
+        else:
+            responses.append(item.response)
+    report["failed_requests"] = sum(1 for response in responses if response is None)
+    logger.info(f"Batch {job.name} {state} in {report['wait_seconds']}s "
+                f"({report['failed_requests']} failed request(s))")
+    return responses, report
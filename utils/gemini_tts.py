@@ -13,14 +13,26 @@ the file is directly readable by ffprobe/ffmpeg downstream.
 
 Rate limiting: the TTS model has a very low free-tier quota (e.g. 3 requests/min),
 so calls are paced and 429s are retried honoring the server-provided retry delay.
+Calls go through an ApiKeyPool, so with several keys a daily-quota 429 retires
+that key and the remaining scenes continue on the others.
 """
+import contextvars
+import hashlib
+import json
 import os
+import queue
 import re
+import threading
 import time
 import wave
 from google import genai
 from google.genai import types
 from google.genai import errors as genai_errors
+from utils import cancellation
+from utils.cancellation import JobCancelled
+from utils.gemini_batch import run_batch
+from utils.http_transport import NETWORK_ERRORS
+from utils.key_pool import ApiKeyPool, KeyPoolExhausted, is_daily_quota_exhausted
 from utils.logger import setup_logger
 
 logger = setup_logger()
@@ -33,6 +45,9 @@ _DEFAULT_SAMPLE_RATE = 24000
 # Retry these transient statuses (rate limit + server errors).
 _RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
+# Per output dir: which narration each scene WAV was synthesized from.
+_NARRATION_MANIFEST = "narration.json"
+
 
 def _parse_sample_rate(mime_type, default=_DEFAULT_SAMPLE_RATE):
     """Pull the sample rate out of a mime type like 'audio/L16;rate=24000'."""
@@ -42,6 +57,26 @@ def _parse_sample_rate(mime_type, default=_DEFAULT_SAMPLE_RATE):
     return int(match.group(1)) if match else default
 
 
+def _narration_digest(narration):
+    return hashlib.sha1(narration.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def _load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    """scene WAV filename -> narration digest, written atomically."""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
 def _retry_delay_from_error(exc, default):
     """
     Extract a suggested wait (seconds) from a 429 error. Gemini includes either
@@ -59,21 +94,12 @@ def _retry_delay_from_error(exc, default):
     return default
 
 
-def _is_daily_quota_exhausted(exc):
-    """
-    True if a 429 is a PER-DAY quota (e.g. free tier's 10 TTS requests/day).
-    These won't clear for hours, so retrying is pointless — skip fast instead of
-    waiting out the (misleading) per-minute retryDelay repeatedly.
-    """
-    text = str(exc)
-    return "PerDay" in text or "RequestsPerDay" in text
-
-
 class GeminiTTS:
     def __init__(self, api_key, model_name="gemini-2.5-flash-preview-tts",
                  voice_name="Kore", api_version="v1beta",
                  delay_seconds=0, max_retries=5, retry_backoff_seconds=20,
-                 max_wait_seconds=120):
+                 max_wait_seconds=120, api_keys=None, rpm_per_key=0, base_url=None,
+                 http_transport=None, request_timeout_seconds=None, daily_limit_per_key=0):
         """
         Initialize the Gemini native TTS client.
 
@@ -81,9 +107,17 @@ class GeminiTTS:
             api_key: Gemini API key (AI Studio key works)
             model_name: A Gemini TTS model, e.g. 'gemini-2.5-flash-preview-tts'
             voice_name: A prebuilt Gemini voice, e.g. 'Kore', 'Puck', 'Charon'
-            delay_seconds: Proactive pause between calls (helps low RPM tiers)
+            delay_seconds: Proactive pause between calls on the same key (helps low RPM tiers)
             max_retries: Attempts per call on transient (429/5xx) errors
             retry_backoff_seconds: Default backoff when the server gives no hint
+            api_keys: Optional list of keys to rotate across (defaults to [api_key])
+            rpm_per_key: Optional requests-per-minute cap per key (0 disables)
+            base_url: Optional API endpoint override (e.g. a local stand-in)
+            http_transport: Optional SharedTransport (pooled connections, per-operation timeouts)
+            request_timeout_seconds: Wall-clock limit per TTS call; a call still
+                                     running then is abandoned and retried (None: no limit)
+            daily_limit_per_key: The plan's TTS requests per key per day, if known
+                                 (0: unknown); used to report remaining quota
         """
         self.api_key = api_key
         self.model_name = model_name
@@ -92,64 +126,91 @@ class GeminiTTS:
         self.max_retries = max(max_retries, 1)
         self.retry_backoff_seconds = max(retry_backoff_seconds, 1)
         self.max_wait_seconds = max(max_wait_seconds, 1)
-        self._last_call_time = 0.0
-        self.client = genai.Client(
-            api_key=api_key,
-            http_options=types.HttpOptions(api_version=api_version) if api_version else None,
+        self.request_timeout_seconds = request_timeout_seconds or None
+        http_options = None
+        if api_version or base_url or http_transport:
+            http_options = types.HttpOptions(
+                api_version=api_version or None, base_url=base_url or None,
+                **(http_transport.http_options() if http_transport else {}),
+            )
+        self.key_pool = ApiKeyPool(
+            api_keys or [api_key],
+            client_factory=lambda key: genai.Client(api_key=key, http_options=http_options),
+            min_interval_seconds=self.delay_seconds,
+            rpm_limit=rpm_per_key,
+            name="tts",
+            daily_limit=daily_limit_per_key,
         )
+        self.client = self.key_pool.primary.client
         logger.info(f"Gemini native TTS initialized (model={model_name}, voice={voice_name}, "
-                    f"delay={self.delay_seconds}s, retries={self.max_retries})")
+                    f"delay={self.delay_seconds}s, retries={self.max_retries}, "
+                    f"keys={len(self.key_pool)})")
+
+    def _speech_config(self):
+        return types.GenerateContentConfig(
+            response_modalities=["AUDIO"],
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                        voice_name=self.voice_name
+                    )
+                )
+            ),
+        )
 
-    def _wait_between_calls(self):
-        """Respect a proactive minimum spacing between TTS calls."""
-        if self.delay_seconds <= 0:
-            return
-        elapsed = time.time() - self._last_call_time
-        if 0 < elapsed < self.delay_seconds and self._last_call_time > 0:
-            time.sleep(self.delay_seconds - elapsed)
+    @staticmethod
+    def _audio_from_response(response):
+        """(pcm_bytes, sample_rate) from a reply, or None if it carries no audio."""
+        for candidate in getattr(response, "candidates", []) or []:
+            content = getattr(candidate, "content", None)
+            for part in getattr(content, "parts", None) or []:
+                blob = getattr(part, "inline_data", None)
+                if blob and getattr(blob, "data", None):
+                    return blob.data, _parse_sample_rate(getattr(blob, "mime_type", None))
+        return None
 
     def _synthesize(self, text):
         """Call Gemini TTS with retry/backoff; return (pcm_bytes, sample_rate)."""
         last_error = None
-        for attempt in range(1, self.max_retries + 1):
-            self._wait_between_calls()
+        attempt = 0
+        while attempt < self.max_retries:
             try:
-                response = self.client.models.generate_content(
+                key = self.key_pool.acquire()
+            except KeyPoolExhausted as exc:
+                last_error = exc
+                logger.error(f"{exc} Skipping without retry — add keys or enable billing "
+                             f"to lift the daily limit.")
+                break
+            attempt += 1
+            try:
+                # Abandoned if the job is cancelled mid-request (JobCancelled) or
+                # the call outlives request_timeout_seconds (TimeoutError, retried).
+                response = cancellation.call(lambda: key.client.models.generate_content(
                     model=self.model_name,
                     contents=text,
-                    config=types.GenerateContentConfig(
-                        response_modalities=["AUDIO"],
-                        speech_config=types.SpeechConfig(
-                            voice_config=types.VoiceConfig(
-                                prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                    voice_name=self.voice_name
-                                )
-                            )
-                        ),
-                    ),
-                )
-                self._last_call_time = time.time()
-
-                for candidate in getattr(response, "candidates", []) or []:
-                    content = getattr(candidate, "content", None)
-                    for part in getattr(content, "parts", None) or []:
-                        blob = getattr(part, "inline_data", None)
-                        if blob and getattr(blob, "data", None):
-                            return blob.data, _parse_sample_rate(getattr(blob, "mime_type", None))
+                    config=self._speech_config(),
+                ), timeout=self.request_timeout_seconds)
+
+                audio = self._audio_from_response(response)
+                if audio:
+                    self.key_pool.record_success(key)
+                    return audio
+                self.key_pool.record_failure(key)
                 raise RuntimeError("Gemini TTS returned no audio content")
 
             except genai_errors.APIError as exc:
-                self._last_call_time = time.time()
                 status = getattr(exc, "code", None)
+                self.key_pool.record_failure(key, rate_limited=status == 429)
                 if status is not None and status not in _RETRYABLE_STATUS:
                     raise
                 last_error = exc
-                # A daily-quota 429 won't clear for hours — don't burn retries
-                # waiting out the per-minute hint repeatedly; give up now.
-                if status == 429 and _is_daily_quota_exhausted(exc):
-                    logger.error("TTS daily quota exhausted (free tier). Skipping without retry — "
-                                 "enable billing to lift the daily limit.")
-                    break
+                # A daily-quota 429 won't clear for hours — retire this key and
+                # move straight to the next one (without spending an attempt).
+                # Once every key is retired, acquire() fails fast and we give up.
+                if status == 429 and is_daily_quota_exhausted(exc):
+                    self.key_pool.retire(key)
+                    attempt -= 1
+                    continue
                 if attempt >= self.max_retries:
                     break
                 if status == 429:
@@ -163,11 +224,66 @@ class GeminiTTS:
                     logger.error(f"TTS 429 suggests waiting {wait:.0f}s (> cap {self.max_wait_seconds}s) — "
                                  f"treating as exhausted quota, not waiting.")
                     break
-                logger.warning(f"TTS transient error {status} (attempt {attempt}/{self.max_retries}); "
-                               f"waiting {wait:.0f}s...")
-                time.sleep(wait)
+                logger.warning(f"TTS transient error {status} on {key.label} "
+                               f"(attempt {attempt}/{self.max_retries}); waiting {wait:.0f}s...")
+                cancellation.sleep(wait)
+            except NETWORK_ERRORS as exc:
+                # Timeout / reset on the shared transport, or a call past its
+                # deadline: same key, normal backoff.
+                self.key_pool.record_failure(key)
+                last_error = exc
+                if attempt >= self.max_retries:
+                    break
+                wait = self.retry_backoff_seconds * attempt
+                logger.warning(f"TTS network error on {key.label} ({exc}); "
+                               f"attempt {attempt}/{self.max_retries}, waiting {wait:.0f}s...")
+                cancellation.sleep(wait)
+
+        raise RuntimeError(f"TTS failed after {attempt} attempt(s): {last_error}") from last_error
 
-        raise RuntimeError(f"TTS failed after {self.max_retries} attempts: {last_error}") from last_error
+    def synthesize_batch(self, texts, **batch_options):
+        """
+        Synthesize many narrations in ONE Gemini Batch API job (cheaper, outside
+        the interactive TTS quota, no latency guarantee).
+
+        Args:
+            texts: Narration strings
+            batch_options: poll_initial_seconds / poll_max_seconds / max_wait_seconds
+                           for utils.gemini_batch.run_batch
+
+        Returns:
+            One (pcm_bytes, sample_rate) per text, or None where the batch gave no
+            audio (the whole list is None if the batch itself failed).
+        """
+        if not texts:
+            return []
+        try:
+            key = self.key_pool.acquire()
+            requests = [
+                types.InlinedRequest(model=self.model_name, contents=text, config=self._speech_config())
+                for text in texts
+            ]
+            responses, report = run_batch(key.client, self.model_name, requests,
+                                          display_name=f"tts-{len(texts)}", **batch_options)
+        except KeyPoolExhausted:
+            raise
+        except Exception as exc:
+            logger.warning(f"TTS batch failed ({exc}); synthesizing interactively")
+            return [None] * len(texts)
+        return [self._audio_from_response(response) if response is not None else None
+                for response in responses]
+
+    @staticmethod
+    def _write_wav(output_path, pcm_bytes, sample_rate):
+        # Written under a temp name and renamed, so an existing WAV is always complete.
+        tmp_path = f"{output_path}.part"
+        with wave.open(tmp_path, "wb") as wav_file:
+            wav_file.setnchannels(_TTS_CHANNELS)
+            wav_file.setsampwidth(_TTS_SAMPLE_WIDTH)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(pcm_bytes)
+        os.replace(tmp_path, output_path)
+        return output_path
 
     def text_to_speech(self, text, output_path):
         """
@@ -181,14 +297,14 @@ class GeminiTTS:
             Path to saved audio file
         """
         pcm_bytes, sample_rate = self._synthesize(text)
-        with wave.open(str(output_path), "wb") as wav_file:
-            wav_file.setnchannels(_TTS_CHANNELS)
-            wav_file.setsampwidth(_TTS_SAMPLE_WIDTH)
-            wav_file.setframerate(sample_rate)
-            wav_file.writeframes(pcm_bytes)
-        return output_path
+        return self._write_wav(output_path, pcm_bytes, sample_rate)
+
+    def start_prefetch(self, output_dir):
+        """Start a background NarrationPrefetcher writing into output_dir."""
+        return NarrationPrefetcher(self, output_dir)
 
-    def generate_audio_for_scenes(self, scenes_data, output_dir, skip_failed=True):
+    def generate_audio_for_scenes(self, scenes_data, output_dir, skip_failed=True,
+                                  prefetched=None, batch=False, batch_options=None):
         """
         Generate audio for all scenes.
 
@@ -197,6 +313,15 @@ class GeminiTTS:
             output_dir: Directory to save audio files
             skip_failed: If True, a scene that still fails after retries is skipped
                 (its clip is omitted) rather than failing the whole job.
+            prefetched: Optional closed NarrationPrefetcher; narration it already
+                synthesized is reused instead of calling the API again.
+            batch: Synthesize the narration in one Batch API job first; scenes
+                the batch gave no audio for fall back to interactive calls.
+            batch_options: Polling options for the batch (see synthesize_batch)
+
+        Scene audio already in output_dir for the same narration (recorded in
+        its narration.json manifest, e.g. by a run that was interrupted) is
+        reused as-is.
 
         Returns:
             List of dictionaries containing scene info and audio paths
@@ -204,9 +329,30 @@ class GeminiTTS:
         audio_files = []
         scenes = scenes_data.get('scenes', [])
         failures = 0
+        manifest_path = os.path.join(output_dir, _NARRATION_MANIFEST)
+        manifest = _load_manifest(manifest_path)
+
+        def existing_audio(scene_num, narration):
+            filename = f"scene_{scene_num:03d}.wav"
+            if (manifest.get(filename) == _narration_digest(narration)
+                    and os.path.exists(os.path.join(output_dir, filename))):
+                return os.path.join(output_dir, filename)
+            return None
 
         logger.info(f"Generating audio for {len(scenes)} scenes using Gemini native TTS")
 
+        batched = {}
+        if batch:
+            pending = sorted({
+                (scene.get('narration') or '').strip() for i, scene in enumerate(scenes, 1)
+                if (scene.get('narration') or '').strip()
+                and not (prefetched and prefetched.has(scene['narration']))
+                and not existing_audio(scene.get('scene_number', i), scene['narration'].strip())
+            })
+            results = self.synthesize_batch(pending, **(batch_options or {}))
+            batched = {text: audio for text, audio in zip(pending, results) if audio}
+            logger.info(f"TTS batch produced audio for {len(batched)}/{len(pending)} narration(s)")
+
         for i, scene in enumerate(scenes, 1):
             scene_num = scene.get('scene_number', i)
             narration = (scene.get('narration') or '').strip()
@@ -220,8 +366,24 @@ class GeminiTTS:
             filename = f"scene_{scene_num:03d}.wav"
             audio_path = os.path.join(output_dir, filename)
 
+            if existing_audio(scene_num, narration):
+                logger.info(f"Scene {scene_num}: narration audio already generated, reusing it")
+                audio_files.append({
+                    'scene_number': scene_num,
+                    'audio_path': audio_path,
+                    'duration': scene.get('duration_seconds')
+                })
+                continue
+
             try:
-                self.text_to_speech(narration, audio_path)
+                prefetched_path = prefetched.take(narration) if prefetched else None
+                if prefetched_path:
+                    os.replace(prefetched_path, audio_path)
+                    logger.info(f"Scene {scene_num}: reused narration audio synthesized during analysis")
+                elif narration in batched:
+                    self._write_wav(audio_path, *batched[narration])
+                else:
+                    self.text_to_speech(narration, audio_path)
             except Exception as e:
                 failures += 1
                 if skip_failed:
@@ -230,6 +392,8 @@ class GeminiTTS:
                 logger.error(f"Error generating audio for scene {scene_num}: {e}")
                 raise
 
+            manifest[filename] = _narration_digest(narration)
+            _save_manifest(manifest_path, manifest)
             audio_files.append({
                 'scene_number': scene_num,
                 'audio_path': audio_path,
@@ -244,3 +408,123 @@ class GeminiTTS:
         if failures:
             logger.warning(f"{failures} scene(s) had no audio and were skipped.")
         return audio_files
+
+
+class NarrationPrefetcher:
+    """
+    Synthesizes narration on a background thread while analysis is still running.
+
+    Scenes are submitted as soon as the analyzer has them (streamed or per
+    chunk). Audio is keyed by the narration text, so a scene delivered twice is
+    synthesized once, and the final TTS stage reuses whatever matches. Audio
+    for scenes that were later discarded (e.g. a retried chunk) is deleted by
+    discard_unused(). If the analysis fails, abort() drops the queued narration
+    instead of synthesizing it, so no quota is spent on a job that won't use it.
+    """
+
+    _STOP = object()
+
+    def __init__(self, tts, output_dir):
+        self._tts = tts
+        self._output_dir = output_dir
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._ready = {}           # narration digest -> wav path
+        self._aborted = False
+        self._started_at = time.time()
+        self.first_audio_seconds = None
+        self.failures = 0
+        self.reused = 0
+        # Run in a copy of the caller's context so log lines keep the session id.
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=context.run, args=(self._worker,), name="tts-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _digest(narration):
+        return _narration_digest(narration)
+
+    def submit(self, scene):
+        """Queue a scene's narration for synthesis (duplicates are ignored)."""
+        narration = (scene.get('narration') or '').strip()
+        if not narration or self._aborted:
+            return
+        digest = self._digest(narration)
+        with self._lock:
+            if digest in self._seen:
+                return
+            self._seen.add(digest)
+        self._queue.put((digest, narration))
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP or self._aborted:
+                return
+            digest, narration = item
+            path = os.path.join(self._output_dir, f"prefetch_{digest}.wav")
+            try:
+                self._tts.text_to_speech(narration, path)
+            except JobCancelled:
+                return
+            except Exception as exc:
+                # The final TTS stage retries this scene normally.
+                self.failures += 1
+                logger.warning(f"Narration prefetch failed (will retry in TTS stage): {exc}")
+                continue
+            with self._lock:
+                self._ready[digest] = path
+                if self.first_audio_seconds is None:
+                    self.first_audio_seconds = round(time.time() - self._started_at, 1)
+                    logger.info(f"First narration audio ready {self.first_audio_seconds}s "
+                                f"after analysis started")
+
+    def close(self):
+        """Stop accepting work and wait for already-queued narration to finish."""
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def abort(self):
+        """
+        Drop queued narration, wait for the one in progress (if any), and
+        delete all audio made so far. Returns the number of files deleted.
+        """
+        self._aborted = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        return self.discard_unused()
+
+    def has(self, narration):
+        """True if audio for this narration is ready to be taken."""
+        with self._lock:
+            return self._digest(narration or '') in self._ready
+
+    def take(self, narration):
+        """Return (and hand over) the prefetched wav for this narration, if any."""
+        with self._lock:
+            path = self._ready.pop(self._digest(narration or ''), None)
+            if path:
+                self.reused += 1
+            return path
+
+    def discard_unused(self):
+        """Delete prefetched audio that no final scene used."""
+        with self._lock:
+            leftovers, self._ready = list(self._ready.values()), {}
+        for path in leftovers:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(leftovers)
+
+    def stats(self):
+        return {
+            "submitted": len(self._seen),
+            "reused": self.reused,
+            "failed": self.failures,
+            "first_audio_seconds": self.first_audio_seconds,
+        }
@@ -0,0 +1,194 @@
+"""
+Shared HTTP transport for outbound Google API calls.
+
+Every genai.Client (one per API key, for analysis and TTS) used to build its
+own httpx client, and nothing set per-operation timeouts: a processing poll
+got the same 10-minute timeout as a generate call, and every small
+`files.get` poll or TTS call could pay a fresh TCP + TLS handshake. Here ONE
+pooled httpx client (plus an async twin for the asyncio layer) is shared by
+all of them:
+
+- keep-alive pool with bounded size and idle expiry,
+- HTTP/2 when the `h2` package is installed (many requests multiplexed over one
+  connection per host), HTTP/1.1 keep-alive otherwise,
+- connect/read/write timeouts chosen per operation (upload, poll, generate,
+  batch, other) from the request itself,
+- metrics per operation: requests, new connections vs reused ones, HTTP
+  version and latency (reported in job results and /api/status).
+
+The YouTube uploader (googleapiclient / httplib2) can't use httpx; it gets a
+keep-alive httplib2.Http with the upload timeouts from youtube_http().
+"""
+import collections
+import threading
+import time
+
+import httpx
+
+from utils.latency_tracker import latency_summary
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Network-level failures worth retrying (timeouts, resets, protocol errors),
+# including a call abandoned at its wall-clock deadline (cancellation.call).
+NETWORK_ERRORS = (httpx.HTTPError, TimeoutError)
+
+OPERATIONS = ("upload", "poll", "generate", "batch", "other")
+
+
+def h2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def classify(request):
+    """Operation type of an outbound Gemini request, from its method and URL."""
+    path = request.url.path
+    if "/upload/" in path:
+        return "upload"
+    if "/batches" in path or ":batchGenerateContent" in path:
+        return "batch"
+    if ":generateContent" in path or ":streamGenerateContent" in path:
+        return "generate"
+    if request.method == "GET" and "/files/" in path:
+        return "poll"
+    return "other"
+
+
+class _OperationStats:
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.http_versions = {}
+        self.latencies = collections.deque(maxlen=1000)  # recent requests only
+
+    def to_dict(self):
+        reused = self.requests - self.new_connections
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+            "http_versions": dict(self.http_versions),
+            "latency": latency_summary(list(self.latencies)),
+        }
+
+
+class SharedTransport:
+    def __init__(self, http2=True, max_connections=20, max_keepalive_connections=10,
+                 keepalive_seconds=60, connect_timeout_seconds=10,
+                 upload_timeout_seconds=900, poll_timeout_seconds=30,
+                 generate_timeout_seconds=600, other_timeout_seconds=60,
+                 async_client=False):
+        """
+        Args:
+            http2: Use HTTP/2 when `h2` is installed
+            max_connections / max_keepalive_connections / keepalive_seconds: pool limits
+            connect_timeout_seconds: TCP + TLS connect timeout for every operation
+            upload_timeout_seconds: Read/write timeout for media uploads
+            poll_timeout_seconds: Read timeout for file state polls
+            generate_timeout_seconds: Read timeout for generate calls (long thinking)
+            other_timeout_seconds: Everything else (deletes, caches, batch status)
+            async_client: Also build a pooled httpx.AsyncClient (only when all async
+                          calls run on one event loop, e.g. EventLoopThread)
+        """
+        self.http2 = bool(http2) and h2_available()
+        if http2 and not self.http2:
+            logger.info("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1 keep-alive")
+        connect = connect_timeout_seconds
+        self.timeouts = {
+            "upload": httpx.Timeout(upload_timeout_seconds, connect=connect),
+            "poll": httpx.Timeout(poll_timeout_seconds, connect=connect),
+            "generate": httpx.Timeout(generate_timeout_seconds, connect=connect),
+            "batch": httpx.Timeout(other_timeout_seconds, connect=connect),
+            "other": httpx.Timeout(other_timeout_seconds, connect=connect),
+        }
+        self._lock = threading.Lock()
+        self._stats = {operation: _OperationStats() for operation in OPERATIONS}
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self.client = httpx.Client(
+            http2=self.http2, limits=limits,
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+        self.async_client = None
+        if async_client:
+            self.async_client = httpx.AsyncClient(
+                http2=self.http2, limits=limits,
+                event_hooks={"request": [self._on_request_async], "response": [self._on_response_async]},
+            )
+        logger.info(f"Shared HTTP transport: {'HTTP/2' if self.http2 else 'HTTP/1.1'}, "
+                    f"pool {max_connections} (keep-alive {max_keepalive_connections}, "
+                    f"{keepalive_seconds}s)")
+
+    # ---------------- hooks ----------------
+
+    def _on_request(self, request, asynchronous=False):
+        operation = classify(request)
+        request.extensions["timeout"] = self.timeouts[operation].as_dict()
+        state = {"operation": operation, "new_connection": False, "started": time.time()}
+        request.extensions["transport_state"] = state
+
+        # httpcore only emits connect events when it opens a new connection.
+        def trace(event_name, info):
+            if event_name.startswith("connection.connect_tcp.started"):
+                state["new_connection"] = True
+
+        async def trace_async(event_name, info):
+            trace(event_name, info)
+
+        request.extensions["trace"] = trace_async if asynchronous else trace
+
+    def _on_response(self, response):
+        state = response.request.extensions.get("transport_state")
+        if not state:
+            return
+        with self._lock:
+            stats = self._stats[state["operation"]]
+            stats.requests += 1
+            stats.new_connections += int(state["new_connection"])
+            stats.http_versions[response.http_version] = stats.http_versions.get(response.http_version, 0) + 1
+            stats.latencies.append(round(time.time() - state["started"], 3))
+
+    async def _on_request_async(self, request):
+        self._on_request(request, asynchronous=True)
+
+    async def _on_response_async(self, response):
+        self._on_response(response)
+
+    # ---------------- clients ----------------
+
+    def http_options(self, **options):
+        """Keyword args for google.genai types.HttpOptions using the shared clients."""
+        options["httpx_client"] = self.client
+        if self.async_client is not None:
+            options["httpx_async_client"] = self.async_client
+        return options
+
+    def youtube_http(self, credentials):
+        """Authorized keep-alive httplib2 transport for googleapiclient (YouTube)."""
+        import google_auth_httplib2
+        import httplib2
+
+        timeout = self.timeouts["upload"].read
+        return google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "http2": self.http2,
+                "operations": {
+                    operation: stats.to_dict()
+                    for operation, stats in self._stats.items() if stats.requests
+                },
+            }
+
+    def close(self):
+        self.client.close()
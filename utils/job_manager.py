@@ -3,25 +3,60 @@ Lightweight background job queue for video processing.
 
 Why: the pipeline (download -> analyze -> TTS -> render) can run for many
 minutes. Running it inside the HTTP request meant a browser refresh, network
-blip, or proxy timeout lost the result. Jobs now run on a single background
-worker thread; the API returns a job id immediately and results are persisted
-to disk (outputs/<session_id>/job.json) so they survive a server restart.
+blip, or proxy timeout lost the result. Jobs now run on background worker
+threads; the API returns a job id immediately and job state is persisted
+(utils/job_store.py, SQLite) so it survives a server restart.
 
 Design notes:
-- One worker thread processes jobs strictly in submission order. Video work is
-  CPU/API heavy and Gemini is rate-limited, so serializing jobs is a feature.
+- A job is a sequence of stages (acquire, prepare, analyze, TTS, render, finalize,
+  upload). Each stage names the worker pool it runs on: "api" for stages that
+  mostly wait on the network / Gemini quota, "cpu" for ffmpeg work. Pools have
+  their own size, so job B can render while job A waits on TTS quota, but a
+  job's own stages still run strictly one after another. Stages share state
+  through a per-job context dict.
+- Within a pool, the next stage to run is picked by priority (urgent,
+  normal, batch) with aging, then weighted-fair among submitters, then
+  submission order (utils/fair_queue.py). Gemini is rate-limited, so the api
+  pool defaults to one worker.
 - job_id == session_id (the frontend already generates a unique session id per
   submission), which keeps logs, output dirs, and jobs trivially correlated.
 - No external broker (Redis/Celery) — deliberate, to keep the app a single
   process anyone can run with `python app.py`.
+- Batch-priority jobs run their api stages on their own pool ("batch lane").
+  They spend most of their time waiting on a Gemini Batch API job, which must
+  not hold up interactive jobs behind them.
+- The job store row is written on submit, when each stage starts and ends,
+  and at the end. Between stages it holds the job params, the next stage and
+  a checkpoint of the stage context, so on startup queued jobs are
+  re-enqueued and interrupted jobs resume at the stage that was running - not
+  from the start. Artifacts a stage produced (chunks, scenes.json, audio) stay
+  on disk and are referenced by the checkpoint.
+- Only queued / running jobs are kept in memory. Finished jobs are read back
+  from the store, and their result from outputs/<job_id>/job.json only when
+  it is asked for.
+- cancel() drops a waiting job from its queue at once; a running stage is
+  stopped through the job's CancelToken (utils/cancellation.py: sleeps wake
+  up, ffmpeg is killed, pending API calls are abandoned), so its worker picks
+  up the next job within seconds. `on_cancel` then releases the job's files.
+- A watchdog thread bounds every running stage: by the stage's deadline
+  (which can scale with the input, e.g. source duration or scene count) and
+  by `stall_seconds` without a heartbeat (the app counts any log line of the
+  job as one). An overdue stage is cancelled the same way and retried from
+  the last checkpoint up to `stage_retries` times, then the job fails. A
+  stage that doesn't stop within `abandon_seconds` of that is left to finish
+  on its own thread (its outcome ignored) and the pool gets a fresh worker.
+  Timeouts are listed in the job's `timeouts` (and its result).
 """
 import json
-import queue
+import os
 import threading
 import time
 from datetime import datetime
 from pathlib import Path
 
+from utils.cancellation import CancelToken, JobCancelled, cancel_scope
+from utils.fair_queue import FairQueue
+from utils.job_store import JobStore
 from utils.logger import setup_logger
 
 logger = setup_logger()
@@ -30,20 +65,121 @@ STATUS_QUEUED = "queued"
 STATUS_RUNNING = "running"
 STATUS_COMPLETED = "completed"
 STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUSES = (STATUS_QUEUED, STATUS_RUNNING, STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED)
+
+PRIORITY_URGENT = "urgent"
+PRIORITY_NORMAL = "normal"
+PRIORITY_BATCH = "batch"   # analysis (and optionally TTS) through the Batch API
+PRIORITIES = (PRIORITY_URGENT, PRIORITY_NORMAL, PRIORITY_BATCH)
+# Rank of each priority, most urgent first (lower runs sooner).
+PRIORITY_LEVELS = {priority: level for level, priority in enumerate(PRIORITIES)}
+
+DEFAULT_SUBMITTER = "anonymous"
+
+POOL_API = "api"      # network / quota bound: downloads, Gemini, YouTube
+POOL_CPU = "cpu"      # ffmpeg rendering and concatenation
+POOL_BATCH = "batch"  # api stages of batch-priority jobs
+DEFAULT_POOL_SIZES = {POOL_API: 1, POOL_CPU: 1, POOL_BATCH: 1}
+
+
+class StageTimeout(TimeoutError):
+    """A stage overran its deadline or stalled, and has no retries left."""
+
+
+class Stage:
+    """
+    One step of a job: run(job, context) on the named worker pool.
+
+    `deadline` is the most seconds the stage may run: a number, or
+    callable(job, context) -> seconds / None evaluated when the stage starts,
+    so it can scale with the input. None: no deadline.
+    """
+
+    def __init__(self, name, run, pool=POOL_API, label=None, deadline=None):
+        self.name = name
+        self.run = run
+        self.pool = pool
+        self.label = label or name.capitalize()
+        self.deadline = deadline
+
+    def deadline_for(self, job, context):
+        if callable(self.deadline):
+            return self.deadline(job, context)
+        return self.deadline
+
+
+class _StageRun:
+    """One attempt at a stage, as seen by the watchdog."""
+
+    def __init__(self, job, stage, pool, deadline):
+        self.job = job
+        self.stage = stage
+        self.pool = pool
+        self.deadline = deadline
+        self.token = CancelToken()  # cancelled by the job's token or the watchdog
+        self.started = self.last_progress = time.time()
+        self.timed_out = None       # why the watchdog stopped it
+        self.timed_out_at = None
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def overdue(self, now, stall_seconds):
+        if self.deadline and now - self.started > self.deadline:
+            return f"exceeded its {self.deadline:.0f}s deadline"
+        if stall_seconds and now - self.last_progress > stall_seconds:
+            return f"made no progress for {stall_seconds:.0f}s"
+        return None
+
+    def settle(self):
+        """Claim the attempt's outcome; False if the worker / watchdog already did."""
+        with self._lock:
+            if self._settled:
+                return False
+            self._settled = True
+            return True
+
+
+def _runner_stages(runner):
+    """Wrap a whole-job runner (callable(job) -> result) as a single stage."""
+    def run(job, context):
+        context["result"] = runner(job)
+    return [Stage("run", run, POOL_API, label="Starting")]
 
 
 class Job:
     def __init__(self, job_id, params):
         self.job_id = job_id
         self.params = params  # everything the runner needs (paths, script, flags)
+        self.priority = params.get("priority") or PRIORITY_NORMAL
+        self.submitter = params.get("submitter") or DEFAULT_SUBMITTER  # fair-share key
         self.status = STATUS_QUEUED
         self.stage = "Queued"
         self.error = None
-        self.result = None
+        self._result = None
+        self._result_loader = None  # callable() -> result, for jobs read back from the store
+        self.context = {}     # state shared by this job's stages
+        self.stage_index = 0  # next stage to run
+        self.sequence = 0     # submission order, for fair ordering within a pool
+        self.stage_seconds = {}
+        self.checkpoint = None  # JSON-safe context after the last completed stage
+        self.cancel_token = CancelToken()
+        self.timeouts = []      # watchdog events: stage, reason, after_seconds, action
         self.created_at = datetime.now().isoformat(timespec="seconds")
         self.started_at = None
         self.finished_at = None
 
+    @property
+    def result(self):
+        if self._result_loader is not None:
+            loader, self._result_loader = self._result_loader, None
+            self._result = loader()
+        return self._result
+
+    @result.setter
+    def result(self, value):
+        self._result, self._result_loader = value, None
+
     def set_stage(self, stage):
         self.stage = stage
 
@@ -52,116 +188,437 @@ class Job:
             "job_id": self.job_id,
             "session_id": self.job_id,
             "status": self.status,
+            "priority": self.priority,
             "stage": self.stage,
             "error": self.error,
             "created_at": self.created_at,
             "started_at": self.started_at,
             "finished_at": self.finished_at,
+            "stage_seconds": self.stage_seconds,
+            "timeouts": self.timeouts,
         }
         if include_result:
             data["result"] = self.result
         return data
 
+    def to_state(self):
+        """to_dict() plus what's needed to resume the job after a restart."""
+        data = self.to_dict()
+        data.update({
+            "params": self.params,
+            "sequence": self.sequence,
+            "stage_index": self.stage_index,
+            "checkpoint": self.checkpoint,
+        })
+        return data
+
+    @classmethod
+    def from_state(cls, data, job_id=None):
+        job = cls(data.get("job_id", job_id), params=data.get("params") or {})
+        job.status = data.get("status", STATUS_FAILED)
+        job.priority = data.get("priority") or PRIORITY_NORMAL
+        job.stage = data.get("stage", "")
+        job.error = data.get("error")
+        job.result = data.get("result")
+        job.created_at = data.get("created_at")
+        job.started_at = data.get("started_at")
+        job.finished_at = data.get("finished_at")
+        job.stage_seconds = data.get("stage_seconds") or {}
+        job.timeouts = data.get("timeouts") or []
+        job.sequence = data.get("sequence") or 0
+        job.stage_index = data.get("stage_index") or 0
+        job.checkpoint = data.get("checkpoint")
+        return job
+
 
 class JobManager:
     """
-    Single-worker FIFO job queue with disk persistence of terminal states.
+    Stage-aware job scheduler with checkpointed disk persistence: each stage
+    runs on its pool's workers, each job's stages run in order, and unfinished
+    jobs resume on startup.
     """
 
-    def __init__(self, runner, state_root, max_history=100):
+    def __init__(self, runner=None, state_root=".", stages=None, pool_sizes=None,
+                 checkpoint=None, restore=None, resume=True, store=None,
+                 aging_seconds=1800, priority_weights=None, on_cancel=None,
+                 stall_seconds=0, stage_retries=1, watchdog_interval_seconds=5,
+                 abandon_seconds=30, on_complete=None):
         """
         Args:
-            runner: callable(job) -> result dict. Raises on failure.
-            state_root: base directory containing per-session output dirs;
-                        job state is written to <state_root>/<job_id>/job.json
-            max_history: max finished jobs kept in memory (disk copies remain)
+            runner: callable(job) -> result dict, run as one stage. Raises on
+                    failure. Ignored when `stages` is given.
+            state_root: base directory containing per-session output dirs; the
+                        final record (with result) is written to
+                        <state_root>/<job_id>/job.json
+            stages: list of Stage. Each gets (job, context); a raise fails the
+                    job. The job result is context["result"] after the last stage.
+            pool_sizes: {pool name: worker threads}, merged over DEFAULT_POOL_SIZES
+            checkpoint: callable(context) -> JSON-safe dict, saved after each stage.
+                        Without it, interrupted jobs restart from the first stage.
+            restore: callable(job, checkpoint) -> context for a resumed job
+                     (default: the checkpoint dict itself)
+            resume: re-enqueue queued / interrupted jobs found in the store
+            store: JobStore (default: <state_root>/jobs.db)
+            aging_seconds: wait that lifts a queued stage one priority level
+            priority_weights: {priority: fair-share weight} (see FairQueue)
+            on_cancel: callable(job, context), run once a cancelled job has
+                       stopped (e.g. to delete its temp files)
+            stall_seconds: a running stage with no heartbeat() for this long is
+                           timed out (0 disables; deadlines are per Stage)
+            stage_retries: times a timed-out stage is retried before the job fails
+            watchdog_interval_seconds: how often running stages are checked
+            abandon_seconds: how long a timed-out stage gets to stop before its
+                             worker is replaced
+            on_complete: callable(job, context), run when a job completes, before
+                         its result is saved (e.g. to record how long it took)
         """
-        self._runner = runner
+        self._stages = list(stages) if stages else _runner_stages(runner)
+        self._checkpoint = checkpoint
+        self._restore = restore
+        self._on_cancel = on_cancel
+        self._on_complete = on_complete
+        self._stall_seconds = stall_seconds
+        self._stage_retries = max(stage_retries, 0)
+        self._abandon_seconds = abandon_seconds
+        self._running = {}       # job_id -> _StageRun
         self._state_root = Path(state_root)
-        self._max_history = max_history
-        self._jobs = {}          # job_id -> Job (insertion ordered)
-        self._pending = []       # job_ids in queue order (for position display)
+        self._store = store or JobStore(self._state_root / "jobs.db")
+        self._active = {}        # job_id -> Job, queued or running in this process
         self._lock = threading.Lock()
-        self._queue = queue.Queue()
-        self._worker = threading.Thread(
-            target=self._worker_loop, name="job-worker", daemon=True
-        )
-        self._worker.start()
+        resumed = [Job.from_state(row) for row in self._store.unfinished()] if resume else []
+        sizes = dict(DEFAULT_POOL_SIZES, **(pool_sizes or {}))
+        self._queues = {pool: FairQueue(aging_seconds, priority_weights) for pool in sizes}
+        self._workers = []
+        for pool, size in sizes.items():
+            for _ in range(max(int(size), 1)):
+                self._start_worker(pool)
+        threading.Thread(target=self._watchdog_loop, args=(watchdog_interval_seconds,),
+                         name="job-watchdog", daemon=True).start()
+        for job in resumed:
+            self._resume(job)
 
     # ---------------- public API ----------------
 
     def submit(self, job_id, params):
+        job = Job(job_id, params)
         with self._lock:
-            if job_id in self._jobs and self._jobs[job_id].status in (
-                STATUS_QUEUED, STATUS_RUNNING
-            ):
-                raise ValueError(f"Job {job_id} is already {self._jobs[job_id].status}")
-            job = Job(job_id, params)
-            self._jobs[job_id] = job
-            self._pending.append(job_id)
-            self._trim_history_locked()
-        self._queue.put(job)
+            # Raises ValueError if the id is already queued / running.
+            job.sequence = self._store.insert(job.to_state())
+            self._active[job_id] = job
+        self._enqueue(job)
         logger.info(f"Job {job_id} queued (position {self.queue_position(job_id)})")
         return job
 
     def get(self, job_id):
-        """Return a Job from memory, falling back to the on-disk record."""
+        """
+        Return a Job: the live object while it is queued / running here,
+        otherwise its stored record (result read from job.json on first access).
+        """
         with self._lock:
-            job = self._jobs.get(job_id)
+            job = self._active.get(job_id)
         if job:
             return job
-        return self._load_from_disk(job_id)
+        row = self._store.get(job_id)
+        if row is None:
+            return self._load_from_disk(job_id)  # finished before the store existed
+        job = Job.from_state(row)
+        job._result_loader = lambda: self._load_result(job_id)
+        return job
+
+    def list_jobs(self, status=None, priority=None, limit=50, offset=0):
+        """
+        Newest-first page of jobs without results.
+
+        Returns:
+            (list of job dicts, total matching jobs)
+        """
+        jobs, total = self._store.list(status=status, priority=priority, limit=limit, offset=offset)
+        with self._lock:
+            # Live jobs carry a fresher stage label than the last saved row.
+            return [self._active[j["job_id"]].to_dict(include_result=False)
+                    if j["job_id"] in self._active else
+                    dict(j, session_id=j["job_id"]) for j in jobs], total
+
+    def cancel(self, job_id, reason="Cancelled by user"):
+        """
+        Cancel a queued or running job. A waiting job is finished right away; a
+        running stage stops at its next cancellation point (sleep, ffmpeg
+        process, API call) and the job is then marked cancelled.
+
+        Returns:
+            the Job (still "running" until its stage has stopped), its stored
+            record if it already finished, or None if unknown
+        """
+        with self._lock:
+            job = self._active.get(job_id)
+        if job is None:
+            return self.get(job_id)
+        if job.cancel_token.cancelled:
+            return job
+        # Set first: cancelling can finish the job on its worker before cancel() returns.
+        job.stage = "Cancelling"
+        if not job.cancel_token.cancel(reason):
+            return job
+        logger.info(f"Job {job_id}: cancellation requested")
+        pool = self._queues[self._pool_for(job, self._stages[job.stage_index])]
+        if pool.remove(job_id):
+            self._finish(job, error=JobCancelled(reason))
+        return job
+
+    def heartbeat(self, job_id):
+        """Record progress of the job's running stage (resets its stall timer)."""
+        run = self._running.get(job_id)
+        if run is not None:
+            run.last_progress = time.time()
+
+    def active_jobs(self):
+        """Jobs queued or running in this process (live objects; don't modify)."""
+        with self._lock:
+            return list(self._active.values())
 
-    def list_jobs(self):
+    def backlog(self):
+        """Jobs not yet started (per priority) and jobs in progress, in this process."""
+        queued, running = {}, 0
         with self._lock:
-            return [j.to_dict(include_result=False) for j in self._jobs.values()]
+            for job in self._active.values():
+                if job.status == STATUS_QUEUED:
+                    queued[job.priority] = queued.get(job.priority, 0) + 1
+                else:
+                    running += 1
+        return {"queued": queued, "running": running}
 
     def queue_position(self, job_id):
-        """1-based position in the pending queue; 0 if not pending."""
+        """
+        1-based position in the order its pool will dispatch waiting work; 0 if
+        the job is not queued. Jobs queued by another process fall back to
+        their position in the store.
+        """
         with self._lock:
-            try:
-                return self._pending.index(job_id) + 1
-            except ValueError:
-                return 0
+            job = self._active.get(job_id)
+        if job is None:
+            return self._store.queue_position(job_id)
+        if job.status != STATUS_QUEUED:
+            return 0
+        return self._queues[self._pool_for(job, self._stages[job.stage_index])].position(job_id)
 
-    # ---------------- worker ----------------
+    # ---------------- workers ----------------
 
-    def _worker_loop(self):
-        while True:
-            job = self._queue.get()
-            with self._lock:
-                if job.job_id in self._pending:
-                    self._pending.remove(job.job_id)
+    def _pool_for(self, job, stage):
+        if job.priority == PRIORITY_BATCH and stage.pool == POOL_API and POOL_BATCH in self._queues:
+            return POOL_BATCH
+        return stage.pool if stage.pool in self._queues else POOL_API
+
+    def _enqueue(self, job):
+        """Queue the job's next stage on that stage's pool."""
+        stage = self._stages[job.stage_index]
+        if job.status == STATUS_RUNNING:
+            job.stage = f"Waiting: {stage.label}"
+        self._queues[self._pool_for(job, stage)].put(job)
+
+    def _start_worker(self, pool):
+        with self._lock:
+            index = sum(1 for worker in self._workers if worker.name.startswith(f"job-{pool}-")) + 1
+            worker = threading.Thread(target=self._worker_loop, args=(pool,),
+                                      name=f"job-{pool}-{index}", daemon=True)
+            self._workers.append(worker)
+        worker.start()
+
+    def _worker_loop(self, pool):
+        while self._run_stage(self._queues[pool].get()):
+            pass
+        # The watchdog gave up on this thread's stage and started a replacement.
+
+    def _run_stage(self, job):
+        """Run the job's next stage; False if the watchdog abandoned it meanwhile."""
+        stage = self._stages[job.stage_index]
+        if job.cancel_token.cancelled:
+            self._finish(job, error=JobCancelled(job.cancel_token.reason))
+            return True
+        if job.status == STATUS_QUEUED:
             job.status = STATUS_RUNNING
-            job.stage = "Starting"
             job.started_at = datetime.now().isoformat(timespec="seconds")
             logger.info(f"Job {job.job_id} started")
+        job.stage = stage.label
+        self._save(job)
+        try:
+            deadline = stage.deadline_for(job, job.context)
+        except Exception as exc:
+            logger.warning(f"Job {job.job_id}: no deadline for stage '{stage.name}' ({exc})")
+            deadline = None
+        run = _StageRun(job, stage, self._pool_for(job, stage), deadline)
+        unlink = job.cancel_token.on_cancel(run.token.cancel)
+        with self._lock:
+            self._running[job.job_id] = run
+        error = None
+        try:
+            with cancel_scope(run.token):
+                stage.run(job, job.context)
+        except (Exception, JobCancelled) as exc:
+            error = exc
+        finally:
+            unlink()
+            with self._lock:
+                if self._running.get(job.job_id) is run:
+                    del self._running[job.job_id]
+        if not run.settle():
+            return False
+        self._complete_stage(run, error)
+        return True
+
+    def _complete_stage(self, run, error):
+        job, stage = run.job, run.stage
+        job.stage_seconds[stage.name] = round(time.time() - run.started, 2)
+        if job.cancel_token.cancelled:
+            # Whatever the stage raised while being torn down, it was cancelled.
+            self._finish(job, error=JobCancelled(job.cancel_token.reason))
+        elif run.timed_out:
+            self._stage_timed_out(run)
+        elif error is not None:
+            self._finish(job, error=error)
+        else:
+            job.stage_index += 1
+            if job.stage_index >= len(self._stages):
+                self._finish(job)
+            else:
+                self._save_checkpoint(job)
+                self._enqueue(job)
+
+    def _stage_timed_out(self, run):
+        job, stage = run.job, run.stage
+        retries = sum(1 for event in job.timeouts
+                      if event["stage"] == stage.name and event["action"] == "retried")
+        retry = retries < self._stage_retries
+        job.timeouts.append({
+            "stage": stage.name,
+            "reason": run.timed_out,
+            "after_seconds": round(run.timed_out_at - run.started, 1),
+            "action": "retried" if retry else "failed",
+            "at": datetime.now().isoformat(timespec="seconds"),
+        })
+        message = f"Stage '{stage.name}' {run.timed_out}"
+        if not retry:
+            self._finish(job, error=StageTimeout(message))
+            return
+        logger.warning(f"Job {job.job_id}: {message}; retrying it")
+        try:
+            job.context = self._stage_context(job)
+        except Exception as exc:
+            self._finish(job, error=StageTimeout(f"{message}; could not retry it: {exc}"))
+            return
+        self._save(job)
+        self._enqueue(job)
+
+    def _stage_context(self, job):
+        """Context as of the last completed stage, for a retried stage."""
+        if job.stage_index == 0:
+            return {}
+        if job.checkpoint is None:
+            return job.context  # not checkpointable: reuse the context as is
+        if self._restore is not None:
+            return self._restore(job, job.checkpoint)
+        return dict(job.checkpoint)
+
+    # ---------------- watchdog ----------------
+
+    def _watchdog_loop(self, interval):
+        while True:
+            time.sleep(interval)
             try:
-                job.result = self._runner(job)
-                job.status = STATUS_COMPLETED
-                job.stage = "Complete"
-                logger.info(f"Job {job.job_id} completed")
+                self._check_stages()
             except Exception as exc:
-                job.status = STATUS_FAILED
-                job.error = str(exc)
-                job.stage = "Failed"
-                logger.error(f"Job {job.job_id} failed: {exc}", exc_info=True)
-            finally:
-                job.finished_at = datetime.now().isoformat(timespec="seconds")
-                self._persist(job)
-                self._queue.task_done()
+                logger.warning(f"Job watchdog check failed: {exc}")
+
+    def _check_stages(self):
+        now = time.time()
+        with self._lock:
+            runs = list(self._running.values())
+        for run in runs:
+            if run.timed_out is None:
+                reason = run.overdue(now, self._stall_seconds)
+                if reason:
+                    logger.warning(f"Job {run.job.job_id}: stage '{run.stage.name}' {reason}; stopping it")
+                    run.timed_out, run.timed_out_at = reason, now
+                    run.token.cancel(f"Stage '{run.stage.name}' {reason}")
+            elif now - run.timed_out_at >= self._abandon_seconds and run.settle():
+                # Stuck somewhere cancellation can't reach: move the job on and
+                # give the pool a fresh worker; the old thread exits when (if)
+                # the stage ever returns.
+                logger.error(f"Job {run.job.job_id}: stage '{run.stage.name}' did not stop "
+                             f"{self._abandon_seconds}s after timing out; abandoning its worker")
+                with self._lock:
+                    if self._running.get(run.job.job_id) is run:
+                        del self._running[run.job.job_id]
+                self._start_worker(run.pool)
+                self._complete_stage(run, None)
+
+    def _save_checkpoint(self, job):
+        if self._checkpoint is not None:
+            try:
+                job.checkpoint = self._checkpoint(job.context)
+            except Exception as exc:
+                # Still resumable, just from the first stage.
+                logger.warning(f"Could not checkpoint job {job.job_id}: {exc}")
+                job.checkpoint = None
+        self._save(job)
+
+    def _finish(self, job, error=None):
+        if error is None:
+            job.result = job.context.get("result")
+            if job.timeouts and isinstance(job.result, dict):
+                job.result["timeouts"] = job.timeouts
+            job.status = STATUS_COMPLETED
+            job.stage = "Complete"
+            logger.info(f"Job {job.job_id} completed")
+            if self._on_complete is not None:
+                try:
+                    self._on_complete(job, job.context)
+                except Exception as exc:
+                    logger.warning(f"Job {job.job_id}: completion hook failed: {exc}")
+        elif isinstance(error, JobCancelled):
+            job.status = STATUS_CANCELLED
+            job.error = str(error) or "Cancelled"
+            job.stage = "Cancelled"
+            logger.info(f"Job {job.job_id} cancelled")
+            if self._on_cancel is not None:
+                try:
+                    self._on_cancel(job, job.context)
+                except Exception as exc:
+                    logger.warning(f"Could not release job {job.job_id}: {exc}")
+        else:
+            job.status = STATUS_FAILED
+            job.error = str(error)
+            job.stage = "Failed"
+            logger.error(f"Job {job.job_id} failed: {error}", exc_info=error)
+        job.context = {}  # drop services / large intermediates
+        job.checkpoint = None
+        job.finished_at = datetime.now().isoformat(timespec="seconds")
+        self._persist(job)
+        self._save(job)
+        with self._lock:
+            self._active.pop(job.job_id, None)
 
     # ---------------- persistence ----------------
 
     def _job_file(self, job_id):
         return self._state_root / job_id / "job.json"
 
+    def _save(self, job):
+        try:
+            self._store.save(job.to_state())
+        except Exception as exc:
+            logger.warning(f"Could not save job {job.job_id}: {exc}")
+
     def _persist(self, job):
+        """Write the final job.json (with result) atomically."""
         try:
             path = self._job_file(job.job_id)
             path.parent.mkdir(parents=True, exist_ok=True)
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(job.to_dict(), f, indent=2, default=str)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.to_state(), f, indent=2, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
         except Exception as exc:
             logger.warning(f"Could not persist job {job.job_id}: {exc}")
 
@@ -171,25 +628,35 @@ class JobManager:
             return None
         try:
             with open(path, encoding="utf-8") as f:
-                data = json.load(f)
-            job = Job(data.get("job_id", job_id), params={})
-            job.status = data.get("status", STATUS_FAILED)
-            job.stage = data.get("stage", "")
-            job.error = data.get("error")
-            job.result = data.get("result")
-            job.created_at = data.get("created_at")
-            job.started_at = data.get("started_at")
-            job.finished_at = data.get("finished_at")
-            return job
+                return Job.from_state(json.load(f), job_id)
         except Exception as exc:
             logger.warning(f"Could not load job {job_id} from disk: {exc}")
             return None
 
-    def _trim_history_locked(self):
-        finished = [
-            jid for jid, j in self._jobs.items()
-            if j.status in (STATUS_COMPLETED, STATUS_FAILED)
-        ]
-        overflow = len(self._jobs) - self._max_history
-        for jid in finished[:max(0, overflow)]:
-            del self._jobs[jid]
+    def _load_result(self, job_id):
+        job = self._load_from_disk(job_id)
+        return job.result if job else None
+
+    # ---------------- resume ----------------
+
+    def _resume(self, job):
+        if job.status == STATUS_RUNNING and job.stage_index < len(self._stages):
+            try:
+                if job.stage_index and job.checkpoint is not None:
+                    job.context = (self._restore(job, job.checkpoint) if self._restore
+                                   else dict(job.checkpoint))
+                else:
+                    job.stage_index, job.context = 0, {}
+            except Exception as exc:
+                logger.warning(f"Job {job.job_id}: checkpoint unusable ({exc}); restarting it")
+                job.stage_index, job.context = 0, {}
+            logger.info(f"Job {job.job_id} resumed at stage "
+                        f"'{self._stages[job.stage_index].name}'")
+        else:
+            job.status, job.stage_index, job.context = STATUS_QUEUED, 0, {}
+            job.stage = "Queued"
+            logger.info(f"Job {job.job_id} re-queued after restart")
+        with self._lock:
+            self._active[job.job_id] = job
+        self._save(job)
+        self._enqueue(job)
@@ -0,0 +1,211 @@
+"""
+SQLite job store: the durable record of every job.
+
+Why: job state used to live in an in-memory dict (trimmed to the last 100 jobs)
+plus one job.json per output dir. Listing meant "whatever is still in memory",
+queue position was a linear scan and resuming after a restart meant globbing
+every output dir. Here one table holds each job's state, params and stage
+checkpoint, with indexes for the queries the app makes:
+
+- queue position: count of queued jobs in the same lane with a lower sequence
+  (index on status, priority, sequence),
+- paginated listing, optionally filtered by status / priority, newest first,
+- unfinished jobs to resume on startup.
+
+Full results stay in outputs/<job_id>/job.json and are only read when a single
+job is requested (JobManager loads them lazily).
+
+The database runs in WAL mode with a busy timeout, and every thread gets its
+own connection, so request threads, job workers and other processes (a second
+server reading status, a CLI) can read while a job is being written. Only one
+process should run the job workers against a given database.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id        TEXT PRIMARY KEY,
+    sequence      INTEGER NOT NULL,
+    status        TEXT NOT NULL,
+    priority      TEXT NOT NULL,
+    stage         TEXT,
+    stage_index   INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    created_at    TEXT,
+    started_at    TEXT,
+    finished_at   TEXT,
+    updated_at    REAL,
+    stage_seconds TEXT,
+    params        TEXT,
+    checkpoint    TEXT,
+    timeouts      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, sequence);
+CREATE INDEX IF NOT EXISTS idx_jobs_sequence ON jobs (sequence);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (status, finished_at);
+"""
+
+# Columns stored as JSON text.
+_JSON_COLUMNS = ("stage_seconds", "params", "checkpoint", "timeouts")
+# Columns added after the first release: (name, type), added to older databases.
+_ADDED_COLUMNS = (("timeouts", "TEXT"),)
+_ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobStore:
+    def __init__(self, path, busy_timeout_seconds=30):
+        """
+        Args:
+            path: SQLite database file (created with its schema if missing)
+            busy_timeout_seconds: how long a write waits for another writer's lock
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout_seconds = busy_timeout_seconds
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in _ADDED_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; multi-statement writes open their own transaction.
+            conn = sqlite3.connect(str(self.path), timeout=self.busy_timeout_seconds,
+                                   isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        data = dict(row)
+        for column in _JSON_COLUMNS:
+            data[column] = json.loads(data[column]) if data[column] else None
+        return data
+
+    @staticmethod
+    def _values(state):
+        return {
+            "job_id": state["job_id"],
+            "status": state["status"],
+            "priority": state["priority"],
+            "stage": state.get("stage"),
+            "stage_index": state.get("stage_index") or 0,
+            "error": state.get("error"),
+            "created_at": state.get("created_at"),
+            "started_at": state.get("started_at"),
+            "finished_at": state.get("finished_at"),
+            "updated_at": time.time(),
+            **{column: json.dumps(state.get(column), default=str)
+               if state.get(column) is not None else None
+               for column in _JSON_COLUMNS},
+        }
+
+    # ---------------- writes ----------------
+
+    def insert(self, state):
+        """
+        Add a new job (or replace a finished one with the same id) and return
+        its sequence number. Raises ValueError if the id is queued or running.
+        """
+        conn = self._conn()
+        values = self._values(state)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute("SELECT status FROM jobs WHERE job_id = ?",
+                                    (state["job_id"],)).fetchone()
+            if existing and existing["status"] in _ACTIVE_STATUSES:
+                raise ValueError(f"Job {state['job_id']} is already {existing['status']}")
+            values["sequence"] = conn.execute(
+                "SELECT COALESCE(MAX(sequence), 0) + 1 FROM jobs").fetchone()[0]
+            columns = ", ".join(values)
+            conn.execute(f"INSERT OR REPLACE INTO jobs ({columns}) VALUES "
+                         f"({', '.join(':' + column for column in values)})", values)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return values["sequence"]
+
+    def save(self, state):
+        """Update a job's mutable fields (status, stage, checkpoint, ...)."""
+        values = self._values(state)
+        assignments = ", ".join(f"{column} = :{column}" for column in values if column != "job_id")
+        self._conn().execute(f"UPDATE jobs SET {assignments} WHERE job_id = :job_id", values)
+
+    # ---------------- reads ----------------
+
+    def get(self, job_id):
+        return self._row(self._conn().execute(
+            "SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+    def queue_position(self, job_id):
+        """1-based position among queued jobs of the same priority; 0 if not queued."""
+        conn = self._conn()
+        row = conn.execute("SELECT status, priority, sequence FROM jobs WHERE job_id = ?",
+                           (job_id,)).fetchone()
+        if row is None or row["status"] != "queued":
+            return 0
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND priority = ? AND sequence <= ?",
+            (row["priority"], row["sequence"]),
+        ).fetchone()[0]
+
+    def list(self, status=None, priority=None, limit=50, offset=0):
+        """
+        Newest-first page of jobs (without params / checkpoint).
+
+        Returns:
+            (list of job dicts, total matching jobs)
+        """
+        where, args = [], []
+        if status:
+            where.append(f"status IN ({', '.join('?' for _ in status)})")
+            args.extend(status)
+        if priority:
+            where.append("priority = ?")
+            args.append(priority)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM jobs {clause}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT job_id, sequence, status, priority, stage, error, created_at, started_at, "
+            f"finished_at, stage_seconds FROM jobs {clause} ORDER BY sequence DESC LIMIT ? OFFSET ?",
+            args + [int(limit), int(offset)],
+        ).fetchall()
+        jobs = []
+        for row in rows:
+            data = dict(row)
+            data["stage_seconds"] = json.loads(data["stage_seconds"]) if data["stage_seconds"] else {}
+            jobs.append(data)
+        return jobs, total
+
+    def unfinished(self):
+        """Queued / running jobs, oldest first (to resume after a restart)."""
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY sequence"
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
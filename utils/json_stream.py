@@ -0,0 +1,81 @@
+"""
+Incremental JSON parsing for streamed Gemini replies.
+
+Why: with a streamed analysis reply the first scenes arrive long before the
+model has written the last one. SceneStreamParser is fed text fragments as
+they arrive and returns each scene object as soon as its closing brace is seen,
+so downstream work (narration TTS) can start while the model is still writing.
+
+It tracks only what it needs: string/escape state and the stack of open
+containers. An object is emitted when it is a direct element of the array that
+sits directly inside the top-level object, i.e. `{"scenes": [ {...}, {...} ]}`.
+Text outside the top-level object (markdown fences, chatter) is ignored.
+"""
+import json
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class SceneStreamParser:
+    def __init__(self):
+        self._buffer = []          # characters of the scene object being captured
+        self._stack = []           # open containers: '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._capturing = False
+        self.emitted = 0
+
+    def feed(self, fragment):
+        """
+        Consume a text fragment.
+
+        Returns:
+            List of scene dicts completed within this fragment (may be empty).
+        """
+        completed = []
+        for ch in fragment or "":
+            if self._capturing:
+                self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+                continue
+
+            if ch in "{[":
+                if ch == "{" and self._stack == ["{", "["]:
+                    self._capturing = True
+                    self._buffer = [ch]
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if ch == "}" and self._capturing and self._stack == ["{", "["]:
+                    self._capturing = False
+                    scene = self._decode("".join(self._buffer))
+                    self._buffer = []
+                    if scene is not None:
+                        self.emitted += 1
+                        completed.append(scene)
+        return completed
+
+    @staticmethod
+    def _decode(text):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as exc:
+            logger.debug(f"Skipping undecodable streamed object: {exc}")
+            return None
+        return value if isinstance(value, dict) else None
@@ -0,0 +1,302 @@
+"""
+Pool of Gemini API keys with per-key rate-limiter state.
+
+Why: a single key means a single quota. When the TTS daily limit runs out every
+remaining scene is skipped, and analysis calls queue behind one key's pacing
+delay. With several keys (each from its own project) throughput scales with the
+number of keys instead of stalling on the first exhausted one.
+
+Each key keeps its own:
+- minimum spacing between calls (the old per-client `delay_seconds` pacing),
+- optional requests-per-minute window,
+- retirement deadline (set when a PER-DAY 429 arrives; the key is skipped until
+  the daily quota window resets),
+- usage counters, reported via `stats()` and included in job results,
+- calls made in the current daily quota window, so `remaining_today()` can
+  tell admission control how much of a known daily limit is left.
+
+`acquire()` routes each call to the active key with the most headroom (the one
+whose next free slot comes soonest, ties broken by recent load) and sleeps only
+as long as that key needs. `acquire_async()` books slots from the same state but
+awaits instead of sleeping, so threaded and asyncio callers share one budget.
+"""
+import asyncio
+import collections
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils import cancellation
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Gemini per-day quotas reset at midnight Pacific time.
+_QUOTA_RESET_TZ = "America/Los_Angeles"
+_FALLBACK_RETIRE_SECONDS = 24 * 3600
+
+
+class KeyPoolExhausted(RuntimeError):
+    """Raised when every key in the pool is retired for the current quota window."""
+
+
+def is_daily_quota_exhausted(exc):
+    """
+    True if a 429 is a PER-DAY quota (e.g. free tier's 10 TTS requests/day).
+    These won't clear for hours, so retrying on the same key is pointless — the
+    key is retired and the call moves to another key (or is skipped fast).
+    """
+    text = str(exc)
+    return "PerDay" in text or "RequestsPerDay" in text
+
+
+def _mask_key(key):
+    """Short, log-safe label for a key (never log full keys)."""
+    if not key:
+        return "<none>"
+    return f"{key[:4]}…{key[-4:]}" if len(key) > 10 else f"{key[:2]}…"
+
+
+def _seconds_until_quota_reset(now=None):
+    """Seconds until the next midnight in the quota reset timezone."""
+    try:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(_QUOTA_RESET_TZ)
+    except Exception:
+        return _FALLBACK_RETIRE_SECONDS
+    current = datetime.fromtimestamp(now or time.time(), tz)
+    midnight = (current + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max((midnight - current).total_seconds(), 60.0)
+
+
+class PooledKey:
+    """One key, its client, and its rate-limiter state. Mutated under the pool lock."""
+
+    def __init__(self, key, client, index):
+        self.key = key
+        self.client = client
+        self.index = index
+        self.label = f"key{index + 1}({_mask_key(key)})"
+        self.last_call_time = 0.0
+        self.recent_calls = collections.deque()  # call timestamps within the RPM window
+        self.retired_until = 0.0
+        self.day_calls = 0          # calls in the current daily quota window
+        self.day_ends = 0.0         # when that window resets
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.retirements = 0
+
+    def is_retired(self, now):
+        return self.retired_until > now
+
+    def to_dict(self, now):
+        return {
+            "key": self.label,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "retired": self.is_retired(now),
+            "retired_for_seconds": round(max(self.retired_until - now, 0.0)),
+        }
+
+
+class ApiKeyPool:
+    """
+    Thread-safe key router. Callers do:
+
+        key = pool.acquire()          # waits for the key with the most headroom
+        key.client.models.generate_content(...)
+        pool.record_success(key)      # or record_failure / retire
+    """
+
+    def __init__(self, keys, client_factory, min_interval_seconds=0,
+                 rpm_limit=0, name="gemini", daily_limit=0):
+        """
+        Args:
+            keys: list of API keys (duplicates and blanks are ignored)
+            client_factory: callable(api_key) -> SDK client for that key
+            min_interval_seconds: minimum spacing between calls on the SAME key
+            rpm_limit: optional requests-per-minute cap per key (0 disables)
+            name: label used in log lines ("analysis", "tts", ...)
+            daily_limit: requests per key per day, if known (0: unknown); only
+                         reported by remaining_today(), calls are not refused
+        """
+        unique = []
+        for key in keys or []:
+            key = (key or "").strip()
+            if key and key not in unique:
+                unique.append(key)
+        if not unique:
+            # Keep behavior of the single-key setup: a client is still built so
+            # the SDK raises its own clear "missing API key" error on first use.
+            unique = [None]
+        self.name = name
+        self.min_interval_seconds = max(min_interval_seconds or 0, 0)
+        self.rpm_limit = max(rpm_limit or 0, 0)
+        self.daily_limit = max(daily_limit or 0, 0)
+        self._lock = threading.Lock()
+        self._keys = [PooledKey(k, client_factory(k), i) for i, k in enumerate(unique)]
+        logger.info(f"API key pool '{name}': {len(self._keys)} key(s), "
+                    f"{self.min_interval_seconds}s spacing per key"
+                    + (f", {self.rpm_limit} RPM per key" if self.rpm_limit else ""))
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def primary(self):
+        """The first key (used for calls that must stay on one project)."""
+        return self._keys[0]
+
+    # ---------------- routing ----------------
+
+    def _next_slot_locked(self, pooled, now):
+        """Earliest time this key may be called without breaking its limits."""
+        slot = now
+        if self.min_interval_seconds and pooled.last_call_time:
+            slot = max(slot, pooled.last_call_time + self.min_interval_seconds)
+        while pooled.recent_calls and pooled.recent_calls[0] <= now - 60:
+            pooled.recent_calls.popleft()
+        if self.rpm_limit and len(pooled.recent_calls) >= self.rpm_limit:
+            slot = max(slot, pooled.recent_calls[0] + 60)
+        return slot
+
+    def _reserve_locked(self, pooled, slot):
+        pooled.last_call_time = slot
+        pooled.recent_calls.append(slot)
+        pooled.calls += 1
+        if slot >= pooled.day_ends:
+            pooled.day_calls = 0
+            pooled.day_ends = slot + _seconds_until_quota_reset(slot)
+        pooled.day_calls += 1
+
+    def active_count(self):
+        now = time.time()
+        with self._lock:
+            return sum(1 for k in self._keys if not k.is_retired(now))
+
+    def reserve(self, prefer=None):
+        """
+        Reserve the next call slot without waiting for it.
+
+        Args:
+            prefer: a PooledKey to stick to when it is still active (e.g. the key
+                    that uploaded a file — uploaded files belong to one project).
+
+        Returns:
+            (PooledKey, seconds until the reserved slot)
+
+        Raises:
+            KeyPoolExhausted: every key is retired for the current quota window.
+        """
+        now = time.time()
+        with self._lock:
+            active = [k for k in self._keys if not k.is_retired(now)]
+            if not active:
+                soonest = min(k.retired_until for k in self._keys)
+                raise KeyPoolExhausted(
+                    f"All {len(self._keys)} '{self.name}' API key(s) have exhausted their "
+                    f"daily quota (next reset in ~{(soonest - now) / 3600:.1f}h)."
+                )
+            if prefer is not None and prefer in active:
+                chosen = prefer
+            else:
+                chosen = min(
+                    active,
+                    key=lambda k: (self._next_slot_locked(k, now), len(k.recent_calls), k.calls),
+                )
+            slot = self._next_slot_locked(chosen, now)
+            self._reserve_locked(chosen, slot)
+        return chosen, slot - now
+
+    def acquire(self, prefer=None):
+        """
+        Reserve the next call slot and return the PooledKey to use, sleeping
+        until that slot arrives (see reserve()).
+        """
+        chosen, wait = self.reserve(prefer=prefer)
+        if wait > 0:
+            logger.info(f"⏳ Rate limit ({self.name}): waiting {wait:.0f}s for {chosen.label}...")
+            cancellation.sleep(wait)
+        return chosen
+
+    async def acquire_async(self, prefer=None):
+        """acquire() for coroutines: awaits the slot instead of blocking a thread."""
+        chosen, wait = self.reserve(prefer=prefer)
+        if wait > 0:
+            logger.info(f"⏳ Rate limit ({self.name}): waiting {wait:.0f}s for {chosen.label}...")
+            await asyncio.sleep(wait)
+        return chosen
+
+    def try_acquire(self, pooled):
+        """
+        Reserve a slot on `pooled` only if one is free RIGHT NOW (no waiting).
+        Used for optional extra calls that must not eat into the pacing budget.
+        """
+        now = time.time()
+        with self._lock:
+            if pooled.is_retired(now) or self._next_slot_locked(pooled, now) > now:
+                return False
+            self._reserve_locked(pooled, now)
+            return True
+
+    # ---------------- outcomes ----------------
+
+    def record_success(self, pooled):
+        with self._lock:
+            pooled.successes += 1
+
+    def record_failure(self, pooled, rate_limited=False):
+        with self._lock:
+            pooled.failures += 1
+            if rate_limited:
+                pooled.rate_limited += 1
+
+    def retire(self, pooled, seconds=None):
+        """
+        Take a key out of rotation until its daily quota window resets.
+
+        Returns:
+            True if other keys are still active.
+        """
+        seconds = seconds if seconds is not None else _seconds_until_quota_reset()
+        with self._lock:
+            pooled.retired_until = time.time() + seconds
+            pooled.retirements += 1
+            remaining = sum(1 for k in self._keys if not k.is_retired(time.time()))
+        logger.warning(f"API key pool '{self.name}': {pooled.label} retired for "
+                       f"{seconds / 3600:.1f}h (daily quota). {remaining} key(s) still active.")
+        return remaining > 0
+
+    def remaining_today(self):
+        """
+        Calls left in the current daily quota window across active keys.
+
+        Returns:
+            (remaining calls or None if the daily limit is unknown, seconds
+             until more quota becomes available)
+        """
+        now = time.time()
+        with self._lock:
+            active = [k for k in self._keys if not k.is_retired(now)]
+            if not active:
+                return 0, min(k.retired_until for k in self._keys) - now
+            resets_in = _seconds_until_quota_reset(now)
+            if not self.daily_limit:
+                return None, resets_in
+            remaining = sum(self.daily_limit - (k.day_calls if k.day_ends > now else 0)
+                            for k in active)
+            return max(remaining, 0), resets_in
+
+    def stats(self):
+        """Per-key usage snapshot (safe to embed in job results)."""
+        now = time.time()
+        with self._lock:
+            return {
+                "pool": self.name,
+                "active_keys": sum(1 for k in self._keys if not k.is_retired(now)),
+                "keys": [k.to_dict(now) for k in self._keys],
+            }
@@ -0,0 +1,55 @@
+"""
+Rolling latency statistics for API calls.
+
+Keeps the most recent N observations and answers percentile queries, so
+callers can learn what "slow" means for the current model/tier (e.g. to decide
+when to hedge a request) and report p50/p95/p99 in job results.
+"""
+import collections
+import math
+import threading
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def latency_summary(values):
+    """Count and p50/p95/p99 (seconds, rounded) for a list of latencies."""
+    def rounded(pct):
+        value = percentile(values, pct)
+        return round(value, 2) if value is not None else None
+    return {
+        "count": len(values),
+        "p50": rounded(50),
+        "p95": rounded(95),
+        "p99": rounded(99),
+    }
+
+
+class LatencyTracker:
+    def __init__(self, max_samples=100):
+        self._samples = collections.deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(float(seconds))
+
+    @property
+    def count(self):
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, pct):
+        with self._lock:
+            return percentile(list(self._samples), pct)
+
+    def summary(self):
+        with self._lock:
+            return latency_summary(list(self._samples))
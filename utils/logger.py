@@ -67,6 +67,9 @@ class SessionLogBroadcaster:
 
 _broadcaster = SessionLogBroadcaster()
 
+# callables(session_id) told about every session log line (e.g. job heartbeats).
+_activity_hooks = []
+
 
 class BroadcastLogHandler(logging.Handler):
     """Custom handler that pushes formatted log lines to the broadcaster."""
@@ -85,6 +88,20 @@ class BroadcastLogHandler(logging.Handler):
             self.handleError(record)
 
 
+class ActivityHandler(logging.Handler):
+    """Report every session-tagged record (any level) to the activity hooks."""
+
+    def emit(self, record):
+        session_id = getattr(record, "session_id", None)
+        if not session_id:
+            return
+        for hook in list(_activity_hooks):
+            try:
+                hook(session_id)
+            except Exception:
+                self.handleError(record)
+
+
 def set_session_context(session_id: Optional[str]):
     """Set the active session id for downstream log entries."""
     _session_context.set(session_id)
@@ -105,6 +122,11 @@ def unregister_log_listener(listener):
     _broadcaster.unregister_listener(listener)
 
 
+def register_activity_hook(hook):
+    """Call hook(session_id) whenever a log line is written for a session."""
+    _activity_hooks.append(hook)
+
+
 def setup_logger(name="VideoAutomation", log_file=None):
     """
     Set up and return a logger with file, console, and broadcast handlers.
@@ -139,4 +161,8 @@ def setup_logger(name="VideoAutomation", log_file=None):
     broadcast_handler.setFormatter(formatter)
     logger.addHandler(broadcast_handler)
 
+    activity_handler = ActivityHandler()
+    activity_handler.setLevel(logging.DEBUG)
+    logger.addHandler(activity_handler)
+
     return logger
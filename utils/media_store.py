@@ -0,0 +1,279 @@
+"""
+Content-addressed store for source videos and what is derived from them.
+
+Why: the same movie is often submitted several times (other instructions, a
+retry). Each job kept its own copy under temp/<sid>/ (Drive URLs were
+downloaded again) and deleted it when done, and the shot index, the analysis
+proxy and the probed duration were all recomputed. Sources now live once in
+the store, keyed by SHA-256:
+
+    <root>/<sha256>/source.<ext>     the video
+    <root>/<sha256>/<attachment>     derived files (shot index, proxies, ...)
+    <root>/index.json                items, Drive file ids, refs, last use
+
+- `put()` moves a file in (or drops it, if the content is already stored);
+  Drive downloads are also indexed by Drive file id, so a repeated URL
+  needs no download at all.
+- `link()` hard-links the stored file into a job's session dir (a copy when
+  hard links aren't possible) and records the job as a reference. Deleting
+  the session dir only removes the link.
+- Attachments and small metadata (e.g. the probed duration) sit next to the
+  item, so later jobs on the same source reuse them.
+- Items count against `quota_bytes`. Past it, the least recently used items
+  without a live reference are evicted. References of jobs that are no
+  longer active (per `is_active`) are dropped first, so a crashed or failed
+  job can't pin an item forever.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+_INDEX_FILE = "index.json"
+_HASH_BLOCK = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _link_or_copy(source, target):
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists():
+        if os.path.samefile(source, target):
+            return target
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError as exc:
+        logger.warning(f"Could not hard-link {source} ({exc}); copying it instead")
+        shutil.copy2(source, target)
+    return target
+
+
+class MediaStore:
+    def __init__(self, root, quota_bytes=0, is_active=None):
+        """
+        Args:
+            root: store directory
+            quota_bytes: total size above which unreferenced items are evicted
+                         (0: no limit)
+            is_active: callable(job_id) -> bool; references of inactive jobs
+                       are dropped before eviction (None: references are kept
+                       until release())
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quota_bytes = quota_bytes
+        self._is_active = is_active
+        self._lock = threading.RLock()
+        self._index = self._load()
+
+    # ---------------- index ----------------
+
+    def _load(self):
+        path = self.root / _INDEX_FILE
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    index = json.load(f)
+                # Items whose directory is gone (deleted by hand) are forgotten.
+                index["items"] = {sha: item for sha, item in index.get("items", {}).items()
+                                  if (self.root / sha / item["filename"]).exists()}
+                index["drive"] = {file_id: sha for file_id, sha in index.get("drive", {}).items()
+                                  if sha in index["items"]}
+                return index
+            except Exception as exc:
+                logger.warning(f"Media store index unreadable ({exc}); starting empty")
+        return {"items": {}, "drive": {}}
+
+    def _save_locked(self):
+        path = self.root / _INDEX_FILE
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, path)
+
+    def _item(self, sha256):
+        item = self._index["items"].get(sha256)
+        if item is None:
+            raise KeyError(f"No stored media {sha256}")
+        return item
+
+    def path(self, sha256):
+        with self._lock:
+            return self.root / sha256 / self._item(sha256)["filename"]
+
+    def __contains__(self, sha256):
+        with self._lock:
+            return sha256 in self._index["items"]
+
+    # ---------------- sources ----------------
+
+    def put(self, path, sha256=None, drive_id=None, job_id=None):
+        """
+        Move `path` into the store (hashing it unless `sha256` is given) and
+        return its hash. If the content is already stored, `path` is deleted
+        instead (unless it already is a link to the stored file). A `job_id`
+        is recorded as a reference at once, so the item can't be evicted
+        before the job links it.
+        """
+        path = Path(path)
+        sha256 = sha256 or file_sha256(path)
+        with self._lock:
+            item = self._index["items"].get(sha256)
+            if item is None:
+                directory = self.root / sha256
+                directory.mkdir(parents=True, exist_ok=True)
+                filename = "source" + path.suffix.lower()
+                shutil.move(str(path), str(directory / filename))
+                item = self._index["items"][sha256] = {
+                    "filename": filename,
+                    "created_at": time.time(),
+                    "last_used": time.time(),
+                    "refs": [],
+                    "attachments": [],
+                    "meta": {},
+                }
+                logger.info(f"Media store: added {sha256[:12]}… ({path.name})")
+            else:
+                stored = self.root / sha256 / item["filename"]
+                if not os.path.samefile(path, stored):
+                    path.unlink()
+                    logger.info(f"Media store: {path.name} is already stored as {sha256[:12]}…")
+                item["last_used"] = time.time()
+            if job_id and job_id not in item["refs"]:
+                item["refs"].append(job_id)
+            if drive_id:
+                self._index["drive"][drive_id] = sha256
+            self._save_locked()
+        self.evict(keep=sha256)
+        return sha256
+
+    def lookup_drive(self, drive_id):
+        """Hash of the stored copy of a Drive file, or None."""
+        with self._lock:
+            return self._index["drive"].get(drive_id)
+
+    def link(self, sha256, job_id, target):
+        """Hard-link the stored source to `target` for `job_id` (a reference until release())."""
+        with self._lock:
+            item = self._item(sha256)
+            if job_id not in item["refs"]:
+                item["refs"].append(job_id)
+            item["last_used"] = time.time()
+            self._save_locked()
+            source = self.root / sha256 / item["filename"]
+        return _link_or_copy(source, target)
+
+    def release(self, job_id):
+        """Drop a job's references (its links stay valid until deleted), then evict."""
+        with self._lock:
+            for item in self._index["items"].values():
+                if job_id in item["refs"]:
+                    item["refs"].remove(job_id)
+            self._save_locked()
+        self.evict()
+
+    # ---------------- attachments ----------------
+
+    def attachment(self, sha256, name):
+        """Path of a stored attachment, or None."""
+        with self._lock:
+            item = self._index["items"].get(sha256)
+            if item is None or name not in item["attachments"]:
+                return None
+            return self.root / sha256 / name
+
+    def link_attachment(self, sha256, name, target):
+        """Hard-link a stored attachment to `target`; returns `target`, or None if there is none."""
+        with self._lock:
+            source = self.attachment(sha256, name)
+            if source is None:
+                return None
+            self._index["items"][sha256]["last_used"] = time.time()
+            self._save_locked()
+        return _link_or_copy(source, target)
+
+    def attach(self, sha256, name, path):
+        """Keep a derived file with the item (hard-linked from `path`)."""
+        with self._lock:
+            item = self._item(sha256)
+            _link_or_copy(path, self.root / sha256 / name)
+            if name not in item["attachments"]:
+                item["attachments"].append(name)
+            self._save_locked()
+        self.evict(keep=sha256)
+
+    def get_meta(self, sha256, key, default=None):
+        with self._lock:
+            item = self._index["items"].get(sha256)
+            return item["meta"].get(key, default) if item else default
+
+    def set_meta(self, sha256, key, value):
+        with self._lock:
+            self._item(sha256)["meta"][key] = value
+            self._save_locked()
+
+    # ---------------- quota ----------------
+
+    def _size_locked(self, sha256):
+        item = self._index["items"][sha256]
+        total = 0
+        for name in [item["filename"]] + item["attachments"]:
+            try:
+                total += (self.root / sha256 / name).stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def evict(self, keep=None):
+        """Evict least recently used unreferenced items until the store fits its quota."""
+        if not self.quota_bytes:
+            return []
+        evicted = []
+        with self._lock:
+            items = self._index["items"]
+            if self._is_active is not None:
+                for item in items.values():
+                    item["refs"] = [job_id for job_id in item["refs"] if self._is_active(job_id)]
+            sizes = {sha: self._size_locked(sha) for sha in items}
+            total = sum(sizes.values())
+            for sha in sorted(items, key=lambda sha: items[sha]["last_used"]):
+                if total <= self.quota_bytes:
+                    break
+                if sha == keep or items[sha]["refs"]:
+                    continue
+                shutil.rmtree(self.root / sha, ignore_errors=True)
+                del items[sha]
+                total -= sizes[sha]
+                evicted.append(sha)
+            self._index["drive"] = {file_id: sha for file_id, sha in self._index["drive"].items()
+                                    if sha in items}
+            self._save_locked()
+        for sha in evicted:
+            logger.info(f"Media store: evicted {sha[:12]}… (quota {self.quota_bytes / 1024 ** 3:.1f} GB)")
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            items = self._index["items"]
+            return {
+                "items": len(items),
+                "bytes": sum(self._size_locked(sha) for sha in items),
+                "quota_bytes": self.quota_bytes,
+                "referenced": sum(1 for item in items.values() if item["refs"]),
+                "drive_files": len(self._index["drive"]),
+            }
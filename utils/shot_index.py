@@ -0,0 +1,141 @@
+"""
+Local shot-boundary index for a source video.
+
+Shot cuts are detected once per source with ffmpeg's scene-change score over a
+small downscaled decode, and kept as a sorted list of timestamps. The index is
+used to:
+
+- pick chunk cut points near real cuts instead of mid-shot (split_video)
+- snap model timestamps to the nearest cut within a tolerance
+- give the model a compact list of cuts per window as a prompt hint
+"""
+import bisect
+import json
+import re
+from pathlib import Path
+
+from utils import cancellation
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+_PTS_TIME = re.compile(r"pts_time:\s*([0-9]+(?:\.[0-9]+)?)")
+
+
+def detect_shot_boundaries(video_path, ffmpeg_path="ffmpeg", threshold=0.3, height=144, timeout=None):
+    """
+    Detect shot cuts with ffmpeg's scene score (one pass, downscaled, no audio).
+
+    Args:
+        video_path: Source video
+        ffmpeg_path: ffmpeg binary
+        threshold: Scene-change score (0-1) above which a frame starts a new shot
+        height: Decode height for scoring; small is fast and enough for cuts
+        timeout: Optional subprocess timeout in seconds
+
+    Returns:
+        Sorted list of cut timestamps in seconds
+    """
+    command = [
+        ffmpeg_path,
+        "-hide_banner",
+        "-nostats",
+        "-i", str(video_path),
+        "-an", "-sn", "-dn",
+        "-vf", f"scale=-2:{int(height)},select='gt(scene,{threshold})',showinfo",
+        "-f", "null",
+        "-",
+    ]
+    process = cancellation.run_process(command, timeout=timeout)
+    stderr = process.stderr.decode("utf-8", errors="ignore")
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg shot detection failed: {stderr.strip()[-500:]}")
+    # showinfo logs one line per selected frame; only those lines carry pts_time.
+    return sorted(float(match.group(1)) for match in _PTS_TIME.finditer(stderr))
+
+
+def _format(seconds):
+    seconds = max(int(round(seconds)), 0)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class ShotIndex:
+    def __init__(self, boundaries, duration_seconds=None):
+        self.boundaries = sorted(float(value) for value in boundaries)
+        self.duration_seconds = duration_seconds
+
+    def __len__(self):
+        return len(self.boundaries)
+
+    def nearest(self, seconds, tolerance):
+        """Closest cut to `seconds` within `tolerance` (None if there is none)."""
+        if not self.boundaries:
+            return None
+        index = bisect.bisect_left(self.boundaries, seconds)
+        candidates = self.boundaries[max(index - 1, 0):index + 1]
+        best = min(candidates, key=lambda value: abs(value - seconds))
+        return best if abs(best - seconds) <= tolerance else None
+
+    def snap(self, seconds, tolerance):
+        """`seconds` moved to the nearest cut within `tolerance`, else unchanged."""
+        cut = self.nearest(seconds, tolerance)
+        return cut if cut is not None else seconds
+
+    def between(self, start, end):
+        """Cuts with start < t < end."""
+        low = bisect.bisect_right(self.boundaries, start)
+        high = bisect.bisect_left(self.boundaries, end)
+        return self.boundaries[low:high]
+
+    def cut_points(self, chunk_seconds, duration_seconds, tolerance):
+        """
+        Chunk start times: every `chunk_seconds`, each moved to the nearest shot
+        cut within `tolerance`. Always starts at 0.
+        """
+        starts = [0.0]
+        nominal = chunk_seconds
+        while nominal < duration_seconds:
+            cut = self.nearest(nominal, tolerance)
+            start = cut if cut is not None else float(nominal)
+            if start - starts[-1] >= chunk_seconds / 2 and duration_seconds - start >= 1.0:
+                starts.append(start)
+            nominal += chunk_seconds
+        return starts
+
+    def hint(self, start, end, max_cuts=120):
+        """
+        Compact, window-relative list of cuts ("00:12, 00:31, ...") for a prompt.
+        Thinned evenly when a window has more than `max_cuts` cuts.
+        """
+        cuts = self.between(start, end)
+        if not cuts:
+            return ""
+        if len(cuts) > max_cuts:
+            step = len(cuts) / max_cuts
+            cuts = [cuts[int(i * step)] for i in range(max_cuts)]
+        return ", ".join(_format(cut - start) for cut in cuts)
+
+    def save(self, path):
+        Path(path).write_text(json.dumps({
+            "duration_seconds": self.duration_seconds,
+            "boundaries": [round(value, 3) for value in self.boundaries],
+        }), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(data.get("boundaries") or [], data.get("duration_seconds"))
+
+    @classmethod
+    def build(cls, video_path, duration_seconds=None, ffmpeg_path="ffmpeg", threshold=0.3,
+              height=144, cache_path=None):
+        """Detect (or load from `cache_path`) the index for a source."""
+        if cache_path and Path(cache_path).exists():
+            return cls.load(cache_path)
+        boundaries = detect_shot_boundaries(video_path, ffmpeg_path=ffmpeg_path,
+                                            threshold=threshold, height=height)
+        index = cls(boundaries, duration_seconds)
+        logger.info(f"Shot index: {len(index)} cuts detected in {Path(video_path).name}")
+        if cache_path:
+            index.save(cache_path)
+        return index
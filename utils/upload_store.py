@@ -0,0 +1,315 @@
+"""
+Resumable, chunked video uploads.
+
+Why: /api/process took the whole video as one multipart form. Werkzeug spooled
+it to a temp file, `save()` copied it into the session dir, and a 2 GB upload
+that dropped at 95% started over. Uploads now go through a small protocol:
+
+    POST   /api/uploads                 {filename, size[, sha256]} -> upload_id
+    PATCH  /api/uploads/<id>            body = bytes, Content-Range: bytes a-b/size
+    GET    /api/uploads/<id>            received ranges (where to resume)
+    POST   /api/uploads/<id>/complete   [sha256] -> verified content hash
+    POST   /api/process                 upload_id=<id>
+
+- Each chunk is streamed from the request straight into the upload's file
+  (created at its full size) with positional writes, so chunks can arrive in
+  any order, be retried, or be sent in parallel, and nothing is spooled.
+- Bytes written before a connection drops still count: the client asks which
+  ranges are missing and sends only those.
+- The SHA-256 is computed while the data arrives: a block that extends the
+  hashed prefix updates the hash as it is written. Only out-of-order data is
+  read back once the gap before it is filled, or after a restart, when the
+  hash state is lost.
+- A completed upload is moved (renamed, not copied) into the job's session
+  dir when a job claims it. Uploads that are not claimed expire.
+
+State lives in <root>/<upload_id>/upload.json next to the data file.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+_META_FILE = "upload.json"
+_HASH_BLOCK = 1024 * 1024
+
+
+class UploadError(Exception):
+    """An upload request that can't be honoured; `status` is the HTTP status to answer."""
+    status = 400
+
+
+class UploadNotFound(UploadError):
+    status = 404
+
+
+class UploadConflict(UploadError):
+    """The upload isn't in a state that allows this (incomplete, hash mismatch, ...)."""
+    status = 409
+
+
+class RangeNotSatisfiable(UploadError):
+    status = 416
+
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, "pwrite"):
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data, offset = data[written:], offset + written
+    else:  # Windows: no pwrite; each request has its own descriptor, so seek is safe
+        os.lseek(fd, offset, os.SEEK_SET)
+        while data:
+            data = data[os.write(fd, data):]
+
+
+def _merge(ranges, start, end):
+    """Add [start, end) to sorted, disjoint [start, end) ranges."""
+    merged = []
+    for a, b in sorted(ranges + [[start, end]]):
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return merged
+
+
+class Upload:
+    def __init__(self, upload_id, filename, size, sha256=None):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.expected_sha256 = sha256   # from the client, verified on completion
+        self.sha256 = None              # set once complete
+        self.ranges = []                # received [start, end) byte ranges
+        self.completed = False
+        self.created_at = time.time()
+        self.lock = threading.Lock()
+        self._hasher = hashlib.sha256()
+        self.hashed = 0                 # bytes [0, hashed) are in _hasher
+
+    @property
+    def received(self):
+        return sum(b - a for a, b in self.ranges)
+
+    @property
+    def contiguous(self):
+        """Bytes received without a gap from the start."""
+        return self.ranges[0][1] if self.ranges and self.ranges[0][0] == 0 else 0
+
+    def missing(self):
+        gaps, position = [], 0
+        for a, b in self.ranges:
+            if a > position:
+                gaps.append([position, a])
+            position = b
+        if position < self.size:
+            gaps.append([position, self.size])
+        return gaps
+
+    def to_dict(self):
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "received": self.received,
+            "ranges": self.ranges,
+            "missing": self.missing(),
+            "completed": self.completed,
+            "sha256": self.sha256,
+        }
+
+    def to_state(self):
+        return dict(self.to_dict(), expected_sha256=self.expected_sha256, created_at=self.created_at)
+
+    @classmethod
+    def from_state(cls, data):
+        upload = cls(data["upload_id"], data["filename"], data["size"], data.get("expected_sha256"))
+        upload.sha256 = data.get("sha256")
+        upload.ranges = [list(r) for r in data.get("ranges") or []]
+        upload.completed = bool(data.get("completed"))
+        upload.created_at = data.get("created_at") or time.time()
+        return upload
+
+
+class UploadStore:
+    def __init__(self, root, max_size=0, expiry_seconds=24 * 3600, block_size=_HASH_BLOCK):
+        """
+        Args:
+            root: directory holding one sub-directory per upload
+            max_size: largest upload accepted, in bytes (0: no limit)
+            expiry_seconds: uploads left idle (no chunk, not claimed by a job)
+                            this long are deleted (0: never)
+            block_size: bytes read from the request per write
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.expiry_seconds = expiry_seconds
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._uploads = {}
+
+    def _dir(self, upload_id):
+        return self.root / upload_id
+
+    def data_path(self, upload):
+        return self._dir(upload.upload_id) / upload.filename
+
+    def _save(self, upload):
+        path = self._dir(upload.upload_id) / _META_FILE
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(upload.to_state(), f)
+        os.replace(tmp_path, path)
+
+    # ---------------- protocol ----------------
+
+    def create(self, filename, size, sha256=None):
+        """Start an upload of `size` bytes; its file is allocated (sparse) at once."""
+        if size is None or size <= 0:
+            raise UploadError("size must be a positive number of bytes")
+        if self.max_size and size > self.max_size:
+            raise UploadError(f"Upload too large ({size} bytes, limit {self.max_size})")
+        self.expire()
+        upload = Upload(uuid.uuid4().hex, filename, int(size), (sha256 or "").lower() or None)
+        directory = self._dir(upload.upload_id)
+        directory.mkdir(parents=True)
+        with open(self.data_path(upload), "wb") as f:
+            f.truncate(upload.size)
+        self._save(upload)
+        with self._lock:
+            self._uploads[upload.upload_id] = upload
+        logger.info(f"Upload {upload.upload_id} started: {filename} ({size / 1024 ** 2:.1f} MB)")
+        return upload
+
+    def get(self, upload_id):
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is not None:
+                return upload
+            meta = self._dir(upload_id) / _META_FILE
+            if not upload_id.isalnum() or not meta.exists():
+                raise UploadNotFound(f"Upload {upload_id} not found")
+            with open(meta, encoding="utf-8") as f:
+                upload = Upload.from_state(json.load(f))
+            self._uploads[upload_id] = upload  # hash state starts over (see module doc)
+            return upload
+
+    def write(self, upload_id, start, stream, length):
+        """
+        Write `length` bytes read from `stream` at offset `start`. Bytes that
+        arrive before the stream ends early are kept (and reported as received).
+        """
+        upload = self.get(upload_id)
+        if upload.completed:
+            raise UploadConflict(f"Upload {upload_id} is already complete")
+        end = start + length
+        if start < 0 or length < 0 or end > upload.size:
+            raise RangeNotSatisfiable(f"Range {start}-{end - 1} is outside 0-{upload.size - 1}")
+        position = start
+        fd = os.open(self.data_path(upload), os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        try:
+            while position < end:
+                block = stream.read(min(self.block_size, end - position))
+                if not block:
+                    break
+                _pwrite(fd, block, position)
+                with upload.lock:
+                    # Extends the hashed prefix: hash it now, while it's in memory.
+                    if position <= upload.hashed < position + len(block):
+                        upload._hasher.update(block[upload.hashed - position:])
+                        upload.hashed = position + len(block)
+                position += len(block)
+        finally:
+            os.close(fd)
+            with upload.lock:
+                if position > start:
+                    upload.ranges = _merge(upload.ranges, start, position)
+                    self._catch_up_hash(upload)
+                self._save(upload)
+        if position < end:
+            raise UploadError(f"Expected {length} bytes, received {position - start}; "
+                              f"resume from the missing ranges")
+        return upload
+
+    def _catch_up_hash(self, upload):
+        """Hash data written out of order, now that the prefix before it is in (lock held)."""
+        target = upload.contiguous
+        if upload.hashed >= target:
+            return
+        with open(self.data_path(upload), "rb") as f:
+            f.seek(upload.hashed)
+            while upload.hashed < target:
+                block = f.read(min(_HASH_BLOCK, target - upload.hashed))
+                if not block:
+                    break
+                upload._hasher.update(block)
+                upload.hashed += len(block)
+
+    def complete(self, upload_id, sha256=None):
+        """Check every byte arrived and the hash matches; the upload can then be claimed."""
+        upload = self.get(upload_id)
+        with upload.lock:
+            if upload.completed:
+                return upload
+            missing = upload.missing()
+            if missing:
+                raise UploadConflict(f"Upload {upload_id} is missing {len(missing)} range(s), "
+                                     f"first at byte {missing[0][0]}")
+            self._catch_up_hash(upload)
+            digest = upload._hasher.hexdigest()
+            expected = (sha256 or "").lower() or upload.expected_sha256
+            if expected and expected != digest:
+                raise UploadConflict(f"SHA-256 mismatch: expected {expected}, received {digest}")
+            upload.sha256 = digest
+            upload.completed = True
+            self._save(upload)
+        logger.info(f"Upload {upload_id} complete (sha256 {digest[:12]}…)")
+        return upload
+
+    def claim(self, upload_id, target_dir):
+        """
+        Move a completed upload's file into `target_dir` (a rename when on the
+        same filesystem) and forget the upload. Returns (path, sha256).
+        """
+        upload = self.get(upload_id)
+        with upload.lock:
+            if not upload.completed:
+                raise UploadConflict(f"Upload {upload_id} is not complete")
+            target_dir = Path(target_dir)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            target = target_dir / upload.filename
+            shutil.move(str(self.data_path(upload)), str(target))
+        self.delete(upload_id)
+        return target, upload.sha256
+
+    def delete(self, upload_id):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        directory = self._dir(upload_id)
+        if not upload_id.isalnum() or not directory.exists():
+            return False
+        shutil.rmtree(directory, ignore_errors=True)
+        return True
+
+    def expire(self):
+        """Delete uploads idle for `expiry_seconds` that no job claimed."""
+        if not self.expiry_seconds:
+            return
+        cutoff = time.time() - self.expiry_seconds
+        for meta in self.root.glob(f"*/{_META_FILE}"):
+            try:
+                if meta.stat().st_mtime < cutoff:
+                    logger.info(f"Upload {meta.parent.name} expired; deleting it")
+                    self.delete(meta.parent.name)
+            except OSError:
+                continue
@@ -5,22 +5,36 @@ import subprocess
 import re
 import shutil
 from pathlib import Path
+from utils import cancellation
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
 class VideoProcessor:
-    def __init__(self, ffmpeg_path="ffmpeg"):
-        """Initialize video processor"""
+    """
+    ffmpeg / ffprobe run through cancellation.run_process: inside a job, the
+    Popen handle is registered on the job's cancel token and killed when the
+    job is cancelled.
+    """
+
+    def __init__(self, ffmpeg_path="ffmpeg", clip_timeout_seconds=300, clip_timeout_per_second=20):
+        """
+        Initialize video processor
+
+        Args:
+            ffmpeg_path: ffmpeg binary
+            clip_timeout_seconds: Minimum time a clip render may take
+            clip_timeout_per_second: Render time allowed per second of clip
+                                     (the timeout is the larger of the two)
+        """
         self.ffmpeg_path = ffmpeg_path
+        self.clip_timeout_seconds = clip_timeout_seconds
+        self.clip_timeout_per_second = clip_timeout_per_second
         logger.info(f"Video processor initialized with ffmpeg: {ffmpeg_path}")
         
         # Verify ffmpeg and ffprobe are available
         try:
-            result = subprocess.run([ffmpeg_path, "-version"], 
-                                  capture_output=True, 
-                                  text=True,
-                                  timeout=5)
+            result = cancellation.run_process([ffmpeg_path, "-version"], text=True, timeout=5)
             if result.returncode == 0:
                 logger.info("FFmpeg is available and working")
                 logger.debug(f"FFmpeg version: {result.stdout.split()[2]}")
@@ -45,26 +59,16 @@ class VideoProcessor:
                 "-of", "default=noprint_wrappers=1:nokey=1",
                 input_path,
             ]
+            result = cancellation.run_process(command, text=True)
             try:
-                result = subprocess.run(
-                    command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    check=True,
-                    text=True,
-                )
-                return float(result.stdout.strip())
-            except (subprocess.CalledProcessError, ValueError):
+                if result.returncode == 0:
+                    return float(result.stdout.strip())
+            except ValueError:
                 pass  # Fallback to ffmpeg if ffprobe fails or output is invalid
 
         # Fallback to ffmpeg
         command = [self.ffmpeg_path, "-i", input_path]
-        result = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
+        result = cancellation.run_process(command, text=True)
         # ffmpeg outputs to stderr
         # Pattern: Duration: 00:00:00.00
         match = re.search(r"Duration:\s*(\d+):(\d+):(\d+\.?\d*)", result.stderr)
@@ -97,7 +101,7 @@ class VideoProcessor:
                 str(audio_path)
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+            result = cancellation.run_process(cmd, text=True, timeout=10)
             
             if result.returncode == 0:
                 data = json.loads(result.stdout)
@@ -153,23 +157,164 @@ class VideoProcessor:
         # Add -y to overwrite
         command.insert(1, "-y")
 
-        process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False,
-        )
+        process = cancellation.run_process(command)
         if process.returncode != 0:
             error_msg = process.stderr.decode("utf-8", errors="ignore").strip()
             raise RuntimeError(f"FFmpeg trim failed: {error_msg}")
 
-    def split_video(self, input_path, chunk_duration=600):
+    def create_analysis_proxy(self, input_path, output_path, height=480, fps=2,
+                              video_kbps=400, audio_kbps=32, mono_audio=True,
+                              keep_audio=True, keyframe_seconds=None, keyframe_times=None):
+        """
+        Transcode a small, low-bitrate copy of the video for AI analysis (one pass).
+
+        The analysis model samples only a few frames per second at modest
+        resolution, so uploading the full-quality source wastes upload time and
+        server-side processing. Rendering still uses the original.
+
+        Args:
+            input_path: Path to the source video
+            output_path: Path for the proxy (.mp4)
+            height: Max output height in pixels (never upscaled)
+            fps: Output frame rate
+            video_kbps: Target video bitrate
+            audio_kbps: Audio bitrate (AAC)
+            mono_audio: Downmix audio to one channel
+            keep_audio: Drop the audio track entirely when False
+            keyframe_seconds: Force a keyframe every N seconds (e.g. the chunk
+                              length) so stream-copy splits land exactly
+            keyframe_times: Force keyframes at these times instead (e.g. chunk
+                            cut points chosen near shot boundaries)
+
+        Returns:
+            Path to the proxy
+        """
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        command = [
+            self.ffmpeg_path,
+            "-y",
+            "-hide_banner",
+            "-loglevel", "error",
+            "-i", str(input_path),
+            "-map", "0:v:0",
+            "-vf", f"scale=-2:'min({int(height)},ih)',fps={fps}",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-b:v", f"{int(video_kbps)}k",
+            "-maxrate", f"{int(video_kbps * 1.5)}k",
+            "-bufsize", f"{int(video_kbps * 2)}k",
+        ]
+        if keyframe_times:
+            command += ["-force_key_frames", ",".join(f"{t:.3f}" for t in keyframe_times)]
+        elif keyframe_seconds:
+            command += ["-force_key_frames", f"expr:gte(t,n_forced*{keyframe_seconds})"]
+        if keep_audio:
+            command += ["-map", "0:a:0?", "-c:a", "aac", "-b:a", f"{int(audio_kbps)}k"]
+            if mono_audio:
+                command += ["-ac", "1"]
+        else:
+            command += ["-an"]
+        command += ["-movflags", "+faststart", str(output_path)]
+
+        logger.info(f"Creating analysis proxy: {height}p @ {fps}fps, {video_kbps}k video"
+                    f"{f', {audio_kbps}k audio' if keep_audio else ', no audio'}")
+        logger.debug(f"FFmpeg command: {' '.join(command)}")
+        process = cancellation.run_process(command)
+        if process.returncode != 0:
+            error_msg = process.stderr.decode("utf-8", errors="ignore").strip()
+            raise RuntimeError(f"FFmpeg proxy transcode failed: {error_msg}")
+        if not output_path.exists() or output_path.stat().st_size == 0:
+            raise RuntimeError(f"Proxy file was not created: {output_path}")
+        return output_path
+
+    def extract_frame_sheets(self, input_path, output_dir, spans, fps=0.5, height=180,
+                             tile=(4, 4), burn_timecodes=True, scene_threshold=None,
+                             max_gap_seconds=10):
+        """
+        Sample frames for frame-based analysis in ONE ffmpeg pass over the source.
+
+        Frames are sampled at `fps` (or at shot changes when `scene_threshold` is
+        set, with at least one frame every `max_gap_seconds`), downscaled,
+        optionally stamped with their film timecode, then split per span and
+        optionally tiled into contact sheets (left-to-right, top-to-bottom).
+
+        Args:
+            input_path: Source video (or analysis proxy)
+            output_dir: Directory for window_NNN/sheet_NNN.jpg
+            spans: (start, end) seconds of each analysis window
+            fps: Sampling rate when not sampling at shot changes
+            height: Frame height in pixels
+            tile: (columns, rows) per contact sheet, or None for single frames
+            burn_timecodes: Draw the absolute timecode on every frame
+            scene_threshold: Sample at scene changes above this score instead of fps
+            max_gap_seconds: Longest gap between samples in scene mode
+
+        Returns:
+            One list per span of (image path, [frame times in seconds]) tuples
+        """
+        output_dir = Path(output_dir)
+        if scene_threshold:
+            sampler = (f"select='gt(scene,{scene_threshold})+isnan(prev_selected_t)"
+                       f"+gte(t-prev_selected_t,{max_gap_seconds})'")
+        else:
+            sampler = f"fps={fps}"
+        chain = [sampler, f"scale=-2:{int(height)}"]
+        if burn_timecodes:
+            chain.append("drawtext=text='%{pts\\:hms}':x=6:y=6:fontsize=h/10:"
+                         "fontcolor=white:box=1:boxcolor=black@0.6")
+        chain.append("showinfo")  # logs pts_time of every sampled frame
+
+        outputs = "".join(f"[s{i}]" for i in range(len(spans)))
+        graph = [f"[0:v]{','.join(chain)},split={len(spans)}{outputs}"]
+        for i, (start, end) in enumerate(spans):
+            branch = f"[s{i}]trim=start={start:.3f}:end={end:.3f}"
+            if tile:
+                branch += f",tile={tile[0]}x{tile[1]}"
+            graph.append(f"{branch}[o{i}]")
+
+        command = [
+            self.ffmpeg_path, "-y", "-hide_banner", "-nostats",
+            "-i", str(input_path),
+            "-an", "-sn",
+            "-filter_complex", ";".join(graph),
+        ]
+        window_dirs = []
+        for i in range(len(spans)):
+            window_dir = output_dir / f"window_{i + 1:03d}"
+            window_dir.mkdir(parents=True, exist_ok=True)
+            window_dirs.append(window_dir)
+            command += ["-map", f"[o{i}]", "-vsync", "0", "-q:v", "4",
+                        str(window_dir / "sheet_%03d.jpg")]
+
+        logger.info(f"Extracting frames for {len(spans)} window(s): "
+                    f"{'shot changes' if scene_threshold else f'{fps} fps'}, {height}p"
+                    f"{f', {tile[0]}x{tile[1]} sheets' if tile else ''}")
+        process = cancellation.run_process(command)
+        stderr = process.stderr.decode("utf-8", errors="ignore")
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg frame extraction failed: {stderr.strip()[-500:]}")
+
+        times = sorted(float(value) for value in re.findall(r"pts_time:\s*([0-9]+(?:\.[0-9]+)?)", stderr))
+        per_sheet = tile[0] * tile[1] if tile else 1
+        result = []
+        for (start, end), window_dir in zip(spans, window_dirs):
+            window_times = [t for t in times if start <= t < end]
+            groups = [window_times[i:i + per_sheet] for i in range(0, len(window_times), per_sheet)]
+            images = sorted(window_dir.glob("sheet_*.jpg"))
+            result.append(list(zip(images, groups)))
+        return result
+
+    def split_video(self, input_path, chunk_duration=600, cut_points=None):
         """
         Split video into chunks of specified duration using the reference logic.
         
         Args:
             input_path: Path to input video file
             chunk_duration: Duration of each chunk in seconds (default: 600s = 10m)
+            cut_points: Optional chunk start times (e.g. near shot cuts from a
+                        ShotIndex) instead of every `chunk_duration` seconds
             
         Returns:
             List of paths to the generated video chunks
@@ -188,12 +333,18 @@ class VideoProcessor:
             
             logger.info(f"Splitting video (duration: {duration:.2f}s) into chunks of {chunk_duration}s")
             
+            if cut_points:
+                starts = [start for start in cut_points if start < duration]
+            else:
+                starts = []
+                start = 0.0
+                while start < duration:
+                    starts.append(start)
+                    start += chunk_duration
+            ends = starts[1:] + [duration]
+
             chunk_paths = []
-            current_start = 0.0
-            clip_index = 1
-            
-            while current_start < duration:
-                current_end = min(current_start + chunk_duration, duration)
+            for clip_index, (current_start, current_end) in enumerate(zip(starts, ends), 1):
                 chunk_filename = f"chunk_{clip_index:03d}.mp4"
                 chunk_path = output_dir / chunk_filename
                 
@@ -213,9 +364,6 @@ class VideoProcessor:
                 except Exception as e:
                     logger.error(f"Failed to create chunk {clip_index}: {str(e)}")
                     raise
-                
-                current_start += chunk_duration
-                clip_index += 1
                     
             return chunk_paths
             
@@ -315,12 +463,9 @@ class VideoProcessor:
                         f"({final_duration:.2f}s)")
             
             # Run FFmpeg
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
-            )
+            # Scales with the clip: a fixed limit killed long clips on slow machines.
+            timeout = max(self.clip_timeout_seconds, final_duration * self.clip_timeout_per_second)
+            result = cancellation.run_process(cmd, text=True, timeout=timeout)
             
             if result.returncode == 0:
                 logger.info(f"✅ Successfully created clip: {output_path}")
@@ -342,8 +487,8 @@ class VideoProcessor:
                 logger.error(f"FFmpeg stderr: {result.stderr}")
                 raise Exception(f"FFmpeg processing failed: {result.stderr}")
                 
-        except subprocess.TimeoutExpired:
-            logger.error("FFmpeg process timed out")
+        except subprocess.TimeoutExpired as e:
+            logger.error(f"FFmpeg process timed out after {e.timeout:.0f}s")
             raise Exception("Video processing timed out")
         except Exception as e:
             logger.error(f"Error processing clip: {str(e)}", exc_info=True)
@@ -455,12 +600,7 @@ class VideoProcessor:
             
             logger.debug(f"Concatenation command: {' '.join(cmd)}")
             
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=600  # 10 minute timeout
-            )
+            result = cancellation.run_process(cmd, text=True, timeout=600)  # 10 minute timeout
             
             if result.returncode == 0:
                 logger.info(f"Successfully created final video: {output_path}")
@@ -27,9 +27,10 @@ SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
 
 class YouTubeUploader:
     def __init__(self, client_secrets_file="client_secrets.json",
-                 token_file="youtube_token.json"):
+                 token_file="youtube_token.json", http_transport=None):
         self.client_secrets_file = str(client_secrets_file)
         self.token_file = str(token_file)
+        self.http_transport = http_transport  # SharedTransport: keep-alive + upload timeouts
         self._service = None
 
     # ---------------- auth ----------------
@@ -94,7 +95,10 @@ class YouTubeUploader:
                 "YouTube is not authorized. Run `python -m utils.youtube_uploader` "
                 "once to complete OAuth consent."
             )
-        self._service = build("youtube", "v3", credentials=creds)
+        if self.http_transport is not None:
+            self._service = build("youtube", "v3", http=self.http_transport.youtube_http(creds))
+        else:
+            self._service = build("youtube", "v3", credentials=creds)
         return self._service
 
     # ---------------- upload ----------------